@@ -0,0 +1,311 @@
+"""
+Index of the stored model checkpoints of a training, and the cleanup of old checkpoints.
+
+The index is a small JSON file next to the models (by default ``<model>.checkpoints.json``)
+with one entry per epoch: the checkpoint filename, whether it is a pretrain epoch, the size on disk
+and the scores of the epoch (as in the learning rate control).
+It is updated by the engine whenever it saves an epoch model,
+see ``checkpoint_index`` in :class:`TFEngine.Engine`.
+
+With the index, :func:`cleanup_old_models` does not need the engine (or even TF),
+and the costs are linear in the number of models (one directory listing, no ``glob`` per model).
+See also ``tools/cleanup-old-models.py``.
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import json
+from Log import log
+
+
+class CheckpointIndex(object):
+  """
+  Epoch -> checkpoint info, stored as JSON.
+  """
+
+  def __init__(self, filename):
+    """
+    :param str|None filename: JSON file. loaded if it exists. if None, the index is only kept in memory
+    """
+    self.filename = filename
+    self.entries = {}  # type: dict[int,dict[str]]  # epoch -> dict with filename, is_pretrain, size, scores
+    if filename and os.path.exists(filename):
+      self.load()
+
+  @classmethod
+  def get_default_filename(cls, model_filename):
+    """
+    :param str model_filename: config option "model", i.e. the prefix of the epoch model filenames
+    :rtype: str
+    """
+    return model_filename + ".checkpoints.json"
+
+  def load(self):
+    with open(self.filename) as f:
+      d = json.load(f)
+    self.entries = {int(epoch): entry for (epoch, entry) in d.items()}
+
+  def save(self):
+    if not self.filename:
+      return
+    # First write to a temp-file, to be sure that writing happens without errors.
+    # Only afterwards, we rename it.
+    tmp_filename = self.filename + ".new_tmp"
+    with open(tmp_filename, "w") as f:
+      json.dump({str(epoch): entry for (epoch, entry) in self.entries.items()}, f, sort_keys=True, indent=1)
+    os.rename(tmp_filename, self.filename)
+
+  def add_checkpoint(self, epoch, filename, is_pretrain, size=None, scores=None):
+    """
+    :param int epoch:
+    :param str filename: checkpoint filename, as for :func:`EngineBase.EngineBase.epoch_model_filename`
+    :param bool is_pretrain:
+    :param int|None size: bytes on disk. can be None if the files are not written yet (async save)
+    :param dict[str,float]|None scores:
+    """
+    self.entries[epoch] = {"filename": filename, "is_pretrain": is_pretrain, "size": size, "scores": scores or {}}
+
+  def set_scores(self, epoch, scores):
+    """
+    :param int epoch:
+    :param dict[str,float] scores:
+    """
+    self.entries[epoch]["scores"] = dict(scores)
+
+  def update_scores_from_learning_rate_control(self, lr_control):
+    """
+    :param LearningRateControl.LearningRateControl lr_control:
+    """
+    for epoch in self.entries.keys():
+      if epoch in lr_control.epochData:
+        self.set_scores(epoch, lr_control.epochData[epoch].error)
+
+  def update_from_existing_models(self, existing_models):
+    """
+    Adds missing and removes no longer existing checkpoints.
+
+    :param dict[int,str] existing_models: epoch -> filename, e.g. via :func:`EngineBase.get_existing_models`
+      or :func:`scan_model_dir`
+    """
+    for epoch in list(self.entries.keys()):
+      if epoch not in existing_models:
+        del self.entries[epoch]
+    for epoch, filename in existing_models.items():
+      if epoch not in self.entries or self.entries[epoch]["filename"] != filename:
+        self.add_checkpoint(epoch=epoch, filename=filename, is_pretrain=filename.endswith(".pretrain.%03d" % epoch))
+
+  def update_sizes(self, dir_listing=None):
+    """
+    Fills in the unknown sizes.
+
+    :param dict[str,list[str]]|None dir_listing: dir -> files, to reuse the directory listing
+    """
+    if dir_listing is None:
+      dir_listing = {}
+    for entry in self.entries.values():
+      if entry["size"] is None:
+        entry["size"] = sum([
+          os.stat(fn).st_size for fn in get_checkpoint_files(entry["filename"], dir_listing=dir_listing)]) or None
+
+  @classmethod
+  def scan_model_dir(cls, model_filename):
+    """
+    Like :func:`EngineBase.get_existing_models`, but with a single directory listing,
+    and independent from the config (final epoch).
+
+    :param str model_filename: config option "model"
+    :return: epoch -> checkpoint filename
+    :rtype: dict[int,str]
+    """
+    model_dir = os.path.dirname(model_filename) or "."
+    pattern = re.compile("^%s(\\.pretrain)?\\.([0-9]+)\\.index$" % re.escape(os.path.basename(model_filename)))
+    existing_models = {}
+    for name in os.listdir(model_dir):
+      m = pattern.match(name)
+      if m:
+        epoch = int(m.group(2))
+        if epoch in existing_models and m.group(1):
+          continue  # like get_existing_models, prefer the non-pretrain model
+        existing_models[epoch] = os.path.join(os.path.dirname(model_filename), name[:-len(".index")])
+    return existing_models
+
+
+def get_checkpoint_files(filename, dir_listing=None):
+  """
+  :param str filename: checkpoint filename (prefix)
+  :param dict[str,list[str]]|None dir_listing: dir -> files. will be filled
+  :return: existing files of the TF checkpoint, i.e. with the extensions ".index", ".meta" and ".data*"
+  :rtype: list[str]
+  """
+  model_dir = os.path.dirname(filename) or "."
+  if dir_listing is None:
+    dir_listing = {}
+  if model_dir not in dir_listing:
+    dir_listing[model_dir] = os.listdir(model_dir)
+  base_name = os.path.basename(filename)
+  return [
+    os.path.join(os.path.dirname(filename), name) for name in dir_listing[model_dir]
+    if name in [base_name + ".index", base_name + ".meta"] or name.startswith(base_name + ".data")]
+
+
+def delete_checkpoint(filename, dir_listing=None):
+  """
+  :param str filename: checkpoint filename (prefix)
+  :param dict[str,list[str]]|None dir_listing: dir -> files
+  :return: accumulated file-size in bytes of deleted files
+  :rtype: int
+  """
+  count_bytes = 0
+  files = get_checkpoint_files(filename, dir_listing=dir_listing)
+  assert filename + ".index" in files, "checkpoint %r does not exist" % filename
+  # Delete the ".index" file first, such that an incompletely deleted checkpoint is not seen as existing.
+  files.remove(filename + ".index")
+  for fn in [filename + ".index"] + sorted(files):
+    count_bytes += os.stat(fn).st_size
+    os.remove(fn)
+  assert count_bytes > 0
+  return count_bytes
+
+
+def select_epochs_to_keep(epoch_scores, keep_last_n=2, keep_best_n=4, keep=None):
+  """
+  :param dict[int,dict[str,float]] epoch_scores: for all existing models, epoch -> scores
+  :param int keep_last_n:
+  :param int keep_best_n: for every score key
+  :param set[int]|list[int]|None keep: if None, some default pattern depending on the number of epochs
+  :return: epochs to keep, subset of epoch_scores.keys()
+  :rtype: set[int]
+  """
+  from itertools import count
+  epochs = sorted(epoch_scores.keys())
+  assert keep_last_n >= 1 and keep_best_n >= 0
+  assert epochs
+  keep_epochs = set()  # type: set[int]
+  if keep is None:
+    keep = set()
+    if epochs[-1] <= 10:
+      keep_every = 4
+      keep_doubles_of = 5
+    elif epochs[-1] <= 50:
+      keep_every = 20
+      keep_doubles_of = 5
+    elif epochs[-1] <= 100:
+      keep_every = 40
+      keep_doubles_of = 10
+    else:
+      keep_every = 80
+      keep_doubles_of = 20
+    for i in count(1):
+      n = keep_every * i
+      if n > epochs[-1]:
+        break
+      keep.add(n)
+    for i in count():
+      n = keep_doubles_of * (2 ** i)
+      if n > epochs[-1]:
+        break
+      keep.add(n)
+  keep_epochs.update(keep)
+  keep_epochs.update(epochs[-keep_last_n:])
+  score_keys = set()  # e.g. "dev_error", "dev_score", etc.
+  # Collect all possible score keys. Note that we could have different ones for different epochs.
+  for scores in epoch_scores.values():
+    score_keys.update(scores.keys())
+  assert score_keys, "no scores for the epochs %r" % (epochs,)
+  score_keys = sorted(score_keys)
+  score_values = {key: [] for key in score_keys}
+  for epoch in epochs:
+    for key, value in epoch_scores[epoch].items():
+      score_values[key].append(value)
+  for key in list(score_keys):
+    scores = score_values[key]
+    if min(scores) == max(scores):
+      print("Ignoring score key %r because all epochs have the same value %r." % (key, scores[0]), file=log.v3)
+      score_keys.remove(key)
+      score_values.pop(key)
+  # Actually, terminology is a bit confusing. We call it "score" here (and elsewhere), but it's a loss,
+  # so the maximum value is the worst possible value.
+  worst_score_values = {key: max(scores) for (key, scores) in score_values.items()}
+  for key in score_keys:
+    scores = sorted([(epoch_scores[epoch].get(key, worst_score_values[key]), epoch) for epoch in epochs])
+    scores = scores[:keep_best_n]
+    keep_epochs.update([v[1] for v in scores])
+  keep_epochs.intersection_update(epochs)
+  return keep_epochs
+
+
+def cleanup_old_models(index, opts, dry_run=False, ask_for_confirmation=False):
+  """
+  Deletes the models which are neither among the last nor among the best ones, see :func:`select_epochs_to_keep`.
+  The index is updated accordingly (and saved, if not dry-run).
+
+  :param CheckpointIndex index: should be up-to-date w.r.t. the existing models and the scores
+  :param Util.CollectionReadCheckCovered opts: config option "cleanup_old_models".
+    keep_last_n, keep_best_n, keep: see :func:`select_epochs_to_keep`.
+    num_workers: number of threads which delete the files
+  :param bool dry_run: only report what would be deleted
+  :param bool ask_for_confirmation: if True, will ask the user interactively to confirm
+  :return: freed bytes (or the bytes which would be freed in dry-run)
+  :rtype: int
+  """
+  from Util import human_bytes_size, confirm
+  epochs = sorted(index.entries.keys())
+  if not epochs:
+    print("Cannot cleanup models, no models found.", file=log.v2)
+    return 0
+  keep_last_n = opts.get("keep_last_n", 2)
+  keep_best_n = opts.get("keep_best_n", 4)
+  keep = opts.get("keep", None)
+  num_workers = opts.get("num_workers", 4)
+  if max(keep_last_n, keep_best_n) >= len(epochs):
+    print(
+      ("Only %i epochs stored so far and keeping last %i epochs and best %i epochs,"
+       " thus not cleaning up any epochs yet.") % (
+        len(epochs), keep_last_n, keep_best_n), file=log.v2)
+    return 0
+  keep_epochs = select_epochs_to_keep(
+    {epoch: index.entries[epoch]["scores"] for epoch in epochs},
+    keep_last_n=keep_last_n, keep_best_n=keep_best_n, keep=keep)
+  if len(keep_epochs) == len(epochs):
+    print("%i epochs stored so far and keeping all." % len(epochs), file=log.v2)
+    return 0
+  remove_epochs = sorted(set(epochs).difference(keep_epochs))
+  assert remove_epochs
+  if len(epochs) > 6:
+    epoch_summary = "[%s, ..., %s]" % (", ".join(map(str, epochs[:3])), ", ".join(map(str, epochs[-3:])))
+  else:
+    epoch_summary = str(epochs)
+  print("We have stored models for epochs %s and keep epochs %s." % (epoch_summary, sorted(keep_epochs)), file=log.v3)
+  print("We will delete the models of epochs %s." % (remove_epochs,), file=log.v3)
+  opts.assert_all_read()
+  dir_listing = {}
+  index.update_sizes(dir_listing=dir_listing)
+  if dry_run:
+    count_bytes = 0
+    for epoch in remove_epochs:
+      size = index.entries[epoch]["size"] or 0
+      print("  epoch %i: %s (%s)" % (epoch, index.entries[epoch]["filename"], human_bytes_size(size)), file=log.v3)
+      count_bytes += size
+    print("Dry-run, will not delete models. Would free %s." % human_bytes_size(count_bytes), file=log.v2)
+    return count_bytes
+  if ask_for_confirmation:
+    confirm("Delete those models?", exit_on_false=True)
+  filenames = [index.entries[epoch]["filename"] for epoch in remove_epochs]
+  if num_workers > 1 and len(filenames) > 1:
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(num_workers, len(filenames)))
+    try:
+      sizes = pool.map(lambda fn: delete_checkpoint(fn, dir_listing=dir_listing), filenames)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    sizes = [delete_checkpoint(fn, dir_listing=dir_listing) for fn in filenames]
+  for epoch in remove_epochs:
+    del index.entries[epoch]
+  index.save()
+  count_bytes = sum(sizes)
+  print("Deleted %s." % human_bytes_size(count_bytes), file=log.v2)
+  return count_bytes
@@ -7,6 +7,8 @@ try:
 except ImportError:
   import _thread as thread
 import threading
+import contextlib
+import time
 
 
 signum_to_signame = {
@@ -344,3 +346,84 @@ def debug_shell(user_ns=None, user_global_ns=None, exit_afterwards=True):
     print("Debug shell exit. Exit now.")
     sys.exit(1)
 
+
+class StartupProfiler:
+  """
+  Measures the time spent in module imports (by wrapping ``__import__``, only in the installing thread),
+  and in named init steps (see :func:`step`).
+  Used via ``rnn.py --startup-profile <config>``.
+  Modules which were imported before :func:`install` are not covered.
+  """
+
+  def __init__(self):
+    self.start_time = None  # type: float|None
+    self.import_times = {}  # type: dict[str,float]  # module -> time, including sub imports
+    self.import_self_times = {}  # type: dict[str,float]  # module -> time, excluding sub imports
+    self.total_import_time = 0.0
+    self.steps = []  # type: list[(str,float)]
+    self._orig_import = None
+    self._thread = None
+    self._stack = []  # type: list[float]  # time of sub imports, per active import
+
+  @staticmethod
+  def _get_builtins_module():
+    try:
+      import builtins
+    except ImportError:  # Python 2
+      import __builtin__ as builtins
+    return builtins
+
+  def install(self):
+    assert not self._orig_import
+    self.start_time = time.time()
+    self._thread = threading.current_thread()
+    builtins = self._get_builtins_module()
+    self._orig_import = builtins.__import__
+    builtins.__import__ = self._import
+
+  def uninstall(self):
+    if self._orig_import:
+      self._get_builtins_module().__import__ = self._orig_import
+      self._orig_import = None
+
+  def _import(self, name, *args, **kwargs):
+    if name in sys.modules or threading.current_thread() is not self._thread:
+      return self._orig_import(name, *args, **kwargs)
+    start_time = time.time()
+    self._stack.append(0.0)
+    try:
+      return self._orig_import(name, *args, **kwargs)
+    finally:
+      elapsed = time.time() - start_time
+      sub_time = self._stack.pop()
+      if self._stack:
+        self._stack[-1] += elapsed
+      else:
+        self.total_import_time += elapsed
+      if not name:  # e.g. "from . import x"
+        name = "%s.*" % ((args[0] if args else kwargs.get("globals")) or {}).get("__package__")
+      self.import_times[name] = self.import_times.get(name, 0.0) + elapsed
+      self.import_self_times[name] = self.import_self_times.get(name, 0.0) + elapsed - sub_time
+
+  @contextlib.contextmanager
+  def step(self, name):
+    """
+    :param str name: e.g. "initBackendEngine"
+    """
+    start_time = time.time()
+    try:
+      yield
+    finally:
+      self.steps.append((name, time.time() - start_time))
+
+  def report(self, file=sys.stdout, num_modules=25):
+    """
+    :param io.TextIOBase file:
+    :param int num_modules: the slowest modules by self time
+    """
+    file.write("Startup profile, %.3f sec since install:\n" % (time.time() - self.start_time))
+    for name, elapsed in self.steps:
+      file.write("  step %s: %.3f sec\n" % (name, elapsed))
+    file.write("  imports: %.3f sec, %i modules\n" % (self.total_import_time, len(self.import_times)))
+    for name, self_time in sorted(self.import_self_times.items(), key=lambda item: -item[1])[:num_modules]:
+      file.write("    import %s: %.3f sec (self), %.3f sec (total)\n" % (name, self_time, self.import_times[name]))
@@ -256,6 +256,9 @@ def sort_strint(txt):
 
 
 class Device(object):
+  shm_ring = None  # type: TaskSystem.ShmRingBuffer|None  # host side, see _init_shm_ring_buffer()
+  shm_ring_timeout = 1.0  # how long to wait for a free slot before falling back to the pipe
+
   def __init__(self, device, config, blocking=False, num_batches=1, update_specs=None):
     """
     :param str device: name, "gpu*" or "cpu*"
@@ -395,6 +398,7 @@ class Device(object):
       self.device_name = self.output_queue.recv(); """ :type: str """
       self.num_train_params = self.output_queue.recv(); """ :type: int """  # = len(trainnet.gparams)
       self.sync_used_targets()
+      self._init_shm_ring_buffer()
     except ProcConnectionDied as e:
       print("Device proc %s (%s) died: %r" % (self.name, device_tag, e), file=log.v3)
       print("Theano flags:", env_update["THEANO_FLAGS"], file=log.v5)
@@ -406,6 +410,39 @@ class Device(object):
     self.name = device_tag[0:3] + str(self.id)
     self.initialized = True
 
+  def _init_shm_ring_buffer(self):
+    """
+    Host side. If enabled via config, creates a shared memory ring buffer (:class:`TaskSystem.ShmRingBuffer`)
+    which is used by :func:`update_data` and :func:`set_net_encoded_params`
+    instead of sending the arrays pickled through the pipe.
+    """
+    self.shm_ring = None
+    if not self.config.bool("device_shm_ring_buffer", False):
+      return
+    from TaskSystem import PosixSharedMem, ShmRingBuffer, SharedMem
+    removed = PosixSharedMem.cleanup_stale()
+    if removed:
+      print("Device %s: removed stale shared memory segments: %r" % (self.name, removed), file=log.v4)
+    try:
+      ring = ShmRingBuffer(
+        num_slots=self.config.int("device_shm_ring_buffer_num_slots", 4),
+        slot_size=self.config.int("device_shm_ring_buffer_slot_size", 64 * 1024 * 1024))
+    except SharedMem.ShmException as exc:
+      print("Device %s: cannot create shared memory ring buffer, using the pipe: %s" % (self.name, exc), file=log.v3)
+      return
+    self.input_queue.send("init-shm-ring-buffer")
+    self.input_queue.send(ring.get_name())
+    r = self.output_queue.recv()
+    # The device proc has attached (or failed), so we can remove the name already.
+    # The memory is freed by the kernel once both procs are gone, also if any of them crashes.
+    ring.mem.unlink()
+    if r != "shm-ring-buffer-ready":
+      print("Device %s: %s, using the pipe" % (self.name, r), file=log.v3)
+      ring.close()
+      return
+    print("Device %s: using %r" % (self.name, ring), file=log.v4)
+    self.shm_ring = ring
+
   def detect_nan(self, i, node, fn):
     for output in fn.outputs:
       if numpy.isnan(output[0]).any():
@@ -1097,6 +1134,7 @@ class Device(object):
     output_queue.send(len(self.trainnet.train_params_vars))
     print("Device %s proc, pid %i is ready for commands." % (device, os.getpid()), file=log.v4)
     network_params = []
+    shm_ring = None
     while True:
       cmd = input_queue.recv()
       if cmd == "stop":  # via self.terminate()
@@ -1120,48 +1158,59 @@ class Device(object):
                           json_content=json_content, train_param_args=train_param_args)
         output_queue.send("reinit-ready")
         output_queue.send(len(self.trainnet.train_params_vars))
+      elif cmd == "init-shm-ring-buffer":  # via self._init_shm_ring_buffer()
+        from TaskSystem import ShmRingBuffer, SharedMem
+        shm_name = input_queue.recv()
+        try:
+          shm_ring = ShmRingBuffer(name=shm_name)
+        except SharedMem.ShmException as exc:
+          output_queue.send("shm-ring-buffer-error: %s" % exc)
+        else:
+          output_queue.send("shm-ring-buffer-ready")
       elif cmd == "update-data":  # via self.update_data()
         t = {}
         target_keys = input_queue.recv()
         for k in target_keys:
           t[k] = input_queue.recv()
-        self.output_index = {}
+        output_index = {}
         for k in target_keys:
-          self.output_index[k] = input_queue.recv()
+          output_index[k] = input_queue.recv()
         self.tags = input_queue.recv()
-        update_start_time = time.time()
-        # self.x == self.y["data"], will be set also here.
-        for k in target_keys:
-          self.y[k].set_value(t[k].astype(self.y[k].dtype), borrow = True)
-        #self.c.set_value(c.astype('int32'), borrow = True)
-        for k in target_keys:
-          self.j[k].set_value(self.output_index[k].astype('int8'), borrow = True)
-        try:
-          self.tags_var.set_value(numpy.array(self.tags).view(dtype='int8').reshape((len(self.tags), max(map(len, self.tags)))))
-        except:
-          tags = [s.encode('utf-8') for s in self.tags]
-          self.tags_var.set_value(numpy.array(tags).view(dtype='int8').reshape((len(tags), max(map(len, tags)))))
-        self.update_total_time += time.time() - update_start_time
+        self._device_update_data(target_keys, t, output_index)
+      elif cmd == "update-data-shm":  # via self.update_data()
+        target_keys = input_queue.recv()
+        header = input_queue.recv()
+        self.tags = input_queue.recv()
+        arrays = shm_ring.get_arrays(header)
+        assert len(arrays) == 2 * len(target_keys)
+        self._device_update_data(
+          target_keys, dict(zip(target_keys, arrays)), dict(zip(target_keys, arrays[len(target_keys):])))
+        del arrays
+        shm_ring.release(header[0])
       elif cmd == "set-learning-rate":  # via self.set_learning_rate()
         learning_rate = input_queue.recv()
         if self.updater:
           self.updater.setLearningRate(learning_rate)
-      elif cmd == "set-net-params":  # via self.set_net_params()
+      elif cmd in ("set-net-params", "set-net-params-shm"):  # via self.set_net_params()
         self.total_cost = 0
         our_params_trainnet = self.trainnet.get_all_params_vars()
         our_params_testnet = self.testnet.get_all_params_vars()
         assert isinstance(our_params_trainnet, list)
-        params_len = input_queue.recv()
-        params = [input_queue.recv_bytes() for i in range(params_len)]
-        assert input_queue.recv() == "end-set-net-params"
+        if cmd == "set-net-params-shm":
+          header = input_queue.recv()
+          params = shm_ring.get_arrays(header)  # zero-copy views, set_value() below will copy
+        else:
+          header = None
+          params_len = input_queue.recv()
+          params = [numpy.fromstring(input_queue.recv_bytes(), dtype='float32') for i in range(params_len)]
+          assert input_queue.recv() == "end-set-net-params"
         assert len(params) == len(our_params_trainnet)
         if self.testnet_share_params:
           assert len(our_params_testnet) == 0
         else:
           assert len(params) == len(our_params_testnet)
-        for i in range(params_len):
-          param_str = params[i]
-          param = numpy.fromstring(param_str, dtype='float32')
+        for i in range(len(params)):
+          param = params[i]
           our_p_train = our_params_trainnet[i]
           our_param_shape = our_p_train.get_value(borrow=True, return_internal_type=True).shape
           assert numpy.prod(our_param_shape) == numpy.prod(param.shape)
@@ -1170,6 +1219,13 @@ class Device(object):
           our_p_train.set_value(converted)
           if not self.testnet_share_params:
             our_params_testnet[i].set_value(converted)
+        if header:
+          params = param = converted = None  # no references to the slot anymore
+          shm_ring.release(header[0])
+      elif cmd == "set-net-params-partial":  # via self.set_net_encoded_params_partial()
+        param_indices, add = input_queue.recv()
+        params = [numpy.fromstring(input_queue.recv_bytes(), dtype='float32') for i in param_indices]
+        self._set_net_params_partial(param_indices, params, add=add)
       elif cmd == 'get-num-updates':
         if self.updater:
           output_queue.send(int(self.updater.i.get_value()))
@@ -1211,6 +1267,30 @@ class Device(object):
       else:
         raise Exception("cmd %s unknown" % cmd)
 
+  def _device_update_data(self, target_keys, targets, output_index):
+    """
+    Device proc side. Copies the batch to the device.
+
+    :param list[str] target_keys:
+    :param dict[str,numpy.ndarray] targets: data-key -> data. can be a view which is only valid during this call
+    :param dict[str,numpy.ndarray] output_index: data-key -> index. same as targets
+    """
+    update_start_time = time.time()
+    # self.x == self.y["data"], will be set also here.
+    for k in target_keys:
+      self.y[k].set_value(targets[k].astype(self.y[k].dtype), borrow = True)
+    #self.c.set_value(c.astype('int32'), borrow = True)
+    self.output_index = {}
+    for k in target_keys:
+      self.output_index[k] = numpy.array(output_index[k])
+      self.j[k].set_value(self.output_index[k].astype('int8'), borrow = True)
+    try:
+      self.tags_var.set_value(numpy.array(self.tags).view(dtype='int8').reshape((len(self.tags), max(map(len, self.tags)))))
+    except:
+      tags = [s.encode('utf-8') for s in self.tags]
+      self.tags_var.set_value(numpy.array(tags).view(dtype='int8').reshape((len(tags), max(map(len, tags)))))
+    self.update_total_time += time.time() - update_start_time
+
   def sync_net_train_params(self):
     if not self.blocking:
       self.input_queue.send("sync-net-train-params")
@@ -1219,20 +1299,31 @@ class Device(object):
     if self.blocking:
       return [v.get_value(borrow=True, return_internal_type=True) for v in self.trainnet.get_all_params_vars()]
     else:
-      assert self.main_pid == os.getpid()
-      self.input_queue.send("get-net-train-params")
-      r = self.output_queue.recv()
-      assert r == "net-train-params"
-      param_count = self.output_queue.recv()
-      assert param_count == len(network.get_all_params_vars())
-      raw = [self.output_queue.recv_bytes() for i in range(param_count)]
-      assert self.output_queue.recv() == "end-get-net-train-params"
-      vars = network.get_all_params_vars()
-      res = []
-      assert len(vars) == len(raw)
-      for p,q in zip(vars, raw):
-        res.append(numpy.fromstring(q, dtype='float32').reshape(p.get_value().shape))
-      return res
+      return list(self.iter_net_train_params(network))
+
+  def iter_net_train_params(self, network):
+    """
+    Like :func:`get_net_train_params`, but yields the params one by one as they arrive from the device proc,
+    so that the caller can already work on the first ones while the others are still being transferred.
+
+    :type network: Network.LayerNetwork
+    :rtype: typing.Iterator[numpy.ndarray]
+    """
+    if self.blocking:
+      for v in self.get_net_train_params(network):
+        yield v
+      return
+    assert self.main_pid == os.getpid()
+    self.input_queue.send("get-net-train-params")
+    r = self.output_queue.recv()
+    assert r == "net-train-params"
+    param_count = self.output_queue.recv()
+    vars = network.get_all_params_vars()
+    assert param_count == len(vars)
+    for p in vars:
+      q = self.output_queue.recv_bytes()
+      yield numpy.fromstring(q, dtype='float32').reshape(p.get_value(borrow=True, return_internal_type=True).shape)
+    assert self.output_queue.recv() == "end-get-net-train-params"
 
   def set_net_encoded_params(self, network_params):
     """
@@ -1240,12 +1331,58 @@ class Device(object):
     This updates *all* params, not just the train params.
     """
     assert not self.blocking
+    if self.shm_ring:
+      header = self.shm_ring.put_arrays(
+        [numpy.asarray(p, dtype='float32') for p in network_params], timeout=self.shm_ring_timeout)
+      if header:
+        self.input_queue.send("set-net-params-shm")
+        self.input_queue.send(header)
+        return
     self.input_queue.send("set-net-params")
     self.input_queue.send(len(network_params))
     for p in network_params:
       self.input_queue.send_bytes(p.astype('float32').tostring())
     self.input_queue.send("end-set-net-params")
 
+  def set_net_encoded_params_partial(self, param_indices, network_params, add=False):
+    """
+    Like :func:`set_net_encoded_params`, but only for some of the params, e.g. the ones of a single layer.
+
+    :param list[int] param_indices: indices into get_all_params_vars()
+    :param list[numpy.ndarray] network_params: for each index
+    :param bool add: if True, adds the values to the current params (e.g. a correction), instead of setting them
+    """
+    assert len(param_indices) == len(network_params)
+    if self.blocking:
+      self._set_net_params_partial(param_indices, network_params, add=add)
+      return
+    self.input_queue.send("set-net-params-partial")
+    self.input_queue.send((list(param_indices), add))
+    for p in network_params:
+      self.input_queue.send_bytes(numpy.asarray(p).astype('float32').tostring())
+
+  def _set_net_params_partial(self, param_indices, params, add=False):
+    """
+    Device proc side (or blocking) of :func:`set_net_encoded_params_partial`.
+
+    :param list[int] param_indices:
+    :param list[numpy.ndarray] params:
+    :param bool add:
+    """
+    self.total_cost = 0
+    our_params_trainnet = self.trainnet.get_all_params_vars()
+    our_params_testnet = self.testnet.get_all_params_vars()
+    for i, param in zip(param_indices, params):
+      our_p_train = our_params_trainnet[i]
+      our_value = our_p_train.get_value()
+      assert numpy.prod(our_value.shape) == numpy.prod(param.shape)
+      converted = param.reshape(our_value.shape)
+      if add:
+        converted = our_value + converted
+      our_p_train.set_value(converted)
+      if not self.testnet_share_params:
+        our_params_testnet[i].set_value(converted)
+
   def set_net_params(self, network):
     """
     :type network: Network.LayerNetwork
@@ -1332,13 +1469,24 @@ class Device(object):
       self.update_total_time += time.time() - update_start_time
     else:
       assert self.main_pid == os.getpid()
-      self.input_queue.send("update-data")
       target_keys = list(sorted(self.used_data_keys))
-      self.input_queue.send(target_keys)
-      for target in target_keys:
-        self.input_queue.send(self.targets[target])
-      for k in target_keys:
-        self.input_queue.send(self.output_index[k])
+      header = None
+      if self.shm_ring:
+        header = self.shm_ring.put_arrays(
+          [self.targets[k] for k in target_keys] + [self.output_index[k] for k in target_keys],
+          timeout=self.shm_ring_timeout)
+      if header:
+        # Only the small header goes through the pipe. The device proc releases the slot when it has copied the data.
+        self.input_queue.send("update-data-shm")
+        self.input_queue.send(target_keys)
+        self.input_queue.send(header)
+      else:
+        self.input_queue.send("update-data")
+        self.input_queue.send(target_keys)
+        for target in target_keys:
+          self.input_queue.send(self.targets[target])
+        for k in target_keys:
+          self.input_queue.send(self.output_index[k])
       self.input_queue.send(self.tags)
       if self.config.value('loss','') in ('ctc', 'hmm'):
         self.input_queue.send(self.ctc_targets)
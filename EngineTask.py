@@ -5,6 +5,10 @@ from math import ceil
 import sys
 import threading
 import time
+try:
+  from Queue import Queue
+except ImportError:
+  from queue import Queue
 
 import numpy
 import theano
@@ -515,7 +519,8 @@ class ModelBrokenError(Exception):
 
 
 class TrainTaskThread(TaskThread):
-  def __init__(self, network, devices, data, batches, learning_rate, updater, seq_train_parallel=None, **kwargs):
+  def __init__(self, network, devices, data, batches, learning_rate, updater, seq_train_parallel=None,
+               param_sync_mode="sequential", param_sync_delayed=False, **kwargs):
     """
     :type network: Network.LayerNetwork
     :type devices: list[Device.Device]
@@ -524,7 +529,18 @@ class TrainTaskThread(TaskThread):
     :type learning_rate: float
     :type updater: Updater.Updater
     :type seq_train_parallel: Engine.SeqTrainParallelControl | None
+    :param str param_sync_mode: how to do the model averaging in :func:`reduce` with multiple devices.
+      "sequential": copy all params from and to the devices one after another.
+      "pipelined": per layer, such that the averaging of one layer overlaps with the transfer of the next one.
+    :param bool param_sync_delayed: stale-by-one averaging (implies the pipelined transfer).
+      The devices continue training while the consensus is computed in the background,
+      and it is applied at the next sync. See :func:`_reduce_delayed`.
     """
+    assert param_sync_mode in ("sequential", "pipelined"), "invalid param_sync_mode %r" % param_sync_mode
+    self.param_sync_mode = param_sync_mode
+    self.param_sync_delayed = param_sync_delayed
+    self.param_sync_time = 0.0
+    self.delayed_consensus = None  # type: (TrainTaskThread.ParamAverageThread,list[list[numpy.ndarray]])|None
     self.updater = updater
     self.learning_rate = learning_rate
     self.seq_train_parallel = seq_train_parallel
@@ -609,7 +625,235 @@ class TrainTaskThread(TaskThread):
     def copy_from_device(self):
       return self._copy(False)
 
+  class ParamFetchThread(threading.Thread):
+    """
+    Receives the params of one device (see :func:`Device.Device.iter_net_train_params`)
+    and makes them available one by one while the rest is still being transferred.
+    """
+
+    def __init__(self, device, network):
+      threading.Thread.__init__(self, name="ParamFetchThread %s" % device.name)
+      self.daemon = True
+      self.device = device
+      self.network = network
+      self.params = []
+      self.exception = None
+      self.finished = False
+      self.cond = threading.Condition()
+      self.start()
+
+    def run(self):
+      try:
+        for value in self.device.iter_net_train_params(self.network):
+          with self.cond:
+            self.params.append(value)
+            self.cond.notify_all()
+      except Exception as exc:  # e.g. ProcConnectionDied
+        self.exception = exc
+      with self.cond:
+        self.finished = True
+        self.cond.notify_all()
+
+    def get(self, idx):
+      """
+      :param int idx: param index in get_all_params_vars()
+      :rtype: numpy.ndarray
+      """
+      with self.cond:
+        while idx >= len(self.params):
+          if self.finished:
+            raise self.exception or Exception("%s: only got %i params" % (self.name, len(self.params)))
+          self.cond.wait()
+        return self.params[idx]
+
+  class ParamSendThread(threading.Thread):
+    """
+    Sends blocks of params to one device (see :func:`Device.Device.set_net_encoded_params_partial`), in order.
+    """
+
+    def __init__(self, device):
+      threading.Thread.__init__(self, name="ParamSendThread %s" % device.name)
+      self.daemon = True
+      self.device = device
+      self.queue = Queue()
+      self.exception = None
+      self.start()
+
+    def put(self, param_indices, params, add=False):
+      self.queue.put((param_indices, params, add))
+
+    def run(self):
+      while True:
+        item = self.queue.get()
+        if item is None:
+          break
+        if self.exception:
+          continue
+        try:
+          self.device.set_net_encoded_params_partial(*item)
+        except Exception as exc:  # e.g. ProcConnectionDied
+          self.exception = exc
+
+    def finish(self):
+      self.queue.put(None)
+      self.join()
+      if self.exception:
+        raise self.exception
+
+  class ParamAverageThread(threading.Thread):
+    """
+    Computes the consensus (:func:`TrainTaskThread.average_params`) in the background.
+    """
+
+    def __init__(self, parent, base_values, hyp_values, weights):
+      threading.Thread.__init__(self, name="ParamAverageThread")
+      self.daemon = True
+      self.parent = parent
+      self.args = (base_values, hyp_values, weights)
+      self.result = None
+      self.exception = None
+      self.start()
+
+    def run(self):
+      try:
+        self.result = self.parent.average_params(*self.args)
+      except Exception as exc:
+        self.exception = exc
+
+    def get_result(self):
+      self.join()
+      if self.exception:
+        raise self.exception
+      return self.result
+
+  def average_params(self, base_values, hyp_values, weights):
+    """
+    Consensus via the weighted average of the updates of the devices, like in :func:`_reduce_sequential`.
+
+    :param list[numpy.ndarray] base_values: params of our network
+    :param list[list[numpy.ndarray]] hyp_values: for each device, same params as base_values
+    :param list[float] weights: for each device, the total cost since the last sync
+    :rtype: list[numpy.ndarray]
+    """
+    consensus = []
+    for i, base in enumerate(base_values):
+      updates = [(hyp[i], weight) for (hyp, weight) in zip(hyp_values, weights)
+                 if numpy.sum(abs(hyp[i] - base)) > numpy.float32(0)]
+      tot_updates = sum([weight for (_, weight) in updates]) / self.reduction_rate
+      if tot_updates:
+        consensus.append(base + numpy.sum(
+          [(hyp - base) * float(weight) / tot_updates for (hyp, weight) in updates], axis=0))
+      else:
+        print("warning: no update available for parameter %i" % i, file=log.v3)
+        consensus.append(base)
+    return consensus
+
+  def get_param_blocks(self):
+    """
+    :return: indices into get_all_params_vars(), grouped by layer, in order
+    :rtype: list[list[int]]
+    """
+    blocks = []
+    last_layer = None
+    for i, p in enumerate(self.network.get_all_params_vars()):
+      layer = getattr(p, "layer", None)
+      if not blocks or layer is not last_layer:
+        blocks.append([])
+      blocks[-1].append(i)
+      last_layer = layer
+    return blocks
+
+  def _start_fetch_device_params(self):
+    """
+    :return: fetch thread for each device
+    :rtype: list[TrainTaskThread.ParamFetchThread]
+    """
+    for device in self.devices:
+      device.sync_net_train_params()
+    self.network.update_step = max([dev.get_num_updates() for dev in self.devices])
+    return [self.ParamFetchThread(device, self.network) for device in self.devices]
+
   def reduce(self, num_frames):
+    start_time = time.time()
+    if len(self.devices) <= 1 or (self.param_sync_mode == "sequential" and not self.param_sync_delayed):
+      self._reduce_sequential()
+    elif self.param_sync_delayed:
+      self._reduce_delayed()
+    else:
+      self._reduce_pipelined()
+    self.param_sync_time += time.time() - start_time
+
+  def _reduce_pipelined(self):
+    """
+    Model averaging, layer by layer: while we average the params of one layer
+    and send the result to the devices, the params of the next layers are still being received.
+    """
+    basenet = self.network.get_all_params_vars()
+    # Get this first, as setting the params resets it.
+    weights = [device.get_total_cost() for device in self.devices]
+    fetchers = self._start_fetch_device_params()
+    senders = [self.ParamSendThread(device) for device in self.devices]
+    try:
+      for block in self.get_param_blocks():
+        base_values = [basenet[i].get_value() for i in block]
+        hyp_values = [[fetcher.get(i) for i in block] for fetcher in fetchers]
+        consensus = self.average_params(base_values, hyp_values, weights)
+        for i, q in zip(block, consensus):
+          basenet[i].set_value(q)
+        for sender in senders:
+          sender.put(block, consensus)
+    finally:
+      for fetcher in fetchers:
+        fetcher.join()
+      for sender in senders:
+        sender.finish()
+
+  def _reduce_delayed(self):
+    """
+    Stale-by-one model averaging.
+    The consensus of the params we fetch now is computed in the background
+    while the devices already continue training with their own params.
+    It is applied at the next sync (or in :func:`finalize`), where each device keeps the updates
+    it has done in the meantime, i.e. we add (consensus - fetched params) to its params.
+    """
+    basenet = self.network.get_all_params_vars()
+    weights = [device.get_total_cost() for device in self.devices]
+    self._apply_delayed_consensus(keep_device_updates=True)
+    fetchers = self._start_fetch_device_params()
+    # The fetch must be finished before the devices get new commands for training.
+    for fetcher in fetchers:
+      fetcher.join()
+    hyp_values = [[fetcher.get(i) for i in range(len(basenet))] for fetcher in fetchers]
+    base_values = [p.get_value() for p in basenet]
+    self.delayed_consensus = (self.ParamAverageThread(self, base_values, hyp_values, weights), hyp_values)
+
+  def _apply_delayed_consensus(self, keep_device_updates):
+    """
+    Waits for the consensus from the last :func:`_reduce_delayed` and applies it to our network and to the devices.
+
+    :param bool keep_device_updates: if True, add (consensus - fetched params) to the device params.
+      otherwise, set the device params to the consensus.
+    """
+    if not self.delayed_consensus:
+      return
+    average_thread, hyp_values = self.delayed_consensus
+    self.delayed_consensus = None
+    consensus = average_thread.get_result()
+    for p, q in zip(self.network.get_all_params_vars(), consensus):
+      p.set_value(q)
+    senders = [self.ParamSendThread(device) for device in self.devices]
+    try:
+      for block in self.get_param_blocks():
+        for sender, hyp in zip(senders, hyp_values):
+          if keep_device_updates:
+            sender.put(block, [consensus[i] - hyp[i] for i in block], add=True)
+          else:
+            sender.put(block, [consensus[i] for i in block])
+    finally:
+      for sender in senders:
+        sender.finish()
+
+  def _reduce_sequential(self):
     for device in self.devices:
       device.sync_net_train_params()
     basenet = self.network.get_all_params_vars()
@@ -690,6 +934,14 @@ class TrainTaskThread(TaskThread):
     #pipe.copy_to_device(self.network)
 
   def finalize(self):
+    if self.delayed_consensus:
+      start_time = time.time()
+      self._apply_delayed_consensus(keep_device_updates=False)
+      self.param_sync_time += time.time() - start_time
+    if len(self.devices) > 1:
+      print("%s, param sync (%s%s): %.3f sec" % (
+        self.report_prefix, self.param_sync_mode, ", delayed" if self.param_sync_delayed else "",
+        self.param_sync_time), file=log.v4)
     super(TrainTaskThread, self).finalize()
     if self.do_ctc_priors:
       self.ctc_priors = self.results["ctc_priors"] / float(self.num_frames["data"])
@@ -1074,6 +1074,7 @@ class FastBwFsaShared:
   def __init__(self):
     self.num_states = 1
     self.edges = []  # type: list[Edge]
+    self._edges_array_cache = None  # type: None|(int,numpy.ndarray,numpy.ndarray)
 
   def add_edge(self, source_state_idx, target_state_idx, emission_idx, weight=0.0):
     """
@@ -1101,22 +1102,34 @@ class FastBwFsaShared:
     """
     return len(self.edges) * n_batch
 
+  def _get_edges_array(self):
+    """
+    :return: (4,num_edges) int32 (from,to,emission_idx,weight-idx=edge-idx) and (num_edges,) float32 weights,
+      for a single seq. cached until the next :func:`add_edge`
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    if self._edges_array_cache is None or self._edges_array_cache[0] != len(self.edges):
+      edges = numpy.array(
+        [(edge.source_state_idx, edge.target_state_idx, edge.label) for edge in self.edges],
+        dtype="int32").reshape((len(self.edges), 3)).transpose()
+      weights = numpy.array([edge.weight for edge in self.edges], dtype="float32")
+      self._edges_array_cache = (len(self.edges), edges, weights)
+    return self._edges_array_cache[1:]
+
   def get_edges(self, n_batch):
     """
     :param int n_batch:
     :return edges: (4,num_edges), edges of the graph (from,to,emission_idx,sequence_idx)
     :rtype: numpy.ndarray
     """
-    num_edges = len(self.edges)
-    res = numpy.zeros((4, num_edges * n_batch), dtype="int32")
-    for batch_idx in range(n_batch):
-      for edge_idx, edge in enumerate(self.edges):
-        res[:, batch_idx * num_edges + edge_idx] = (
-          edge.source_state_idx + batch_idx * self.num_states,
-          edge.target_state_idx + batch_idx * self.num_states,
-          edge.label,
-          batch_idx)
-    return res
+    single_edges, _ = self._get_edges_array()
+    num_edges = single_edges.shape[1]
+    batch_idxs = numpy.arange(n_batch, dtype="int32")
+    res = numpy.empty((4, n_batch, num_edges), dtype="int32")
+    res[0:2] = single_edges[0:2, None, :] + (batch_idxs * self.num_states)[None, :, None]
+    res[2] = single_edges[2][None, :]
+    res[3] = batch_idxs[:, None]
+    return res.reshape((4, n_batch * num_edges))
 
   def get_weights(self, n_batch):
     """
@@ -1124,12 +1137,8 @@ class FastBwFsaShared:
     :return weights: (num_edges,), weights of the edges
     :rtype: numpy.ndarray
     """
-    num_edges = len(self.edges)
-    res = numpy.zeros((num_edges * n_batch,), dtype="float32")
-    for batch_idx in range(n_batch):
-      for edge_idx, edge in enumerate(self.edges):
-        res[batch_idx * num_edges + edge_idx] = edge.weight
-    return res
+    _, single_weights = self._get_edges_array()
+    return numpy.tile(single_weights, n_batch)
 
   def get_start_end_states(self, n_batch):
     """
@@ -1139,12 +1148,8 @@ class FastBwFsaShared:
     """
     start_state_idx = 0
     end_state_idx = self.num_states - 1
-    res = numpy.zeros((2, n_batch), dtype="int32")
-    for batch_idx in range(n_batch):
-      res[:, batch_idx] = (
-        start_state_idx + batch_idx * self.num_states,
-        end_state_idx + batch_idx * self.num_states)
-    return res
+    offsets = numpy.arange(n_batch, dtype="int32") * self.num_states
+    return numpy.stack([offsets + start_state_idx, offsets + end_state_idx])
 
   def get_fast_bw_fsa(self, n_batch):
     """
@@ -1157,12 +1162,79 @@ class FastBwFsaShared:
       start_end_states=self.get_start_end_states(n_batch))
 
 
+_fast_bw_fsa_staircase_cache = {}  # (seq_len, opts...) -> (num_states, edges)
+_fast_bw_fsa_staircase_cache_max_size = 1000
+
+
+def _fast_bw_fsa_staircase_single(seq_len, with_loop, max_skip, start_max_skip, end_max_skip):
+  """
+  Staircase FSA for a single seq, see :func:`fast_bw_fsa_staircase`.
+  The result is cached, so that repeated seq lengths are cheap.
+
+  :param int seq_len:
+  :param bool with_loop:
+  :param int|None max_skip:
+  :param int|None start_max_skip:
+  :param int|None end_max_skip:
+  :return: (num_states, edges), edges of shape (3,num_edges) (from,to,emission_idx), int32, read-only
+  :rtype: (int, numpy.ndarray)
+  """
+  key = (seq_len, bool(with_loop), max_skip, start_max_skip, end_max_skip)
+  if key in _fast_bw_fsa_staircase_cache:
+    return _fast_bw_fsa_staircase_cache[key]
+  assert seq_len > 0
+  # Conventions:
+  # * create seq_len + 1 states
+  # * state 't': all outgoing edges have emission 't'
+  # * state t=0 is initial/first; state t=seq_len is final.
+  # * need extra handling for first:
+  #   - all outgoing edges can have emissions up to the skip-len
+  # Note that a max-skip of 0 is treated like None, i.e. unlimited.
+  state_idxs = numpy.arange(seq_len, dtype="int32")
+  cur_max_skip = numpy.full((seq_len,), max_skip or 0, dtype="int32")
+  if end_max_skip:
+    cur_max_skip[state_idxs + end_max_skip >= seq_len] = end_max_skip
+  if start_max_skip:
+    cur_max_skip[0] = start_max_skip
+  j_max = numpy.where(cur_max_skip > 0, numpy.minimum(seq_len, state_idxs + cur_max_skip), seq_len)
+  loop = 1 if with_loop else 0
+
+  # First state, with the extra rule.
+  # For each target j, edges with emission t in [0, j), and with a loop also the emission j.
+  js = numpy.arange(1, j_max[0] + 1, dtype="int32")
+  first_js = numpy.repeat(js, js + 1)
+  first_ts = numpy.arange(first_js.shape[0], dtype="int32") - numpy.repeat(numpy.cumsum(js + 1) - (js + 1), js + 1)
+  if with_loop:
+    mask = numpy.where(first_ts < first_js, (first_ts != 0) | (first_js >= seq_len), first_js < seq_len)
+  else:
+    mask = first_ts < first_js
+  first_js, first_ts = first_js[mask], first_ts[mask]
+  first_edges = numpy.stack([numpy.zeros_like(first_js), first_js, first_ts])
+  if with_loop:
+    first_edges = numpy.concatenate([numpy.zeros((3, 1), dtype="int32"), first_edges], axis=1)
+
+  # All other states. The optional loop first, then the edges to the next states up to j_max.
+  num_out_edges = j_max[1:] - state_idxs[1:] + loop
+  from_idxs = numpy.repeat(state_idxs[1:], num_out_edges)
+  pos = numpy.arange(from_idxs.shape[0], dtype="int32") - numpy.repeat(
+    numpy.cumsum(num_out_edges) - num_out_edges, num_out_edges)
+  other_edges = numpy.stack([from_idxs, from_idxs + pos + (1 - loop), from_idxs])
+
+  edges = numpy.concatenate([first_edges, other_edges], axis=1).astype("int32")
+  edges.flags.writeable = False
+  res = (seq_len + 1, edges)
+  if len(_fast_bw_fsa_staircase_cache) >= _fast_bw_fsa_staircase_cache_max_size:
+    _fast_bw_fsa_staircase_cache.clear()
+  _fast_bw_fsa_staircase_cache[key] = res
+  return res
+
+
 def fast_bw_fsa_staircase(seq_lens, with_loop=False, max_skip=None, start_max_skip=None, end_max_skip=None):
   """
   Builds up a staircase FSA, returns a FastBaumWelchBatchFsa.
   The emissions are indices [0, ..., seq_len - 1].
 
-  :param list[int] seq_lens:
+  :param list[int]|numpy.ndarray seq_lens:
   :param bool with_loop:
   :param int|list[int] max_skip: per batch if a list
   :param int|list[int] start_max_skip: per batch if a list
@@ -1179,58 +1251,109 @@ def fast_bw_fsa_staircase(seq_lens, with_loop=False, max_skip=None, start_max_sk
   # numpy.ndarray edges: (4,num_edges), edges of the graph (from,to,emission_idx,sequence_idx)
   # numpy.ndarray weights: (num_edges,), weights of the edges
   # numpy.ndarray start_end_states: (2, batch), (start,end) state idx in automaton.
-  state_idx = 0
-  edges = []
-  start_end_states = []
-  for batch in range(n_batch):
-    seq_len = seq_lens[batch]
-    assert seq_len > 0
-    start_state_idx = state_idx
-    # Conventions:
-    # * create seq_len + 1 states
-    # * state 't': all outgoing edges have emission 't'
-    # * state t=0 is initial/first; state t=seq_len is final.
-    # * need extra handling for first:
-    #   - all outgoing edges can have emissions up to the skip-len
-    for i in range(seq_len):
-      cur_state_idx = state_idx
-      cur_max_skip = None
-      if not cur_max_skip and i == 0:
-        cur_max_skip = start_max_skip[batch]
-      if not cur_max_skip and end_max_skip[batch] and i + end_max_skip[batch] >= seq_len:
-        cur_max_skip = end_max_skip[batch]
-      if not cur_max_skip:
-        cur_max_skip = max_skip[batch]
-      j_max = seq_len
-      if cur_max_skip:
-        j_max = min(j_max, i + cur_max_skip)
-      if with_loop:
-        emission_idx = i
-        target_state_idx = cur_state_idx
-        edges += [(cur_state_idx, target_state_idx, emission_idx, batch)]
-      for j in range(i + 1, j_max + 1):
-        target_state_idx = cur_state_idx + j - i
-        if i > 0:
-          emission_idx = i
-          edges += [(cur_state_idx, target_state_idx, emission_idx, batch)]
-        else:  # see comment above. extra rule for first state
-          for t in range(i, j):
-            if with_loop and i == t and j < seq_len:
-              continue
-            emission_idx = t
-            edges += [(cur_state_idx, target_state_idx, emission_idx, batch)]
-          if with_loop and j < seq_len:
-            emission_idx = j
-            edges += [(cur_state_idx, target_state_idx, emission_idx, batch)]
-      state_idx += 1
-    end_state_idx = state_idx
-    start_end_states += [(start_state_idx, end_state_idx)]
-    state_idx += 1
-  weights = [0.0] * len(edges)
-  return FastBaumWelchBatchFsa(
-    edges=numpy.array(edges).transpose(),
-    weights=numpy.array(weights),
-    start_end_states=numpy.array(start_end_states).transpose())
+  singles = [
+    _fast_bw_fsa_staircase_single(
+      seq_len=int(seq_lens[batch]), with_loop=with_loop,
+      max_skip=max_skip[batch], start_max_skip=start_max_skip[batch], end_max_skip=end_max_skip[batch])
+    for batch in range(n_batch)]
+  num_states = numpy.array([s[0] for s in singles], dtype="int32").reshape((n_batch,))
+  num_edges = numpy.array([s[1].shape[1] for s in singles], dtype="int32").reshape((n_batch,))
+  state_offsets = numpy.cumsum(num_states) - num_states
+  edges = numpy.empty((4, int(num_edges.sum())), dtype="int32")
+  if n_batch > 0:
+    edges[0:3] = numpy.concatenate([s[1] for s in singles], axis=1)
+  edges[0:2] += numpy.repeat(state_offsets, num_edges)[None, :]
+  edges[3] = numpy.repeat(numpy.arange(n_batch, dtype="int32"), num_edges)
+  weights = numpy.zeros((edges.shape[1],), dtype="float32")
+  start_end_states = numpy.stack([state_offsets, state_offsets + num_states - 1]).astype("int32")
+  return FastBaumWelchBatchFsa(edges=edges, weights=weights, start_end_states=start_end_states)
+
+
+def fast_bw_fsa_from_labels(labels, label_lens, topology="ctc", blank_idx=None,
+                            num_states_per_label=1, with_skip=False,
+                            loop_weight=0.0, fwd_weight=0.0, skip_weight=0.0):
+  """
+  Builds up the FSAs for a batch of label sequences, without any Python loop over edges or seqs.
+  Supported topologies:
+
+    * "ctc": like in CTC, blank between and around the labels. The blank is mandatory between repeated labels.
+    * "optional_blank": like "ctc", but the blank is always optional, also between repeated labels.
+    * "hmm": num_states_per_label states for every label, each with a loop and a forward edge,
+      and optionally (with_skip) a skip edge to the next-but-one state.
+      The emission idx of state j of label l is l * num_states_per_label + j.
+
+  Every seq gets an initial state, a state for every (extended) label, and an extra final state.
+  All edges which could end the path are duplicated into that final state.
+  The weights are in -log space, as for :class:`FastBaumWelchOp`.
+
+  :param numpy.ndarray labels: (batch,max_label_len), sparse label indices
+  :param numpy.ndarray|list[int] label_lens: (batch,)
+  :param str topology: "ctc", "optional_blank" or "hmm"
+  :param int|None blank_idx: for "ctc" and "optional_blank"
+  :param int num_states_per_label: for "hmm"
+  :param bool with_skip: for "hmm"
+  :param float loop_weight:
+  :param float fwd_weight:
+  :param float skip_weight: for the skip edges. for "ctc", these are the ones which skip a blank
+  :rtype: FastBaumWelchBatchFsa
+  """
+  labels = numpy.asarray(labels, dtype="int32")
+  label_lens = numpy.asarray(label_lens, dtype="int32")
+  n_batch = label_lens.shape[0]
+  labels = labels.reshape((n_batch, -1))
+  max_label_len = labels.shape[1]
+  # ext is 1-based, i.e. ext[:, k] is the emission of state k, and state 0 is the initial state.
+  # It is padded by 2 so that we can always access ext[:, k + 2].
+  if topology in ("ctc", "optional_blank"):
+    assert blank_idx is not None, "%s topology needs blank_idx" % topology
+    ext_lens = label_lens * 2 + 1
+    ext = numpy.full((n_batch, max_label_len * 2 + 4), blank_idx, dtype="int32")
+    ext[:, 2:max_label_len * 2 + 1:2] = labels
+    state_idxs = numpy.arange(ext.shape[1] - 2)
+    skip_ok = (state_idxs % 2 == 0)[None, :]  # skip a blank, i.e. target is a label
+    if topology == "ctc":
+      skip_ok = skip_ok & ((state_idxs == 0)[None, :] | (ext[:, 2:] != ext[:, :-2]))
+    can_skip_end = True  # the last label can end the path, i.e. the final blank can be skipped
+  elif topology == "hmm":
+    assert num_states_per_label >= 1
+    ext_lens = label_lens * num_states_per_label
+    ext = numpy.zeros((n_batch, max_label_len * num_states_per_label + 3), dtype="int32")
+    ext[:, 1:max_label_len * num_states_per_label + 1] = (
+      labels[:, :, None] * num_states_per_label + numpy.arange(num_states_per_label)[None, None, :]).reshape(
+      (n_batch, max_label_len * num_states_per_label))
+    skip_ok = numpy.full((1, ext.shape[1] - 2), bool(with_skip))
+    can_skip_end = bool(with_skip)
+  else:
+    raise ValueError("fast_bw_fsa_from_labels: invalid topology %r" % topology)
+
+  # Candidate edges for every seq b, source state k and edge type, in -log space:
+  # loop (k -> k), fwd (k -> k + 1), skip (k -> k + 2),
+  # and the same again but going into the final state (ext_len + 1) instead.
+  num_src_states = ext.shape[1] - 2
+  k = numpy.arange(num_src_states)[None, :]
+  lens = ext_lens[:, None]
+  is_end = lambda target: (target == lens) | ((target == lens - 1) & (target >= 1) & can_skip_end)
+  valid = [(k >= 1) & (k <= lens), k + 1 <= lens, (k + 2 <= lens) & skip_ok]
+  targets = [k, k + 1, k + 2]
+  valid += [v & is_end(t) for v, t in zip(valid, targets)]
+  targets += [numpy.broadcast_to(lens + 1, (n_batch, num_src_states))] * 3
+  emissions = [ext[:, 0:num_src_states], ext[:, 1:num_src_states + 1], ext[:, 2:num_src_states + 2]] * 2
+  type_weights = numpy.array([loop_weight, fwd_weight, skip_weight] * 2, dtype="float32")
+  valid = numpy.stack([numpy.broadcast_to(v, (n_batch, num_src_states)) for v in valid], axis=2)
+  b_idxs, k_idxs, type_idxs = numpy.nonzero(valid)  # ordered by seq, then source state, then type
+
+  num_states = ext_lens + 2
+  state_offsets = (numpy.cumsum(num_states) - num_states).astype("int32")
+  targets = numpy.stack([numpy.broadcast_to(t, (n_batch, num_src_states)) for t in targets], axis=2)
+  emissions = numpy.stack(emissions, axis=2)
+  edges = numpy.stack([
+    k_idxs + state_offsets[b_idxs],
+    targets[b_idxs, k_idxs, type_idxs] + state_offsets[b_idxs],
+    emissions[b_idxs, k_idxs, type_idxs],
+    b_idxs]).astype("int32")
+  weights = type_weights[type_idxs]
+  start_end_states = numpy.stack([state_offsets, state_offsets + num_states - 1]).astype("int32")
+  return FastBaumWelchBatchFsa(edges=edges, weights=weights, start_end_states=start_end_states)
 
 
 class LoadWfstOp(theano.Op):
@@ -3,9 +3,9 @@ from __future__ import print_function
 import collections
 import functools as fun
 import gc
+import os
 import h5py
 import numpy
-import theano
 from CachedDataset import CachedDataset
 from CachedDataset2 import CachedDataset2
 from Dataset import Dataset, DatasetSeq
@@ -23,13 +23,22 @@ attr_ctcIndexTranscription = 'ctcIndexTranscription'
 
 class HDFDataset(CachedDataset):
 
-  def __init__(self, files=None, use_cache_manager=False, **kwargs):
+  def __init__(self, files=None, use_cache_manager=False, shared_mem_cache=False, **kwargs):
     """
     :param None|list[str] files:
     :param bool use_cache_manager: uses :func:`Util.cf` for files
+    :param bool shared_mem_cache: loads all the data into shared memory, which is shared with all other processes
+      on the same host which use the same files, see :class:`TaskSystem.SharedMemSeqCache`.
+      This replaces the cache (cache_byte_size).
     """
     super(HDFDataset, self).__init__(**kwargs)
     self._use_cache_manager = use_cache_manager
+    self._shared_mem_cache_enabled = shared_mem_cache
+    self._shared_mem_cache = None  # type: TaskSystem.SharedMemSeqCache|None
+    if shared_mem_cache:
+      # Disable the cache logic of CachedDataset. The data is read directly from the shared memory.
+      self.cache_byte_size_limit_at_start = 0
+      self.cache_byte_size_total_limit = 0
     self.files = []; """ :type: list[str] """  # file names
     self.h5_files = []  # type: list[h5py.File]
     self.file_start = [0]
@@ -212,7 +221,46 @@ class HDFDataset(CachedDataset):
       fin.close()
     gc.collect()
 
+  def _get_shared_mem_cache(self):
+    """
+    :rtype: TaskSystem.SharedMemSeqCache
+    """
+    if self._shared_mem_cache:
+      return self._shared_mem_cache
+    from TaskSystem import SharedMemSeqCache
+    fin = self.h5_files[0]
+    layout = {"data": (self.data_dtype["data"], fin['inputs'].shape[1:], self._seq_lengths[:, 0])}
+    if 'targets' in fin:
+      for key in fin['targets/data']:
+        ldx = self.target_keys.index(key) + 1
+        layout[key] = (self.data_dtype[key], fin['targets/data/' + key].shape[1:], self._seq_lengths[:, ldx])
+    name = "HDFDataset:%r" % [(os.path.abspath(fn), os.path.getsize(fn), os.path.getmtime(fn)) for fn in self.files]
+    self._shared_mem_cache = SharedMemSeqCache(name=name, layout=layout, fill_func=self._fill_shared_mem_cache)
+    return self._shared_mem_cache
+
+  def _fill_shared_mem_cache(self, cache, chunk_size=1000000):
+    """
+    :param TaskSystem.SharedMemSeqCache cache:
+    :param int chunk_size: num frames to read at once
+    """
+    print("%s: loading all data into shared memory" % self, file=log.v3)
+    for key in sorted(cache.layout.keys()):
+      out = cache.get_writable_array(key)
+      ldx = 0 if key == "data" else (self.target_keys.index(key) + 1)
+      offset = 0
+      for i, fin in enumerate(self.h5_files):
+        source = fin['inputs'] if key == "data" else fin['targets/data/' + key]
+        num_frames = int(self.file_seq_start[i][-1][ldx])
+        for start in range(0, num_frames, chunk_size):
+          end = min(start + chunk_size, num_frames)
+          out[offset + start:offset + end] = source[start:end]
+        offset += num_frames
+      assert offset == out.shape[0]
+
   def get_data(self, seq_idx, key):
+    if self._shared_mem_cache_enabled:
+      return self._get_shared_mem_cache().get_seq(key, self._seq_index[seq_idx])
+
     if self.cache_byte_size_total_limit > 0:  # Use the cache?
       return super(HDFDataset, self).get_data(seq_idx, key)
 
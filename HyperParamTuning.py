@@ -19,19 +19,36 @@ or use real training intermediate results and resume from them.
 We could even do some simple search in the beginning of each epoch when we keep it cheap enough.
 
 Also, we could store the population of hyper params on disk to allow resuming of a search.
+What we do store (optional, ``cost_cache_file``) are the costs of all trained hyper param settings,
+so that a repeated setting (in the same search or in a restarted one) is not trained again.
+
+Options in the ``hyper_param_tuning`` config dict, besides the population sizes:
+
+  * ``backend``: "thread" (default) trains the individuals in threads of this process.
+    "process" trains them in separate worker processes (fork+exec), which avoids the GIL and a shared TF session.
+  * ``num_threads``: number of individuals trained in parallel (threads or worker processes).
+  * ``num_threads_per_worker``: TF intra/inter op threads for each individual.
+    Default for the process backend: the available CPUs divided by ``num_threads``.
+  * ``cost_cache_file``: if given, the costs are stored in and loaded from this file.
+  * ``successive_halving_min_frac``: if given, use successive halving in each iteration:
+    all individuals are first trained on this fraction of ``num_train_steps``,
+    then only the best 1/``successive_halving_eta`` (default 2) are trained with ``eta`` times more, and so on,
+    up to the full ``num_train_steps``, see :func:`get_successive_halving_schedule`.
+    The survivors continue training from their checkpoint of the previous rung (stored in a temp dir),
+    and their cost is the average over all their train steps.
 """
 
 from __future__ import print_function
 
+import os
 import sys
 import time
 import numpy
-import tensorflow as tf
+from threading import Lock
 from Config import Config
 from Log import log
 from Dataset import Dataset
 from GeneratingDataset import StaticDataset
-from TFEngine import Engine, Runner, CancelTrainingException
 from Util import CollectionReadCheckCovered, hms_fraction, guess_requested_max_num_threads
 
 
@@ -264,8 +281,30 @@ class Individual:
     """
     self.hyper_param_mapping = hyper_param_mapping
     self.cost = None
+    self.num_train_steps = None  # type: int|None  # for self.cost. can be less than the full num if killed early
+    self.checkpoint = None  # type: str|None  # model after self.num_train_steps, to continue training
     self.name = name
 
+  def remove_checkpoint(self):
+    """
+    Removes the files of self.checkpoint, if there is one.
+    """
+    if not self.checkpoint:
+      return
+    from glob import glob
+    for fn in glob(self.checkpoint + ".*"):
+      os.remove(fn)
+    self.checkpoint = None
+
+  def get_sort_key(self):
+    """
+    :return: key to sort individuals, best first.
+      Individuals which were killed early (successive halving) are always sorted behind fully trained ones.
+    :rtype: (int,float)
+    """
+    assert self.cost is not None
+    return -self.num_train_steps, self.cost
+
   def cross_over(self, hyper_params, population, random_seed):
     """
     :param list[HyperParam] hyper_params:
@@ -278,7 +317,7 @@ class Individual:
     if len(name) > 10:
       name = name[:8] + ".."
     name += "x%x" % random_seed
-    res = Individual(hyper_param_mapping=self.hyper_param_mapping.copy(), name=name)
+    res = Individual(hyper_param_mapping=self.hyper_param_mapping.copy(), name=name)  # without cost, checkpoint
     rnd = numpy.random.RandomState(random_seed)
     while True:
       other = population[rnd.random_integers(0, len(population) - 1)]
@@ -320,7 +359,21 @@ class Optimization:
       "num_kill_individuals", self.num_individuals // 2)
     self.num_best = self.opts.get("num_best", 10)
     self.num_threads = self.opts.get("num_threads", guess_requested_max_num_threads())
+    self.backend = self.opts.get("backend", "thread")
+    assert self.backend in ("thread", "process"), "hyper_param_tuning: invalid backend %r" % self.backend
+    self.num_threads_per_worker = self.opts.get("num_threads_per_worker", None)
+    if self.num_threads_per_worker is None and self.backend == "process":
+      self.num_threads_per_worker = max((guess_requested_max_num_threads() or 1) // self.num_threads, 1)
+    self.successive_halving_min_frac = self.opts.get("successive_halving_min_frac", None)
+    self.successive_halving_eta = self.opts.get("successive_halving_eta", 2)
+    self.cost_cache_file = self.opts.get("cost_cache_file", None)
     self.opts.assert_all_read()
+    self.cost_cache = {}  # type: dict[(int,int),float]  # (hash of mapping, num train steps) -> cost
+    self.cost_cache_lock = Lock()
+    if self.cost_cache_file and os.path.exists(self.cost_cache_file):
+      self._load_cost_cache()
+    self.worker_procs = {}  # type: dict[int,_WorkerProcess]  # for the process backend, by worker idx
+    self.checkpoint_dir = None  # type: str|None  # for successive halving, set in work()
 
   def _find_hyper_params(self, base=None, visited=None):
     """
@@ -388,10 +441,110 @@ class Optimization:
         population=population[:i] + population[i + 1:],
         random_seed=iteration_idx * 1013 + i * 17)
 
+  def get_num_train_steps(self):
+    """
+    :return: number of seqs of the full training
+    :rtype: int
+    """
+    return self.train_data.num_seqs
+
+  def get_train_steps_schedule(self):
+    """
+    :return: num train steps for each rung of the successive halving, or just the full num train steps
+    :rtype: list[int]
+    """
+    num_train_steps = self.get_num_train_steps()
+    if not self.successive_halving_min_frac:
+      return [num_train_steps]
+    return get_successive_halving_schedule(
+      num_train_steps=num_train_steps, min_frac=self.successive_halving_min_frac, eta=self.successive_halving_eta)
+
+  def get_train_data(self, num_train_steps, start_train_steps=0):
+    """
+    :param int num_train_steps:
+    :param int start_train_steps:
+    :return: the seqs [start_train_steps:num_train_steps] of our train data
+    :rtype: StaticDataset
+    """
+    return _get_train_data_subset(self.train_data, num_train_steps, start_train_steps=start_train_steps)
+
+  def get_checkpoint_filename(self, individual, num_train_steps):
+    """
+    :param Individual individual:
+    :param int num_train_steps:
+    :return: where to store the model after training num_train_steps, such that the next rung can continue,
+      or None if there is no next rung
+    :rtype: str|None
+    """
+    if not self.checkpoint_dir or num_train_steps >= self.get_num_train_steps():
+      return None
+    return "%s/%s.%i" % (self.checkpoint_dir, individual.name, num_train_steps)
+
+  def get_cost_cache_key(self, hyper_param_mapping, num_train_steps):
+    """
+    :param dict[HyperParam] hyper_param_mapping:
+    :param int num_train_steps:
+    :return: key for self.cost_cache. deterministic, i.e. also valid for a new run with the same config
+    :rtype: (int,int)
+    """
+    values = [hyper_param_mapping[p] for p in self.hyper_params]
+    values = [v if isinstance(v, (int, float, str, type(None))) else repr(v) for v in values]
+    return hash_obj([(p.get_canonical_usage(), v) for (p, v) in zip(self.hyper_params, values)]), num_train_steps
+
+  def _load_cost_cache(self):
+    with open(self.cost_cache_file) as f:
+      for line in f:
+        if not line.strip() or line.startswith("#"):
+          continue
+        mapping_hash, num_train_steps, cost = line.split()[:3]
+        self.cost_cache[(int(mapping_hash), int(num_train_steps))] = float(cost)
+    print("Loaded %i cached costs from %r." % (len(self.cost_cache), self.cost_cache_file), file=log.v2)
+
+  def get_cached_cost(self, individual, num_train_steps):
+    """
+    :param Individual individual:
+    :param int num_train_steps:
+    :rtype: float|None
+    """
+    key = self.get_cost_cache_key(individual.hyper_param_mapping, num_train_steps)
+    with self.cost_cache_lock:
+      return self.cost_cache.get(key, None)
+
+  def set_cost(self, individual, cost, num_train_steps):
+    """
+    :param Individual individual:
+    :param float cost:
+    :param int num_train_steps:
+    """
+    individual.cost = cost
+    individual.num_train_steps = num_train_steps
+    key = self.get_cost_cache_key(individual.hyper_param_mapping, num_train_steps)
+    with self.cost_cache_lock:
+      if key in self.cost_cache:
+        return
+      self.cost_cache[key] = cost
+      if self.cost_cache_file:
+        # Append directly, so that nothing is lost if we crash.
+        with open(self.cost_cache_file, "a") as f:
+          f.write("%i %i %r %s\n" % (key[0], key[1], cost, individual.name))
+
+  def get_worker_proc(self, worker_idx, gpu_id):
+    """
+    :param int worker_idx:
+    :param int|None gpu_id:
+    :return: worker process, for the process backend. reused over iterations, restarted if it died
+    :rtype: _WorkerProcess
+    """
+    proc = self.worker_procs.get(worker_idx, None)
+    if proc is None or not proc.is_alive():
+      proc = _WorkerProcess(optim=self, name="Hyper param tune worker %i" % worker_idx, gpu_id=gpu_id)
+      self.worker_procs[worker_idx] = proc
+    return proc
+
   def create_config_instance(self, hyper_param_mapping, gpu_ids):
     """
     :param dict[HyperParam] hyper_param_mapping: maps each hyper param to some value
-    :param set[int] gpu_ids:
+    :param set[int]|None gpu_ids: None means to not set the TF GPU options (e.g. via CUDA_VISIBLE_DEVICES instead)
     :rtype: Config
     """
     assert set(self.hyper_params) == set(hyper_param_mapping.keys())
@@ -403,16 +556,102 @@ class Optimization:
       for attr_chain in p.usages:
         attr_chain.write_attrib(base=config, new_value=value)
     tf_session_opts = config.typed_dict.setdefault("tf_session_opts", {})
-    # https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/protobuf/config.proto
-    gpu_opts = tf_session_opts.setdefault("gpu_options", tf.GPUOptions())
-    if isinstance(gpu_opts, dict):
-      gpu_opts = tf.GPUOptions(**gpu_opts)
-    gpu_opts.visible_device_list = ",".join(map(str, sorted(gpu_ids)))
+    if self.num_threads_per_worker:
+      tf_session_opts["intra_op_parallelism_threads"] = self.num_threads_per_worker
+      tf_session_opts["inter_op_parallelism_threads"] = self.num_threads_per_worker
+    if gpu_ids is not None:
+      # https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/protobuf/config.proto
+      import tensorflow as tf
+      gpu_opts = tf_session_opts.setdefault("gpu_options", tf.GPUOptions())
+      if isinstance(gpu_opts, dict):
+        gpu_opts = tf.GPUOptions(**gpu_opts)
+      gpu_opts.visible_device_list = ",".join(map(str, sorted(gpu_ids)))
     return config
 
   def work(self):
-    print("Starting hyper param search. Using %i threads." % self.num_threads, file=log.v1)
+    from Util import hms
+    print("Starting hyper param search. Using %i %s." % (
+      self.num_threads, {"thread": "threads", "process": "worker processes"}[self.backend]), file=log.v1)
+    best_individuals = []
+    population = []
+    canceled = False
+    schedule = self.get_train_steps_schedule()
+    if len(schedule) > 1:
+      import tempfile
+      self.checkpoint_dir = tempfile.mkdtemp(prefix="returnn-hyper-param-tuning-")
+      print("Successive halving with num train steps %r, checkpoints in %r." % (
+        schedule, self.checkpoint_dir), file=log.v2)
+    try:
+      print("Population of %i individuals (hyper param setting instances), running for %i evaluation iterations." % (
+        self.num_individuals, self.num_iterations), file=log.v2)
+      for cur_iteration_idx in range(1, self.num_iterations + 1):
+        print("Starting iteration %i." % cur_iteration_idx, file=log.v2)
+        if cur_iteration_idx == 1:
+          population.append(Individual(
+            {p: p.get_default_value() for p in self.hyper_params}, name="default"))
+          population.append(Individual(
+            {p: p.get_initial_value() for p in self.hyper_params}, name="canonical"))
+        population.extend(self.get_population(
+          iteration_idx=cur_iteration_idx, num_individuals=self.num_individuals - len(population)))
+        if cur_iteration_idx > 1:
+          self.cross_over(population=population, iteration_idx=cur_iteration_idx)
+        if cur_iteration_idx == 1 and self.dry_run_first_individual:
+          # Train first directly for testing and to see log output.
+          # Later we will strip away all log output.
+          print("Very first try with log output:", file=log.v2)
+          _IndividualTrainer(optim=self, individual=population[0], gpu_ids={0}).run()
+        iteration_start_time = time.time()
+        candidates = list(population)
+        for rung_idx, num_train_steps in enumerate(schedule):
+          self._train_population(population=candidates, num_train_steps=num_train_steps)
+          if rung_idx == len(schedule) - 1:
+            break
+          candidates.sort(key=lambda p: p.cost)
+          num_keep = max(int(numpy.ceil(len(candidates) / float(self.successive_halving_eta))), 1)
+          print("Successive halving: Keep best %i of %i individuals after %i train steps." % (
+            num_keep, len(candidates), num_train_steps), file=log.v2)
+          for individual in candidates[num_keep:]:
+            individual.remove_checkpoint()
+          del candidates[num_keep:]
+        print("Training iteration elapsed time:", hms(time.time() - iteration_start_time))
+        print("Training iteration finished.")
+        population.sort(key=lambda p: p.get_sort_key())
+        del population[-self.num_kill_individuals:]
+        best_individuals.extend(population)
+        best_individuals.sort(key=lambda p: p.get_sort_key())
+        del best_individuals[self.num_best:]
+        population = best_individuals[:self.num_kill_individuals // 4] + population
+        print("Current best setting, individual %s" % best_individuals[0].name, "cost:", best_individuals[0].cost)
+        for p in self.hyper_params:
+          print(" %s -> %s" % (p.description(), best_individuals[0].hyper_param_mapping[p]))
+    except KeyboardInterrupt:
+      print("KeyboardInterrupt, canceled search.")
+      canceled = True
+    finally:
+      for proc in self.worker_procs.values():
+        proc.close()
+      self.worker_procs.clear()
+      if self.checkpoint_dir:
+        import shutil
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self.checkpoint_dir = None
+
+    print("Best %i settings:" % len(best_individuals))
+    for individual in best_individuals:
+      print("Individual %s" % individual.name, "cost:", individual.cost)
+      for p in self.hyper_params:
+        print(" %s -> %s" % (p.description(), individual.hyper_param_mapping[p]))
+
+  def _train_population(self, population, num_train_steps):
+    """
+    Trains all individuals in parallel, with self.num_threads threads or worker processes.
+    Individuals which already have a cost for this num of train steps (also via the cost cache) are skipped.
+
+    :param list[Individual] population:
+    :param int num_train_steps:
+    """
     from TFUtil import get_available_gpu_devices
+    from TFEngine import CancelTrainingException
     from Log import wrap_log_streams, StreamDummy
     from threading import Thread, Condition
     from Util import progress_bar, hms, is_tty
@@ -425,12 +664,14 @@ class Optimization:
       exception = None
 
     class WorkerThread(Thread):
-      def __init__(self, gpu_ids):
+      def __init__(self, worker_idx, gpu_id):
         """
-        :param set[int] gpu_ids:
+        :param int worker_idx:
+        :param int gpu_id:
         """
         super(WorkerThread, self).__init__(name="Hyper param tune train thread")
-        self.gpu_ids = gpu_ids
+        self.worker_idx = worker_idx
+        self.gpu_id = gpu_id
         self.trainer = None  # type: _IndividualTrainer
         self.finished = False
         self.start()
@@ -461,7 +702,13 @@ class Optimization:
                 Outstanding.cond.notify_all()
                 return
               individual = Outstanding.population.pop(0)
-              self_thread.trainer = _IndividualTrainer(optim=self, individual=individual, gpu_ids=self_thread.gpu_ids)
+              if self.backend == "process":
+                self_thread.trainer = _ProcessIndividualTrainer(
+                  optim=self, individual=individual, num_train_steps=num_train_steps,
+                  worker_proc=self.get_worker_proc(self_thread.worker_idx, gpu_id=self_thread.gpu_id))
+              else:
+                self_thread.trainer = _IndividualTrainer(
+                  optim=self, individual=individual, gpu_ids={self_thread.gpu_id}, num_train_steps=num_train_steps)
             self_thread.name = "Hyper param tune train thread on %r" % individual.name
             self_thread.trainer.run()
         except Exception as exc:
@@ -477,117 +724,165 @@ class Optimization:
               # This would normally dump it on sys.stderr so it's fine.
               sys.excepthook(*sys.exc_info())
 
-    best_individuals = []
-    population = []
-    canceled = False
     num_gpus = len(get_available_gpu_devices())
     print("Num available GPUs:", num_gpus)
     num_gpus = num_gpus or 1  # Would be ignored anyway.
     interactive = is_tty()
-    try:
-      print("Population of %i individuals (hyper param setting instances), running for %i evaluation iterations." % (
-        self.num_individuals, self.num_iterations), file=log.v2)
-      for cur_iteration_idx in range(1, self.num_iterations + 1):
-        print("Starting iteration %i." % cur_iteration_idx, file=log.v2)
-        if cur_iteration_idx == 1:
-          population.append(Individual(
-            {p: p.get_default_value() for p in self.hyper_params}, name="default"))
-          population.append(Individual(
-            {p: p.get_initial_value() for p in self.hyper_params}, name="canonical"))
-        population.extend(self.get_population(
-          iteration_idx=cur_iteration_idx, num_individuals=self.num_individuals - len(population)))
-        if cur_iteration_idx > 1:
-          self.cross_over(population=population, iteration_idx=cur_iteration_idx)
-        if cur_iteration_idx == 1 and self.dry_run_first_individual:
-          # Train first directly for testing and to see log output.
-          # Later we will strip away all log output.
-          print("Very first try with log output:", file=log.v2)
-          _IndividualTrainer(optim=self, individual=population[0], gpu_ids={0}).run()
-        print("Starting training with thread pool of %i threads." % self.num_threads)
-        iteration_start_time = time.time()
-        with wrap_log_streams(StreamDummy(), also_sys_stdout=True, tf_log_verbosity="WARN"):
-          Outstanding.exit = False
-          Outstanding.population = list(population)
-          Outstanding.threads = [WorkerThread(gpu_ids={i % num_gpus}) for i in range(self.num_threads)]
-          try:
-            while True:
-              with Outstanding.cond:
-                if all([thread.finished for thread in Outstanding.threads]) or Outstanding.exception:
-                  break
-                complete_frac = max(len(population) - len(Outstanding.population) - len(Outstanding.threads), 0)
-                complete_frac += sum([thread.get_complete_frac() for thread in Outstanding.threads])
-                complete_frac /= float(len(population))
-                remaining_str = ""
-                if complete_frac > 0:
-                  start_elapsed = time.time() - iteration_start_time
-                  total_time_estimated = start_elapsed / complete_frac
-                  remaining_estimated = total_time_estimated - start_elapsed
-                  remaining_str = hms(remaining_estimated)
-                if interactive:
-                  progress_bar(complete_frac, prefix=remaining_str, file=sys.__stdout__)
-                else:
-                  print(
-                    "Progress: %.02f%%" % (complete_frac * 100),
-                    "remaining:", remaining_str or "unknown", file=sys.__stdout__)
-                  sys.__stdout__.flush()
-                Outstanding.cond.wait(1 if interactive else 10)
-            for thread in Outstanding.threads:
-              thread.join()
-          finally:
-            Outstanding.exit = True
-            for thread in Outstanding.threads:
-              thread.cancel(join=True)
-        Outstanding.threads = []
-        print("Training iteration elapsed time:", hms(time.time() - iteration_start_time))
-        if Outstanding.exception:
-          raise Outstanding.exception
-        assert not Outstanding.population
-        print("Training iteration finished.")
-        population.sort(key=lambda p: p.cost)
-        del population[-self.num_kill_individuals:]
-        best_individuals.extend(population)
-        best_individuals.sort(key=lambda p: p.cost)
-        del best_individuals[self.num_best:]
-        population = best_individuals[:self.num_kill_individuals // 4] + population
-        print("Current best setting, individual %s" % best_individuals[0].name, "cost:", best_individuals[0].cost)
-        for p in self.hyper_params:
-          print(" %s -> %s" % (p.description(), best_individuals[0].hyper_param_mapping[p]))
-    except KeyboardInterrupt:
-      print("KeyboardInterrupt, canceled search.")
-      canceled = True
+    print("Starting training of %i individuals with %i train steps, with %i %s." % (
+      len(population), num_train_steps, self.num_threads,
+      {"thread": "threads", "process": "worker processes"}[self.backend]))
+    start_time = time.time()
+    with wrap_log_streams(StreamDummy(), also_sys_stdout=True, tf_log_verbosity="WARN"):
+      Outstanding.exit = False
+      Outstanding.population = list(population)
+      Outstanding.threads = [WorkerThread(worker_idx=i, gpu_id=i % num_gpus) for i in range(self.num_threads)]
+      try:
+        while True:
+          with Outstanding.cond:
+            if all([thread.finished for thread in Outstanding.threads]) or Outstanding.exception:
+              break
+            complete_frac = max(len(population) - len(Outstanding.population) - len(Outstanding.threads), 0)
+            complete_frac += sum([thread.get_complete_frac() for thread in Outstanding.threads])
+            complete_frac /= float(len(population))
+            remaining_str = ""
+            if complete_frac > 0:
+              start_elapsed = time.time() - start_time
+              total_time_estimated = start_elapsed / complete_frac
+              remaining_estimated = total_time_estimated - start_elapsed
+              remaining_str = hms(remaining_estimated)
+            if interactive:
+              progress_bar(complete_frac, prefix=remaining_str, file=sys.__stdout__)
+            else:
+              print(
+                "Progress: %.02f%%" % (complete_frac * 100),
+                "remaining:", remaining_str or "unknown", file=sys.__stdout__)
+              sys.__stdout__.flush()
+            Outstanding.cond.wait(1 if interactive else 10)
+        for thread in Outstanding.threads:
+          thread.join()
+      finally:
+        Outstanding.exit = True
+        for thread in Outstanding.threads:
+          thread.cancel(join=True)
+    Outstanding.threads = []
+    print("Training with %i train steps elapsed time:" % num_train_steps, hms(time.time() - start_time))
+    if Outstanding.exception:
+      raise Outstanding.exception
+    assert not Outstanding.population
+    assert all([individual.cost is not None for individual in population])
+
+
+def get_successive_halving_schedule(num_train_steps, min_frac, eta):
+  """
+  :param int num_train_steps: full num train steps, for the last rung
+  :param float min_frac: fraction of num_train_steps for the first rung
+  :param float eta: factor of train steps between the rungs
+  :return: num train steps for each rung.
+    If the full num is less than sqrt(eta) times the last rung, it replaces the last rung,
+    as it would cut most of the individuals for only a few more train steps.
+  :rtype: list[int]
+  """
+  assert 0 < min_frac < 1 and eta > 1
+  schedule = []
+  frac = min_frac
+  while frac < 1:
+    steps = max(int(round(num_train_steps * frac)), 1)
+    if not schedule or steps > schedule[-1]:
+      schedule.append(steps)
+    frac *= eta
+  if schedule[-1] < num_train_steps:
+    if num_train_steps < schedule[-1] * numpy.sqrt(eta):
+      schedule[-1] = num_train_steps
+    else:
+      schedule.append(num_train_steps)
+  return schedule
 
-    print("Best %i settings:" % len(best_individuals))
-    for individual in best_individuals:
-      print("Individual %s" % individual.name, "cost:", individual.cost)
-      for p in self.hyper_params:
-        print(" %s -> %s" % (p.description(), individual.hyper_param_mapping[p]))
+
+def _get_train_data_subset(train_data, num_train_steps, start_train_steps=0):
+  """
+  :param StaticDataset train_data:
+  :param int num_train_steps:
+  :param int start_train_steps:
+  :return: the seqs [start_train_steps:num_train_steps]
+  :rtype: StaticDataset
+  """
+  return StaticDataset(
+    data=train_data.data[start_train_steps:num_train_steps], target_list=train_data.target_list,
+    output_dim=train_data.num_outputs, input_dim=train_data.num_inputs)
 
 
 class _IndividualTrainer:
-  def __init__(self, optim, individual, gpu_ids):
+  def __init__(self, optim, individual, gpu_ids, num_train_steps=None):
     """
-    :param Optimization optim:
-    :param Individual individual:
-    :param set[int] gpu_ids:
+    :param Optimization|None optim:
+    :param Individual|None individual:
+    :param set[int]|None gpu_ids:
+    :param int|None num_train_steps: if None, the full num
     """
     self.optim = optim
     self.individual = individual
     self.runner = None  # type: Runner
     self.gpu_ids = gpu_ids
+    self.num_train_steps = num_train_steps or (optim.get_num_train_steps() if optim else None)
     self.cancel_flag = False
 
   def run(self):
-    if self.individual.cost is not None:
+    if self.individual.cost is not None and self.individual.num_train_steps >= self.num_train_steps:
       return self.individual.cost
+    cached_cost = self.optim.get_cached_cost(self.individual, num_train_steps=self.num_train_steps)
+    if cached_cost is not None:
+      print("Individual %s:" % self.individual.name, "Train cost:", cached_cost, "(cached)", file=self.optim.log)
+      self.individual.remove_checkpoint()  # we have no model for these train steps, thus the next rung starts new
+      self.optim.set_cost(self.individual, cached_cost, num_train_steps=self.num_train_steps)
+      return cached_cost
     start_time = time.time()
     hyper_param_mapping = self.individual.hyper_param_mapping
     print("Training %r using hyper params:" % self.individual.name, file=log.v2)
     for p in self.optim.hyper_params:
       print(" %s -> %s" % (p.description(), hyper_param_mapping[p]), file=log.v2)
     config = self.optim.create_config_instance(hyper_param_mapping, gpu_ids=self.gpu_ids)
+    start_train_steps, load_filename = 0, None
+    if self.individual.checkpoint and self.individual.num_train_steps < self.num_train_steps:
+      # Survivor of successive halving. Continue from the previous rung.
+      start_train_steps, load_filename = self.individual.num_train_steps, self.individual.checkpoint
+    save_filename = self.optim.get_checkpoint_filename(self.individual, num_train_steps=self.num_train_steps)
+    cost = self.train(
+      config=config, start_train_steps=start_train_steps, load_filename=load_filename, save_filename=save_filename)
+    if start_train_steps:
+      # Average over all train steps, like when trained from scratch.
+      cost = (
+        self.individual.cost * start_train_steps + cost * (self.num_train_steps - start_train_steps)
+      ) / float(self.num_train_steps)
+    print(
+      "Individual %s:" % self.individual.name,
+      "Train cost:", cost,
+      "train steps:", self.num_train_steps,
+      "continued from:", start_train_steps,
+      "elapsed time:", hms_fraction(time.time() - start_time),
+      file=self.optim.log)
+    self.individual.remove_checkpoint()
+    self.individual.checkpoint = save_filename
+    self.optim.set_cost(self.individual, cost, num_train_steps=self.num_train_steps)
+    return cost
+
+  def train(self, config, train_data=None, start_train_steps=0, load_filename=None, save_filename=None):
+    """
+    :param Config config: with the hyper params applied
+    :param StaticDataset|None train_data: if None, from self.optim
+    :param int start_train_steps: if train_data is None, start with this seq of the train data of self.optim
+    :param str|None load_filename: model to continue training from
+    :param str|None save_filename: store the model after training
+    :return: train cost (of the seqs trained here)
+    :rtype: float
+    """
+    from TFEngine import Engine, Runner, CancelTrainingException
     engine = Engine(config=config)
-    train_data = StaticDataset.copy_from_dataset(self.optim.train_data)
+    if train_data is None:
+      train_data = self.optim.get_train_data(
+        num_train_steps=self.num_train_steps, start_train_steps=start_train_steps)
     engine.init_train_from_config(config=config, train_data=train_data)
+    if load_filename:
+      engine.load_model(filename=load_filename)
     # Not directly calling train() as we want to have full control.
     engine.epoch = 1
     train_data.init_seq_order(epoch=engine.epoch)
@@ -604,17 +899,126 @@ class _IndividualTrainer:
     self.runner = trainer
     if self.cancel_flag:
       raise CancelTrainingException("Trainer cancel flag is set")
-    trainer.run(report_prefix="hyper param tune train %r" % self.individual.name)
+    trainer.run(report_prefix="hyper param tune train %r" % (self.individual.name if self.individual else "?"))
     if not trainer.finalized:
       print("Trainer exception:", trainer.run_exception, file=log.v1)
       raise trainer.run_exception
-    cost = trainer.score["cost:output"]
-    print(
-      "Individual %s:" % self.individual.name,
-      "Train cost:", cost,
-      "elapsed time:", hms_fraction(time.time() - start_time),
-      file=self.optim.log)
-    self.individual.cost = cost
+    if save_filename:
+      engine.save_model(filename=save_filename)
+      engine.wait_for_pending_model_save()
+    return trainer.score["cost:output"]
+
+
+class _ProcessIndividualTrainer(_IndividualTrainer):
+  """
+  Trains in a :class:`_WorkerProcess`.
+  """
+
+  def __init__(self, worker_proc, **kwargs):
+    """
+    :param _WorkerProcess worker_proc:
+    """
+    super(_ProcessIndividualTrainer, self).__init__(gpu_ids=None, **kwargs)
+    self.worker_proc = worker_proc
+
+  def train(self, config, train_data=None, start_train_steps=0, load_filename=None, save_filename=None):
+    assert train_data is None
+    return self.worker_proc.train(
+      config=config, num_train_steps=self.num_train_steps, start_train_steps=start_train_steps,
+      load_filename=load_filename, save_filename=save_filename, cancel_check=lambda: self.cancel_flag)
+
+
+class _WorkerProcess:
+  """
+  Separate process (fork+exec, like the Theano device procs) which trains one individual after another,
+  such that the workers do not share the GIL and the TF session.
+  The train data is sent once, and then only the config instance for each individual.
+  """
+
+  def __init__(self, optim, name, gpu_id=None):
+    """
+    :param Optimization optim:
+    :param str name:
+    :param int|None gpu_id:
+    """
+    from TaskSystem import AsyncTask
+    env_update = {}
+    if gpu_id is not None:
+      env_update["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
+    self.name = name
+    self.proc = AsyncTask(func=_worker_process_main, name=name, mustExec=True, env_update=env_update)
+    train_data = optim.train_data
+    self.proc.conn.send(dict(
+      data=train_data.data, target_list=train_data.target_list,
+      output_dim=train_data.num_outputs, input_dim=train_data.num_inputs))
+
+  def is_alive(self):
+    return self.proc.child_pid is not None and self.proc.is_alive()
+
+  def train(self, config, num_train_steps, start_train_steps, load_filename, save_filename, cancel_check):
+    """
+    :param Config config: with the hyper params applied
+    :param int num_train_steps:
+    :param int start_train_steps:
+    :param str|None load_filename:
+    :param str|None save_filename:
+    :param ()->bool cancel_check:
+    :return: train cost
+    :rtype: float
+    """
+    self.proc.conn.send(("train", config, num_train_steps, start_train_steps, load_filename, save_filename))
+    while not self.proc.conn.poll(1.0):
+      if cancel_check():
+        from TFEngine import CancelTrainingException
+        self.proc.terminate()
+        raise CancelTrainingException("%s canceled" % self.name)
+    res = self.proc.conn.recv()
+    if res[0] == "error":
+      raise TrainException("%s: %s" % (self.name, res[1]))
+    assert res[0] == "cost"
+    return res[1]
+
+  def close(self):
+    if self.is_alive():
+      try:
+        self.proc.conn.send(("exit",))
+        self.proc.join(timeout=10)
+      except Exception as exc:  # e.g. ProcConnectionDied
+        print("%s: exception on exit: %s" % (self.name, exc), file=log.v3)
+    if self.proc.child_pid is not None and self.proc.is_alive():
+      self.proc.terminate()
+
+
+def _worker_process_main(asyncTask):
+  """
+  Main loop of :class:`_WorkerProcess`, in the child process.
+
+  :param TaskSystem.AsyncTask asyncTask:
+  """
+  import rnn
+  rnn.initBetterExchook()
+  log.initialize(verbosity=[0])
+  conn = asyncTask.conn
+  train_data = StaticDataset(**conn.recv())
+  while True:
+    msg = conn.recv()
+    if msg[0] == "exit":
+      break
+    assert msg[0] == "train"
+    config, num_train_steps, start_train_steps, load_filename, save_filename = msg[1:]
+    if rnn.config is None:
+      rnn.config = config
+      rnn.initBackendEngine()
+    try:
+      cost = _IndividualTrainer(optim=None, individual=None, gpu_ids=None).train(
+        config=config,
+        train_data=_get_train_data_subset(train_data, num_train_steps, start_train_steps=start_train_steps),
+        load_filename=load_filename, save_filename=save_filename)
+    except Exception as exc:
+      sys.excepthook(*sys.exc_info())
+      conn.send(("error", "%s: %s" % (type(exc).__name__, exc)))
+    else:
+      conn.send(("cost", float(cost)))
 
 
 class _AttribOrKey:
@@ -741,7 +1145,7 @@ def hash_int(x):
 
 def hash_obj(x):
   """
-  :param tuple|list|str|_AttribOrKey|_AttrChain x:
+  :param tuple|list|str|_AttribOrKey|_AttrChain|int|float|None x:
   :rtype: int
   """
   if isinstance(x, (list, tuple)):
@@ -754,4 +1158,8 @@ def hash_obj(x):
     return hash_seq(x.chain)
   if isinstance(x, int):
     return hash_int(x)
+  if isinstance(x, float):
+    return hash_str_djb2(repr(x))
+  if x is None:
+    return hash_str_djb2("None")
   raise TypeError("invalid type %s" % type(x))
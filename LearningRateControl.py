@@ -65,9 +65,13 @@ class LearningRateControl(object):
     :param str|list[str]|None errorMeasureKey: for getEpochErrorValue() the selector for EpochData.error which is a dict
     :param int minNumEpochsPerNewLearningRate: if the lr was recently updated, use it for at least N epochs
     :param bool relativeErrorDivByOld: if True, compute relative error as (new - old) / old.
-    :param str filename: load from and save to file
+    :param str filename: load from and save to file.
+      if it ends with ".jsonl", it is an append-only store with one JSON record per line,
+      otherwise the whole epoch data as Python repr (the newbob file)
     """
     self.epochData = {}  # type: dict[int,LearningRateControl.EpochData]
+    self._error_key_cache = {}  # type: dict[int,str]  # epoch -> key, see getErrorKey
+    self._saved_records = {}  # type: dict[int,str]  # epoch -> JSON record, as stored in the jsonl file
     self.defaultLearningRate = defaultLearningRate
     self.minLearningRate = minLearningRate
     if defaultLearningRates:
@@ -203,10 +207,29 @@ class LearningRateControl(object):
     for v in error.values():
       assert isinstance(v, float)
     self.epochData[epoch].error.update(error)
+    self._error_key_cache.pop(epoch, None)
     if epoch == 1:
       print("Learning-rate-control: error key %r from %r" % (self.getErrorKey(epoch), error), file=log.v4)
 
   def getErrorKey(self, epoch):
+    """
+    :param int epoch:
+    :rtype: str|None
+    """
+    if epoch in self._error_key_cache:
+      return self._error_key_cache[epoch]
+    key = self._calc_error_key(epoch)
+    if epoch in self.epochData and self.epochData[epoch].error:
+      # This is called for every epoch in getLastBestEpoch and calcRelativeError,
+      # so cache it. It can only change via setEpochError or load.
+      self._error_key_cache[epoch] = key
+    return key
+
+  def _calc_error_key(self, epoch):
+    """
+    :param int epoch:
+    :rtype: str|None
+    """
     if epoch not in self.epochData:
       if isinstance(self.errorMeasureKey, list):
         return self.errorMeasureKey[0]
@@ -298,8 +321,17 @@ class LearningRateControl(object):
       return None
     return min(values)[1]
 
+  def _is_jsonl_file(self):
+    """
+    :rtype: bool
+    """
+    return self.filename.endswith(".jsonl")
+
   def save(self):
     if not self.filename: return
+    if self._is_jsonl_file():
+      self._save_jsonl()
+      return
     # First write to a temp-file, to be sure that the write happens without errors.
     # Otherwise, it could happen that we delete the old existing file, then
     # some error happens (e.g. disk quota), and we loose the newbob data.
@@ -312,9 +344,80 @@ class LearningRateControl(object):
     os.rename(tmp_filename, self.filename)
 
   def load(self):
+    self._error_key_cache.clear()
+    if self._is_jsonl_file():
+      self._load_jsonl()
+      return
     s = open(self.filename).read()
     self.epochData = eval(s, {"nan": float("nan"), "inf": float("inf")}, ObjAsDict(self))
 
+  @staticmethod
+  def _epoch_data_to_json_record(epoch, data):
+    """
+    :param int epoch:
+    :param LearningRateControl.EpochData data:
+    :return: one line for the jsonl file, without newline
+    :rtype: str
+    """
+    import json
+    return json.dumps({"epoch": epoch, "learningRate": data.learningRate, "error": data.error}, sort_keys=True)
+
+  def _save_jsonl(self):
+    """
+    Appends a record for every epoch which changed since the last save or load.
+    All records are written with a single write() call on a file opened in append mode,
+    thus the file is always consistent, except maybe a truncated last line on a crash, which load ignores.
+    """
+    new_records = {}
+    for epoch, data in sorted(self.epochData.items()):
+      record = self._epoch_data_to_json_record(epoch, data)
+      if self._saved_records.get(epoch) != record:
+        new_records[epoch] = record
+    if not new_records:
+      return
+    s = "".join(["%s\n" % record for (epoch, record) in sorted(new_records.items())])
+    fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+      os.write(fd, s.encode("utf8"))
+    finally:
+      os.close(fd)
+    self._saved_records.update(new_records)
+
+  def _load_jsonl(self):
+    """
+    Reads all records. The last record of an epoch wins.
+    If there are many outdated records, or the last line is incomplete (interrupted write),
+    the file gets compacted, such that further appends start on a new line.
+    """
+    import json
+    self.epochData = {}
+    self._saved_records = {}
+    num_records = 0
+    with open(self.filename) as f:
+      content = f.read()
+    need_compact = bool(content) and not content.endswith("\n")
+    lines = content.splitlines()
+    for i, line in enumerate(lines):
+      if not line.strip():
+        continue
+      try:
+        d = json.loads(line)
+      except ValueError:
+        if i == len(lines) - 1:  # can happen if a write got interrupted
+          print("Learning-rate-control: ignoring incomplete last line in %s" % self.filename, file=log.v3)
+          break
+        raise
+      epoch = d["epoch"]
+      self.epochData[epoch] = self.EpochData(learningRate=d["learningRate"], error=d["error"])
+      self._saved_records[epoch] = self._epoch_data_to_json_record(epoch, self.epochData[epoch])
+      num_records += 1
+    if need_compact or num_records > 2 * len(self.epochData) + 10:
+      tmp_filename = self.filename + ".new_tmp"
+      with open(tmp_filename, "w") as f:
+        for epoch, record in sorted(self._saved_records.items()):
+          f.write("%s\n" % record)
+      os.rename(tmp_filename, self.filename)
+
 
 class ConstantLearningRate(LearningRateControl):
 
@@ -435,6 +435,29 @@ class AllophoneState:
   def __repr__(self):
     return self.format()
 
+  @classmethod
+  def from_str(cls, s):
+    """
+    Inverse of :func:`format`.
+
+    :param str s: e.g. "a{b+c}@i.0"
+    :rtype: AllophoneState
+    """
+    m = re.match(r"^(.+)\{(.*)\+(.*)\}((?:@i)?)((?:@f)?)(?:\.(\d+))?$", s)
+    if not m:
+      raise ValueError("AllophoneState.from_str: cannot parse %r" % s)
+    phone, history, future, initial, final, state = m.groups()
+    a = AllophoneState(id=phone, state=int(state) if state is not None else None)
+    if history != "#":
+      a.context_history = tuple(history.split("-"))
+    if future != "#":
+      a.context_future = tuple(future.split("-"))
+    if initial:
+      a.mark_initial()
+    if final:
+      a.mark_final()
+    return a
+
   def copy(self):
     a = AllophoneState(id=self.id, state=self.state)
     for attr in self._attrs:
@@ -542,6 +565,47 @@ class AllophoneState:
     result += self.boundary
     return result
 
+  @classmethod
+  def index_many(cls, allos, phone_idxs, num_states=3, context_length=1):
+    """
+    Like :func:`index`, but for a whole sequence at once.
+    The phone context part of the index is only calculated once per distinct allophone,
+    and the rest is done via Numpy.
+
+    :param list[AllophoneState] allos:
+    :param dict[str,int] phone_idxs:
+    :param int num_states: how much state per allophone
+    :param int context_length: how much left/right context
+    :return: shape (len(allos),), int64
+    :rtype: numpy.ndarray
+    """
+    contexts = {}  # (id, history, future) -> context idx
+    context_idxs = numpy.array(
+      [contexts.setdefault((a.id, a.context_history, a.context_future), len(contexts)) for a in allos],
+      dtype="int64")
+    states = numpy.array([a.state for a in allos], dtype="int64")
+    boundaries = numpy.array([a.boundary for a in allos], dtype="int64")
+    assert numpy.all((0 <= states) & (states < num_states)) and numpy.all((0 <= boundaries) & (boundaries < 4))
+    # pos sequence: 0, -1, 1, [-2, 2, ...], see :func:`index`
+    positions = [(i // 2) if i % 2 == 0 else (-(i // 2) - 1) for i in range(2 * context_length + 1)]
+    num_phones = max(phone_idxs.values()) + 1
+    num_phone_classes = num_phones + 1  # 0 is the special no-context symbol
+    phone_classes = {phone: idx + 1 for (phone, idx) in phone_idxs.items()}
+    phone_classes[None] = 0
+    context_phone_classes = numpy.zeros((len(contexts), len(positions)), dtype="int64")
+    for (phone, history, future), context_idx in contexts.items():
+      assert max(len(history), len(future)) <= context_length
+      for i, pos in enumerate(positions):
+        if pos == 0:
+          context_phone_classes[context_idx, i] = phone_classes[phone]
+        elif pos > 0 and pos <= len(future):
+          context_phone_classes[context_idx, i] = phone_classes[future[pos - 1]]
+        elif pos < 0 and -pos <= len(history):
+          context_phone_classes[context_idx, i] = phone_classes[history[-pos - 1]]
+    context_values = context_phone_classes.dot(
+      num_phone_classes ** numpy.arange(len(positions) - 1, -1, -1, dtype="int64"))
+    return (context_values[context_idxs] * num_states + states) * 4 + boundaries
+
   @classmethod
   def from_index(cls, index, phone_ids, num_states=3, context_length=1):
     """
@@ -686,7 +750,11 @@ class Lexicon:
 
 
 class StateTying:
+  MaxDenseLookupSize = 1 << 26
+
   def __init__(self, state_tying_file):
+    self.state_tying_file = state_tying_file
+    self._dense_lookups = {}  # (phone_idxs, num_states, context_length) -> numpy.ndarray
     self.allo_map = {}  # allophone-state-str -> class-idx
     self.class_map = {}  # class-idx -> set(allophone-state-str)
     ls = open(state_tying_file).read().splitlines()
@@ -702,6 +770,71 @@ class StateTying:
     assert max_class_idx == len(self.class_map) - 1, "some classes are not represented"
     self.num_classes = len(self.class_map)
 
+  def get_dense_lookup(self, phone_idxs, num_states=3, context_length=1):
+    """
+    The lookup is cached next to the state tying file, see :func:`Util.load_or_create_npz_cache`.
+
+    :param dict[str,int] phone_idxs:
+    :param int num_states: how much state per allophone
+    :param int context_length: how much left/right context
+    :return: dense allophone state idx (see :func:`AllophoneState.index`) -> class-idx, or -1 if not in the state tying.
+      None if the dense lookup would be too big (see :data:`MaxDenseLookupSize`)
+    :rtype: numpy.ndarray|None
+    """
+    key = (tuple(sorted(phone_idxs.items())), num_states, context_length)
+    if key in self._dense_lookups:
+      return self._dense_lookups[key]
+    num_phone_classes = max(phone_idxs.values()) + 2  # 0 is the special no-context symbol
+    size = num_phone_classes ** (2 * context_length + 1) * num_states * 4
+    if size > self.MaxDenseLookupSize:
+      self._dense_lookups[key] = None
+      return None
+
+    def create():
+      lookup = numpy.full((size,), -1, dtype="int32")
+      for allo_str, class_idx in self.allo_map.items():
+        try:
+          a = AllophoneState.from_str(allo_str)
+        except ValueError:
+          continue  # e.g. some special entry. we cannot represent it in the dense lookup
+        if a.state is None or a.state >= num_states:
+          continue
+        if max(len(a.context_history), len(a.context_future)) > context_length:
+          continue
+        if any([p not in phone_idxs for p in (a.id,) + a.context_history + a.context_future]):
+          continue
+        lookup[a.index(phone_idxs=phone_idxs, num_states=num_states, context_length=context_length)] = class_idx
+      return {"lookup": lookup}
+
+    import hashlib
+    from Util import load_or_create_npz_cache, md5_of_files
+    # Different keys (e.g. other phone_idxs or num_states) must not overwrite each other's cache file.
+    key_hash = hashlib.md5(repr(key).encode("utf8")).hexdigest()[:8]
+    lookup = load_or_create_npz_cache(
+      "%s.dense_lookup.%s.npz" % (self.state_tying_file, key_hash),
+      cache_key=md5_of_files([self.state_tying_file], extra="StateTying-v1 %r" % (key,)),
+      create_func=create, verbose_out=log.v4)["lookup"]
+    self._dense_lookups[key] = lookup
+    return lookup
+
+  def map_many(self, allos, phone_idxs, num_states=3, context_length=1):
+    """
+    :param list[AllophoneState] allos:
+    :param dict[str,int] phone_idxs:
+    :param int num_states: how much state per allophone
+    :param int context_length: how much left/right context
+    :return: class-idx for each allophone state, shape (len(allos),), int32
+    :rtype: numpy.ndarray
+    """
+    lookup = self.get_dense_lookup(phone_idxs=phone_idxs, num_states=num_states, context_length=context_length)
+    if lookup is None:
+      return numpy.array([self.allo_map[a.format()] for a in allos], dtype="int32")
+    idxs = AllophoneState.index_many(allos, phone_idxs=phone_idxs, num_states=num_states, context_length=context_length)
+    class_idxs = lookup[idxs]
+    if numpy.any(class_idxs < 0):
+      raise KeyError(allos[int(numpy.argmin(class_idxs))].format())
+    return class_idxs
+
 
 class PhoneSeqGenerator:
   def __init__(self, lexicon_file,
@@ -736,6 +869,7 @@ class PhoneSeqGenerator:
       self.state_tying = StateTying(state_tying_file)
     else:
       self.state_tying = None
+    self._phone_idxs = {p: self.lexicon.phonemes[p]["index"] for p in self.phonemes}
 
   def random_seed(self, seed):
     self.rnd.seed(seed)
@@ -758,7 +892,9 @@ class PhoneSeqGenerator:
     if dtype is None: dtype = "int32"
     if self.state_tying:
       # State tying indices.
-      return numpy.array([self.state_tying.allo_map[a.format()] for a in phones], dtype=dtype)
+      return self.state_tying.map_many(
+        phones, phone_idxs=self._phone_idxs,
+        num_states=self.allo_num_states, context_length=self.allo_context_len).astype(dtype)
     else:
       # Phoneme indices. This must be consistent with get_class_labels.
       # It should not happen that we don't have some phoneme. The lexicon should not be inconsistent.
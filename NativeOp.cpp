@@ -385,6 +385,7 @@ typedef Ndarray_DIM_Type const* Ndarray_DIMS_Type;
 // <<<DimGrid,DimBlock,ShmemSize|0,Stream|0>>>. http://docs.nvidia.com/cuda/cuda-c-programming-guide/#execution-configuration
 #define start_dev_kernel(kernel, args) \
 	(kernel<<<DIM_GRID,DIM_BLOCK,0,CUDA_CUR_STREAM>>>  args);
+#define start_dev_kernel_multi_threaded(kernel, args) start_dev_kernel(kernel, args)
 
 static const char *_cudaGetErrorEnum(cublasStatus_t error) {
 	switch (error) {
@@ -435,8 +436,36 @@ static void _cudaHandleError(cublasStatus_t status, const char *file, int line)
 
 #else   // not CUDA
 
+#if __cplusplus >= 201103L
+#define NATIVE_OP_CPU_MULTI_THREADED 1
+#else
+#define NATIVE_OP_CPU_MULTI_THREADED 0
+#endif
+
+#if NATIVE_OP_CPU_MULTI_THREADED
+#include <stdlib.h>
+#include <unistd.h>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <functional>
+#include <algorithm>
+#endif
+
+// Kernels started via start_dev_kernel_multi_threaded must not use elem_atomic_add.
 #define elem_atomic_add(x, v) (*x += v)  // ignore atomic for now...
+#if NATIVE_OP_CPU_MULTI_THREADED
+// The min is independent of the order, so this is also deterministic.
+// Only for integer types.
+template<typename T>
+static void _elem_atomic_min(T* x, T v) {
+	T old = __atomic_load_n(x, __ATOMIC_RELAXED);
+	while(v < old && !__atomic_compare_exchange_n(x, &old, v, true, __ATOMIC_RELAXED, __ATOMIC_RELAXED)) {}
+}
+#define elem_atomic_min(x, v) _elem_atomic_min(x, v)
+#else
 #define elem_atomic_min(x, v) (*x = (v < *x) ? v : *x)  // ignore atomic for now...
+#endif
 
 #if !TENSORFLOW
 // Numpy, see: http://docs.scipy.org/doc/numpy/reference/c-api.array.html
@@ -482,6 +511,20 @@ typedef Ndarray_DIM_Type const* Ndarray_DIMS_Type;
 #define DEF_KERNEL
 #define start_dev_kernel(kernel, args) \
 	{ for(_KernelLoop loop; !loop.finished(); loop.next()) { kernel args; } }
+/*
+Like start_dev_kernel, but on CPU, this runs the kernel in all the threads of the CPU thread pool
+(see _CpuThreadPool), where each thread gets its own threadIdx.x and blockDim.x == num threads.
+This is only valid for kernels which loop over their elements (idx += gridDim.x * blockDim.x),
+and where every output element is written by exactly one thread (or via elem_atomic_min),
+such that the result is the same as single-threaded, bit by bit.
+*/
+#if NATIVE_OP_CPU_MULTI_THREADED
+#define start_dev_kernel_multi_threaded(kernel, args) \
+	{ _CpuThreadPool::run_job([&](int _thread_idx, int _num_threads) { \
+		_KernelLoop::set_thread(_thread_idx, _num_threads); kernel args; }); }
+#else
+#define start_dev_kernel_multi_threaded(kernel, args) start_dev_kernel(kernel, args)
+#endif
 
 struct _int3 {
     int x, y, z;
@@ -496,10 +539,16 @@ static void resetVec3(T& v) {
     v.x = v.y = v.z = 0;
 }
 
-static _uint3 _threadIdx;
-static _uint3 _blockIdx;
-static _int3 _blockDim;
-static _int3 _gridDim;
+#if NATIVE_OP_CPU_MULTI_THREADED
+#define _native_op_thread_local thread_local
+#else
+#define _native_op_thread_local
+#endif
+
+static _native_op_thread_local _uint3 _threadIdx;
+static _native_op_thread_local _uint3 _blockIdx;
+static _native_op_thread_local _int3 _blockDim;
+static _native_op_thread_local _int3 _gridDim;
 // We need those as macros to not infer with the CUDA versions if CUDA was also included.
 #define threadIdx _threadIdx
 #define blockIdx _blockIdx
@@ -524,8 +573,141 @@ struct _KernelLoop {
 		// TODO: Also blockIdx and y/z, but doesn't matter with the constants above.
 		threadIdx.x++;
 	}
+	static void set_thread(int thread_idx, int num_threads) {
+		// Like above, but we are the thread thread_idx of num_threads.
+		resetVec3(gridDim); gridDim.x = 1;
+		resetVec3(blockDim); blockDim.x = num_threads;
+		resetVec3(threadIdx); threadIdx.x = thread_idx;
+		resetVec3(blockIdx);
+	}
+};
+
+#if NATIVE_OP_CPU_MULTI_THREADED
+/*
+Simple thread pool for the CPU kernels. The threads are created once and then wait for jobs.
+The number of threads (incl. the calling thread) which are used for a job can be set
+via the env var RETURNN_NATIVE_OP_CPU_THREADS (it is checked for every job).
+This is opt-in: it defaults to 1, i.e. single-threaded, and then the pool is not even created.
+For small ops, the overhead of waking up the threads is more than what we gain,
+and TF itself might already run multiple ops in parallel (inter-op parallelism).
+Only one job runs at a time. If another op is already using the pool, we just run single-threaded.
+*/
+struct _CpuThreadPool {
+	typedef std::function<void(int, int)> Job;  // (thread_idx, num_threads)
+
+	std::mutex mutex;  // for the variables below
+	std::mutex run_mutex;  // held while a job is running
+	std::condition_variable cond;
+	const Job* job;
+	int job_num_threads;
+	long job_generation;
+	int num_running;
+	int max_num_threads;
+
+	static _CpuThreadPool& get() {
+		// Never destroyed, the worker threads are detached.
+		// After a fork, the worker threads are gone, thus we create a new pool.
+		static _CpuThreadPool* pool = NULL;
+		static pid_t pool_pid = 0;
+		static std::mutex create_mutex;
+		std::lock_guard<std::mutex> lock(create_mutex);
+		if(!pool || pool_pid != getpid()) {
+			pool = new _CpuThreadPool();
+			pool_pid = getpid();
+		}
+		return *pool;
+	}
+
+	static int get_num_threads() {
+		const char* s = getenv("RETURNN_NATIVE_OP_CPU_THREADS");
+		int n = (s && *s) ? atoi(s) : 1;
+		return (n >= 1) ? n : 1;
+	}
+
+	static void run_job(const Job& func) {
+		int num_threads = get_num_threads();
+		if(num_threads <= 1) {
+			func(0, 1);
+			_KernelLoop::set_thread(0, 1);
+			return;
+		}
+		get().run(func, num_threads);
+	}
+
+	_CpuThreadPool() : job(NULL), job_num_threads(1), job_generation(0), num_running(0) {
+		max_num_threads = std::max(get_num_threads(), (int) std::thread::hardware_concurrency());
+		for(int i = 1; i < max_num_threads; ++i)
+			std::thread(&_CpuThreadPool::worker, this, i).detach();
+	}
+
+	void worker(int thread_idx) {
+		long last_generation = 0;
+		while(true) {
+			const Job* cur_job = NULL;
+			int num_threads = 1;
+			{
+				std::unique_lock<std::mutex> lock(mutex);
+				while(job_generation == last_generation)
+					cond.wait(lock);
+				last_generation = job_generation;
+				cur_job = job;
+				num_threads = job_num_threads;
+			}
+			if(thread_idx < num_threads)
+				(*cur_job)(thread_idx, num_threads);
+			{
+				std::unique_lock<std::mutex> lock(mutex);
+				if(--num_running == 0)
+					cond.notify_all();
+			}
+		}
+	}
+
+	void run(const Job& func, int num_threads) {
+		num_threads = std::min(num_threads, max_num_threads);
+		std::unique_lock<std::mutex> run_lock(run_mutex, std::try_to_lock);
+		if(num_threads <= 1 || !run_lock.owns_lock()) {
+			func(0, 1);
+			_KernelLoop::set_thread(0, 1);
+			return;
+		}
+		{
+			std::unique_lock<std::mutex> lock(mutex);
+			job = &func;
+			job_num_threads = num_threads;
+			num_running = max_num_threads - 1;
+			++job_generation;
+		}
+		cond.notify_all();
+		func(0, num_threads);
+		_KernelLoop::set_thread(0, 1);
+		std::unique_lock<std::mutex> lock(mutex);
+		while(num_running > 0)
+			cond.wait(lock);
+	}
 };
 
+// Calls func(i) for all i in [0, n), distributed over the threads of _CpuThreadPool.
+template<typename F>
+static void cpu_parallel_for(int n, const F& func) {
+	if(n <= 1) {
+		for(int i = 0; i < n; ++i)
+			func(i);
+		return;
+	}
+	_CpuThreadPool::run_job([&](int thread_idx, int num_threads) {
+		for(int i = thread_idx; i < n; i += num_threads)
+			func(i);
+	});
+}
+#else
+template<typename F>
+static void cpu_parallel_for(int n, const F& func) {
+	for(int i = 0; i < n; ++i)
+		func(i);
+}
+#endif
+
 #endif
 
 
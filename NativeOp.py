@@ -1500,7 +1500,7 @@ class NativeLstm2(NativeOpGenBase):
           data_ptr(H, t), n_batch, n_cells * 4,
           false, false);
   
-        start_dev_kernel(lstm_kernel, (
+        start_dev_kernel_multi_threaded(lstm_kernel, (
           n_batch,
           n_cells,
           Ndarray_DEV_DATA(i) + t * n_batch,
@@ -1636,7 +1636,7 @@ class NativeLstm2(NativeOpGenBase):
       for(; (step > 0) ? (t >= start) : (t <= start); t -= step) {
         bool right = (step > 0) ? (t - step >= start) : (t - step <= start);
 
-        start_dev_kernel(lstm_bwd_kernel, (
+        start_dev_kernel_multi_threaded(lstm_bwd_kernel, (
           n_batch,
           n_cells,
           Ndarray_DEV_DATA(i) + t * n_batch,
@@ -3463,6 +3463,10 @@ class FastBaumWelchOp(NativeOpGenBase):
     :param weights: weights of the edges
   outputs:
     :param output: Baum-Welch alignment, scores in -log space. 3d (time,batch,dim), like am_scores
+
+  On CPU, the seqs can be calculated in parallel, via the NativeOp.cpp CPU thread pool
+  (opt-in, number of threads via the env var RETURNN_NATIVE_OP_CPU_THREADS, default 1).
+  The result does not depend on the number of threads.
   """
   in_info = (
     {"name": "am_scores",        "ndim": 3, "shape": (None,   None,    None), "need_contiguous": True, "gradient": "disconnected"},
@@ -3477,9 +3481,11 @@ class FastBaumWelchOp(NativeOpGenBase):
     {"name": "sums",   "ndim": 2, "shape": ((0, 0), (0, 1)),         "need_contiguous": True },
   )
 
-  c_extra_support_code = copy.copy(common_fast_bw_kernels)
+  c_extra_support_code = {
+    key: "#if CUDA\n%s\n#endif\n" % code for (key, code) in common_fast_bw_kernels.items()}
   c_extra_support_code.update({
     "100_init_bwd_state_buffer": """
+    #if CUDA
       __global__
       void init_bwd_state_buffer(float* states, unsigned* end_states, unsigned t, unsigned max_t, float* index, unsigned index_stride) {
         unsigned idx = blockIdx.x * blockDim.x + threadIdx.x;
@@ -3488,8 +3494,10 @@ class FastBaumWelchOp(NativeOpGenBase):
           states[state_idx] = 0.0;
         }
       }
+    #endif
     """,
     "101_next_frame": """
+    #if CUDA
       __global__
       void next_frame(bool fwd, unsigned num_edges, unsigned  num_emissions,
                       unsigned* sequence_idxs, unsigned* from_buffer, unsigned* to_buffer, float* weight_buffer, unsigned* emission_idxs,
@@ -3521,8 +3529,10 @@ class FastBaumWelchOp(NativeOpGenBase):
         }
         atomic_prob_add(next_frame + to, val);
       }
+    #endif
     """,
     "102_normalize": """
+    #if CUDA
       __global__
       void normalize(float* buffer, unsigned* sequence_idxs, unsigned num_edges, unsigned num_seqs, float* sum_output) {
         extern __shared__ float sum[];
@@ -3553,8 +3563,10 @@ class FastBaumWelchOp(NativeOpGenBase):
           buffer[e] -= sum[s];
         }
       }
+    #endif
     """,
     "103_compute_result": """
+    #if CUDA
       __global__
       void compute_result(float* edge_buffer, float* out, unsigned* emission_idxs, unsigned* sequence_idxs,
                           unsigned frame_stride, unsigned seq_stride,
@@ -3572,8 +3584,10 @@ class FastBaumWelchOp(NativeOpGenBase):
 
         atomic_prob_add(out + frame * frame_stride + seq_idx * seq_stride + emission_idx, score);
       }
+    #endif
     """,
     "110_write_alignment_to_file": """
+    #if CUDA
       void write_alignment_to_file(float* d_state_buffer, float* d_index, unsigned index_stride,
                                    unsigned* d_start_states, unsigned* d_end_states,
                                    float pruning, unsigned n_frames, unsigned n_seqs, unsigned n_states, unsigned batch_idx) {
@@ -3612,8 +3626,10 @@ class FastBaumWelchOp(NativeOpGenBase):
           }
         }
       }
+    #endif
     """,
     "111_write_output_to_file": """
+    #if CUDA
       void write_output_to_file(float* d_out, float* d_index, unsigned index_stride,
                                 float pruning, unsigned n_frames, unsigned n_seqs, unsigned n_emissions, unsigned batch_idx) {
         std::vector<float> buffer(n_frames * n_seqs * n_emissions);
@@ -3639,6 +3655,109 @@ class FastBaumWelchOp(NativeOpGenBase):
           }
         }
       }
+    #endif
+    """,
+    "200_cpu_fast_bw": """
+    #if !CUDA
+      #include <algorithm>
+      #include <cmath>
+
+      static float cpu_prob_add(float a, float b) {
+        float diff = a - b;
+        if (std::isnan(diff)) {
+          return std::numeric_limits<float>::infinity();
+        }
+        else {
+          return -log1pf(expf(-fabsf(diff))) + std::min(a, b);
+        }
+      }
+
+      /*
+      Full-sum (fwd-bwd) over the edges of a single seq. See the CUDA code for reference.
+      The edges of different seqs are independent, thus the seqs can run in parallel,
+      and the result does not depend on the number of threads.
+      edge_buffer is (n_frames, n_edges), and we only touch the entries of our edges here.
+      */
+      static void cpu_fast_bw_seq(
+            unsigned seq_idx, const std::vector<unsigned>& seq_edges,
+            const unsigned* from, const unsigned* to, const unsigned* emission_idxs, const float* weights,
+            unsigned start_state, unsigned end_state,
+            const float* am_scores, unsigned frame_stride, unsigned sequence_stride,
+            const float* index, unsigned index_stride,
+            unsigned n_frames, unsigned n_edges,
+            float* edge_buffer, float* sum_output, unsigned n_seqs,
+            float* out, unsigned out_frame_stride, unsigned out_sequence_stride, unsigned n_emissions) {
+        const float inf = std::numeric_limits<float>::infinity();
+        // The states of this seq, mapped to [0, n_states).
+        unsigned min_state = std::min(start_state, end_state), max_state = std::max(start_state, end_state);
+        for (unsigned e : seq_edges) {
+          min_state = std::min(min_state, std::min(from[e], to[e]));
+          max_state = std::max(max_state, std::max(from[e], to[e]));
+        }
+        unsigned n_states = max_state - min_state + 1u;
+        std::vector<float> prev(n_states, inf), next(n_states, inf);
+        const float* am_seq = am_scores + seq_idx * sequence_stride;
+
+        // fwd pass
+        prev[start_state - min_state] = 0.0;
+        for (unsigned t = 0u; t < n_frames; t++) {
+          std::fill(next.begin(), next.end(), inf);
+          for (unsigned e : seq_edges) {
+            float prev_val = prev[from[e] - min_state];
+            if (std::isinf(prev_val)) {
+              edge_buffer[t * n_edges + e] = inf;
+              continue;
+            }
+            float val = prev_val + weights[e] + am_seq[t * frame_stride + emission_idxs[e]];
+            edge_buffer[t * n_edges + e] += val;
+            float& next_val = next[to[e] - min_state];
+            next_val = cpu_prob_add(next_val, val);
+          }
+          std::swap(prev, next);
+        }
+
+        // bwd pass
+        std::fill(prev.begin(), prev.end(), inf);
+        for (unsigned t = n_frames; t > 0; t--) {
+          if (index[(t - 1) * index_stride + seq_idx] == 1.0 && (t == n_frames || index[t * index_stride + seq_idx] == 0.0))
+            prev[end_state - min_state] = 0.0;
+          std::fill(next.begin(), next.end(), inf);
+          for (unsigned e : seq_edges) {
+            float prev_val = prev[to[e] - min_state];
+            if (std::isinf(prev_val)) {
+              edge_buffer[(t - 1) * n_edges + e] = inf;
+              continue;
+            }
+            float val = prev_val + weights[e] + am_seq[(t - 1) * frame_stride + emission_idxs[e]];
+            edge_buffer[(t - 1) * n_edges + e] += prev_val;
+            float& next_val = next[from[e] - min_state];
+            next_val = cpu_prob_add(next_val, val);
+          }
+          std::swap(prev, next);
+        }
+
+        // normalize at each time frame, and compute the result
+        for (unsigned t = 0u; t < n_frames; t++) {
+          float sum = inf;
+          for (unsigned e : seq_edges)
+            sum = cpu_prob_add(sum, edge_buffer[t * n_edges + e]);
+          // if the frame is empty (happens due to batching of seqs with unequal length), set it to 0
+          sum_output[t * n_seqs + seq_idx] = std::isinf(sum) ? 0.0 : sum;
+          float* out_frame = out + t * out_frame_stride + seq_idx * out_sequence_stride;
+          std::fill(out_frame, out_frame + n_emissions, inf);
+          for (unsigned e : seq_edges) {
+            float score = edge_buffer[t * n_edges + e] - sum;
+            edge_buffer[t * n_edges + e] = score;
+            out_frame[emission_idxs[e]] = cpu_prob_add(out_frame[emission_idxs[e]], score);
+          }
+          #if TENSORFLOW
+          // See the CUDA code, remove_inf.
+          for (unsigned i = 0u; i < n_emissions; i++)
+            out_frame[i] = std::min(out_frame[i], 1e32f);
+          #endif
+        }
+      }
+    #endif
     """,
   })
 
@@ -3707,6 +3826,27 @@ class FastBaumWelchOp(NativeOpGenBase):
 
     assert(n_frames > 0);
 
+    #if !CUDA
+    // Group the edges by seq, and then calculate each seq independently, in parallel.
+    std::vector<std::vector<unsigned> > seq_edges(n_seqs);
+    for (unsigned e = 0u; e < n_edges; e++) {
+      assert_cmp(d_sequence_idxs[e], <, n_seqs);
+      seq_edges[d_sequence_idxs[e]].push_back(e);
+    }
+    std::vector<float> edge_buffer(n_edges * n_frames, 0.0);
+    cpu_parallel_for(n_seqs, [&](int seq_idx) {
+      cpu_fast_bw_seq(
+        seq_idx, seq_edges[seq_idx],
+        d_from, d_to, d_emission_idxs, d_weights,
+        d_start_states[seq_idx], d_end_states[seq_idx],
+        d_am_scores, frame_stride, sequence_stride,
+        d_index, index_stride,
+        n_frames, n_edges,
+        edge_buffer.data(), d_sum_output, n_seqs,
+        d_out, Ndarray_STRIDE(out, 0), Ndarray_STRIDE(out, 1), n_emissions);
+    });
+    #else
+
     //std::cerr << "n_frames: "    << n_frames    << std::endl;
     //std::cerr << "n_seqs: "      << n_seqs      << std::endl;
     //std::cerr << "n_emissions: " << n_emissions << std::endl;
@@ -3818,12 +3958,11 @@ class FastBaumWelchOp(NativeOpGenBase):
       device_free(d_state_buffer_all);
     }
     batch_idx++;
+    #endif
   """
 
   c_bw_code = None
 
-  cpu_support = False  # TODO: fix CPU support...
-
 
 class MultiEndFastBaumWelchOp(NativeOpGenBase):
   """
@@ -4728,7 +4867,7 @@ class EditDistanceOp(NativeOpGenBase):
 
     int num_diag = n_a_max_len + n_b_max_len + 1;
     for(int diag_idx = 0; diag_idx < num_diag; ++diag_idx) {
-      start_dev_kernel(next_step_kernel, (
+      start_dev_kernel_multi_threaded(next_step_kernel, (
         n_batch, n_a_max_len, n_b_max_len,
         diag_idx,
         Ndarray_DEV_DATA_int32(a), Ndarray_DEV_DATA_int32(b),
@@ -4886,7 +5025,7 @@ class OptimalCompletionEditDistanceOp(NativeOpGenBase):
     assert_cmp(Ndarray_DIMS(b_len)[0], ==, n_batch);
     int n_a_max_len = Ndarray_DIMS(a)[1];
     int n_b_max_len = Ndarray_DIMS(b)[1];
-    start_dev_kernel(init_result_kernel, (n_batch, Ndarray_DEV_DATA_int32(out)));
+    start_dev_kernel_multi_threaded(init_result_kernel, (n_batch, Ndarray_DEV_DATA_int32(out)));
 
     // Working buffer.
     int max_num_entries = std::min(n_a_max_len + 1, n_b_max_len + 1);
@@ -4897,7 +5036,7 @@ class OptimalCompletionEditDistanceOp(NativeOpGenBase):
 
     int num_diag = n_a_max_len + n_b_max_len + 1;
     for(int diag_idx = 0; diag_idx < num_diag; ++diag_idx) {
-      start_dev_kernel(next_step_kernel, (
+      start_dev_kernel_multi_threaded(next_step_kernel, (
         n_batch, n_a_max_len, n_b_max_len,
         diag_idx,
         Ndarray_DEV_DATA_int32(a), Ndarray_DEV_DATA_int32(b),
@@ -5119,7 +5258,7 @@ class OptimalCompletionEditDistancePerSuccessorOp(NativeOpGenBase):
 
     int num_diag = n_a_max_len + n_b_max_len + 1;
     for(int diag_idx = 0; diag_idx < num_diag; ++diag_idx) {
-      start_dev_kernel(next_step_kernel, (
+      start_dev_kernel_multi_threaded(next_step_kernel, (
         n_batch, n_a_max_len, n_b_max_len,
         diag_idx,
         Ndarray_DEV_DATA_int32(a), Ndarray_DEV_DATA_int32(b),
@@ -5133,14 +5272,14 @@ class OptimalCompletionEditDistancePerSuccessorOp(NativeOpGenBase):
       cur_dist = tmp;
     }
 
-    start_dev_kernel(init_result_kernel, (
+    start_dev_kernel_multi_threaded(init_result_kernel, (
       n_batch, n_b_max_len, n_labels,
       Ndarray_DEV_DATA_int32(a_len), Ndarray_DEV_DATA_int32(b_len),
       a_last_row,
       Ndarray_DEV_DATA_int32(out)
     ));
 
-    start_dev_kernel(expand_kernel, (
+    start_dev_kernel_multi_threaded(expand_kernel, (
       n_batch, n_b_max_len, n_labels,
       Ndarray_DEV_DATA_int32(b),
       Ndarray_DEV_DATA_int32(b_len),
@@ -5266,7 +5405,7 @@ class NextEditDistanceRowOp(NativeOpGenBase):
     assert_cmp(Ndarray_DIMS(b)[1], ==, n_b_max_len);
     assert_cmp(Ndarray_DIMS(b_len)[0], ==, n_batch);
 
-    start_dev_kernel(next_row_kernel, (
+    start_dev_kernel_multi_threaded(next_row_kernel, (
       n_batch, n_b_max_len,
       Ndarray_DEV_DATA_int32(last_row),
       Ndarray_DEV_DATA_int32(a), Ndarray_DEV_DATA_int32(a_n), Ndarray_DEV_DATA_int32(a_ended),
@@ -5400,7 +5539,7 @@ class NextEditDistanceReduceOp(NativeOpGenBase):
     assert_cmp(Ndarray_DIMS(b)[1], ==, n_b_max_len);
     assert_cmp(Ndarray_DIMS(b_len)[0], ==, n_batch);
 
-    start_dev_kernel(calc_result_kernel, (
+    start_dev_kernel_multi_threaded(calc_result_kernel, (
       n_batch, n_b_max_len, n_labels,
       Ndarray_DEV_DATA_int32(last_row),
       Ndarray_DEV_DATA_int32(a), Ndarray_DEV_DATA_int32(a_n), Ndarray_DEV_DATA_int32(a_ended),
@@ -2,8 +2,7 @@
 from __future__ import print_function
 
 import sys
-from Network import LayerNetwork
-from NetworkBaseLayer import Layer
+from NetworkDescription import LayerNetworkDescription
 from NetworkCopyUtils import intelli_copy_layer, LayerDoNotMatchForCopy
 from Log import log
 from Util import unicode, long
@@ -429,6 +428,8 @@ class Pretrain:
     :type epoch: int
     :rtype: Network.LayerNetwork
     """
+    from Network import LayerNetwork  # Theano
+    from NetworkBaseLayer import Layer
     json_content = self.get_network_json_for_epoch(epoch)
     Layer.rng_seed = epoch
     return LayerNetwork.from_json(json_content, mask=mask, **self.network_init_args)
@@ -486,10 +487,11 @@ def pretrainFromConfig(config):
   pretrainType = config.bool_or_other("pretrain", None)
   if pretrainType == "default" or (isinstance(pretrainType, dict) and pretrainType) or pretrainType is True:
     if Util.BackendEngine.is_theano_selected():
+      from Network import LayerNetwork
       network_init_args = LayerNetwork.init_args_from_config(config)
     else:
       network_init_args = None
-    original_network_json = LayerNetwork.json_from_config(config)
+    original_network_json = LayerNetworkDescription.json_from_config(config)
     opts = config.get_of_type("pretrain", dict, {})
     if config.has("pretrain_copy_output_layer"):
       opts.setdefault("copy_output_layer", config.bool_or_other("pretrain_copy_output_layer", "ifpossible"))
@@ -0,0 +1,491 @@
+"""
+Scoring of hypotheses against references, i.e. WER, CER and BLEU,
+without any dependency on TF or Theano.
+
+All metrics are computed via sufficient statistics per utterance
+(e.g. number of word errors and number of reference words for WER),
+such that the corpus-level score is just a function of the summed statistics.
+This allows to compute the statistics in parallel (see :class:`Scorer`),
+to report per-utterance scores,
+and to estimate confidence intervals via bootstrap resampling over utterances.
+
+Hypotheses and references are read in a streaming way from files (see :func:`iter_text_file`),
+in the py format as written by search (``search_output_file_format = "py"``)
+or by ``tools/dump-dataset-raw-strings.py``, or as plain text.
+
+This is used by ``tools/score-hyps.py``, ``tools/calculate-word-error-rate.py``,
+and by :func:`TFEngine.Engine.search` (see config option ``search_score_metrics``).
+"""
+
+from __future__ import print_function
+
+import sys
+import numpy
+
+
+def _to_int_seqs(*seqs):
+  """
+  :param list[str]|str|numpy.ndarray seqs:
+  :return: each seq as int array, with a common mapping of the tokens
+  :rtype: list[numpy.ndarray]
+  """
+  vocab = {}
+  return [
+    numpy.array([vocab.setdefault(token, len(vocab)) for token in seq], dtype="int32")
+    for seq in seqs]
+
+
+def edit_distance(hyp, ref):
+  """
+  Levenshtein distance (substitutions, insertions and deletions all have cost 1).
+  We loop over the shorter sequence, and the update of one row of the DP table is vectorized with numpy,
+  where the insertions within the row are resolved via a cumulative minimum.
+
+  :param list[str]|str hyp: list of words, or a string for characters
+  :param list[str]|str ref:
+  :rtype: int
+  """
+  if len(hyp) == 0:
+    return len(ref)
+  if len(ref) == 0:
+    return len(hyp)
+  hyp, ref = _to_int_seqs(hyp, ref)
+  if len(hyp) > len(ref):
+    hyp, ref = ref, hyp  # symmetric
+  offsets = numpy.arange(len(ref) + 1)
+  row = offsets
+  for i, token in enumerate(hyp):
+    new_row = numpy.empty_like(row)
+    new_row[0] = i + 1
+    # Match/substitution from the diagonal, or deletion from the previous row.
+    numpy.minimum(row[:-1] + (ref != token), row[1:] + 1, out=new_row[1:])
+    # Insertion: new_row[j] = min_{k<=j} new_row[k] + (j - k).
+    row = numpy.minimum.accumulate(new_row - offsets) + offsets
+  return int(row[-1])
+
+
+def bleu_stats(hyp, ref, max_order=4):
+  """
+  :param list[str] hyp:
+  :param list[str] ref:
+  :param int max_order:
+  :return: hyp len, ref len, n-gram matches per order, possible n-gram matches per order
+  :rtype: list[int]
+  """
+  from Util import _get_ngrams
+  ref_ngram_counts = _get_ngrams(ref, max_order)
+  hyp_ngram_counts = _get_ngrams(hyp, max_order)
+  matches = [0] * max_order
+  possible_matches = [0] * max_order
+  for ngram, count in ref_ngram_counts.items():
+    matches[len(ngram) - 1] += min(count, hyp_ngram_counts[ngram])
+  for ngram, count in hyp_ngram_counts.items():
+    possible_matches[len(ngram) - 1] += count
+  return [len(hyp), len(ref)] + matches + possible_matches
+
+
+def bleu_from_stats(stats, max_order=4, use_bp=True):
+  """
+  Same as :func:`Util.compute_bleu`, but on the summed statistics from :func:`bleu_stats`.
+
+  :param numpy.ndarray|list[int] stats:
+  :param int max_order:
+  :param bool use_bp: whether to apply brevity penalty
+  :return: BLEU in [0,1]
+  :rtype: float
+  """
+  import math
+  hyp_len, ref_len = stats[:2]
+  matches = stats[2:2 + max_order]
+  possible_matches = stats[2 + max_order:2 + 2 * max_order]
+  precisions = [0.0] * max_order
+  smooth = 1.0
+  for i in range(max_order):
+    if possible_matches[i] > 0:
+      if matches[i] > 0:
+        precisions[i] = float(matches[i]) / possible_matches[i]
+      else:
+        smooth *= 2
+        precisions[i] = 1.0 / (smooth * possible_matches[i])
+  geo_mean = 0.0
+  if max(precisions) > 0:
+    geo_mean = math.exp(sum([math.log(p) for p in precisions if p]) / max_order)
+  bp = 1.0
+  if use_bp and ref_len > 0:
+    ratio = float(hyp_len) / ref_len
+    if ratio < 1e-30:
+      bp = 0.0
+    elif ratio < 1.0:
+      bp = math.exp(1 - 1. / ratio)
+  return geo_mean * bp
+
+
+class Metric(object):
+  """
+  Base class for a metric, computed via sufficient statistics per utterance.
+  """
+  name = None  # type: str
+  num_stats = None  # type: int
+  lower_is_better = True
+
+  def get_stats(self, hyp, ref):
+    """
+    :param str hyp:
+    :param str ref:
+    :return: sufficient statistics of this single utterance, of length num_stats
+    :rtype: list[int]
+    """
+    raise NotImplementedError
+
+  def get_score(self, stats):
+    """
+    :param numpy.ndarray stats: (num_stats,), summed over some utterances
+    :rtype: float
+    """
+    raise NotImplementedError
+
+
+class WordErrorRate(Metric):
+  name = "wer"
+  num_stats = 2  # num errors, num ref words
+
+  def get_stats(self, hyp, ref):
+    hyp, ref = hyp.split(), ref.split()
+    return [edit_distance(hyp, ref), len(ref)]
+
+  def get_score(self, stats):
+    return float(stats[0]) / max(stats[1], 1)
+
+
+class CharErrorRate(WordErrorRate):
+  """
+  Like WER, but on characters. Whitespace is normalized and also counted as a character.
+  """
+  name = "cer"
+
+  def get_stats(self, hyp, ref):
+    hyp, ref = " ".join(hyp.split()), " ".join(ref.split())
+    return [edit_distance(hyp, ref), len(ref)]
+
+
+class Bleu(Metric):
+  name = "bleu"
+  num_stats = 2 + 2 * 4
+  lower_is_better = False
+  max_order = 4
+
+  def get_stats(self, hyp, ref):
+    return bleu_stats(hyp.split(), ref.split(), max_order=self.max_order)
+
+  def get_score(self, stats):
+    return bleu_from_stats(stats, max_order=self.max_order)
+
+
+Metrics = {cls.name: cls for cls in [WordErrorRate, CharErrorRate, Bleu]}
+
+
+def get_metric(name):
+  """
+  :param str name: "wer", "cer" or "bleu"
+  :rtype: Metric
+  """
+  assert name in Metrics, "unknown metric %r, available: %r" % (name, sorted(Metrics.keys()))
+  return Metrics[name]()
+
+
+def _compute_stats_chunk(args):
+  """
+  Executed in the worker processes of :class:`Scorer`.
+
+  :param (list[str],list[(str,str,str)]) args: metric names, list of (seq tag, hyp, ref)
+  :return: per metric, stats of shape (len(pairs), num_stats)
+  :rtype: list[numpy.ndarray]
+  """
+  metric_names, pairs = args
+  res = []
+  for name in metric_names:
+    metric = get_metric(name)
+    stats = numpy.zeros((len(pairs), metric.num_stats), dtype="int64")
+    for i, (seq_tag, hyp, ref) in enumerate(pairs):
+      stats[i] = metric.get_stats(hyp, ref)
+    res.append(stats)
+  return res
+
+
+class Scorer:
+  """
+  Collects the per-utterance statistics for a set of metrics.
+  Use :func:`add` for single utterances (computed in-process),
+  or :func:`add_pairs` for some (streaming) iterator, where we can use a process pool.
+  """
+
+  def __init__(self, metrics=("wer",), num_workers=0, chunk_size=100):
+    """
+    :param list[str]|tuple[str] metrics: see :data:`Metrics`
+    :param int num_workers: for :func:`add_pairs`. 0 means to compute in this process
+    :param int chunk_size: number of utterances which are processed at once
+    """
+    self.metrics = [get_metric(name) for name in metrics]
+    self.metric_names = [metric.name for metric in self.metrics]
+    self.num_workers = num_workers
+    self.chunk_size = chunk_size
+    self.seq_tags = []  # type: list[str]
+    self._stats_chunks = {name: [] for name in self.metric_names}  # type: dict[str,list[numpy.ndarray]]
+    self._totals = {
+      metric.name: numpy.zeros((metric.num_stats,), dtype="int64") for metric in self.metrics}
+    self._pending = []  # type: list[(str,str,str)]
+
+  def _add_chunk_stats(self, pairs, stats):
+    """
+    :param list[(str,str,str)] pairs:
+    :param list[numpy.ndarray] stats: per metric
+    """
+    self.seq_tags.extend([seq_tag for (seq_tag, hyp, ref) in pairs])
+    for name, metric_stats in zip(self.metric_names, stats):
+      self._stats_chunks[name].append(metric_stats)
+      self._totals[name] += numpy.sum(metric_stats, axis=0)
+
+  def _flush(self):
+    if self._pending:
+      pairs, self._pending = self._pending, []
+      self._add_chunk_stats(pairs, _compute_stats_chunk((self.metric_names, pairs)))
+
+  def add(self, seq_tag, hyp, ref):
+    """
+    :param str seq_tag:
+    :param str hyp:
+    :param str ref:
+    """
+    self._pending.append((seq_tag, hyp, ref))
+    if len(self._pending) >= self.chunk_size:
+      self._flush()
+
+  def add_pairs(self, pairs):
+    """
+    :param typing.Iterable[(str,str,str)] pairs: (seq tag, hyp, ref), e.g. via :func:`iter_hyp_ref_pairs`.
+      This is consumed in a streaming way, i.e. only a bounded number of utterances is kept in memory.
+    """
+    self._flush()
+    chunks = self._iter_chunks(pairs)
+    if self.num_workers <= 0:
+      for chunk in chunks:
+        self._add_chunk_stats(chunk, _compute_stats_chunk((self.metric_names, chunk)))
+      return
+    import multiprocessing
+    from itertools import islice
+    pool = multiprocessing.Pool(processes=self.num_workers)
+    try:
+      while True:
+        # Pool.imap would consume the whole input at once, thus we handle a bounded window of chunks.
+        window = list(islice(chunks, self.num_workers * 4))
+        if not window:
+          break
+        results = pool.map(_compute_stats_chunk, [(self.metric_names, chunk) for chunk in window])
+        for chunk, stats in zip(window, results):
+          self._add_chunk_stats(chunk, stats)
+    finally:
+      pool.terminate()
+      pool.join()
+
+  def _iter_chunks(self, pairs):
+    """
+    :param typing.Iterable[(str,str,str)] pairs:
+    :rtype: typing.Iterator[list[(str,str,str)]]
+    """
+    chunk = []
+    for pair in pairs:
+      chunk.append(pair)
+      if len(chunk) >= self.chunk_size:
+        yield chunk
+        chunk = []
+    if chunk:
+      yield chunk
+
+  def get_num_seqs(self):
+    """
+    :rtype: int
+    """
+    self._flush()
+    return len(self.seq_tags)
+
+  def get_stats(self, name):
+    """
+    :param str name: metric name
+    :return: per-utterance statistics, shape (num_seqs, num_stats)
+    :rtype: numpy.ndarray
+    """
+    self._flush()
+    metric = self.metrics[self.metric_names.index(name)]
+    chunks = self._stats_chunks[name]
+    if not chunks:
+      return numpy.zeros((0, metric.num_stats), dtype="int64")
+    if len(chunks) > 1:
+      chunks[:] = [numpy.concatenate(chunks, axis=0)]
+    return chunks[0]
+
+  def get_corpus_score(self, name):
+    """
+    :param str name: metric name
+    :rtype: float
+    """
+    self._flush()
+    return self.metrics[self.metric_names.index(name)].get_score(self._totals[name])
+
+  def get_utterance_scores(self, name):
+    """
+    :param str name: metric name
+    :return: seq tag -> score
+    :rtype: dict[str,float]
+    """
+    metric = self.metrics[self.metric_names.index(name)]
+    stats = self.get_stats(name)
+    return {seq_tag: metric.get_score(stats[i]) for (i, seq_tag) in enumerate(self.seq_tags)}
+
+  def get_bootstrap_interval(self, name, num_samples=1000, confidence=0.95, seed=42):
+    """
+    Bootstrap resampling over the utterances (with replacement), and the corpus score on each sample.
+
+    :param str name: metric name
+    :param int num_samples:
+    :param float confidence:
+    :param int seed:
+    :return: (lower, upper) bound
+    :rtype: (float,float)
+    """
+    metric = self.metrics[self.metric_names.index(name)]
+    stats = self.get_stats(name)
+    num_seqs = stats.shape[0]
+    assert num_seqs > 0
+    rnd = numpy.random.RandomState(seed)
+    scores = numpy.zeros((num_samples,), dtype="float64")
+    for i in range(num_samples):
+      counts = numpy.bincount(rnd.randint(0, num_seqs, size=num_seqs), minlength=num_seqs)
+      scores[i] = metric.get_score(counts.dot(stats))
+    alpha = (1.0 - confidence) / 2.0
+    lower, upper = numpy.percentile(scores, [alpha * 100.0, (1.0 - alpha) * 100.0])
+    return float(lower), float(upper)
+
+  def print_report(self, file=sys.stdout, num_bootstrap_samples=1000, confidence=0.95, prefix=""):
+    """
+    :param typing.TextIO file:
+    :param int num_bootstrap_samples: 0 to disable the confidence interval
+    :param float confidence:
+    :param str prefix:
+    """
+    num_seqs = self.get_num_seqs()
+    print("%sNum seqs: %i" % (prefix, num_seqs), file=file)
+    for name in self.metric_names:
+      s = "%s%s: %.02f%%" % (prefix, name.upper(), self.get_corpus_score(name) * 100)
+      if num_bootstrap_samples and num_seqs > 0:
+        lower, upper = self.get_bootstrap_interval(name, num_samples=num_bootstrap_samples, confidence=confidence)
+        s += " (%i%% confidence interval: %.02f%% - %.02f%%)" % (confidence * 100, lower * 100, upper * 100)
+      print(s, file=file)
+
+
+def _open_text_file(filename):
+  """
+  :param str filename:
+  :rtype: typing.TextIO
+  """
+  if filename.endswith(".gz"):
+    import gzip
+    import io
+    return io.TextIOWrapper(gzip.open(filename, "rb"), encoding="utf8")
+  import io
+  return io.open(filename, "r", encoding="utf8")
+
+
+def _get_best_hyp(value):
+  """
+  :param str|list[(float,str)] value: single hyp, or N-best list with (score, hyp)
+  :rtype: str
+  """
+  if isinstance(value, list):
+    assert value, "empty N-best list"
+    return max(value, key=lambda item: item[0])[1]
+  assert isinstance(value, str), "unexpected entry %r" % (value,)
+  return value
+
+
+def iter_text_file(filename):
+  """
+  Reads the file in a streaming way.
+  In the py format (dict seq tag -> str or N-best list), as written by search,
+  we expect that each entry starts on a new line, which is the case for the search output
+  and ``tools/dump-dataset-raw-strings.py``.
+  For N-best lists, the hyp with the best score is used.
+  Otherwise, we expect one seq per line, and the seq tag is the line index.
+
+  :param str filename:
+  :return: yields (seq tag, text)
+  :rtype: typing.Iterator[(str,str)]
+  """
+  with _open_text_file(filename) as f:
+    first_line = f.readline()
+    if first_line.strip() != "{":
+      line_idx = 0
+      line = first_line
+      while line:
+        yield "line-%i" % line_idx, line.strip()
+        line_idx += 1
+        line = f.readline()
+      return
+    buf = []
+    for line in f:
+      line = line.strip()
+      if not buf and line in {"", "}"}:
+        continue
+      buf.append(line)
+      try:
+        entry = eval("{%s}" % "\n".join(buf))
+      except SyntaxError:  # the entry spans multiple lines, e.g. N-best lists
+        continue
+      buf = []
+      assert isinstance(entry, dict)
+      for seq_tag, value in entry.items():
+        yield seq_tag, _get_best_hyp(value)
+    assert not buf, "%s: incomplete entry at end: %r" % (filename, "\n".join(buf))
+
+
+def iter_hyp_ref_pairs(hyps, refs, missing_hyp=None):
+  """
+  Joins the hyps and refs by seq tag.
+  Both are consumed in parallel, such that only the seqs which are not matched yet are kept in memory.
+  I.e. if they are in the same order, this needs constant memory.
+
+  :param typing.Iterable[(str,str)] hyps: (seq tag, hyp)
+  :param typing.Iterable[(str,str)] refs: (seq tag, ref)
+  :param str|None missing_hyp: if given, used as hyp for refs without hyp (e.g. ""). otherwise an error
+  :return: yields (seq tag, hyp, ref)
+  :rtype: typing.Iterator[(str,str,str)]
+  """
+  iters = {"hyps": iter(hyps), "refs": iter(refs)}
+  pending = {"hyps": {}, "refs": {}}  # type: dict[str,dict[str,str]]
+  while iters:
+    for key in ["hyps", "refs"]:
+      if key not in iters:
+        continue
+      try:
+        seq_tag, text = next(iters[key])
+      except StopIteration:
+        del iters[key]
+        continue
+      other_key = {"hyps": "refs", "refs": "hyps"}[key]
+      if seq_tag in pending[other_key]:
+        other_text = pending[other_key].pop(seq_tag)
+        if key == "hyps":
+          yield seq_tag, text, other_text
+        else:
+          yield seq_tag, other_text, text
+      else:
+        assert seq_tag not in pending[key], "%s: seq tag %r is not unique" % (key, seq_tag)
+        pending[key][seq_tag] = text
+  if pending["hyps"]:
+    raise Exception("There are %i hyps without ref, e.g. %r." % (
+      len(pending["hyps"]), sorted(pending["hyps"].keys())[0]))
+  if pending["refs"]:
+    if missing_hyp is None:
+      raise Exception("There are %i refs without hyp, e.g. %r." % (
+        len(pending["refs"]), sorted(pending["refs"].keys())[0]))
+    for seq_tag in sorted(pending["refs"].keys()):
+      yield seq_tag, missing_hyp, pending["refs"][seq_tag]
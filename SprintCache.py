@@ -320,6 +320,61 @@ class FileArchive:
 
     return self._raw_read(size=fi.size, typ=typ)
 
+  def _read_raw_bytes(self, filename):
+    """
+    :param str filename: the entry-name in the archive
+    :return: the (uncompressed) content of the entry, or None if empty
+    :rtype: bytes|None
+    """
+    if filename not in self.ft:
+      if filename in self._short_seg_names:
+        filename = self._short_seg_names[filename]
+    fi = self.ft[filename]
+    self.f.seek(fi.pos)
+    size = self.read_U32()
+    comp = self.read_U32()
+    chk  = self.read_U32()
+    if size == 0:
+      return None
+    if comp > 0:
+      return zlib.decompress(self.f.read(comp), 15+32)
+    return self.f.read(size)
+
+  def read_align_array(self, filename, label_lookup=None):
+    """
+    Like ``read(filename, "align")``, but decodes the RLE alignment with Numpy,
+    which is much faster than the pure Python loop.
+
+    :param str filename: the entry-name in the archive
+    :param numpy.ndarray|None label_lookup: shape (max_states, num_allophones) -> label idx, or -1 if invalid,
+      e.g. via :func:`AllophoneLabeling.get_label_lookup`
+    :return: shape (time,), int32. if label_lookup is None, the allophone state idx,
+      i.e. allophone + state * (1 << 26), otherwise the label idx
+    :rtype: numpy.ndarray
+    """
+    buf = self._read_raw_bytes(filename)
+    if buf is None:
+      return None
+    pos = 0
+    type_len, = unpack("I", buf[pos:pos + 4])
+    pos += 4
+    typ = buf[pos:pos + type_len].decode("ascii")
+    pos += type_len
+    assert typ == "flow-alignment"
+    pos += 4  # flag
+    typ = buf[pos:pos + 8].decode("ascii")
+    pos += 8
+    if typ not in ["ALIGNRLE", "AALPHRLE"]:
+      raise Exception("No valid alignment header found (found: %r). Wrong cache?" % typ)
+    size, = unpack("I", buf[pos:pos + 4])
+    pos += 4
+    if size >= (1 << 31):
+      raise NotImplementedError("No support for weighted alignments yet.")
+    allo_states = decode_align_rle(buf, pos=pos, size=size)
+    if label_lookup is None:
+      return allo_states
+    return map_allo_states_to_labels(allo_states, label_lookup=label_lookup)
+
   def getState(self, mix):
     # See src/Tools/Archiver/Archiver.cc:getStateInfo() from Sprint source code.
     assert self.allophones
@@ -439,6 +494,19 @@ class FileArchiveBundle():
         filename = self._short_seg_names[filename]
     return self.files[filename].read(filename, typ)
 
+  def read_align_array(self, filename, label_lookup=None):
+    """
+    :param str filename: the entry-name in the archive
+    :param numpy.ndarray|None label_lookup:
+    :rtype: numpy.ndarray
+
+    Uses FileArchive.read_align_array().
+    """
+    if filename not in self.files:
+      if filename in self._short_seg_names:
+        filename = self._short_seg_names[filename]
+    return self.files[filename].read_align_array(filename, label_lookup=label_lookup)
+
   def setAllophones(self, filename):
     """
     :param str filename: allophone filename 
@@ -447,6 +515,74 @@ class FileArchiveBundle():
       a.setAllophones(filename)
 
 
+def decode_align_rle(buf, pos, size):
+  """
+  Decodes the RLE scheme of the Sprint ALIGNRLE alignment, see :func:`FileArchive._raw_read`.
+  Each run starts with a signed char n: n > 0 is followed by n values, n < 0 by a single value repeated -n times,
+  and n == 0 by a time index.
+  We only loop over the runs in Python and gather and expand the values with Numpy.
+
+  :param bytes buf:
+  :param int pos: position of the first run in buf
+  :param int size: number of frames
+  :return: shape (size,), int32, allophone state idx (allophone + state * (1 << 26)) per frame
+  :rtype: numpy.ndarray
+  """
+  if not isinstance(buf, bytearray):
+    buf = bytearray(buf)  # indexing gives int in Python 2 and 3
+  value_offsets = []  # byte offset of the first value of each run
+  value_counts = []  # number of values in each run
+  value_repeats = []  # how often each value of the run is repeated
+  num_frames = 0
+  while num_frames < size:
+    n = buf[pos]
+    if n >= 128:
+      n -= 256
+    pos += 1
+    if n > 0:
+      value_offsets.append(pos)
+      value_counts.append(n)
+      value_repeats.append(1)
+      pos += 4 * n
+      num_frames += n
+    elif n < 0:
+      value_offsets.append(pos)
+      value_counts.append(1)
+      value_repeats.append(-n)
+      pos += 4
+      num_frames -= n
+    else:
+      pos += 4  # time index, ignored here. we just return the frames in order
+  assert num_frames == size
+  value_counts = numpy.array(value_counts, dtype="int64")
+  run_starts = numpy.cumsum(value_counts) - value_counts
+  value_idxs = numpy.arange(numpy.sum(value_counts), dtype="int64")
+  value_byte_offsets = (
+    numpy.repeat(numpy.array(value_offsets, dtype="int64"), value_counts) +
+    4 * (value_idxs - numpy.repeat(run_starts, value_counts)))
+  raw = numpy.frombuffer(buf, dtype="uint8")
+  values_bytes = raw[value_byte_offsets[:, None] + numpy.arange(4)[None, :]]  # (num_values, 4)
+  values = numpy.ascontiguousarray(values_bytes).view("<i4")[:, 0].astype("int32")
+  return numpy.repeat(values, numpy.repeat(numpy.array(value_repeats, dtype="int64"), value_counts))
+
+
+def map_allo_states_to_labels(allo_states, label_lookup):
+  """
+  :param numpy.ndarray allo_states: allophone state idx, i.e. allophone + state * (1 << 26)
+  :param numpy.ndarray label_lookup: shape (max_states, num_allophones) -> label idx, or -1 if invalid
+  :return: label idx, same shape as allo_states, int32
+  :rtype: numpy.ndarray
+  """
+  allo_idxs = allo_states & ((1 << 26) - 1)
+  state_idxs = allo_states >> 26
+  assert numpy.all(allo_idxs < label_lookup.shape[1]) and numpy.all(state_idxs < label_lookup.shape[0])
+  labels = label_lookup[state_idxs, allo_idxs].astype("int32")
+  if numpy.any(labels < 0):
+    i = int(numpy.argmin(labels))
+    raise KeyError("allo idx %i, state idx %i not found" % (allo_idxs[i], state_idxs[i]))
+  return labels
+
+
 def open_file_archive(archive_filename, must_exists=True):
   """
   :param str archive_filename:
@@ -484,11 +620,13 @@ class AllophoneLabeling(object):
     :param str silence_phone: e.g. "si"
     :param str allophone_file: list of allophones
     :param str|None phoneme_file: list of phonemes
-    :param str|None state_tying_file: allophone state tying (e.g. via CART). maps each allophone state to a class label
+    :param str|None state_tying_file: allophone state tying (e.g. via CART). maps each allophone state to a class label.
+      the dense label lookup (see :func:`get_label_lookup`) is cached next to it, see :func:`Util.load_or_create_npz_cache`
     :param file verbose_out: stream to dump log messages
     """
     assert phoneme_file or state_tying_file
     self.allophone_file = allophone_file
+    self.state_tying_file = state_tying_file
     self.allophones = [l for l in open(allophone_file).read().splitlines() if l and l[0] != "#"]
     self.allophones_idx = {p: i for i, p in enumerate(self.allophones)}
     self.sil_allo_state_id = self.allophones_idx[silence_phone + "{#+#}@i@f"]
@@ -498,9 +636,10 @@ class AllophoneLabeling(object):
     self.num_labels = None
     self.phonemes = None
     self.phoneme_idxs = None
-    self.state_tying = None
-    self.state_tying_by_allo_state_idx = None
+    self._state_tying = None
+    self._state_tying_by_allo_state_idx = None
     self.num_allo_states = None
+    self._label_lookup = None
     if phoneme_file:
       self.phonemes = open(phoneme_file).read().splitlines()
       self.phoneme_idxs = {p: i for i, p in enumerate(self.phonemes)}
@@ -510,52 +649,102 @@ class AllophoneLabeling(object):
         if verbose_out:
           print("AllophoneLabeling: %i phones = labels." % self.num_labels, file=verbose_out)
     if state_tying_file:
-      self.state_tying = {k: int(v)
-                          for l in open(state_tying_file).read().splitlines()
-                          for (k, v) in [l.split()]}
-      self.sil_label_idx = self.state_tying[silence_phone + "{#+#}@i@f.0"]
-      self.num_allo_states = self._get_num_allo_states()
-      self.state_tying_by_allo_state_idx = {
+      from Util import load_or_create_npz_cache, md5_of_files
+      cache = load_or_create_npz_cache(
+        "%s.allophone_labeling.npz" % state_tying_file,
+        cache_key=md5_of_files([allophone_file, state_tying_file], extra="AllophoneLabeling-v1"),
+        create_func=self._create_state_tying_cache, verbose_out=verbose_out)
+      self._label_lookup = cache["label_lookup"]
+      self.num_allo_states = int(cache["num_allo_states"])
+      self.num_labels = int(cache["num_labels"])
+      self.sil_label_idx = int(self._label_lookup[0, self.sil_allo_state_id])
+      assert self.sil_label_idx >= 0, "silence allophone state not in state tying"
+      if verbose_out:
+        print("AllophoneLabeling: State tying with %i labels." % self.num_labels, file=verbose_out)
+    assert self.num_labels is not None
+    assert self.state_tying_file or self.phoneme_idxs
+
+  @property
+  def state_tying(self):
+    """
+    :return: allophone-state-str -> label idx. loaded on demand, see :func:`get_label_lookup` instead
+    :rtype: dict[str,int]|None
+    """
+    if self._state_tying is None and self.state_tying_file:
+      self._state_tying = {k: int(v)
+                           for l in open(self.state_tying_file).read().splitlines()
+                           for (k, v) in [l.split()]}
+    return self._state_tying
+
+  @property
+  def state_tying_by_allo_state_idx(self):
+    """
+    :return: allophone state idx (allophone + state * (1 << 26)) -> label idx. loaded on demand
+    :rtype: dict[int,int]|None
+    """
+    if self._state_tying_by_allo_state_idx is None and self.state_tying_file:
+      self._state_tying_by_allo_state_idx = {
         a + s * (1 << 26): self.state_tying["%s.%i" % (a_s, s)]
         for (a, a_s) in enumerate(self.allophones)
         for s in range(self.num_allo_states)
         if ("%s.%i" % (a_s, s)) in self.state_tying}
-      self.num_labels = max(self.state_tying.values()) + 1
-      if verbose_out:
-        print("AllophoneLabeling: State tying with %i labels." % self.num_labels, file=verbose_out)
-    assert self.num_labels is not None
-    assert self.state_tying or self.phoneme_idxs
+    return self._state_tying_by_allo_state_idx
 
   def _get_num_allo_states(self):
     assert self.state_tying
     return max([int(s.split(".")[-1]) for s in self.state_tying.keys()]) + 1
 
+  def _create_state_tying_cache(self):
+    """
+    :return: label_lookup, num_allo_states, num_labels
+    :rtype: dict[str,numpy.ndarray|int]
+    """
+    num_allo_states = self._get_num_allo_states()
+    max_states = max(6, num_allo_states)  # see getState above()
+    lookup = numpy.full((max_states, len(self.allophones)), -1, dtype="int32")
+    for allo_state_str, label_idx in self.state_tying.items():
+      allo_str, state_str = allo_state_str.rsplit(".", 1)
+      allo_idx = self.allophones_idx.get(allo_str)
+      if allo_idx is not None:
+        lookup[int(state_str), allo_idx] = label_idx
+    return {
+      "label_lookup": lookup, "num_allo_states": num_allo_states, "num_labels": max(self.state_tying.values()) + 1}
+
+  def get_label_lookup(self):
+    """
+    :return: shape (max_states, num_allophones) -> label idx, or -1 if invalid, int32.
+      can be used for :func:`FileArchive.read_align_array`
+    :rtype: numpy.ndarray
+    """
+    if self._label_lookup is not None:
+      return self._label_lookup
+    max_states = 6  # see getState above()
+    lookup = numpy.full((max_states, len(self.allophones)), -1, dtype="int32")
+    for allo_idx, allo_str in enumerate(self.allophones):
+      lookup[:, allo_idx] = self.phoneme_idxs.get(allo_str[:allo_str.index("{")], -1)
+    self._label_lookup = lookup
+    return lookup
+
+  def map_many(self, allo_state_idxs):
+    """
+    :param numpy.ndarray allo_state_idxs: allophone state idx, i.e. allophone + state * (1 << 26), any shape
+    :return: label idx, same shape, int32
+    :rtype: numpy.ndarray
+    """
+    return map_allo_states_to_labels(numpy.asarray(allo_state_idxs), label_lookup=self.get_label_lookup())
+
   def get_label_idx_by_allo_state_idx(self, allo_state_idx):
-    if self.state_tying_by_allo_state_idx:
-      return self.state_tying_by_allo_state_idx[allo_state_idx]
     # See getState above().
-    max_states = 6
-    allo_idx = allo_state_idx
-    state_idx = 0
-    for state_idx in range(max_states):
-      if allo_idx >= len(self.allophones):
-        allo_idx -= (1<<26)
-      else:
-        break
-    assert allo_idx >= 0
-    return self.get_label_idx(allo_idx, state_idx)
+    return self.get_label_idx(allo_idx=allo_state_idx & ((1 << 26) - 1), state_idx=allo_state_idx >> 26)
 
   def get_label_idx(self, allo_idx, state_idx):
-    if self.state_tying_by_allo_state_idx:
-      try:
-        return self.state_tying_by_allo_state_idx[allo_idx + state_idx * (1 << 26)]
-      except KeyError:
-        allo_str = self.allophones[allo_idx]
-        r = self.state_tying.get("%s.%i" % (allo_str, state_idx))
-        raise KeyError("allo idx %i (%r), state idx %i not found; entry: %r" % (allo_idx, allo_str, state_idx, r))
-    allo_str = self.allophones[allo_idx]
-    phone = allo_str[:allo_str.index("{")]
-    return self.phoneme_idxs[phone]
+    lookup = self.get_label_lookup()
+    label_idx = int(lookup[state_idx, allo_idx]) if state_idx < lookup.shape[0] else -1
+    if label_idx < 0:
+      allo_str = self.allophones[allo_idx]
+      r = self.state_tying.get("%s.%i" % (allo_str, state_idx)) if self.state_tying else None
+      raise KeyError("allo idx %i (%r), state idx %i not found; entry: %r" % (allo_idx, allo_str, state_idx, r))
+    return label_idx
 
 
 ###############################################################################
@@ -870,7 +870,7 @@ class SprintCacheDataset(CachedDataset2):
           assert self.num_labels < 2 ** 31
           self.dtype = "int32"
         self.num_dims = 1
-        if self.allophone_labeling.state_tying_by_allo_state_idx:
+        if self.allophone_labeling.state_tying_file:
           self.type = "align_raw"
       elif type == "feat":
         self.num_labels = self._get_feature_dim()
@@ -895,16 +895,11 @@ class SprintCacheDataset(CachedDataset2):
       :return: numpy array of shape (time, [num_labels])
       :rtype: numpy.ndarray
       """
+      if self.type in ["align", "align_raw"]:
+        label_seq = self.sprint_cache.read_align_array(name, label_lookup=self.allophone_labeling.get_label_lookup())
+        return label_seq.astype(self.dtype)
       res = self.sprint_cache.read(name, typ=self.type)
-      if self.type == "align":
-        label_seq = numpy.array([self.allophone_labeling.get_label_idx(a, s) for (t, a, s) in res], dtype=self.dtype)
-        assert label_seq.shape == (len(res),)
-        return label_seq
-      elif self.type == "align_raw":
-        label_seq = numpy.array([self.allophone_labeling.state_tying_by_allo_state_idx[a] for (t, a, s) in res], dtype=self.dtype)
-        assert label_seq.shape == (len(res),)
-        return label_seq
-      elif self.type == "feat":
+      if self.type == "feat":
         times, feats = res
         assert len(times) == len(feats) > 0
         feat_mat = numpy.array(feats, dtype=self.dtype)
@@ -265,6 +265,221 @@ class SprintSubprocessInstance:
     self._start_child()
 
 
+class SprintAutomataCache:
+  """
+  Caches the allophone-state automata (FSAs) which we get from Sprint per segment.
+  The automaton only depends on the segment and the Sprint config (lexicon, etc.),
+  so there is no need to ask Sprint again in every epoch.
+
+  There are two levels: an in-memory LRU cache, and optionally an on-disk store.
+  The on-disk store is keyed by a hash of the Sprint config and the segment name,
+  so it can be shared across runs (and across processes) with the same config.
+  An automaton is a tuple (num_states, edges, weights),
+  where edges is of shape (3, num_edges), each (from, to, emission-idx), of dtype uint32,
+  and weights is of shape (num_edges,), of dtype float32.
+  """
+
+  def __init__(self, config_hash, max_num_entries=1000, cache_dir=None):
+    """
+    :param str config_hash: hash of the Sprint config, see :func:`get_config_hash`
+    :param int max_num_entries: for the in-memory LRU cache. 0 disables it
+    :param str|None cache_dir: if set, we also store the automata in this directory
+    """
+    from collections import OrderedDict
+    self.lock = RLock()
+    self.config_hash = config_hash
+    self.max_num_entries = max_num_entries
+    self.entries = OrderedDict()  # segment name -> automaton
+    self.cache_dir = None
+    if cache_dir:
+      self.cache_dir = os.path.join(cache_dir, config_hash)
+      if not os.path.exists(self.cache_dir):
+        try:
+          os.makedirs(self.cache_dir)
+        except OSError:
+          assert os.path.isdir(self.cache_dir)
+    self.num_hits = 0
+    self.num_misses = 0
+
+  @classmethod
+  def get_config_hash(cls, sprint_opts):
+    """
+    :param dict[str] sprint_opts: the options which define the Sprint instance
+    :return: hash of sprint_opts, and of the path, size and mtime of all files referenced by it
+      (Sprint executable, config files, lexicon, state-tying, etc.), see :func:`get_referenced_files`
+    :rtype: str
+    """
+    import hashlib
+    hash_obj = hashlib.md5(repr(sorted(sprint_opts.items())).encode("utf8"))
+    for filename in cls.get_referenced_files(sprint_opts):
+      st = os.stat(filename)
+      hash_obj.update(("\n%s:%i:%i" % (filename, st.st_size, int(st.st_mtime))).encode("utf8"))
+    return hash_obj.hexdigest()
+
+  @classmethod
+  def get_referenced_files(cls, sprint_opts):
+    """
+    Any argument in the Sprint config str (e.g. "--config=x.config" or "--*.lexicon.file=lexicon.xml.gz")
+    which refers to an existing file counts as a reference.
+    Sprint config files (``*.config``) are scanned recursively for ``include`` and ``key = value`` lines.
+
+    :param dict[str] sprint_opts: see :class:`SprintSubprocessInstance`
+    :return: sorted absolute filenames
+    :rtype: list[str]
+    """
+    sprint_config_str = sprint_opts.get("sprintConfigStr", "")
+    if sprint_config_str.startswith("config:"):
+      from Config import get_global_config
+      config = get_global_config()
+      assert config
+      sprint_config_str = config.typed_dict[sprint_config_str[len("config:"):]]
+    candidates = [sprint_opts.get("sprintExecPath", "")]
+    for arg in eval_shell_str(sprint_config_str):
+      candidates.append(arg.split("=", 1)[-1] if arg.startswith("--") else arg)
+    filenames = set()
+    while candidates:
+      filename = candidates.pop()
+      if not filename or not os.path.isfile(filename):
+        continue
+      filename = os.path.abspath(filename)
+      if filename in filenames:
+        continue
+      filenames.add(filename)
+      if filename.endswith(".config"):
+        candidates.extend(cls._get_sprint_config_file_references(filename))
+    return sorted(filenames)
+
+  @staticmethod
+  def _get_sprint_config_file_references(filename):
+    """
+    :param str filename: Sprint config file
+    :return: potential filenames, relative to the cwd or to the dir of the config file
+    :rtype: list[str]
+    """
+    res = []
+    with open(filename) as f:
+      for line in f:
+        line = line.split("#", 1)[0].strip()
+        if line.startswith("include "):
+          value = line[len("include "):].strip()
+        elif "=" in line:
+          value = line.split("=", 1)[1].strip()
+        else:
+          continue
+        if value:
+          res += [value, os.path.join(os.path.dirname(filename), value)]
+    return res
+
+  def _get_filename(self, segment_name):
+    """
+    :param str segment_name:
+    :rtype: str
+    """
+    import hashlib
+    return os.path.join(self.cache_dir, hashlib.md5(segment_name.encode("utf8")).hexdigest() + ".npz")
+
+  def _load_from_disk(self, segment_name):
+    """
+    :param str segment_name:
+    :return: automaton or None
+    :rtype: (int,numpy.ndarray,numpy.ndarray)|None
+    """
+    filename = self._get_filename(segment_name)
+    if not os.path.exists(filename):
+      return None
+    try:
+      with numpy.load(filename) as d:
+        if str(d["segment_name"]) != segment_name:  # hash collision
+          return None
+        return int(d["num_states"]), d["edges"], d["weights"]
+    except (IOError, OSError, ValueError, KeyError) as exc:
+      print("SprintAutomataCache: cannot read %r: %r" % (filename, exc), file=log.v3)
+      return None
+
+  def _save_to_disk(self, segment_name, automaton):
+    """
+    :param str segment_name:
+    :param (int,numpy.ndarray,numpy.ndarray) automaton:
+    """
+    filename = self._get_filename(segment_name)
+    num_states, edges, weights = automaton
+    # Write to a temporary file first and rename it, so that other readers never see partial files.
+    tmp_filename = "%s.%i.tmp.npz" % (filename[:-len(".npz")], os.getpid())
+    numpy.savez(
+      tmp_filename, segment_name=numpy.array(segment_name), num_states=numpy.array(num_states),
+      edges=edges, weights=weights)
+    os.rename(tmp_filename, filename)
+
+  def get(self, segment_name):
+    """
+    :param str segment_name:
+    :return: automaton or None if not cached
+    :rtype: (int,numpy.ndarray,numpy.ndarray)|None
+    """
+    with self.lock:
+      if segment_name in self.entries:
+        automaton = self.entries.pop(segment_name)
+        self.entries[segment_name] = automaton  # move to end, i.e. most recently used
+        self.num_hits += 1
+        return automaton
+    if self.cache_dir:
+      automaton = self._load_from_disk(segment_name)
+      if automaton is not None:
+        self._set_in_memory(segment_name, automaton)
+        with self.lock:
+          self.num_hits += 1
+        return automaton
+    with self.lock:
+      self.num_misses += 1
+    return None
+
+  def _set_in_memory(self, segment_name, automaton):
+    """
+    :param str segment_name:
+    :param (int,numpy.ndarray,numpy.ndarray) automaton:
+    """
+    if self.max_num_entries <= 0:
+      return
+    with self.lock:
+      self.entries.pop(segment_name, None)
+      self.entries[segment_name] = automaton
+      while len(self.entries) > self.max_num_entries:
+        self.entries.popitem(last=False)
+
+  def set(self, segment_name, automaton):
+    """
+    :param str segment_name:
+    :param (int,numpy.ndarray,numpy.ndarray) automaton:
+    """
+    for x in automaton[1:]:
+      x.flags.writeable = False  # the cached arrays are shared, make sure nobody modifies them
+    self._set_in_memory(segment_name, automaton)
+    if self.cache_dir:
+      self._save_to_disk(segment_name, automaton)
+
+  @staticmethod
+  def assemble_batch(automata):
+    """
+    :param list[(int,numpy.ndarray,numpy.ndarray)] automata: for each seq in the batch
+    :return: (edges, weights, start_end_states), see :func:`SprintInstancePool.get_automata_for_batch`
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    n_batch = len(automata)
+    num_states = numpy.array([a[0] for a in automata], dtype="uint32")
+    num_edges = numpy.array([a[1].shape[1] for a in automata], dtype="int64")
+    state_offsets = numpy.zeros((n_batch,), dtype="uint32")
+    numpy.cumsum(num_states[:-1], out=state_offsets[1:])
+    edges = numpy.empty((4, int(num_edges.sum())), dtype="uint32")
+    edges[:3] = numpy.concatenate([a[1] for a in automata], axis=1) if n_batch else 0
+    edges[0:2] += numpy.repeat(state_offsets, num_edges)[None, :]
+    edges[3] = numpy.repeat(numpy.arange(n_batch, dtype="uint32"), num_edges)
+    weights = numpy.concatenate([a[2] for a in automata]) if n_batch else numpy.zeros((0,), dtype="float32")
+    start_end_states = numpy.empty((2, n_batch), dtype="uint32")
+    start_end_states[0] = state_offsets
+    start_end_states[1] = state_offsets + num_states - 1
+    return edges, weights.astype("float32", copy=False), start_end_states
+
+
 class SprintInstancePool:
   """
   This is a pool of Sprint instances.
@@ -272,7 +487,8 @@ class SprintInstancePool:
     which can be accessed via get_global_instance.
   Then, this can be used in multiple ways.
     (1) get_batch_loss_and_error_signal.
-    (2) ...
+    (2) get_automata_for_batch. The automata are cached, see :class:`SprintAutomataCache`.
+      Options for that: "automataCacheSize" (in-memory, num segments), "automataCacheDir" (on-disk).
   """
 
   class_lock = RLock()
@@ -300,7 +516,12 @@ class SprintInstancePool:
     assert isinstance(sprint_opts, dict)
     sprint_opts = sprint_opts.copy()
     self.max_num_instances = int(sprint_opts.pop("numInstances", 1))
+    automata_cache_size = int(sprint_opts.pop("automataCacheSize", 1000))
+    automata_cache_dir = sprint_opts.pop("automataCacheDir", None)
     self.sprint_opts = sprint_opts
+    self.automata_cache = SprintAutomataCache(
+      config_hash=SprintAutomataCache.get_config_hash(sprint_opts),
+      max_num_entries=automata_cache_size, cache_dir=automata_cache_dir)
     self.instances = []; ":type: list[SprintSubprocessInstance]"
 
   def _maybe_create_new_instance(self):
@@ -366,6 +587,82 @@ class SprintInstancePool:
         numpy_set_unused(error_signal)
     return batch_loss, batch_error_signal
 
+  @staticmethod
+  def _get_segment_name(tags, b):
+    """
+    :param list[str]|numpy.ndarray tags: see :func:`get_automata_for_batch`
+    :param int b: batch idx
+    :rtype: str
+    """
+    if isinstance(tags[0], (str, bytes)):
+      segment_name = tags[b]
+    else:
+      segment_name = tags[b].view('S%d' % tags.shape[1])[0]
+    if isinstance(segment_name, bytes) and not isinstance(segment_name, str):
+      segment_name = segment_name.decode("utf8")
+    assert isinstance(segment_name, str)
+    return segment_name
+
+  def _get_automata_from_sprint(self, segment_names):
+    """
+    Fetches the automata for the given segments via the Sprint subprocesses.
+    The segments are spread over all instances, and as soon as some instance is done,
+    it gets the next segment.
+
+    :param list[str] segment_names:
+    :return: automaton for each segment, see :class:`SprintAutomataCache`
+    :rtype: dict[str,(int,numpy.ndarray,numpy.ndarray)]
+    """
+    from select import select
+    results = {}
+    queue = list(reversed(segment_names))
+    busy = {}  # instance idx -> segment name
+    try:
+      while queue or busy:
+        for i in range(self.max_num_instances):
+          if not queue:
+            break
+          if i in busy:
+            continue
+          segment_name = queue.pop()
+          instance = self._get_instance(i)
+          busy[i] = segment_name
+          instance._send(("export_allophone_state_fsa_by_segment_name", segment_name))
+        fds = {self.instances[i].pipe_c2p[0].fileno(): i for i in busy}
+        ready, _, _ = select(list(fds.keys()), [], [])
+        for fd in ready:
+          i = fds[fd]
+          r = self.instances[i]._read()
+          segment_name = busy.pop(i)
+          if r[0] != 'ok':
+            raise RuntimeError("Sprint instance %i, segment %r: %s" % (i, segment_name, r[1]))
+          num_states, num_edges, edges, weights = r[1:]
+          # (from, to, emission-idx) for each edge, uint32. weights for each edge, float32.
+          results[segment_name] = (
+            int(num_states), edges.reshape((3, num_edges)).astype("uint32", copy=False), weights)
+    except BaseException:
+      # The other instances might still be busy, and their replies would be read by the next request.
+      self._drain_instances(busy)
+      raise
+    return results
+
+  def _drain_instances(self, busy):
+    """
+    Reads and discards the pending replies of the busy instances, such that they are in a clean state again.
+    If that fails (e.g. broken pipe), the instance gets restarted.
+
+    :param dict[int,str] busy: instance idx -> segment name. will be cleared
+    """
+    for i, segment_name in sorted(busy.items()):
+      instance = self.instances[i]
+      try:
+        instance._read()
+      except BaseException as exc:
+        print("SprintInstancePool: instance %i, segment %r, exception %r, restart" % (i, segment_name, exc), file=log.v3)
+        instance._exit_child(should_interrupt=True)
+        instance._start_child()
+    busy.clear()
+
   def get_automata_for_batch(self, tags):
     """
     :param list[str]|numpy.ndarray tags: sequence names, used for Sprint (ndarray of shape (batch, max_str_len))
@@ -374,50 +671,29 @@ class SprintInstancePool:
       weights are of shape (num_edges,), of dtype float32.
       start_end_states are of shape (2, batch), each (start,stop) state idx, batch = len(tags), of dtype uint32.
     :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+
+    The automata are cached per segment (see :class:`SprintAutomataCache`),
+    and only the missing ones are requested from Sprint.
+    This acquires :attr:`lock` itself only when Sprint needs to be asked.
     """
-    all_num_states = [None] * len(tags)  # type: list[int]
-    all_num_edges  = [None] * len(tags)  # type: list[int]
-    all_edges      = [None] * len(tags)  # type: list[numpy.ndarray]
-    all_weights    = [None] * len(tags)  # type: list[numpy.ndarray]
-    for bb in range(0, len(tags), self.max_num_instances):
-      for i in range(self.max_num_instances):
-        b = bb + i
-        if b >= len(tags): break
-        instance = self._get_instance(i)
-        if isinstance(tags[0], str):
-          segment_name = tags[b]
-        else:
-          segment_name = tags[b].view('S%d' % tags.shape[1])[0]
-        assert isinstance(segment_name, str)
-        instance._send(("export_allophone_state_fsa_by_segment_name", segment_name))
-      for i in range(self.max_num_instances):
-        b = bb + i
-        if b >= len(tags): break
-        instance = self._get_instance(i)
-        r = instance._read()
-        if r[0] != 'ok':
-          raise RuntimeError(r[1])
-        num_states, num_edges, edges, weights = r[1:]
-        all_num_states[b] = num_states
-        all_num_edges [b] = num_edges
-        all_edges     [b] = edges.reshape((3, num_edges))  # (from, to, emission-idx) for each edge, uint32
-        all_weights   [b] = weights  # for each edge, float32
-    state_offset = 0
-    for idx in range(len(all_edges)):
-      num_edges = all_num_edges[idx]
-      all_edges[idx][0:2,:] += state_offset
-      state_offset += all_num_states[idx]
-      # add sequence_idx. becomes (from, to, emission-idx, seq-idx) for each edge
-      all_edges[idx] = numpy.vstack((all_edges[idx], numpy.ones((1, num_edges), dtype='uint32') * idx))
-
-    start_end_states = numpy.empty((2, len(all_num_states)), dtype='uint32')
-    state_offset = 0
-    for idx, num_states in enumerate(all_num_states):
-      start_end_states[0,idx] = state_offset
-      start_end_states[1,idx] = state_offset + num_states - 1
-      state_offset += num_states
-
-    return numpy.hstack(all_edges), numpy.hstack(all_weights), start_end_states
+    segment_names = [self._get_segment_name(tags, b) for b in range(len(tags))]
+    automata = {}
+    missing = []
+    for segment_name in segment_names:
+      if segment_name in automata or segment_name in missing:
+        continue
+      automaton = self.automata_cache.get(segment_name)
+      if automaton is None:
+        missing.append(segment_name)
+      else:
+        automata[segment_name] = automaton
+    if missing:
+      with self.lock:
+        fetched = self._get_automata_from_sprint(missing)
+      for segment_name, automaton in fetched.items():
+        self.automata_cache.set(segment_name, automaton)
+      automata.update(fetched)
+    return SprintAutomataCache.assemble_batch([automata[segment_name] for segment_name in segment_names])
 
   def get_free_instance(self):
     for inst in self.instances:
@@ -24,7 +24,7 @@ import theano.tensor as T
 
 from SprintDataset import SprintDatasetBase
 from Log import log
-from Device import get_gpu_names
+from Device import get_gpu_names, TheanoFlags
 import rnn
 _rnn_file = rnn.__file__
 _main_file = getattr(sys.modules["__main__"], "__file__", "")
@@ -537,7 +537,7 @@ def dumpFlags():
     print("CUDA via", theano_cuda.__file__)
     print("CUDA available:", theano_cuda.cuda_available)
 
-    print("THEANO_FLAGS:", rnn.TheanoFlags)
+    print("THEANO_FLAGS:", TheanoFlags)
 
 
 def setTargetMode(mode):
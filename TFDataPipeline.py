@@ -768,11 +768,13 @@ class DataProviderBase(object):
     :param ExternData extern_data:
     :param set(str)|None data_keys:
     """
+    from Util import TimingStats
     self.coord = tf.train.Coordinator()
     self.extern_data = extern_data
     if data_keys is None:
       data_keys = extern_data.data.keys()
     self.data_keys = sorted(data_keys)  # type: list[str]
+    self.timing_stats = TimingStats()  # e.g. time of Dataset.load_seqs. collected by TFEngine.Runner
 
   def start_threads(self):
     raise NotImplementedError
@@ -826,6 +828,13 @@ class DataProviderBase(object):
     """
     raise NotImplementedError
 
+  def get_queue_size(self):
+    """
+    :return: number of prepared batches in the queue, if this is known
+    :rtype: int|None
+    """
+    return None
+
 
 class FeedDictDataProvider(DataProviderBase):
   """
@@ -915,7 +924,8 @@ class FeedDictDataProvider(DataProviderBase):
     data.update({"seq_idx": [-1] * batch.num_slices, "seq_tag": [""] * batch.num_slices})
     seq_lens = {k: numpy.zeros(shape=(shapes[k][0],), dtype=self.extern_data.data[k].size_dtype)
                 for k in self.data_keys if self.extern_data.data[k].have_time_axis()}
-    self.dataset.load_seqs(batch.start_seq, batch.end_seq)
+    with self.timing_stats.measure("dataset_load_seqs"):
+      self.dataset.load_seqs(batch.start_seq, batch.end_seq)
     from Util import slice_pad_zeros
     with self.dataset.lock:
       for seq in batch.seqs:
@@ -1058,6 +1068,14 @@ class FeedDictDataProvider(DataProviderBase):
   def get_complete_frac(self):
     return self.batches.completed_frac()
 
+  def get_queue_size(self):
+    """
+    :rtype: int|None
+    """
+    if self.queue:
+      return self.queue.qsize()
+    return None
+
 
 class QueueDataProvider(DataProviderBase):
   """
@@ -27,12 +27,12 @@ import tensorflow as tf
 from tensorflow.python.client import timeline
 
 from Dataset import Dataset, Batch, BatchSetGenerator
-from Engine import Engine as TheanoEngine
+from EngineBase import EngineBase
 from LearningRateControl import loadLearningRateControlFromConfig, LearningRateControl
 from Log import log
-from Network import LayerNetwork
+from NetworkDescription import LayerNetworkDescription
 from Pretrain import pretrainFromConfig
-from TFNetwork import TFNetwork, ExternData, help_on_tf_exception
+from TFNetwork import TFNetwork, ExternData, AsyncCheckpointSaver, help_on_tf_exception
 from TFUpdater import Updater
 from Util import hms, NumbersDict, PY3, BackendEngine
 from pprint import pprint
@@ -90,6 +90,10 @@ class Runner(object):
       assert extra_fetches_callback
     self.extra_fetches_callback = extra_fetches_callback
     self._horovod_stopped_runner = False
+    from Util import TimingStats
+    # Always collected, cheap. Printed at the end, and per step to runner_timing_log_file if set.
+    self.timing_stats = TimingStats()
+    self.timing_log_filename = engine.config.value("runner_timing_log_file", None)
 
     from Util import terminal_size
     terminal_width, _ = terminal_size()
@@ -253,6 +257,42 @@ class Runner(object):
     self.num_steps = num_steps
     self.finalized = True
 
+  def _collect_step_timing(self, step, timing_log_file=None):
+    """
+    Called after each step. Collects the data provider stats (e.g. dataset load_seqs time)
+    and writes the timings of this step to the timing log file, if given.
+
+    :param int step:
+    :param typing.IO[str]|None timing_log_file: JSONL
+    """
+    data_provider_times = self.data_provider.timing_stats.pop_cur()
+    for key, value in data_provider_times.items():
+      self.timing_stats.collect(key, value)
+    step_times = self.timing_stats.pop_cur()
+    if timing_log_file:
+      import json
+      d = {"dataset": self.data_provider.get_dataset_name(), "epoch": self.engine.epoch, "step": step}
+      d.update(step_times)
+      timing_log_file.write(json.dumps(d, sort_keys=True) + "\n")
+
+  def _print_timing_summary(self, report_prefix, elapsed, timing_log_file=None):
+    """
+    :param str report_prefix:
+    :param float elapsed: total time of the epoch in secs
+    :param typing.IO[str]|None timing_log_file: JSONL
+    """
+    if self.timing_stats.counts.get("data_wait"):
+      print("%s, timings: %s" % (
+        report_prefix, self.timing_stats.get_summary_str(
+          total_time=elapsed, time_keys=set(self.timing_stats.totals.keys()).difference(["queue_size"]))),
+        file=log.v4)
+    if timing_log_file:
+      import json
+      d = {"dataset": self.data_provider.get_dataset_name(), "epoch": self.engine.epoch, "summary": True,
+           "elapsed": elapsed}
+      d.update(self.timing_stats.get_summary_dict())
+      timing_log_file.write(json.dumps(d, sort_keys=True) + "\n")
+
   def _get_batch_dim_from_fetches(self, fetches_results):
     """
     :param dict[str,numpy.ndarray|None] fetches_results: results of calculations, see self._get_fetches_dict()
@@ -517,6 +557,9 @@ class Runner(object):
       writer = None
     print("TF: log_dir: %s" % logdir, file=log.v5)
     run_metadata = tf.RunMetadata()
+    timing_log_file = None
+    if self.timing_log_filename:
+      timing_log_file = open(self.timing_log_filename, "a")
     debug_shell_in_runner = self.engine.config.bool("debug_shell_in_runner", False)
     debug_shell_in_runner_step = self.engine.config.int("debug_shell_in_runner_step", 1)
 
@@ -551,7 +594,11 @@ class Runner(object):
         if hvd_stop:
           # Some other peer does not have data anymore, but no error occurred.
           break
-        feed_dict, meta_step_info = self.data_provider.get_feed_dict()
+        queue_size = self.data_provider.get_queue_size()
+        if queue_size is not None:
+          self.timing_stats.collect("queue_size", queue_size)
+        with self.timing_stats.measure("data_wait"):
+          feed_dict, meta_step_info = self.data_provider.get_feed_dict()
         if isinstance(self.engine.network.train_flag, tf.Tensor):
           feed_dict[self.engine.network.train_flag] = self._train_flag
         if isinstance(self.engine.network.epoch_step, tf.Tensor):
@@ -591,6 +638,7 @@ class Runner(object):
               options=run_options,
               run_metadata=run_metadata)  # type: dict[str,numpy.ndarray|str]
             elapsed_time_tf += time.time() - session_run_start_time
+            self.timing_stats.collect("session_run", time.time() - session_run_start_time)
             writer.add_summary(fetches_results["summary"], step + step_offset)
             writer.add_run_metadata(run_metadata, 'step_{:04d}'.format(step + step_offset))
             tl = timeline.Timeline(run_metadata.step_stats)
@@ -601,6 +649,7 @@ class Runner(object):
             session_run_start_time = time.time()
             fetches_results = sess.run(fetches_dict, feed_dict=feed_dict)  # type: dict[str,numpy.ndarray|str]
             elapsed_time_tf += time.time() - session_run_start_time
+            self.timing_stats.collect("session_run", time.time() - session_run_start_time)
             if writer and "summary" in fetches_results:
               writer.add_summary(fetches_results["summary"], step + step_offset)
         except tf.errors.OpError as exc:
@@ -608,9 +657,13 @@ class Runner(object):
           # Extra info will be printed below.
           raise
 
-        eval_info = self._collect_eval_info(fetches_results=fetches_results)
-        self._maybe_handle_extra_fetches(fetches_results)
+        with self.timing_stats.measure("eval_info"):
+          eval_info = self._collect_eval_info(fetches_results=fetches_results)
+        if self.extra_fetches is not None:
+          with self.timing_stats.measure("extra_fetches_callback"):
+            self._maybe_handle_extra_fetches(fetches_results)
         elapsed_time_tf += self._horovod_sync_params(local_step=step)
+        self._collect_step_timing(step=step, timing_log_file=timing_log_file)
         duration = time.time() - start_time
         self._print_process(report_prefix=report_prefix, step=step, step_duration=duration, eval_info=eval_info)
         if step <= 10 and writer:
@@ -642,6 +695,7 @@ class Runner(object):
       elapsed_tf_percentage = (elapsed_time_tf / elapsed) if (elapsed > 0) else 0.0
       print("%s, finished after %i steps, %s elapsed (%.1f%% computing time)" % (
         report_prefix, step, hms(elapsed), (elapsed_tf_percentage * 100.)), file=log.v3)
+      self._print_timing_summary(report_prefix=report_prefix, elapsed=elapsed, timing_log_file=timing_log_file)
 
     except KeyboardInterrupt as exc:
       print("KeyboardInterrupt in step %r." % step)
@@ -668,10 +722,12 @@ class Runner(object):
       try_and_ignore_exception(coord.request_stop)
       try_and_ignore_exception(lambda: coord.join(threads))
       try_and_ignore_exception(self.data_provider.stop_threads)
+      if timing_log_file:
+        try_and_ignore_exception(timing_log_file.close)
       self.elapsed = time.time() - self.start_time
 
 
-class Engine(object):
+class Engine(EngineBase):
   def __init__(self, config=None):
     """
     :param Config.Config|None config:
@@ -701,8 +757,11 @@ class Engine(object):
     self.use_search_flag = config.value("task", None) == "search"
     self.use_eval_flag = config.value("task", None) != "forward"
     self._const_cache = {}  # type: dict[str,tf.Tensor]
+    self._async_checkpoint_saver = None  # type: AsyncCheckpointSaver|None
+    self._checkpoint_index = None  # type: CheckpointIndex.CheckpointIndex|None
 
   def finalize(self):
+    self.wait_for_pending_model_save()
     self._close_tf_session()
     tf.reset_default_graph()
     self.network = None
@@ -778,11 +837,6 @@ class Engine(object):
     self._merge_all_summaries = None
     self._const_cache.clear()
 
-  get_train_start_epoch_batch = TheanoEngine.get_train_start_epoch_batch
-  config_get_final_epoch = TheanoEngine.config_get_final_epoch
-  get_epoch_model = TheanoEngine.get_epoch_model
-  epoch_model_filename = TheanoEngine.epoch_model_filename
-
   def get_epoch_model_filename(self, epoch=None):
     if not epoch:
       epoch = self.epoch
@@ -816,6 +870,7 @@ class Engine(object):
       assert not filename
       filename = self.get_epoch_model_filename(epoch=epoch)
     print("Load model %s" % (filename,), file=log.v4)
+    self.wait_for_pending_model_save()
     self.network.load_params_from_file(filename, session=self.tf_session)
 
   def save_model(self, filename=None):
@@ -827,7 +882,81 @@ class Engine(object):
     if not filename:
       filename = self.get_epoch_model_filename()
     print("Save model under %s" % (filename,), file=log.v4)
-    self.network.save_params_to_file(filename, session=self.tf_session)
+    if self.config.bool("save_model_async", False):
+      # Only fetches the values now. Writing to disk happens in the background.
+      if not self._async_checkpoint_saver:
+        self._async_checkpoint_saver = AsyncCheckpointSaver()
+      self.network.save_params_to_file(
+        filename, session=self.tf_session, async_saver=self._async_checkpoint_saver)
+    else:
+      self.network.save_params_to_file(filename, session=self.tf_session)
+    if self.epoch and self.model_filename and filename == self.get_epoch_model_filename():
+      self._update_checkpoint_index()
+
+  def _get_checkpoint_index(self):
+    """
+    :return: index of the epoch models, see :mod:`CheckpointIndex`. None if disabled via config "checkpoint_index"
+    :rtype: CheckpointIndex.CheckpointIndex|None
+    """
+    if self._checkpoint_index:
+      return self._checkpoint_index
+    model_filename = self.config.value("model", None)
+    if not model_filename or not self.config.bool("checkpoint_index", True):
+      return None
+    from CheckpointIndex import CheckpointIndex
+    self._checkpoint_index = CheckpointIndex(CheckpointIndex.get_default_filename(model_filename))
+    return self._checkpoint_index
+
+  def _update_checkpoint_index(self):
+    """
+    Adds or updates the entry of the current epoch model, with the scores so far.
+    The size is filled in later if the model is saved asynchronously.
+    """
+    index = self._get_checkpoint_index()
+    if not index:
+      return
+    filename = self.get_epoch_model_filename()
+    if self.epoch not in index.entries or index.entries[self.epoch]["filename"] != filename:
+      index.add_checkpoint(epoch=self.epoch, filename=filename, is_pretrain=self.is_pretrain_epoch())
+    if self.epoch in self.learning_rate_control.epochData:
+      index.set_scores(self.epoch, self.learning_rate_control.epochData[self.epoch].error)
+    index.save()
+
+  def wait_for_pending_model_save(self):
+    """
+    With `save_model_async`, waits until the last checkpoint is completely written.
+    """
+    if self._async_checkpoint_saver:
+      self._async_checkpoint_saver.wait()
+
+  def average_models(self, epochs, output_filename=None, weights=None, ema_decay=None):
+    """
+    Averages the params of the existing models of the given epochs, and saves it as a new checkpoint.
+    See :func:`TFNetwork.average_checkpoints`.
+    If we have a network, the variable names are resolved w.r.t. it,
+    i.e. the resulting checkpoint can always be loaded into the current network.
+
+    :param list[int] epochs: ordered from old to new (relevant for ema_decay)
+    :param str|None output_filename: by default "<model>.avg.<last epoch>"
+    :param list[float]|None weights: one per epoch
+    :param float|None ema_decay: exponential moving average instead of weights
+    :return: output filename
+    :rtype: str
+    """
+    from TFNetwork import average_checkpoints
+    self.wait_for_pending_model_save()
+    existing_models = self.get_existing_models(config=self.config)
+    for epoch in epochs:
+      assert epoch in existing_models, "model of epoch %i not found. existing: %r" % (
+        epoch, sorted(existing_models.keys()))
+    if not output_filename:
+      model_filename = self.config.value("model", None)
+      assert model_filename, "no 'model' in config"
+      output_filename = self.epoch_model_filename(model_filename + ".avg", epochs[-1], is_pretrain=False)
+    average_checkpoints(
+      filenames=[existing_models[epoch] for epoch in epochs], output_filename=output_filename,
+      weights=weights, ema_decay=ema_decay, network=self.network)
+    return output_filename
 
   @staticmethod
   def delete_model(filename):
@@ -838,17 +967,8 @@ class Engine(object):
     """
     # This assumes TensorFlow models here.
     # They consists of multiple files with the extensions ".index", ".meta" and ".data*".
-    from glob import glob
-    count_bytes = 0
-    assert os.path.exists(filename + ".index")
-    for fn in glob(filename + "*"):
-      fn_ext = os.path.splitext(fn)[1]
-      if fn_ext not in [".index", ".meta"] and not fn_ext.startswith(".data"):
-        continue
-      count_bytes += os.stat(fn).st_size
-      os.remove(fn)
-    assert count_bytes > 0
-    return count_bytes
+    from CheckpointIndex import delete_checkpoint
+    return delete_checkpoint(filename)
 
   def init_train_from_config(self, config=None, train_data=None, dev_data=None, eval_data=None):
     """
@@ -930,7 +1050,7 @@ class Engine(object):
       # In self.init_train_epoch(), we initialize a new model.
       net_dict = self.pretrain.get_network_json_for_epoch(self.epoch)
     else:
-      net_dict = LayerNetwork.json_from_config(config)
+      net_dict = LayerNetworkDescription.json_from_config(config)
     if net_dict_post_proc:
       net_dict = net_dict_post_proc(net_dict)
 
@@ -1025,6 +1145,20 @@ class Engine(object):
       self.orig_config[key] = orig_value
       set_value(key, value)
 
+  def _get_random_seeds(self, epoch):
+    """
+    :param int epoch:
+    :return: TF graph random seed, network random seed
+    :rtype: (int, int)
+    """
+    tf_random_seed = 42
+    net_random_seed = epoch
+    if self.config.opt_typed_value("random_seed", None):
+      seed = self.config.int("random_seed", None)
+      net_random_seed = (epoch * 3 + seed * 5 + 7) % (2 ** 31)
+      tf_random_seed = (net_random_seed * 2 + 3) % (2 ** 31)
+    return tf_random_seed, net_random_seed
+
   def _init_network(self, net_desc, epoch=None):
     """
     :param dict[str,dict[str]] net_desc: layer name -> layer description dict
@@ -1037,12 +1171,7 @@ class Engine(object):
     self._maybe_update_config(net_desc=net_desc, epoch=epoch)
     # The new session will by default use the newly created default graph.
     self._make_tf_session()
-    tf_random_seed = 42
-    net_random_seed = epoch
-    if self.config.opt_typed_value("random_seed", None):
-      seed = self.config.int("random_seed", None)
-      net_random_seed = (epoch * 3 + seed * 5 + 7) % (2 ** 31)
-      tf_random_seed = (net_random_seed * 2 + 3) % (2 ** 31)
+    tf_random_seed, net_random_seed = self._get_random_seeds(epoch=epoch)
     tf.set_random_seed(tf_random_seed)
     from TFUtil import get_global_train_flag_placeholder
     if self.use_dynamic_train_flag:
@@ -1053,12 +1182,33 @@ class Engine(object):
       extern_data = ExternData()
       extern_data.init_from_config(self.config)
       # TODO...
-    self.network, self.updater = self.create_network(
-      config=self.config,
-      rnd_seed=net_random_seed,
-      train_flag=train_flag, eval_flag=self.use_eval_flag, search_flag=self.use_search_flag,
-      initial_learning_rate=getattr(self, "initial_learning_rate", None),
-      net_dict=net_desc)
+    network, graph_cache, graph_cache_key = None, None, None
+    if self.config.value("tf_graph_cache_dir", None) and train_flag is False:
+      from TFGraphCache import GraphCache, NotCacheable
+      graph_cache = GraphCache(cache_dir=self.config.value("tf_graph_cache_dir", None))
+      try:
+        graph_cache_key = graph_cache.get_key(
+          net_dict=net_desc, config=self.config, eval_flag=self.use_eval_flag, search_flag=self.use_search_flag)
+      except NotCacheable as exc:
+        print("TF graph cache: cannot use cache: %s" % exc, file=log.v3)
+        graph_cache = None
+      if graph_cache:
+        network = graph_cache.load(
+          graph_cache_key, config=self.config, rnd_seed=net_random_seed,
+          eval_flag=self.use_eval_flag, search_flag=self.use_search_flag)
+    if network:
+      network.layers_desc = net_desc
+      network.print_network_info()
+      self.network, self.updater = network, None
+    else:
+      self.network, self.updater = self.create_network(
+        config=self.config,
+        rnd_seed=net_random_seed,
+        train_flag=train_flag, eval_flag=self.use_eval_flag, search_flag=self.use_search_flag,
+        initial_learning_rate=getattr(self, "initial_learning_rate", None),
+        net_dict=net_desc)
+      if graph_cache:
+        graph_cache.save(graph_cache_key, network=self.network)
     self.network.initialize_params(session=self.tf_session)
     if self.config.is_true("use_horovod"):
       # Note: Might not be needed as it should be deterministic. But just to be sure...
@@ -1070,7 +1220,8 @@ class Engine(object):
       self.tf_session.run(bcast_op)
 
   @classmethod
-  def create_network(cls, config, rnd_seed, train_flag, eval_flag, search_flag, net_dict, initial_learning_rate=1.0):
+  def create_network(cls, config, rnd_seed, train_flag, eval_flag, search_flag, net_dict, initial_learning_rate=1.0,
+                     global_train_step=None, updater=None):
     """
     :param Config.Config config:
     :param int rnd_seed:
@@ -1079,6 +1230,9 @@ class Engine(object):
     :param bool eval_flag:
     :param bool search_flag:
     :param dict[str,dict[str]] net_dict:
+    :param tf.Variable|None global_train_step: see :class:`TFNetwork`
+    :param Updater|None updater: if given (and train_flag), it is reused for the new network,
+      see :func:`Updater.set_network`. the graph must be the same
     :return: network, updater
     :rtype: (TFNetwork, Updater|None)
     """
@@ -1088,7 +1242,8 @@ class Engine(object):
       rnd_seed=rnd_seed,
       train_flag=train_flag,
       eval_flag=eval_flag,
-      search_flag=search_flag)
+      search_flag=search_flag,
+      global_train_step=global_train_step)
     network.construct_from_dict(net_dict)
     if train_flag is not False and config.list("search_train_network_layers"):
       network.construct_extra_net(
@@ -1103,8 +1258,12 @@ class Engine(object):
       for extra_param in network.extra_net.get_params_list():
         assert extra_param in net_params
     network.layers_desc = net_dict
-    updater = None
-    if train_flag is not False:
+    if train_flag is False:
+      updater = None
+    elif updater:
+      updater.set_network(network)
+      updater.set_trainable_vars(network.get_trainable_params())
+    else:
       # Need to create new Updater because it has the learning_rate var which must be in the current graph.
       updater = Updater(
         config=config, network=network,
@@ -1122,6 +1281,9 @@ class Engine(object):
     from Util import dict_diff_str
     print("reinit because network description differs. Diff:",
           dict_diff_str(self.network.layers_desc, net_desc), file=log.v3)
+    if self.config.bool("pretrain_incremental_construction", False) and self.is_pretrain_epoch():
+      if self._init_network_incremental(net_desc):
+        return
     old_network_params = self.network.get_params_serialized(self.tf_session)
     self._init_network(net_desc)
     if self.is_pretrain_epoch() and not self.pretrain.copy_output_layer:
@@ -1142,6 +1304,84 @@ class Engine(object):
       copy_param_mode=self.pretrain.copy_param_mode if self.is_pretrain_epoch() else None,
       ignore_non_existing=self.is_pretrain_epoch())
 
+  def _init_network_incremental(self, net_desc):
+    """
+    Constructs the new network in the existing graph and session, instead of resetting both (:func:`_init_network`)
+    and copying all params over.
+    The layer variables are created with AUTO_REUSE (see :func:`LayerBase.var_creation_scope`),
+    thus variables with the same name and shape are kept in place, with their values,
+    and only the new variables are initialized.
+    This is the same as what :func:`maybe_init_new_network` does via :func:`TFNetwork.set_params_by_serialized`,
+    except for params with changed shape (copy_param_mode), where we fall back to the full reconstruction.
+    The updater is reused (:func:`Updater.set_network`), so the optimizer slot vars of the kept params
+    are not created again.
+    If params of the old network are not used anymore, we also fall back to the full reconstruction,
+    as these vars would stay in the graph and session.
+    Note that the ops of the old network stay in the graph (TF graphs are append-only).
+
+    :param dict[str,dict[str]] net_desc: layer name -> layer description dict
+    :return: whether it was successful. if not, the graph can contain some unused ops,
+      and :func:`_init_network` should be used
+    :rtype: bool
+    """
+    import re
+    from TFUtil import CollectionKeys, get_global_train_flag_placeholder
+    from Util import hms_fraction
+    if self.config.is_true("use_horovod"):
+      return False
+    start_time = time.time()
+    old_network = self.network
+    graph = tf.get_default_graph()
+    assert graph is self.tf_session.graph
+    old_params = set(old_network.get_params_list())
+    old_var_names = set([v.op.name for v in tf.global_variables()])
+    self._maybe_update_config(net_desc=net_desc, epoch=self.epoch)
+    # These would refer to ops of the old network, which we do not feed anymore.
+    for key in [tf.GraphKeys.SUMMARIES, tf.GraphKeys.UPDATE_OPS, CollectionKeys.RETURNN_LAYERS]:
+      del graph.get_collection_ref(key)[:]
+    tf_random_seed, net_random_seed = self._get_random_seeds(epoch=self.epoch)
+    tf.set_random_seed(tf_random_seed)
+    try:
+      network, updater = self.create_network(
+        config=self.config,
+        rnd_seed=net_random_seed,
+        train_flag=get_global_train_flag_placeholder() if self.use_dynamic_train_flag else False,
+        eval_flag=self.use_eval_flag, search_flag=self.use_search_flag,
+        initial_learning_rate=getattr(self, "initial_learning_rate", None),
+        net_dict=net_desc,
+        global_train_step=old_network.global_train_step,
+        updater=self.updater)
+    except ValueError as exc:  # e.g. "Trying to share variable ..., but specified shape ..."
+      print("Incremental network construction not possible: %s" % exc, file=log.v3)
+      return False
+    params = set(network.get_params_list())
+    num_removed_params = len([param for param in old_params if param not in params])
+    if num_removed_params:
+      print("Incremental network construction not possible, %i params of the old network are not used anymore." % (
+        num_removed_params,), file=log.v3)
+      return False
+    new_params = [param for param in network.get_params_list() if param not in old_params]
+    for param in new_params:
+      # Vars not created via tf.get_variable get a new unique name, which would not match in the checkpoint.
+      base_name = re.sub("_[0-9]+$", "", param.op.name)
+      if base_name != param.op.name and base_name in old_var_names:
+        print("Incremental network construction not possible, name clash for var %r." % param.op.name, file=log.v3)
+        return False
+    reinit_params = []
+    if not self.pretrain.copy_output_layer:
+      for layer in network.get_output_layers():
+        if layer.name in old_network.layers:
+          print("suspend copying of output layer: " + layer.name, file=log.v2)
+          reinit_params += [param for param in layer.params.values() if param in old_params]
+    network.initialize_params(session=self.tf_session, var_list=new_params + reinit_params)
+    self.network, self.updater = network, updater
+    self._checked_uninitialized_vars = False
+    self._merge_all_summaries = None
+    print("Incremental network construction: kept %i params, initialized %i new params, took %s." % (
+      len(network.get_params_list()) - len(new_params) - len(reinit_params), len(new_params) + len(reinit_params),
+      hms_fraction(time.time() - start_time)), file=log.v3)
+    return True
+
   def train(self):
     print("start training at epoch %i and step %i" % (self.start_epoch, self.start_batch), file=log.v3)
     print("using batch size: %r, max seqs: %i" % (self.batch_size, self.max_seqs), file=log.v4)
@@ -1292,6 +1532,9 @@ class Engine(object):
     print(
       self.get_epoch_str(), "score:", self.format_score(trainer.score), "elapsed:", hms(trainer.elapsed), file=log.v1)
     self.eval_model()
+    checkpoint_index = self._get_checkpoint_index() if self._do_save() else None
+    if checkpoint_index and self.epoch in checkpoint_index.entries:
+      self._update_checkpoint_index()  # now also with the dev scores
 
     if self.config.bool_or_other("cleanup_old_models", None):
       self.cleanup_old_models()
@@ -1513,104 +1756,27 @@ class Engine(object):
 
   def cleanup_old_models(self, ask_for_confirmation=False):
     """
+    See :func:`CheckpointIndex.cleanup_old_models`.
+
     :param bool ask_for_confirmation: if True, will ask the user interactively to confirm
     """
     if not self._do_save():
       return
-    from Util import CollectionReadCheckCovered, human_bytes_size, confirm
-    from itertools import count
+    from Util import CollectionReadCheckCovered
+    from CheckpointIndex import CheckpointIndex, cleanup_old_models
+    self.wait_for_pending_model_save()  # such that the last model is complete and will be taken into account
     opts = CollectionReadCheckCovered(self.config.get_of_type("cleanup_old_models", dict, {}))
-    existing_models = TheanoEngine.get_existing_models(config=self.config)
+    index = self._get_checkpoint_index()
+    if not index:  # disabled, thus only in memory
+      index = CheckpointIndex(filename=None)
+    index.update_from_existing_models(self.get_existing_models(config=self.config) or {})
     if hasattr(self, "learning_rate_control"):
       lr_control = self.learning_rate_control
     else:
       lr_control = loadLearningRateControlFromConfig(self.config)
-    epochs = sorted(existing_models.keys())
-    if not epochs:
-      print("Cannot cleanup models, no models found.", file=log.v2)
-      return
-    keep_last_n = opts.get("keep_last_n", 2)
-    keep_best_n = opts.get("keep_best_n", 4)
-    assert keep_last_n >= 1 and keep_best_n >= 0
-    if max(keep_last_n, keep_best_n) >= len(epochs):
-      print(
-        ("Only %i epochs stored so far and keeping last %i epochs and best %i epochs,"
-         " thus not cleaning up any epochs yet.") % (
-          len(epochs), keep_last_n, keep_best_n), file=log.v2)
-      return
-    keep_epochs = set()  # type: set[int]
-    default_keep_pattern = set()
-    if epochs[-1] <= 10:
-      keep_every = 4
-      keep_doubles_of = 5
-    elif epochs[-1] <= 50:
-      keep_every = 20
-      keep_doubles_of = 5
-    elif epochs[-1] <= 100:
-      keep_every = 40
-      keep_doubles_of = 10
-    else:
-      keep_every = 80
-      keep_doubles_of = 20
-    for i in count(1):
-      n = keep_every * i
-      if n > epochs[-1]:
-        break
-      default_keep_pattern.add(n)
-    for i in count():
-      n = keep_doubles_of * (2 ** i)
-      if n > epochs[-1]:
-        break
-      default_keep_pattern.add(n)
-    keep_epochs.update(opts.get("keep", default_keep_pattern))
-    keep_epochs.update(epochs[-keep_last_n:])
-    score_keys = set()  # e.g. "dev_error", "dev_score", etc.
-    # Collect all possible score keys. Note that we could have different ones for different epochs.
-    for data in lr_control.epochData.values():
-      score_keys.update(data.error.keys())
-    assert score_keys
-    score_keys = sorted(score_keys)
-    score_values = {key: [] for key in score_keys}
-    for epoch in epochs:
-      epoch_scores = lr_control.epochData[epoch].error
-      for key in epoch_scores.keys():
-        score_values[key].append(epoch_scores[key])
-    for key in list(score_keys):
-      scores = score_values[key]
-      if min(scores) == max(scores):
-        print("Ignoring score key %r because all epochs have the same value %r." % (key, scores[0]), file=log.v3)
-        score_keys.remove(key)
-        score_values.pop(key)
-    # Actually, terminology is a bit confusing. We call it "score" here (and elsewhere), but it's a loss,
-    # so the maximum value is the worst possible value.
-    worst_score_values = {key: max(scores) for (key, scores) in score_values.items()}
-    for key in score_keys:
-      scores = sorted([
-        (lr_control.epochData[epoch].error.get(key, worst_score_values[key]), epoch) for epoch in epochs])
-      scores = scores[:keep_best_n]
-      keep_epochs.update([v[1] for v in scores])
-    keep_epochs.intersection_update(epochs)
-    if len(keep_epochs) == len(epochs):
-      print("%i epochs stored so far and keeping all." % len(epochs), file=log.v2)
-      return
-    remove_epochs = sorted(set(epochs).difference(keep_epochs))
-    assert remove_epochs
-    if len(epochs) > 6:
-      epoch_summary = "[%s, ..., %s]" % (", ".join(map(str, epochs[:3])), ", ".join(map(str, epochs[-3:])))
-    else:
-      epoch_summary = str(epochs)
-    print("We have stored models for epochs %s and keep epochs %s." % (epoch_summary, sorted(keep_epochs)), file=log.v3)
-    print("We will delete the models of epochs %s." % (remove_epochs,), file=log.v3)
-    opts.assert_all_read()
-    if self.config.bool("dry_run", False):
-      print("Dry-run, will not delete models.", file=log.v2)
-      return
-    if ask_for_confirmation:
-      confirm("Delete those models?", exit_on_false=True)
-    count_bytes = 0
-    for epoch in remove_epochs:
-      count_bytes += self.delete_model(existing_models[epoch])
-    print("Deleted %s." % human_bytes_size(count_bytes), file=log.v2)
+    index.update_scores_from_learning_rate_control(lr_control)
+    cleanup_old_models(
+      index=index, opts=opts, dry_run=self.config.bool("dry_run", False), ask_for_confirmation=ask_for_confirmation)
 
   def get_all_merged_summaries(self):
     """
@@ -1938,6 +2104,12 @@ class Engine(object):
       out_cache = {}
     if not log.verbose[4]:
       print("Set log_verbosity to level 4 or higher to see seq info on stdout.", file=log.v2)
+    # output layer name -> Scoring.Scorer. Scores the best hyp against the ref, e.g. WER, see Scoring.
+    scorers = {}
+    search_score_metrics = self.config.list("search_score_metrics", [])
+    if search_score_metrics:
+      import Scoring
+      scorers = {name: Scoring.Scorer(metrics=search_score_metrics) for name in output_layer_names}
 
     def extra_fetches_callback(seq_idx, seq_tag, **kwargs):
       """
@@ -2006,6 +2178,13 @@ class Engine(object):
                   dataset.serialize_data(key=target_keys[target_idx], data=outputs[target_idx][out_idx + beam_idx]),
                   file=log.v4)
 
+            if output_layer_names[target_idx] in scorers and targets[target_idx] is not None:
+              # In case of a beam, the first hyp is the best one.
+              scorers[output_layer_names[target_idx]].add(
+                seq_tag=seq_tag[batch_idx],
+                hyp=dataset.serialize_data(key=target_keys[target_idx], data=outputs[target_idx][out_idx]),
+                ref=dataset.serialize_data(key=target_keys[target_idx], data=targets[target_idx][batch_idx]))
+
             if out_cache is not None:
               if out_beam_sizes[target_idx] is None:
                   out_data = dataset.serialize_data(key=target_keys[target_idx], data=outputs[target_idx][out_idx])
@@ -2047,6 +2226,10 @@ class Engine(object):
       sys.exit(1)
     print("Search done. Num steps %i, Final: score %s error %s" % (
       runner.num_steps, self.format_score(runner.score), self.format_score(runner.error)), file=log.v1)
+    for output_layer_name, scorer in sorted(scorers.items()):
+      scorer.print_report(
+        file=log.v1, num_bootstrap_samples=self.config.int("search_score_bootstrap_samples", 1000),
+        prefix="Search output %r: " % output_layer_name)
     if output_file:
       assert out_cache
       assert 0 in out_cache
@@ -2149,46 +2332,80 @@ class Engine(object):
 
   def compute_priors(self, dataset, config=None):
     """
+    Computes the average posterior of the output layer over the dataset, and saves it in +log space.
+    The sums are reduced per batch inside the graph (for sparse outputs via a segment sum of the labels,
+    i.e. without a one-hot expansion), and accumulated in float64 via :class:`Util.PriorAccumulator`.
+
+    Relevant config options:
+
+      prior_log_space: bool. dense output is assumed to be in log-space (e.g. log-softmax),
+        and is accumulated via logsumexp.
+      prior_num_shards, prior_shard_idx: int. only the batches with idx % num_shards == shard_idx are used.
+        each shard writes its partial sum to prior_partial_file, merge them via tools/merge-priors.py.
+      prior_partial_file: str. the accumulator is saved there regularly (every prior_save_interval batches),
+        and if it exists already, the computation resumes from it.
+
     :param Dataset dataset:
     :param Config.Config config:
     """
     assert isinstance(dataset, Dataset)
     if config:
       assert config is self.config
+    else:
+      config = self.config
 
+    from Util import PriorAccumulator
     output_layer = self._get_output_layer()
-    assert config.has('output_file'), 'output_file for priors numbers should be provided'
-    output_file = config.value('output_file', '')
-    assert not os.path.exists(output_file), "Already existing output file %r." % output_file
-    print("Compute priors, using output layer %r, writing to %r." % (output_layer, output_file), file=log.v2)
+    output = output_layer.output
+    num_shards = config.int('prior_num_shards', 1)
+    shard_idx = config.int('prior_shard_idx', 0)
+    assert 0 <= shard_idx < num_shards
+    partial_file = config.value('prior_partial_file', None)
+    save_interval = config.int('prior_save_interval', 100)
+    output_file = config.value('output_file', None)
+    if num_shards > 1:
+      assert partial_file, 'prior_partial_file should be provided for prior_num_shards > 1'
+    else:
+      assert output_file, 'output_file for priors numbers should be provided'
+    if output_file:
+      assert not os.path.exists(output_file), "Already existing output file %r." % output_file
+    print("Compute priors, using output layer %r, writing to %r." % (
+      output_layer, output_file or partial_file), file=log.v2)
+    log_space = config.bool('prior_log_space', False) and not output.sparse
+
+    if partial_file and os.path.exists(partial_file):
+      accumulator = PriorAccumulator.load(partial_file)
+      assert accumulator.dim == output.dim and accumulator.log_space == log_space, (
+        "Partial prior file %r does not match: %r" % (partial_file, accumulator))
+      print("Resume from %r: %r" % (partial_file, accumulator), file=log.v2)
+    else:
+      accumulator = PriorAccumulator(dim=output.dim, log_space=log_space)
+    num_skip_batches = accumulator.num_batches
+
+    with tf.name_scope("prior"):
+      flat = output.get_placeholder_flattened()
+      if output.sparse:
+        batch_sum = tf.unsorted_segment_sum(
+          tf.ones_like(flat, dtype=tf.float64), segment_ids=tf.cast(flat, tf.int32), num_segments=output.dim)
+      else:
+        flat = tf.cast(flat, tf.float64)
+        if log_space:
+          batch_sum = tf.reduce_logsumexp(flat, axis=0)
+        else:
+          batch_sum = tf.reduce_sum(flat, axis=0)
+      num_frames = tf.shape(flat)[0]
 
-    class Accumulator(object):
+    def extra_fetches_callback(batch_sum, num_frames):
       """
-      Also see PriorEstimationTaskThread for reference.
-      """
-
-      def __init__(self):
-        self.sum_posteriors = numpy.zeros(int(output_layer.output.dim))
-        self.seq_len = 0
+      Called via extra_fetches_callback from the Runner.
 
-      def __call__(self, outputs):
-        """
-        Called via extra_fetches_callback from the Runner.
+      :param numpy.ndarray batch_sum: shape (dim,), float64
+      :param numpy.ndarray|int num_frames:
+      """
+      accumulator.add_batch_sum(batch_sum, num_frames=num_frames)
+      if partial_file and save_interval > 0 and accumulator.num_batches % save_interval == 0:
+        accumulator.save(partial_file)
 
-        :param numpy.ndarray outputs: shape=(time,data)|(time,), depending if dense or sparse, flattened over batches
-        """
-        seq_len = outputs.shape[0]
-        if output_layer.output.sparse:
-          assert outputs.shape == (seq_len,)
-        else:
-          assert outputs.shape == (seq_len, output_layer.output.dim)
-        if output_layer.output.sparse:
-          from Util import class_idx_seq_to_1_of_k
-          outputs = class_idx_seq_to_1_of_k(outputs, num_classes=output_layer.output.dim)
-        self.sum_posteriors += numpy.sum(outputs, axis=0)
-        self.seq_len += seq_len
-
-    accumulator = Accumulator()
     batch_size = config.int('batch_size', 1)
     max_seqs = config.int('max_seqs', -1)
     epoch = config.int('epoch', 1)
@@ -2196,29 +2413,48 @@ class Engine(object):
     if max_seq_length <= 0:
       max_seq_length = sys.maxsize
     dataset.init_seq_order(epoch=epoch)
-    batches = dataset.generate_batches(
-      recurrent_net=self.network.recurrent,
-      batch_size=batch_size,
-      max_seq_length=max_seq_length,
-      max_seqs=max_seqs,
-      used_data_keys=self.network.used_data_keys)
+
+    def shard_batch_generator():
+      """
+      :return: the batches of this shard, except those which were already accumulated
+      :rtype: typing.Iterator[Batch]
+      """
+      shard_batch_idx = 0
+      for batch_idx, batch in enumerate(dataset._generate_batches(
+            recurrent_net=self.network.recurrent,
+            batch_size=batch_size,
+            max_seq_length=max_seq_length,
+            max_seqs=max_seqs,
+            used_data_keys=self.network.used_data_keys)):
+        if batch_idx % num_shards != shard_idx:
+          continue
+        shard_batch_idx += 1
+        if shard_batch_idx <= num_skip_batches:
+          continue
+        yield batch
+
+    batches = BatchSetGenerator(
+      dataset=dataset, generator=shard_batch_generator(),
+      cache_whole_epoch=dataset.batch_set_generator_cache_whole_epoch())
     forwarder = Runner(
       engine=self, dataset=dataset, batches=batches,
       train=False, eval=False,
-      extra_fetches={
-        'outputs': output_layer.output.get_placeholder_flattened()
-      },
-      extra_fetches_callback=accumulator)
+      extra_fetches={'batch_sum': batch_sum, 'num_frames': num_frames},
+      extra_fetches_callback=extra_fetches_callback)
     forwarder.run(report_prefix=self.get_epoch_str() + " forward")
     if not forwarder.finalized:
       print("Error happened. Exit now.")
       sys.exit(1)
 
-    average_posterior = accumulator.sum_posteriors / accumulator.seq_len
-    avg_sum = numpy.sum(average_posterior)
+    if partial_file:
+      accumulator.save(partial_file)
+      print("Saved partial prior sum in %r: %r" % (partial_file, accumulator), file=log.v1)
+    if not output_file:
+      return
+    log_average_posterior = accumulator.get_log_prior()
+    avg_sum = numpy.sum(numpy.exp(log_average_posterior))
     assert numpy.isfinite(avg_sum)
     print("Prior sum in std-space (should be close to 1.0):", avg_sum, file=log.v1)
-    log_average_posterior = numpy.log(average_posterior)
     with open(output_file, 'w') as f:
       numpy.savetxt(f, log_average_posterior, delimiter=' ')
     print("Saved prior in %r in +log space." % output_file, file=log.v1)
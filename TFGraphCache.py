@@ -0,0 +1,480 @@
+"""
+Cache for the constructed TF computation graph of a :class:`TFNetwork`.
+
+The network construction can take quite long, e.g. the template construction of the :class:`RecLayer`
+for deep attention models, and it is repeated in every process start.
+For repeated runs on the same model which do not train, e.g. eval, search or forward,
+we can store the constructed graph as a ``MetaGraphDef``, together with the network metadata
+(the :class:`Data` templates of the layers and the extern data, the params, the losses),
+and restore that instead of constructing the network again.
+
+The cache key is a hash of the net dict, the config, the network flags and the code version
+(all RETURNN source files, and the TF version).
+Enable it via the config option ``tf_graph_cache_dir``, see :func:`TFEngine.Engine._init_network`.
+
+The restored layers are instances of :class:`CachedLayer`, which only provide the output, the params,
+the search beam scores and the stats.
+This is all which is needed for forwarding, search and eval via the engine,
+but other code which needs the real layer (e.g. to construct further things on the layer internals)
+will not work with it.
+Graphs which cannot be serialized (e.g. with ``tf.py_func``) are not cached.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import hashlib
+import tensorflow as tf
+from TFNetwork import TFNetwork, ExternData, LossHolder
+from TFNetworkLayer import LayerBase
+from TFUtil import Data
+from Log import log
+
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
+
+_ConfigIgnoreKeys = {
+  "task", "load", "load_epoch", "model", "epoch", "device", "log", "log_verbosity", "log_batch_size",
+  "train", "dev", "eval", "search_data", "eval_datasets", "output_file", "search_output_file",
+  "search_output_file_format", "forward_output_layer", "output_file_format", "tf_graph_cache_dir",
+  "batch_size", "max_seqs", "max_seq_length", "tf_log_dir", "tf_log_memory_usage", "num_epochs",
+}
+
+_PyFuncOpTypes = {"PyFunc", "PyFuncStateless", "EagerPyFunc"}
+
+
+def _get_hashable_repr(obj):
+  """
+  :param object obj: e.g. net dict or config value
+  :return: deterministic repr. functions are represented by their code
+  :rtype: str
+  :raises NotCacheable: if there is no deterministic repr for some value
+  """
+  from Util import betterRepr
+  import numpy
+  if isinstance(obj, dict):
+    return betterRepr({key: _get_hashable_repr(value) for (key, value) in obj.items()})
+  if isinstance(obj, (list, tuple)):
+    return betterRepr([_get_hashable_repr(value) for value in obj])
+  if isinstance(obj, (set, frozenset)):
+    return "<set %s>" % betterRepr(sorted([_get_hashable_repr(value) for value in obj]))
+  if isinstance(obj, (str, int, float, bool, type(None))):
+    return repr(obj)
+  if isinstance(obj, numpy.ndarray):
+    return "<ndarray %s %r %s>" % (obj.dtype, obj.shape, hashlib.sha256(obj.tobytes()).hexdigest())
+  if isinstance(obj, numpy.generic):
+    return repr(obj)
+  code = getattr(obj, "__code__", obj)
+  if hasattr(code, "co_code"):
+    return "<func %s %s %s>" % (
+      getattr(obj, "__name__", "?"), hashlib.sha256(code.co_code).hexdigest(), _get_hashable_repr(code.co_consts))
+  if isinstance(obj, type) or type(obj).__name__ == "module":
+    return "<%s %s>" % (type(obj).__name__, getattr(obj, "__name__", "?"))
+  s = repr(obj)
+  if " at 0x" in s:  # default object repr, does not contain the state
+    raise NotCacheable("no deterministic repr for %s" % s)
+  return "<%s %s>" % (type(obj).__name__, s)
+
+
+def get_code_version():
+  """
+  :return: hash of all RETURNN source files and the TF version
+  :rtype: str
+  """
+  from Util import describe_tensorflow_version
+  returnn_dir = os.path.dirname(os.path.abspath(__file__))
+  h = hashlib.sha256()
+  for filename in sorted(os.listdir(returnn_dir)):
+    if filename.endswith(".py"):
+      with open("%s/%s" % (returnn_dir, filename), "rb") as f:
+        h.update(filename.encode("utf8"))
+        h.update(f.read())
+  h.update(describe_tensorflow_version().encode("utf8"))
+  h.update(("%i.%i" % sys.version_info[:2]).encode("utf8"))
+  return h.hexdigest()
+
+
+class CachedLayer(LayerBase):
+  """
+  Layer restored from the graph cache.
+  The output and the params are taken from the imported graph. Nothing is constructed here.
+  """
+
+  def __init__(self, layer_class, params, search_choices=None, stats=None, **kwargs):
+    """
+    :param str layer_class: of the original layer
+    :param dict[str,tf.Variable] params:
+    :param _CachedSearchChoices|None search_choices:
+    :param dict[str,tf.Tensor]|None stats:
+    """
+    super(CachedLayer, self).__init__(**kwargs)
+    self.layer_class = layer_class
+    self.params.update(params)
+    self.search_choices = search_choices
+    self.stats.update(stats or {})
+
+
+class CachedNetwork(TFNetwork):
+  """
+  Network restored from the graph cache.
+  The objective (losses) is part of the cached graph, and we just set it when it is requested.
+  """
+
+  def __init__(self, **kwargs):
+    super(CachedNetwork, self).__init__(**kwargs)
+    self.cached_objective = None  # type: None|(dict[str,_CachedLossHolder],tf.Tensor|int,tf.Tensor|int,tf.Tensor|int,set[str])
+
+  def _construct_objective(self):
+    if not self.cached_objective:
+      # Not cached because eval_flag was not set. This will not have any losses then.
+      super(CachedNetwork, self)._construct_objective()
+      return
+    losses_dict, self.total_loss, self.total_constraints, self.total_objective, used_data_keys = self.cached_objective
+    self.losses_dict.clear()
+    self.losses_dict.update(losses_dict)
+    self.used_data_keys.update(used_data_keys)
+
+
+class _CachedSearchChoices:
+  def __init__(self, beam_size, beam_scores):
+    """
+    :param int beam_size:
+    :param tf.Tensor beam_scores: (batch, beam)
+    """
+    self.beam_size = beam_size
+    self.beam_scores = beam_scores
+
+
+class _CachedLossHolder:
+  """
+  Provides the interface of :class:`LossHolder` which is used by the engine for eval.
+  """
+
+  def __init__(self, name, loss_value, error_value, norm_factor, only_on_eval):
+    """
+    :param str name:
+    :param tf.Tensor|None loss_value:
+    :param tf.Tensor|None error_value:
+    :param tf.Tensor|float norm_factor:
+    :param bool only_on_eval:
+    """
+    self.name = name
+    self._loss_value = loss_value
+    self._error_value = error_value
+    self._norm_factor = norm_factor
+    self._only_on_eval = only_on_eval
+
+  def get_only_on_eval(self):
+    return self._only_on_eval
+
+  def get_loss_value_for_fetch(self):
+    return self._loss_value
+
+  def get_error_value(self):
+    return self._error_value
+
+  def get_norm_factor(self):
+    return self._norm_factor
+
+
+class NotCacheable(Exception):
+  """
+  The network graph cannot be serialized.
+  """
+
+
+def _encode(x):
+  """
+  :param tf.Tensor|tf.Variable|int|float|None x:
+  :return: tensor name or plain value
+  :rtype: (str,str|int|float|None)
+  """
+  if isinstance(x, tf.Variable):
+    return "var", x.op.name
+  if isinstance(x, tf.Tensor):
+    return "tensor", x.name
+  if x is None or isinstance(x, (int, float)):
+    return "value", x
+  raise NotCacheable("cannot encode %r" % (x,))
+
+
+def _decode(graph, x, variables):
+  """
+  :param tf.Graph graph:
+  :param (str,str|int|float|None) x: via :func:`_encode`
+  :param dict[str,tf.Variable] variables: op name -> var
+  :rtype: tf.Tensor|tf.Variable|int|float|None
+  """
+  kind, value = x
+  if kind == "var":
+    return variables[value]
+  if kind == "tensor":
+    return graph.get_tensor_by_name(value)
+  return value
+
+
+def _encode_data(data):
+  """
+  :param Data data:
+  :rtype: dict[str]
+  """
+  return {
+    "kwargs": data.get_kwargs(),
+    "placeholder": _encode(data.placeholder),
+    "size_placeholder": {i: _encode(size) for (i, size) in data.size_placeholder.items()}}
+
+
+def _decode_data(graph, d, variables):
+  """
+  :param tf.Graph graph:
+  :param dict[str] d: via :func:`_encode_data`
+  :param dict[str,tf.Variable] variables:
+  :rtype: Data
+  """
+  return Data(
+    placeholder=_decode(graph, d["placeholder"], variables),
+    size_placeholder={i: _decode(graph, size, variables) for (i, size) in d["size_placeholder"].items()},
+    **d["kwargs"])
+
+
+class GraphCache(object):
+  """
+  Stores and restores the constructed network graphs in a directory.
+  """
+
+  def __init__(self, cache_dir):
+    """
+    :param str cache_dir:
+    """
+    self.cache_dir = cache_dir
+
+  def get_key(self, net_dict, config, eval_flag, search_flag):
+    """
+    :param dict[str,dict[str]] net_dict:
+    :param Config.Config config:
+    :param bool eval_flag:
+    :param bool search_flag:
+    :rtype: str
+    """
+    config_dict = {}
+    for d in [config.dict, config.typed_dict]:
+      for key, value in d.items():
+        if key.startswith("_") or key in _ConfigIgnoreKeys:
+          continue
+        config_dict[key] = value
+    s = _get_hashable_repr({
+      "net_dict": net_dict, "config": config_dict, "eval_flag": eval_flag, "search_flag": search_flag,
+      "code": get_code_version()})
+    return hashlib.sha256(s.encode("utf8")).hexdigest()[:32]
+
+  def _get_filename_prefix(self, key):
+    """
+    :param str key:
+    :rtype: str
+    """
+    return "%s/%s" % (self.cache_dir, key)
+
+  def save(self, key, network):
+    """
+    Stores the current default graph with the network metadata.
+
+    :param str key: via :func:`get_key`
+    :param TFNetwork network: constructed, in the current default graph. not for training
+    :return: whether it was stored
+    :rtype: bool
+    """
+    from Util import betterRepr
+    from TFUtil import OpCodeCompiler
+    assert network.train_flag is False
+    assert network.total_objective is None, "expected to be called directly after the construction"
+    graph = tf.get_default_graph()
+    try:
+      meta = self._get_network_meta(network)
+      op_types = set([op.type for op in graph.get_operations()])
+      if op_types.intersection(_PyFuncOpTypes):
+        raise NotCacheable("graph contains Python functions %s" % sorted(op_types.intersection(_PyFuncOpTypes)))
+      meta["op_libraries"] = list(OpCodeCompiler.loaded_op_libraries)
+      try:
+        meta_raw = pickle.dumps(meta, protocol=2)
+      except Exception as exc:
+        raise NotCacheable("cannot pickle network metadata: %s" % exc)
+    except NotCacheable as exc:
+      print("TF graph cache: cannot store network: %s" % exc, file=log.v3)
+      return False
+    if not os.path.exists(self.cache_dir):
+      os.makedirs(self.cache_dir)
+    prefix = self._get_filename_prefix(key)
+    tmp_suffix = ".tmp.%i" % os.getpid()
+    tf.train.export_meta_graph(
+      filename=prefix + ".meta" + tmp_suffix, graph=graph,
+      collection_list=[
+        tf.GraphKeys.GLOBAL_VARIABLES, tf.GraphKeys.TRAINABLE_VARIABLES, tf.GraphKeys.LOCAL_VARIABLES,
+        tf.GraphKeys.GLOBAL_STEP, tf.GraphKeys.UPDATE_OPS])
+    with open(prefix + ".pkl" + tmp_suffix, "wb") as f:
+      f.write(meta_raw)
+    with open(prefix + ".txt", "w") as f:
+      f.write(betterRepr(network.layers_desc))
+      f.write("\n")
+    # The meta graph last, as we check for that in load().
+    os.rename(prefix + ".pkl" + tmp_suffix, prefix + ".pkl")
+    os.rename(prefix + ".meta" + tmp_suffix, prefix + ".meta")
+    print("TF graph cache: stored network graph in %s.meta." % prefix, file=log.v3)
+    return True
+
+  @staticmethod
+  def _get_network_meta(network):
+    """
+    :param TFNetwork network:
+    :rtype: dict[str]
+    """
+    for var in tf.global_variables():
+      if getattr(var, "custom_post_init", None):
+        # E.g. the KenLM vocab. We cannot restore the Python function.
+        raise NotCacheable("variable %r has custom_post_init" % var)
+    layers = {}
+    for name, layer in network.layers.items():
+      assert isinstance(layer, LayerBase)
+      for param in layer.get_saveable_params_dict().values():
+        if not isinstance(param, tf.Variable):
+          raise NotCacheable("layer %r has custom saveable param %r" % (name, param))
+      search_choices = None
+      if layer.output.beam_size:
+        choices = layer.get_search_choices()
+        if choices and choices.beam_scores is not None:
+          search_choices = (choices.beam_size, _encode(choices.beam_scores))
+      target = layer.target
+      if target and target.startswith("layer:"):
+        target = None  # would need the loss target, see Runner._get_fetches_dict
+      layers[name] = {
+        "layer_class": layer.layer_class,
+        "output": _encode_data(layer.output),
+        "params": {param_name: param.op.name for (param_name, param) in layer.params.items()},
+        "not_saveable_params": sorted([
+          param_name for (param_name, param) in layer.params.items()
+          if layer.saveable_param_replace.get(param, param) is None]),
+        "is_output_layer": layer.is_output_layer(),
+        "target": target,
+        "only_on_eval": layer.only_on_eval,
+        "search_choices": search_choices,
+        "stats": {k: _encode(v) for (k, v) in layer.stats.items()}}
+    objective = None
+    used_data_keys = set(network.used_data_keys)
+    if network.eval_flag:
+      # The objective is constructed lazily, e.g. only if we eval, and then it also marks the targets as used.
+      # Construct it now, such that it is part of the graph, but then reset the state,
+      # such that the targets are only needed when it is really used.
+      try:
+        network.maybe_construct_objective()
+        losses = {}
+        for name, loss in network.losses_dict.items():
+          assert isinstance(loss, LossHolder)
+          losses[name] = {
+            "loss_value": _encode(loss.get_loss_value_for_fetch()),
+            "error_value": _encode(loss.get_error_value()),
+            "norm_factor": _encode(loss.get_norm_factor()),
+            "only_on_eval": loss.get_only_on_eval()}
+        objective = {
+          "losses": losses,
+          "total_loss": _encode(network.total_loss),
+          "total_constraints": _encode(network.total_constraints),
+          "total_objective": _encode(network.total_objective),
+          "used_data_keys": sorted(network.used_data_keys)}
+      finally:
+        network.losses_dict.clear()
+        network.total_loss = network.total_constraints = network.total_objective = None
+        network.used_data_keys = used_data_keys
+    return {
+      "extern_data": {key: _encode_data(data) for (key, data) in network.extern_data.data.items()},
+      "default_input": network.extern_data.default_input,
+      "default_target": network.extern_data.default_target,
+      "layers": layers,
+      "objective": objective,
+      "recurrent": network.recurrent,
+      "used_data_keys": sorted(used_data_keys),
+      "global_train_step": network.global_train_step.op.name,
+      "epoch_step": _encode(network.epoch_step),
+      "extra_vars_to_save": [v.op.name for v in network.extra_vars_to_save]}
+
+  def load(self, key, config, rnd_seed, eval_flag, search_flag):
+    """
+    Imports the cached graph into the current default graph, which is expected to be empty.
+
+    :param str key: via :func:`get_key`
+    :param Config.Config config:
+    :param int rnd_seed:
+    :param bool eval_flag:
+    :param bool search_flag:
+    :return: restored network, or None if not in the cache
+    :rtype: TFNetwork|None
+    """
+    prefix = self._get_filename_prefix(key)
+    if not os.path.exists(prefix + ".meta"):
+      return None
+    graph = tf.get_default_graph()
+    try:
+      with open(prefix + ".pkl", "rb") as f:
+        meta = pickle.load(f)
+      for filename in meta["op_libraries"]:
+        if not os.path.exists(filename):
+          print("TF graph cache: op library %r does not exist anymore, ignore cache." % filename, file=log.v3)
+          return None
+        tf.load_op_library(filename)
+    except Exception as exc:
+      print("TF graph cache: cannot load %s.pkl, ignore cache: %s" % (prefix, exc), file=log.v3)
+      return None
+    num_ops = len(graph.get_operations())
+    try:
+      tf.train.import_meta_graph(prefix + ".meta")
+    except Exception as exc:
+      if len(graph.get_operations()) != num_ops:
+        raise  # partially imported, we cannot recover from that
+      print("TF graph cache: cannot import %s.meta, ignore cache: %s" % (prefix, exc), file=log.v3)
+      return None
+    variables = {v.op.name: v for v in tf.global_variables()}
+
+    extern_data = ExternData(default_input=meta["default_input"], default_target=meta["default_target"])
+    for key_, d in meta["extern_data"].items():
+      extern_data.data[key_] = _decode_data(graph, d, variables)
+    network = CachedNetwork(
+      name="root", config=config, extern_data=extern_data, rnd_seed=rnd_seed,
+      train_flag=False, eval_flag=eval_flag, search_flag=search_flag,
+      global_train_step=variables[meta["global_train_step"]])
+    network.recurrent = meta["recurrent"]
+    network.used_data_keys.update(meta["used_data_keys"])
+    network.epoch_step = _decode(graph, meta["epoch_step"], variables)
+    network.extra_vars_to_save = [variables[name] for name in meta["extra_vars_to_save"]]
+    for name, d in sorted(meta["layers"].items()):
+      search_choices = None
+      if d["search_choices"]:
+        beam_size, beam_scores = d["search_choices"]
+        search_choices = _CachedSearchChoices(beam_size=beam_size, beam_scores=_decode(graph, beam_scores, variables))
+      layer = CachedLayer(
+        name=name, network=network, layer_class=d["layer_class"],
+        output=_decode_data(graph, d["output"], variables),
+        params={param_name: variables[var_name] for (param_name, var_name) in d["params"].items()},
+        search_choices=search_choices,
+        stats={k: _decode(graph, v, variables) for (k, v) in d["stats"].items()},
+        is_output_layer=d["is_output_layer"], target=d["target"], only_on_eval=d["only_on_eval"])
+      for param_name in d["not_saveable_params"]:
+        layer.saveable_param_replace[layer.params[param_name]] = None
+      network.layers[name] = layer
+    if meta["objective"]:
+      objective = meta["objective"]
+      network.cached_objective = (
+        {name: _CachedLossHolder(
+          name=name,
+          loss_value=_decode(graph, d["loss_value"], variables),
+          error_value=_decode(graph, d["error_value"], variables),
+          norm_factor=_decode(graph, d["norm_factor"], variables),
+          only_on_eval=d["only_on_eval"])
+         for (name, d) in objective["losses"].items()},
+        _decode(graph, objective["total_loss"], variables),
+        _decode(graph, objective["total_constraints"], variables),
+        _decode(graph, objective["total_objective"], variables),
+        set(objective["used_data_keys"]))
+    print("TF graph cache: restored network graph from %s.meta." % prefix, file=log.v3)
+    return network
@@ -18,7 +18,11 @@ kenlm_dir = returnn_dir + "/extern/kenlm"
 # https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/framework/tensor_types.h
 # https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/lib/strings/str_util.h
 _src_code = """
+#include <cstring>
 #include <exception>
+#include <list>
+#include <unordered_map>
+#include <vector>
 #include "tensorflow/core/framework/op.h"
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/shape_inference.h"
@@ -53,6 +57,57 @@ REGISTER_OP("KenLmAbsScoreStrings")
 .Doc("KenLmScoreStrings: scores texts. returns in +log space (natural log, not base 10)");
 
 
+REGISTER_OP("KenLmAbsScoreStringsPrefixCached")
+.Input("handle: resource")
+.Input("strings: string")
+.Output("scores: float32")
+.SetShapeFn([](::tensorflow::shape_inference::InferenceContext* c) {
+  c->set_output(0, c->input(1));
+  return Status::OK();
+})
+.Doc("KenLmAbsScoreStringsPrefixCached: like KenLmAbsScoreStrings, but common word prefixes of the strings"
+  " (e.g. in an N-best list) are only scored once."
+  " returns in +log space (natural log, not base 10)");
+
+
+REGISTER_OP("KenLmNextStates")
+.Input("handle: resource")
+.Input("bpe_merge_symbol: string")
+.Input("prev_states: string")
+.Input("new_inputs: string")
+.Output("next_states: string")
+.Output("scores: float32")
+.SetShapeFn([](::tensorflow::shape_inference::InferenceContext* c) {
+  c->set_output(0, c->input(2));
+  c->set_output(1, c->input(2));
+  return Status::OK();
+})
+.Doc("KenLmNextStates: appends the new inputs to the hyp states (empty string is the initial state)."
+  " returns the new states and the abs scores, like KenLmAbsScoreBpeStrings on the accumulated strings,"
+  " in +log space (natural log, not base 10)."
+  " each step only scores the new words, and the scores are cached per (state, word).");
+
+
+REGISTER_OP("KenLmNextStatesDense")
+.Input("handle: resource")
+.Input("bpe_merge_symbol: string")
+.Input("prev_states: string")
+.Input("new_inputs: string")
+.Input("labels: string")
+.Output("next_states: string")
+.Output("scores: float32")
+.Output("dense_scores: float32")
+.SetShapeFn([](::tensorflow::shape_inference::InferenceContext* c) {
+  c->set_output(0, c->input(2));
+  c->set_output(1, c->input(2));
+  ::tensorflow::shape_inference::ShapeHandle out_shape;
+  TF_RETURN_IF_ERROR(c->Concatenate(c->input(2), c->input(4), &out_shape));
+  c->set_output(2, out_shape);
+  return Status::OK();
+})
+.Doc("KenLmNextStatesDense: like KenLmNextStates, but with scores like KenLmAbsScoreBpeStringsDense.");
+
+
 REGISTER_OP("KenLmAbsScoreBpeStrings")
 .Input("handle: resource")
 .Input("bpe_merge_symbol: string")
@@ -112,6 +167,40 @@ struct KenLmModel : public ResourceBase {
     return total * logf(10.);
   }
 
+  // Like abs_score, for all texts, but we keep the LM state of each word prefix in a prefix tree,
+  // such that common prefixes (e.g. of the hyps of an N-best list) are only scored once.
+  // KenLM queries are const and thread-safe, thus we don't lock mu_ here,
+  // such that multiple ops (e.g. in parallel session runs) can score concurrently.
+  void abs_scores_prefix_cached(TTypes<string>::ConstFlat texts, TTypes<float>::Flat out_scores) {
+    struct PrefixNode {
+      lm::ngram::State state;
+      float score;
+      std::unordered_map<lm::WordIndex, size_t> children;
+    };
+    std::vector<PrefixNode> nodes(1);
+    model_.BeginSentenceWrite(&nodes[0].state);
+    nodes[0].score = 0;
+    for(int i = 0; i < texts.size(); ++i) {
+      size_t node_idx = 0;
+      for(const string& word : tensorflow::str_util::Split(texts(i), ' ')) {
+        if(word.empty()) continue;
+        auto word_idx = model_.BaseVocabulary().Index(word);
+        auto it = nodes[node_idx].children.find(word_idx);
+        if(it != nodes[node_idx].children.end()) {
+          node_idx = it->second;
+          continue;
+        }
+        PrefixNode child;
+        child.score = nodes[node_idx].score + model_.FullScore(nodes[node_idx].state, word_idx, child.state).prob;
+        nodes.push_back(child);
+        nodes[node_idx].children[word_idx] = nodes.size() - 1;
+        node_idx = nodes.size() - 1;
+      }
+      // See abs_score about log10.
+      out_scores(i) = nodes[node_idx].score * logf(10.);
+    }
+  }
+
   // See comments below.
   // We expect that the text either ends with a space or not, i.e. "... word " or "... subword".
   float abs_score_dense(
@@ -151,13 +240,144 @@ struct KenLmModel : public ResourceBase {
     return total_score * logf(10.);
   }
 
+  // State of a hypothesis for KenLmNextStates, serialized as string, see below.
+  struct HypState {
+    lm::ngram::State state;  // after all complete words
+    float score;  // log10 score of all complete words
+    string pending;  // incomplete last word (BPE merged), or empty
+  };
+
+  static string serialize_hyp_state(const HypState& hyp) {
+    string s(sizeof(lm::ngram::State) + sizeof(float), '\0');
+    std::memcpy(&s[0], &hyp.state, sizeof(lm::ngram::State));
+    std::memcpy(&s[sizeof(lm::ngram::State)], &hyp.score, sizeof(float));
+    s += hyp.pending;
+    return s;
+  }
+
+  // The empty string is the initial state (begin of sentence).
+  bool deserialize_hyp_state(const string& s, HypState* hyp) {
+    if(s.empty()) {
+      model_.BeginSentenceWrite(&hyp->state);
+      hyp->score = 0;
+      hyp->pending.clear();
+      return true;
+    }
+    const size_t header_size = sizeof(lm::ngram::State) + sizeof(float);
+    if(s.size() < header_size)
+      return false;
+    std::memcpy(&hyp->state, s.data(), sizeof(lm::ngram::State));
+    std::memcpy(&hyp->score, s.data() + sizeof(lm::ngram::State), sizeof(float));
+    hyp->pending = s.substr(header_size);
+    return true;
+  }
+
+  // Appends the input to the hyp, with BPE merging like KenLmAbsScoreBpeStrings,
+  // and scores all words which are complete now.
+  void hyp_append(HypState* hyp, const string& input, const string& bpe_merge_symbol) {
+    string text = hyp->pending + input;
+    if(!bpe_merge_symbol.empty())
+      text = tensorflow::str_util::StringReplace(text, bpe_merge_symbol + " ", "", /* replace_all */ true);
+    std::vector<string> words = tensorflow::str_util::Split(text, ' ');
+    // The last entry is the incomplete word, or empty if the text ends with a space.
+    for(int i = 0; i + 1 < (int) words.size(); ++i) {
+      if(words[i].empty()) continue;
+      lm::ngram::State out_state;
+      hyp->score += cached_score(hyp->state, model_.BaseVocabulary().Index(words[i]), &out_state);
+      hyp->state = out_state;
+    }
+    hyp->pending = words.empty() ? string() : words[words.size() - 1];
+  }
+
+  // Like abs_score on the BPE-merged accumulated string (see KenLmAbsScoreBpeStrings). log10.
+  float hyp_abs_score(const HypState& hyp) {
+    float total = hyp.score;
+    if(!hyp.pending.empty()) {
+      lm::ngram::State out_state;
+      total += cached_score(hyp.state, model_.BaseVocabulary().Index(hyp.pending), &out_state);
+    }
+    return total;
+  }
+
+  // Like abs_score_dense (see KenLmAbsScoreBpeStringsDense). log10.
+  float hyp_abs_score_dense(
+        const HypState& hyp, const string& last_word_join,
+        const TTypes<string>::ConstFlat labels, TTypes<float>::UnalignedFlat out_dense_scores) {
+    assert(labels.size() == out_dense_scores.size());
+    lm::ngram::State out_state;
+    for(int i = 0; i < labels.size(); ++i) {
+      auto word_idx = model_.BaseVocabulary().Index(hyp.pending + labels(i));
+      out_dense_scores(i) = hyp.score + cached_score(hyp.state, word_idx, &out_state);
+    }
+    float total = hyp.score;
+    if(!hyp.pending.empty())
+      total += cached_score(hyp.state, model_.BaseVocabulary().Index(hyp.pending + last_word_join), &out_state);
+    return total;
+  }
+
+  // model_.FullScore(...).prob, with a LRU cache of (state, word) -> (out_state, score),
+  // as during search, the same hyp states are scored again and again.
+  // KenLM queries are const and thread-safe, thus we only lock the cache.
+  float cached_score(const lm::ngram::State& in_state, lm::WordIndex word_idx, lm::ngram::State* out_state) {
+    ScoreCacheKey key;
+    key.state = in_state;
+    key.word_idx = word_idx;
+    {
+      mutex_lock l(score_cache_mu_);
+      auto it = score_cache_map_.find(key);
+      if(it != score_cache_map_.end()) {
+        score_cache_list_.splice(score_cache_list_.begin(), score_cache_list_, it->second);
+        *out_state = it->second->second.out_state;
+        return it->second->second.score;
+      }
+    }
+    ScoreCacheValue value;
+    value.score = model_.FullScore(in_state, word_idx, value.out_state).prob;
+    {
+      mutex_lock l(score_cache_mu_);
+      if(score_cache_map_.find(key) == score_cache_map_.end()) {
+        score_cache_list_.push_front(std::make_pair(key, value));
+        score_cache_map_[key] = score_cache_list_.begin();
+        if(score_cache_map_.size() > score_cache_max_size_) {
+          score_cache_map_.erase(score_cache_list_.back().first);
+          score_cache_list_.pop_back();
+        }
+      }
+    }
+    *out_state = value.out_state;
+    return value.score;
+  }
+
   string DebugString() override {
     return strings::StrCat("KenLmModel[", filename_, "]");
   }
 
+  struct ScoreCacheKey {
+    lm::ngram::State state;
+    lm::WordIndex word_idx;
+    bool operator==(const ScoreCacheKey& other) const {
+      return word_idx == other.word_idx && state == other.state;
+    }
+  };
+  struct ScoreCacheKeyHash {
+    size_t operator()(const ScoreCacheKey& key) const {
+      return lm::ngram::hash_value(key.state, key.word_idx);
+    }
+  };
+  struct ScoreCacheValue {
+    lm::ngram::State out_state;
+    float score;
+  };
+  typedef std::list<std::pair<ScoreCacheKey, ScoreCacheValue> > ScoreCacheList;
+
   const string filename_;
   mutex mu_;
   lm::ngram::ProbingModel model_ GUARDED_BY(mu_);
+  mutex score_cache_mu_;
+  const size_t score_cache_max_size_ = 1 << 18;
+  ScoreCacheList score_cache_list_ GUARDED_BY(score_cache_mu_);
+  std::unordered_map<ScoreCacheKey, ScoreCacheList::iterator, ScoreCacheKeyHash> score_cache_map_
+    GUARDED_BY(score_cache_mu_);
 };
 
 
@@ -227,6 +447,112 @@ class KenLmAbsScoreStringsOp : public OpKernel {
 REGISTER_KERNEL_BUILDER(Name("KenLmAbsScoreStrings").Device(DEVICE_CPU), KenLmAbsScoreStringsOp);
 
 
+class KenLmAbsScoreStringsPrefixCachedOp : public OpKernel {
+ public:
+  using OpKernel::OpKernel;
+
+  void Compute(OpKernelContext* context) override {
+    KenLmModel* lm;
+    {
+      const Tensor* handle;
+      OP_REQUIRES_OK(context, context->input("handle", &handle));
+      OP_REQUIRES_OK(context, GetResourceFromContext(context, "handle", &lm));
+    }
+    core::ScopedUnref unref(lm);
+
+    const Tensor& input_tensor = context->input(1);
+    auto input_flat = input_tensor.flat<string>();
+
+    Tensor* output_tensor = NULL;
+    OP_REQUIRES_OK(context, context->allocate_output(0, input_tensor.shape(), &output_tensor));
+    auto output_flat = output_tensor->flat<float>();
+
+    lm->abs_scores_prefix_cached(input_flat, output_flat);
+  }
+};
+
+REGISTER_KERNEL_BUILDER(
+  Name("KenLmAbsScoreStringsPrefixCached").Device(DEVICE_CPU), KenLmAbsScoreStringsPrefixCachedOp);
+
+
+class KenLmNextStatesOp : public OpKernel {
+ public:
+  using OpKernel::OpKernel;
+
+  void Compute(OpKernelContext* context) override {
+    KenLmModel* lm;
+    {
+      const Tensor* handle;
+      OP_REQUIRES_OK(context, context->input("handle", &handle));
+      OP_REQUIRES_OK(context, GetResourceFromContext(context, "handle", &lm));
+    }
+    core::ScopedUnref unref(lm);
+
+    OP_REQUIRES(context, context->input(1).NumElements() == 1,
+      errors::InvalidArgument(
+        "bpe_merge_symbol must be a single element but got shape ",
+        context->input(1).shape().DebugString()));
+    const string& bpe_merge_symbol = context->input(1).flat<string>()(0);
+
+    const Tensor& prev_states_tensor = context->input(2);
+    auto prev_states_flat = prev_states_tensor.flat<string>();
+    const Tensor& new_inputs_tensor = context->input(3);
+    auto new_inputs_flat = new_inputs_tensor.flat<string>();
+    OP_REQUIRES(context, prev_states_tensor.shape() == new_inputs_tensor.shape(),
+      errors::InvalidArgument(
+        "prev_states and new_inputs shape mismatch: ",
+        prev_states_tensor.shape().DebugString(), " vs ", new_inputs_tensor.shape().DebugString()));
+    const bool dense = context->num_inputs() > 4;
+
+    Tensor* next_states_tensor = NULL;
+    OP_REQUIRES_OK(context, context->allocate_output(0, prev_states_tensor.shape(), &next_states_tensor));
+    auto next_states_flat = next_states_tensor->flat<string>();
+    Tensor* scores_tensor = NULL;
+    OP_REQUIRES_OK(context, context->allocate_output(1, prev_states_tensor.shape(), &scores_tensor));
+    auto scores_flat = scores_tensor->flat<float>();
+
+    Tensor output_dense_flat_tensor;
+    if(dense) {
+      const Tensor& labels_tensor = context->input(4);
+      Tensor* output_dense_tensor = NULL;
+      TensorShape output_dense_shape(prev_states_tensor.shape());
+      output_dense_shape.AppendShape(labels_tensor.shape());
+      OP_REQUIRES_OK(context, context->allocate_output(2, output_dense_shape, &output_dense_tensor));
+      OP_REQUIRES(context,
+        output_dense_flat_tensor.CopyFrom(
+          *output_dense_tensor,
+          TensorShape({prev_states_tensor.NumElements(), labels_tensor.NumElements()})),
+        errors::Internal("CopyFrom failed"));
+    }
+
+    KenLmModel::HypState hyp;
+    for(int i = 0; i < prev_states_flat.size(); ++i) {
+      OP_REQUIRES(context, lm->deserialize_hyp_state(prev_states_flat(i), &hyp),
+        errors::InvalidArgument("invalid KenLM hyp state"));
+      lm->hyp_append(&hyp, new_inputs_flat(i), bpe_merge_symbol);
+      next_states_flat(i) = KenLmModel::serialize_hyp_state(hyp);
+      float score;
+      if(dense)
+        score = lm->hyp_abs_score_dense(
+          hyp, bpe_merge_symbol, context->input(4).flat<string>(),
+          output_dense_flat_tensor.Slice(i, i + 1).unaligned_flat<float>());
+      else
+        score = lm->hyp_abs_score(hyp);
+      // See abs_score about log10.
+      scores_flat(i) = score * logf(10.);
+    }
+    if(dense) {
+      auto dense_flat = output_dense_flat_tensor.flat<float>();
+      for(int i = 0; i < dense_flat.size(); ++i)
+        dense_flat(i) *= logf(10.);
+    }
+  }
+};
+
+REGISTER_KERNEL_BUILDER(Name("KenLmNextStates").Device(DEVICE_CPU), KenLmNextStatesOp);
+REGISTER_KERNEL_BUILDER(Name("KenLmNextStatesDense").Device(DEVICE_CPU), KenLmNextStatesOp);
+
+
 class KenLmAbsScoreBpeStringsOp : public OpKernel {
  public:
   using OpKernel::OpKernel;
@@ -334,10 +660,13 @@ _kenlm_src_code_workarounds = """
 _tf_mod = None
 
 
-def get_tf_mod(verbose=False):
-  global _tf_mod
-  if _tf_mod:
-    return _tf_mod
+def get_tf_mod_compiler(verbose=False):
+  """
+  This will not compile yet. See :func:`get_tf_mod`.
+
+  :param bool verbose:
+  :rtype: TFUtil.OpCodeCompiler
+  """
   import platform
   from glob import glob
   from TFUtil import OpCodeCompiler
@@ -374,13 +703,20 @@ def get_tf_mod(verbose=False):
   src_code += "\n\n// ------------ our code now: ------------\n\n"
   src_code += _src_code
 
-  compiler = OpCodeCompiler(
-    base_name="KenLM", code_version=1, code=src_code,
+  return OpCodeCompiler(
+    base_name="KenLM", code_version=3, code=src_code,
     include_paths=(kenlm_dir, kenlm_dir + "/util/double-conversion"),
     c_macro_defines={"NDEBUG": 1, "KENLM_MAX_ORDER": 6, "HAVE_ZLIB": 1},
     ld_flags=["-l%s" % lib for lib in libs],
     is_cpp=True, use_cuda_if_available=False,
     verbose=verbose)
+
+
+def get_tf_mod(verbose=False):
+  global _tf_mod
+  if _tf_mod:
+    return _tf_mod
+  compiler = get_tf_mod_compiler(verbose=verbose)
   tf_mod = compiler.load_tf_module()
   assert hasattr(tf_mod, "ken_lm_abs_score_strings"), "content of mod: %r" % (dir(tf_mod),)
   _tf_mod = tf_mod
@@ -406,6 +742,55 @@ def ken_lm_abs_score_strings(handle, strings):
   return get_tf_mod().ken_lm_abs_score_strings(handle=handle, strings=strings)
 
 
+def ken_lm_abs_score_strings_prefix_cached(handle, strings):
+  """
+  Like :func:`ken_lm_abs_score_strings`, but common word prefixes of the strings are only scored once.
+  This is useful for N-best lists, where all the strings of an utterance should be passed at once.
+
+  :param tf.Tensor handle: TF resource handle returned by :func:`ken_lm_load`
+  :param tf.Tensor strings: strings which are being scores. white-space delimited words.
+  :return: same shape as `strings`, float32
+  :rtype: tf.Tensor
+  """
+  return get_tf_mod().ken_lm_abs_score_strings_prefix_cached(handle=handle, strings=strings)
+
+
+def ken_lm_next_states(handle, bpe_merge_symbol, prev_states, new_inputs):
+  """
+  Keeps the KenLM state per hypothesis, such that each step only needs to score the new words.
+  The states are string tensors (the KenLM state serialized), thus they can be reordered like any other tensor,
+  e.g. via :func:`TFUtil.select_src_beams`.
+
+  :param tf.Tensor handle: TF resource handle returned by :func:`ken_lm_load`
+  :param str bpe_merge_symbol: e.g. "@@", or "" for no BPE merging
+  :param tf.Tensor prev_states: string. the empty string is the initial state
+  :param tf.Tensor new_inputs: string, same shape as `prev_states`. new (sub)words, e.g. "hello " or "wor@@ "
+  :return: (next_states, scores), both same shape as `prev_states`.
+    scores (float32) are the same as :func:`ken_lm_abs_score_bpe_strings` on the accumulated strings
+  :rtype: (tf.Tensor, tf.Tensor)
+  """
+  next_states, scores = get_tf_mod().ken_lm_next_states(
+    handle=handle, bpe_merge_symbol=bpe_merge_symbol, prev_states=prev_states, new_inputs=new_inputs)
+  return next_states, scores
+
+
+def ken_lm_next_states_dense(handle, bpe_merge_symbol, prev_states, new_inputs, labels):
+  """
+  Like :func:`ken_lm_next_states`, with the scores of :func:`ken_lm_abs_score_bpe_strings_dense`.
+
+  :param tf.Tensor handle: TF resource handle returned by :func:`ken_lm_load`
+  :param str bpe_merge_symbol: e.g. "@@", or "" for no BPE merging
+  :param tf.Tensor prev_states: string. the empty string is the initial state
+  :param tf.Tensor new_inputs: string, same shape as `prev_states`
+  :param tf.Tensor|tf.Variable labels:
+  :return: (next_states, scores, dense_scores)
+  :rtype: (tf.Tensor, tf.Tensor, tf.Tensor)
+  """
+  next_states, scores, dense_scores = get_tf_mod().ken_lm_next_states_dense(
+    handle=handle, bpe_merge_symbol=bpe_merge_symbol, prev_states=prev_states, new_inputs=new_inputs, labels=labels)
+  return next_states, scores, dense_scores
+
+
 def ken_lm_abs_score_bpe_strings(handle, bpe_merge_symbol, strings):
   """
   :param tf.Tensor handle: TF resource handle returned by :func:`ken_lm_load`
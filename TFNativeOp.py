@@ -364,6 +364,7 @@ class OpMaker(object):
         #undef Ndarray_sgemm_batched
         #undef DEF_KERNEL
         #undef start_dev_kernel
+        #undef start_dev_kernel_multi_threaded
         #undef assert_cmp
         #undef threadIdx
         #undef blockIdx
@@ -391,9 +392,13 @@ class OpMaker(object):
       code_gpu_op = ""
     return code_header + code_cpu_op + code_gpu_op
 
-  def _make_mod(self):
-    if self.cache_key in self.mod_cache:
-      return self.mod_cache[self.cache_key]
+  def make_compiler(self):
+    """
+    This will not compile yet. See :func:`_make_mod`.
+    Can be used to compile the lib without loading it, e.g. for precompiling.
+
+    :rtype: TFUtil.OpCodeCompiler
+    """
     from Util import find_lib
     # Note about BLAS linkage:
     # TensorFlow (or its Eigen lib) likely has linked against some BLAS lib itself.
@@ -455,13 +460,18 @@ class OpMaker(object):
         have_blas_lib = True
     if not have_blas_lib:
       print("WARNING: OpMaker: no BLAS lib found")
-    comp = TFUtil.OpCodeCompiler(
+    return TFUtil.OpCodeCompiler(
       base_name=self.name, code_version=self.description.code_version,
       code=self._make_code(),
       include_deps=[self.support_native_op_cpp_filename],
       ld_flags=ld_flags,
       use_cuda_if_available=self.with_cuda,
       **dict(self.compiler_opts))
+
+  def _make_mod(self):
+    if self.cache_key in self.mod_cache:
+      return self.mod_cache[self.cache_key]
+    comp = self.make_compiler()
     mod = comp.load_tf_module()
     mod._op_compiler = comp
     self.mod_cache[self.cache_key] = mod
@@ -1061,6 +1071,51 @@ def fast_baum_welch_staircase(am_scores, seq_lens, **opts):
     am_scores=am_scores, edges=edges, weights=weights, start_end_states=start_end_states, float_idx=float_idx)
 
 
+def tf_fast_bw_fsa_from_labels(labels, label_lens, **opts):
+  """
+  :param tf.Tensor labels: (batch, max_label_len), sparse label indices
+  :param tf.Tensor label_lens: (batch,)
+  :param opts: passed to :func:`Fsa.fast_bw_fsa_from_labels`, e.g. topology, blank_idx
+  :return: edges, weights, start_end_states
+  :rtype: (tf.Tensor, tf.Tensor, tf.Tensor)
+  """
+  from Fsa import fast_bw_fsa_from_labels
+
+  def tf_fast_bw_fsa_from_labels_wrapper(labels, label_lens):
+    fsa = fast_bw_fsa_from_labels(labels, label_lens, **opts)
+    return fsa.edges.astype("int32"), fsa.weights.astype("float32"), fsa.start_end_states.astype("int32")
+
+  edges, weights, start_end_states = tf.py_func(
+    tf_fast_bw_fsa_from_labels_wrapper,
+    [labels, label_lens],
+    [tf.int32, tf.float32, tf.int32],
+    stateful=False)
+  # edges: (4, num_edges), edges of the graph (from,to,emission_idx,sequence_idx)
+  # weights: (num_edges,), weights of the edges
+  # start_end_states: (2, batch), (start,end) state idx in automaton.
+  edges.set_shape((4, None))
+  weights.set_shape((None,))
+  start_end_states.set_shape((2, None))
+  return edges, weights, start_end_states
+
+
+def fast_baum_welch_by_labels(am_scores, float_idx, labels, label_lens, **opts):
+  """
+  Full-sum over the FSAs built by :func:`Fsa.fast_bw_fsa_from_labels`, i.e. no Sprint is needed.
+
+  :param tf.Tensor am_scores: (time, batch, dim), in -log space
+  :param tf.Tensor float_idx: (time, batch) -> 0 or 1 (index mask, via seq lens)
+  :param tf.Tensor labels: (batch, max_label_len), sparse label indices
+  :param tf.Tensor label_lens: (batch,)
+  :param opts: passed to :func:`Fsa.fast_bw_fsa_from_labels`, e.g. topology, blank_idx
+  :return: (fwdbwd, obs_scores), fwdbwd is (time, batch, dim), obs_scores is (time, batch), in -log space
+  :rtype: (tf.Tensor, tf.Tensor)
+  """
+  edges, weights, start_end_states = tf_fast_bw_fsa_from_labels(labels, label_lens, **opts)
+  return fast_baum_welch(
+    am_scores=am_scores, edges=edges, weights=weights, start_end_states=start_end_states, float_idx=float_idx)
+
+
 def edit_distance(a, a_len, b, b_len):
   """
   Wraps :class:`NativeOp.EditDistanceOp`.
@@ -191,6 +191,7 @@ class TFNetwork(object):
                train_flag=False, eval_flag=False, search_flag=False,
                parent_layer=None, parent_net=None, extra_parent_net=None,
                is_inside_rec_layer=None,
+               global_train_step=None,
                name=None):
     """
     :param Config.Config config: only needed to init extern_data if not specified explicitly
@@ -203,6 +204,7 @@ class TFNetwork(object):
     :param TFNetwork|None parent_net:
     :param TFNetwork|None extra_parent_net:
     :param bool is_inside_rec_layer: at template construction, use this
+    :param tf.Variable|None global_train_step: if given, will be shared, e.g. with a previous network in the same graph
     :param str name: only for debugging
     """
     if not name:
@@ -251,6 +253,8 @@ class TFNetwork(object):
     self.total_objective = None  # type: tf.Tensor
     if parent_net:
       self.global_train_step = parent_net.global_train_step
+    elif global_train_step is not None:
+      self.global_train_step = global_train_step
     else:
       self.global_train_step = tf.Variable(
         name="global_step", initial_value=0, dtype="int64", collections=[tf.GraphKeys.GLOBAL_STEP], trainable=False)
@@ -853,9 +857,10 @@ class TFNetwork(object):
         num_params += numpy.prod(shape)
     return num_params
 
-  def initialize_params(self, session):
+  def initialize_params(self, session, var_list=None):
     """
     :param tf.Session session:
+    :param list[tf.Variable]|None var_list: by default all params and auxiliary params
 
     Note: This will create a new node to the graph for each call!
     And it will overwrite also the already initialized variables.
@@ -863,7 +868,8 @@ class TFNetwork(object):
     from external sources.
     If you know that you will load all params explicitly, you would not need to call this function.
     """
-    var_list = self.get_params_list() + self.get_auxiliary_params()
+    if var_list is None:
+      var_list = self.get_params_list() + self.get_auxiliary_params()
     with tf.name_scope("var_initializer"):
       initializer_op = tf.variables_initializer(var_list=var_list)
     session.run(initializer_op)
@@ -976,32 +982,23 @@ class TFNetwork(object):
       self.saver = tf.train.Saver(
         var_list=self.get_saveable_params_list(), max_to_keep=2 ** 31 - 1)
 
-  def save_params_to_file(self, filename, session):
+  def save_params_to_file(self, filename, session, async_saver=None):
     """
     Will save the model parameters to the filename.
     Note that the model parameters live inside the current TF session.
     :param str filename:
     :param tf.Session session:
+    :param AsyncCheckpointSaver|None async_saver: if given, the values are fetched now,
+      but the checkpoint is written in the background. See :class:`AsyncCheckpointSaver`.
     """
     import os
     filename = os.path.abspath(filename)  # TF needs absolute path
     if not self.saver:
       self._create_saver()
-    # We add some extra logic to try again for DiskQuota and other errors.
-    # This could save us multiple hours of computation.
-    try_again_wait_time = 10
-    while True:
-      try:
-        self.saver.save(sess=session, save_path=filename)
-        break
-      except IOError as e:
-        import errno, time
-        if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
-          print("Exception while saving:", e, file=log.v3)
-          print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
-          time.sleep(try_again_wait_time)
-          continue
-        raise
+    if async_saver:
+      async_saver.save(network=self, filename=filename, session=session)
+      return
+    call_with_retry_on_io_error(lambda: self.saver.save(sess=session, save_path=filename))
 
   def load_params_from_file(self, filename, session):
     """
@@ -1674,7 +1671,7 @@ class CustomCheckpointLoader:
   """
 
   def __init__(self, filename, saveable_params, params_prefix="", load_if_prefix="", ignore_missing=False,
-               network=None):
+               network=None, num_threads=None, max_bytes_in_flight=2 ** 30):
     """
     :param str filename: filepattern for NewCheckpointReader
     :param list[tf.Variable|tensorflow.python.training.saver.BaseSaverBuilder.SaveableObject] saveable_params:
@@ -1684,8 +1681,20 @@ class CustomCheckpointLoader:
     :param bool ignore_missing: any vars in the model, which are not found in the checkpoint, will be ignored.
       however, if there is no single var in the checkpoint, this is still an error.
     :param TFNetwork network:
+    :param int|None num_threads: for reading the checkpoint in :func:`load_now`. by default depends on the num CPUs
+    :param int max_bytes_in_flight: :func:`load_now` reads and assigns in chunks of at most this size
     """
+    import threading
     self.filename = filename
+    if num_threads is None:
+      from Util import get_number_available_cpus
+      num_threads = min(get_number_available_cpus() or 1, 8)
+    self.num_threads = num_threads
+    self.max_bytes_in_flight = max_bytes_in_flight
+    self._creator_thread = threading.current_thread()
+    self._thread_local = threading.local()
+    self._lock = threading.Lock()
+    self._cudnn_converted = {}  # type: dict[(str,str),dict[str,numpy.ndarray]]
     self.network = network
     self.ignore_missing = ignore_missing
     self.params_prefix = params_prefix
@@ -1804,28 +1813,163 @@ class CustomCheckpointLoader:
     return v_name
 
   class VariableValue:
-    def __init__(self, value=None, custom_param_importer=None):
+    def __init__(self, value=None, custom_param_importer=None, loader=None):
       """
       :param numpy.ndarray|None value:
       :param CustomCheckpointLoader.CustomParamImporter custom_param_importer:
+      :param ((tf.train.CheckpointReader)->numpy.ndarray)|None loader: to read the value lazily
       """
-      assert value is not None or custom_param_importer
+      assert value is not None or custom_param_importer or loader
       self.value = value
       self.custom_param_importer = custom_param_importer
+      self.loader = loader
 
-    def assign_var(self, var, session):
+    def read_value(self, reader):
+      """
+      :param tf.train.CheckpointReader reader:
+      :rtype: numpy.ndarray
+      """
+      if self.value is not None:
+        return self.value
+      assert self.loader
+      return self.loader(reader)
+
+    def assign_var(self, var, session, reader=None):
       """
       :param tf.Variable var:
       :param tf.Session session:
+      :param tf.train.CheckpointReader|None reader: needed if the value is not yet loaded
       """
-      if self.value is not None:
-        VariableAssigner(var=var).assign(value=self.value, session=session)
-      else:
+      if self.custom_param_importer:
         self.custom_param_importer.assign_var(var=var, session=session)
+      else:
+        VariableAssigner(var=var).assign(value=self.read_value(reader), session=session)
+
+  # This map_list can be extended by all the mappings in checkpoint_convert.py.
+  # Old name (in checkpoint) -> new name (current variable name).
+  RenameMapList = {
+    "lstm_cell/biases": "lstm_cell/bias",
+    "lstm_cell/weights": "lstm_cell/kernel",
+    "cudnn/params_canonical/rnn/multi_rnn_cell/cell_0/cudnn_compatible_lstm_cell/bias": "lstm_fused_cell/bias",
+    "cudnn/params_canonical/rnn/multi_rnn_cell/cell_0/cudnn_compatible_lstm_cell/kernel": "lstm_fused_cell/kernel",
+  }
+  CudnnPostfix = "/cudnn/CudnnRNNParamsToCanonical:0"
+
+  # (checkpoint, network vars, ...) -> resolved var name map. See :func:`_resolve_var_name_map`.
+  _var_name_map_cache = {}  # type: dict[tuple,dict[str,tuple]]
+
+  def _get_var_name_map_cache_key(self):
+    """
+    :return: key for the resolved var name map. covers the checkpoint (incl. its mtime) and the network vars
+    :rtype: tuple
+    """
+    import os
+    filename = os.path.realpath(self.filename)
+    index_filename = filename + ".index"
+    mtime = os.path.getmtime(index_filename) if os.path.exists(index_filename) else None
+    return (
+      filename, mtime, self.params_prefix, self.load_if_prefix,
+      tuple(sorted(self.var_net_names)), tuple(sorted(self.var_ckpt_names)))
+
+  def _resolve_var_name_map(self):
+    """
+    Here we try to make matches of missing vars and vars which seem to be obsolete.
+    The result is cached per checkpoint/network pair, and it is pure data (no closures),
+    such that it can be used with any reader (e.g. one reader per thread).
+
+    :return: current var name -> (loader func name, args...). see :func:`_load_by_spec`
+    :rtype: dict[str,tuple]
+    """
+    cache_key = self._get_var_name_map_cache_key()
+    if cache_key in self._var_name_map_cache:
+      return self._var_name_map_cache[cache_key]
+    missing_var_names = self.missing_var_names
+    obsolete_var_names = self.obsolete_var_names
+    var_name_map = {}  # type: dict[str,tuple]  # current name -> spec
+    for v in missing_var_names:
+      if v.endswith("/lstm_cell/kernel"):
+        old_name1 = v[:-len("/lstm_cell/kernel")] + "/W_re"
+        old_name2 = v[:-len("/lstm_cell/kernel")] + "/W"
+        if old_name1 in obsolete_var_names and old_name2 in obsolete_var_names:
+          var_name_map[v] = ("weights_nativelstm_to_basic", old_name1, old_name2)
+      if v.endswith("/lstm_cell/bias"):
+        old_name = v[:-len("/lstm_cell/bias")] + "/b"
+        if old_name in obsolete_var_names:
+          var_name_map[v] = ("bias_nativelstm_to_basic", old_name)
+    for v in obsolete_var_names:
+      for k_old, k_new in self.RenameMapList.items():
+        if v.endswith("/%s" % k_old):
+          v2 = v[:-len(k_old)] + k_new
+          if v2 in missing_var_names:
+            var_name_map[v2] = ("renamed", v)
+            break
+      if v.endswith(self.CudnnPostfix):
+        prefix = v[:-len(self.CudnnPostfix) + 1]
+        target = "lstm_block_wrapper/"
+        for k in [target + "bias", target + "kernel"]:
+          var_name_map[prefix + k] = ("cudnn_rnn", prefix, target, prefix + k)
+    self._var_name_map_cache[cache_key] = var_name_map
+    return var_name_map
+
+  def _load_by_spec(self, reader, spec):
+    """
+    :param tf.train.CheckpointReader reader:
+    :param tuple spec: from :func:`_resolve_var_name_map`
+    :rtype: numpy.ndarray
+    """
+    kind, args = spec[0], spec[1:]
+    if kind == "renamed":
+      old_name, = args
+      return reader.get_tensor(old_name)
+    if kind == "weights_nativelstm_to_basic":
+      old_name1, old_name2 = args
+      # i = input_gate, j = new_input, f = forget_gate, o = output_gate
+      # BasicLSTM: i, j, f, o; Input: [inputs, h]
+      # LstmGenericBase/NativeLstm: j, i, f, o
+      # NativeLstm2: j, i, f, o
+      W_re = reader.get_tensor(old_name1)  # (n_out,n_out*4)
+      W_ff = reader.get_tensor(old_name2)  # (n_in,n_out*4)
+      assert W_re.ndim == W_ff.ndim == 2 and W_re.shape[1] == W_ff.shape[1] and W_re.shape[1] // 4 == W_re.shape[0]
+      W = numpy.concatenate([W_ff, W_re], axis=0)  # (n_in+n_out,n_out*4)
+      W_j, W_i, W_f, W_o = numpy.split(W, 4, axis=1)
+      W = numpy.concatenate([W_i, W_j, W_f, W_o], axis=1)
+      return W
+    if kind == "bias_nativelstm_to_basic":
+      old_name, = args
+      # See weights_nativelstm_to_basic.
+      b = reader.get_tensor(old_name)  # (n_out*4,)
+      assert b.ndim == 1
+      b_j, b_i, b_f, b_o = numpy.split(b, 4, axis=0)
+      b = numpy.concatenate([b_i, b_j, b_f, b_o], axis=0)
+      return b
+    if kind == "cudnn_rnn":
+      prefix, target, key = args
+      # This converts both bias and kernel at once, thus we keep the result until both are read.
+      with self._lock:
+        if (prefix, target) not in self._cudnn_converted:
+          from TFNetworkRecLayer import RecLayer
+          self._cudnn_converted[(prefix, target)] = RecLayer.convert_cudnn_canonical_to_lstm_block(
+            reader=reader, prefix=prefix, target=target)
+        data = self._cudnn_converted[(prefix, target)]
+        value = data.pop(key)
+        if not data:
+          del self._cudnn_converted[(prefix, target)]
+        return value
+    raise Exception("%s: invalid spec %r" % (self, spec))
+
+  def _make_loader(self, spec):
+    """
+    :param tuple spec: from :func:`_resolve_var_name_map`
+    :rtype: (tf.train.CheckpointReader)->numpy.ndarray
+    """
+    return lambda reader: self._load_by_spec(reader=reader, spec=spec)
 
   def get_variable_value_map(self):
     """
-    :return: var -> numpy array
+    Note that the values are not read here yet (except for custom param importers).
+    They are read lazily via :func:`VariableValue.read_value`, or in parallel via :func:`load_now`.
+
+    :return: var -> value
     :rtype: dict[tf.Variable,CustomCheckpointLoader.VariableValue]
     """
     variable_values = {}
@@ -1834,8 +1978,7 @@ class CustomCheckpointLoader:
       for v in self.saveable_params:
         assert isinstance(v, tf.Variable), "not yet implemented otherwise..."
         v_name = self._get_param_name(v)
-        value = self.reader.get_tensor(v_name)
-        variable_values[v] = self.VariableValue(value=value)
+        variable_values[v] = self.VariableValue(loader=self._make_loader(("renamed", v_name)))
       return variable_values
 
     reader = self.reader
@@ -1844,117 +1987,16 @@ class CustomCheckpointLoader:
     var_ckpt_names = self.var_ckpt_names
     var_net_names = self.var_net_names
     missing_var_names = self.missing_var_names
-    obsolete_var_names = self.obsolete_var_names
-
-    # This map_list can be extended by all the mappings in checkpoint_convert.py.
-    # Old name (in checkpoint) -> new name (current variable name).
-    map_list = {
-      "lstm_cell/biases": "lstm_cell/bias",
-      "lstm_cell/weights": "lstm_cell/kernel",
-      "cudnn/params_canonical/rnn/multi_rnn_cell/cell_0/cudnn_compatible_lstm_cell/bias": "lstm_fused_cell/bias",
-      "cudnn/params_canonical/rnn/multi_rnn_cell/cell_0/cudnn_compatible_lstm_cell/kernel": "lstm_fused_cell/kernel",
-    }
 
     print("Variables to restore which are not in checkpoint:", missing_var_names, file=log.v2)
 
-    var_name_map = {}  # type: dict[str,()->numpy.ndarray]  # current name -> value-loader
-
-    def make_load_renamed(old_name):
-      def load_old():
-        return reader.get_tensor(old_name)
-
-      return load_old
-
-    def make_load_weights_nativelstm_to_basic(new_name):
-      assert new_name.endswith("/lstm_cell/kernel")
-      old_name1 = new_name[:-len("/lstm_cell/kernel")] + "/W_re"
-      old_name2 = new_name[:-len("/lstm_cell/kernel")] + "/W"
-
-      def load_native_lstm_weights():
-        # i = input_gate, j = new_input, f = forget_gate, o = output_gate
-        # BasicLSTM: i, j, f, o; Input: [inputs, h]
-        # LstmGenericBase/NativeLstm: j, i, f, o
-        # NativeLstm2: j, i, f, o
-        W_re = reader.get_tensor(old_name1)  # (n_out,n_out*4)
-        W_ff = reader.get_tensor(old_name2)  # (n_in,n_out*4)
-        assert W_re.ndim == W_ff.ndim == 2 and W_re.shape[1] == W_ff.shape[1] and W_re.shape[1] // 4 == W_re.shape[0]
-        W = numpy.concatenate([W_ff, W_re], axis=0)  # (n_in+n_out,n_out*4)
-        W_j, W_i, W_f, W_o = numpy.split(W, 4, axis=1)
-        W = numpy.concatenate([W_i, W_j, W_f, W_o], axis=1)
-        return W
-
-      return load_native_lstm_weights
-
-    def make_load_bias_nativelstm_to_basic(new_name):
-      assert new_name.endswith("/lstm_cell/bias")
-      old_name = new_name[:-len("/lstm_cell/bias")] + "/b"
-
-      def load_native_lstm_bias():
-        # i = input_gate, j = new_input, f = forget_gate, o = output_gate
-        # BasicLSTM: i, j, f, o; Input: [inputs, h]
-        # LstmGenericBase/NativeLstm: j, i, f, o
-        # NativeLstm2: j, i, f, o
-        b = reader.get_tensor(old_name)  # (n_out*4,)
-        assert b.ndim == 1
-        b_j, b_i, b_f, b_o = numpy.split(b, 4, axis=0)
-        b = numpy.concatenate([b_i, b_j, b_f, b_o], axis=0)
-        return b
-
-      return load_native_lstm_bias
-
-    class make_load_cudnn_rnn:
-      cudnn_postfix = "/cudnn/CudnnRNNParamsToCanonical:0"
-
-      def __init__(self, prefix, target="lstm_block_wrapper/"):
-        self.target = target
-        self.keys = [target + "bias", target + "kernel"]
-        self.prefix = prefix
-        self.data = None
-
-      def _load(sself):
-        from TFNetworkRecLayer import RecLayer
-        sself.data = RecLayer.convert_cudnn_canonical_to_lstm_block(
-          reader=reader, prefix=sself.prefix, target=sself.target)
-
-      def make_getter(self, key):
-        def get():
-          if self.data is None:
-            self._load()
-          return self.data[key]
-
-        return get
-
-      def get_lazy_dict(self):
-        return {self.prefix + k: self.make_getter(self.prefix + k) for k in self.keys}
-
-    # Here we try to make matches of missing vars and vars which seem to be obsolete.
-    for v in missing_var_names:
-      if v.endswith("/lstm_cell/kernel"):
-        old_name1 = v[:-len("/lstm_cell/kernel")] + "/W_re"
-        old_name2 = v[:-len("/lstm_cell/kernel")] + "/W"
-        if old_name1 in obsolete_var_names and old_name2 in obsolete_var_names:
-          var_name_map[v] = make_load_weights_nativelstm_to_basic(v)
-      if v.endswith("/lstm_cell/bias"):
-        old_name = v[:-len("/lstm_cell/bias")] + "/b"
-        if old_name in obsolete_var_names:
-          var_name_map[v] = make_load_bias_nativelstm_to_basic(v)
-    for v in obsolete_var_names:
-      for k_old, k_new in map_list.items():
-        if v.endswith("/%s" % k_old):
-          v2 = v[:-len(k_old)] + k_new
-          if v2 in missing_var_names:
-            var_name_map[v2] = make_load_renamed(old_name=v)
-            break
-      if v.endswith(make_load_cudnn_rnn.cudnn_postfix):
-        var_name_map.update(
-          make_load_cudnn_rnn(prefix=v[:-len(make_load_cudnn_rnn.cudnn_postfix) + 1]).get_lazy_dict())
+    var_name_map = self._resolve_var_name_map()
 
     could_not_find_map_list = [v for v in missing_var_names if v not in var_name_map]
     if self.ignore_missing or not could_not_find_map_list:
       # We can restore all.
       print("We found these corresponding variables in the checkpoint:", var_name_map, file=log.v2)
       print("Custom param importers:", self.custom_param_importers, file=log.v2)
-      print("Loading now...", file=log.v3)
       # Similar: from tensorflow.contrib.framework.python.ops import assign_from_checkpoint
       for v in self.saveable_params:
         v_name = self._get_param_name(v)  # current name
@@ -1962,17 +2004,17 @@ class CustomCheckpointLoader:
         if custom_importer:
           variable_values[v] = self.VariableValue(custom_param_importer=custom_importer)
         elif v_name in var_ckpt_names:
-          variable_values[v] = self.VariableValue(value=reader.get_tensor(v_name))
+          variable_values[v] = self.VariableValue(loader=self._make_loader(("renamed", v_name)))
         else:
           if self.ignore_missing and v_name not in var_name_map:
             print(
               "Warning, did not find match for var %r (%r, params_prefix %r, load_if_prefix %r) in checkpoint %r." % (
                 v, v_name, self.params_prefix, self.load_if_prefix, self.filename), file=log.v3)
             continue
-          variable_values[v] = self.VariableValue(value=var_name_map[v_name]())
+          variable_values[v] = self.VariableValue(loader=self._make_loader(var_name_map[v_name]))
       assert variable_values, "no vars to load; saveable vars are %r. load_if_prefix %r." % (
         self.saveable_params, self.load_if_prefix)
-      print("Successfully loaded all variables. Any new save will use the updated variable names.", file=log.v3)
+      print("Found all variables. Any new save will use the updated variable names.", file=log.v3)
       return variable_values
 
     else:
@@ -2006,13 +2048,76 @@ class CustomCheckpointLoader:
         node_def=None, op=None,
         message="CustomCheckpointLoader. could_not_find_map_list: %r" % (could_not_find_map_list,))
 
+  def _get_thread_reader(self):
+    """
+    :return: a reader for the current thread. the checkpoint reader is not thread-safe
+    :rtype: tf.train.CheckpointReader
+    """
+    import threading
+    if threading.current_thread() is self._creator_thread:
+      return self.reader
+    if not getattr(self._thread_local, "reader", None):
+      self._thread_local.reader = tf.train.NewCheckpointReader(self.filename)
+    return self._thread_local.reader
+
+  def _iter_chunks(self, var_values):
+    """
+    :param list[(tf.Variable,CustomCheckpointLoader.VariableValue)] var_values:
+    :return: yields chunks where the estimated size is at most self.max_bytes_in_flight (or a single var)
+    :rtype: typing.Iterator[list[(tf.Variable,CustomCheckpointLoader.VariableValue)]]
+    """
+    chunk = []
+    chunk_bytes = 0
+    for var, value in var_values:
+      num_elements = var.get_shape().num_elements() or 0
+      num_bytes = num_elements * var.dtype.base_dtype.size
+      if chunk and chunk_bytes + num_bytes > self.max_bytes_in_flight:
+        yield chunk
+        chunk = []
+        chunk_bytes = 0
+      chunk.append((var, value))
+      chunk_bytes += num_bytes
+    if chunk:
+      yield chunk
+
   def load_now(self, session):
     """
+    Reads the values in parallel (:class:`ThreadPool` with `num_threads`),
+    in chunks with bounded memory (`max_bytes_in_flight`),
+    and assigns each chunk with a single `session.run`.
+
     :param tf.Session session:
     :return: nothing, will assign the variables in the session
     """
-    for var, value in self.get_variable_value_map().items():
-      value.assign_var(var=var, session=session)
+    import threading
+    from multiprocessing.pool import ThreadPool
+    var_values = []  # type: list[(tf.Variable,CustomCheckpointLoader.VariableValue)]
+    for var, value in sorted(self.get_variable_value_map().items(), key=lambda item: item[0].name):
+      if value.custom_param_importer:
+        value.assign_var(var=var, session=session)
+      else:
+        var_values.append((var, value))
+    if not var_values:
+      return
+
+    def read(item):
+      """
+      :param (tf.Variable,CustomCheckpointLoader.VariableValue) item:
+      :rtype: numpy.ndarray
+      """
+      return item[1].read_value(reader=self._get_thread_reader())
+
+    pool = ThreadPool(processes=self.num_threads) if self.num_threads > 1 else None
+    try:
+      for chunk in self._iter_chunks(var_values):
+        values = pool.map(read, chunk) if pool else list(map(read, chunk))
+        VariableAssigner.assign_multiple(
+          var_values=[(var, value) for ((var, _), value) in zip(chunk, values)], session=session)
+    finally:
+      if pool:
+        pool.close()
+        pool.join()
+      self._thread_local = threading.local()  # free the readers of the pool threads
 
   def set_as_custom_init(self):
     var_value_map = self.get_variable_value_map()
@@ -2031,7 +2136,7 @@ class CustomCheckpointLoader:
         assert var not in read_vars, "Cannot initialize this twice. On purpose, to free memory."
         read_vars.add(var)
         value = var_value_map.pop(var)
-        value.assign_var(var=var, session=session)
+        value.assign_var(var=var, session=session, reader=self.reader)
 
       return var_post_init
 
@@ -2054,3 +2159,291 @@ def set_custom_post_init(var, func):
   # This custom attribute is a big ugly but simple.
   # It's read in TFNetwork.initialize_params().
   var.custom_post_init = func
+
+
+def call_with_retry_on_io_error(func, try_again_wait_time=10):
+  """
+  Calls `func` and tries again for DiskQuota and other recoverable IO errors.
+  This is used for saving checkpoints. This could save us multiple hours of computation.
+
+  :param ()->T func:
+  :param int|float try_again_wait_time: in secs
+  :rtype: T
+  """
+  while True:
+    try:
+      return func()
+    except IOError as e:
+      import errno, time
+      if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
+        print("Exception while saving:", e, file=log.v3)
+        print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
+        time.sleep(try_again_wait_time)
+        continue
+      raise
+
+
+class AsyncCheckpointSaver(object):
+  """
+  Saves checkpoints in the background, such that the training loop is not blocked by the disk IO.
+
+  The values of all saveable params are fetched with a single `session.run` into host memory.
+  Then a background thread writes them via a separate graph and session (`SaveV2` op),
+  i.e. the checkpoint format is exactly the same as with :class:`tf.train.Saver`.
+  All files are first written under a temporary prefix and then renamed,
+  where the ".index" file is renamed last, such that a checkpoint is only visible when it is complete.
+
+  There is at most one pending write. Any new save will wait for the pending one first.
+  The thread is not a daemon, thus the process will also wait for it at exit.
+  """
+
+  def __init__(self):
+    self._thread = None  # type: threading.Thread|None
+    self._exception = None  # type: BaseException|None
+
+  @staticmethod
+  def get_checkpoint_tensors(saveable_params):
+    """
+    :param list[tf.Variable|tensorflow.python.training.saver.BaseSaverBuilder.SaveableObject] saveable_params:
+    :return: checkpoint name -> tensor, the same names as :class:`tf.train.Saver` would use
+    :rtype: dict[str,tf.Tensor|tf.Variable]
+    """
+    d = {}
+    for param in saveable_params:
+      if isinstance(param, tf.Variable):
+        d[param.op.name] = param
+      else:  # SaveableObject
+        for spec in param.specs:
+          assert not spec.slice_spec, "%r: slices not supported" % param
+          d[spec.name] = spec.tensor
+    return d
+
+  def save(self, network, filename, session):
+    """
+    :param TFNetwork network:
+    :param str filename: absolute filename prefix
+    :param tf.Session session:
+    """
+    import threading
+    self.wait()
+    assert network.saver
+    fetches = self.get_checkpoint_tensors(network.get_saveable_params_list())
+    values = session.run(fetches)
+    meta_graph_def = network.saver.export_meta_graph(clear_devices=True)
+    self._thread = threading.Thread(
+      target=self._write_thread_main, args=(filename, values, meta_graph_def),
+      name="%s %r" % (self.__class__.__name__, filename))
+    self._thread.start()
+
+  def _write_thread_main(self, filename, values, meta_graph_def):
+    """
+    :param str filename:
+    :param dict[str,numpy.ndarray] values:
+    :param tensorflow.core.protobuf.meta_graph_pb2.MetaGraphDef meta_graph_def:
+    """
+    try:
+      call_with_retry_on_io_error(
+        lambda: self.write_checkpoint(filename=filename, values=values, meta_graph_def=meta_graph_def))
+    except BaseException as exc:
+      print("%s: Exception while writing %r: %s" % (self.__class__.__name__, filename, exc), file=log.v1)
+      self._exception = exc
+
+  @staticmethod
+  def write_checkpoint(filename, values, meta_graph_def=None):
+    """
+    Writes the values as a TF checkpoint, in a new graph, thus this can run in any thread.
+
+    :param str filename: absolute filename prefix
+    :param dict[str,numpy.ndarray] values: checkpoint name -> value
+    :param tensorflow.core.protobuf.meta_graph_pb2.MetaGraphDef|None meta_graph_def: written to ".meta" if given
+    """
+    import os
+    tmp_filename = "%s.tmp-%i" % (filename, os.getpid())
+    write_checkpoint_values(filename=tmp_filename, values=values)
+    if meta_graph_def is not None:
+      with open(tmp_filename + ".meta", "wb") as f:
+        f.write(meta_graph_def.SerializeToString())
+    rename_checkpoint_files(old_filename=tmp_filename, new_filename=filename)
+
+  def have_pending(self):
+    """
+    :return: whether there is a pending write
+    :rtype: bool
+    """
+    return self._thread is not None and self._thread.is_alive()
+
+  def wait(self):
+    """
+    Waits for the pending write, if there is any.
+    If the write failed, the exception is reraised here.
+    """
+    if self._thread:
+      if self._thread.is_alive():
+        print("Waiting for pending checkpoint write (%s)..." % self._thread.name, file=log.v4)
+      self._thread.join()
+      self._thread = None
+    if self._exception:
+      exc, self._exception = self._exception, None
+      raise exc
+
+
+def write_checkpoint_values(filename, values):
+  """
+  Writes the values as a TF checkpoint (".index" and ".data-*" files), via the `SaveV2` op,
+  i.e. in the same format as :class:`tf.train.Saver`.
+  This uses a new graph and session, thus this can run in any thread.
+
+  :param str filename: absolute filename prefix
+  :param dict[str,numpy.ndarray] values: checkpoint name -> value
+  """
+  from tensorflow.python.ops import io_ops
+  names = sorted(values.keys())
+  with tf.Graph().as_default() as graph:
+    placeholders = [
+      tf.placeholder(
+        name="value_%i" % i, shape=values[name].shape,
+        dtype=tf.string if values[name].dtype == numpy.object_ else tf.as_dtype(values[name].dtype))
+      for i, name in enumerate(names)]
+    save_op = io_ops.save_v2(
+      prefix=filename, tensor_names=names, shape_and_slices=[""] * len(names), tensors=placeholders)
+    with tf.Session(graph=graph, config=tf.ConfigProto(device_count={"GPU": 0})) as session:
+      session.run(save_op, feed_dict={placeholder: values[name] for (placeholder, name) in zip(placeholders, names)})
+
+
+def rename_checkpoint_files(old_filename, new_filename):
+  """
+  Renames all files of the checkpoint (".data-*", ".meta", ".index").
+  The ".index" file is renamed last, such that the checkpoint under the new name is only visible when complete.
+
+  :param str old_filename: filename prefix
+  :param str new_filename: filename prefix
+  """
+  import os
+  from glob import glob
+  old_files = sorted(glob(old_filename + ".*"), key=lambda fn: fn.endswith(".index"))  # index last
+  assert old_files, "no checkpoint files found for %r" % old_filename
+  for old_fn in old_files:
+    os.rename(old_fn, new_filename + old_fn[len(old_filename):])
+
+
+def get_checkpoint_average_weights(num_checkpoints, weights=None, ema_decay=None):
+  """
+  :param int num_checkpoints:
+  :param list[float]|None weights: one per checkpoint. will be normalized. uniform by default
+  :param float|None ema_decay: exponential moving average over the checkpoints, from old to new,
+    i.e. the newest checkpoint gets the weight (1 - ema_decay), the one before (1 - ema_decay) * ema_decay, etc.,
+    and the oldest checkpoint gets ema_decay ** (num_checkpoints - 1).
+  :return: normalized weights, one per checkpoint, sum is 1
+  :rtype: list[float]
+  """
+  assert num_checkpoints >= 1
+  if ema_decay is not None:
+    assert weights is None, "specify either weights or ema_decay"
+    assert 0. <= ema_decay < 1.
+    weights = [(1. - ema_decay) * ema_decay ** (num_checkpoints - 1 - i) for i in range(num_checkpoints)]
+    weights[0] = ema_decay ** (num_checkpoints - 1)
+  if weights is None:
+    weights = [1.] * num_checkpoints
+  assert len(weights) == num_checkpoints and all([w >= 0 for w in weights]) and sum(weights) > 0
+  return [float(w) / sum(weights) for w in weights]
+
+
+def average_checkpoints(filenames, output_filename, weights=None, ema_decay=None, network=None,
+                        max_bytes_per_shard=2 ** 28):
+  """
+  Averages the variables of multiple checkpoints and writes the result as a new checkpoint.
+
+  This works in a streaming way: Only one variable of all the checkpoints is read at a time,
+  and the averaged values are written as temporary checkpoint shards of at most `max_bytes_per_shard`,
+  which are merged in the end (like :class:`tf.train.Saver` does it for sharded checkpoints).
+  Thus the memory consumption does not depend on the model size.
+
+  Non-float variables (e.g. the global train step) are not averaged but taken from the last checkpoint.
+
+  :param list[str] filenames: checkpoint filename prefixes, ordered from old to new (relevant for ema_decay)
+  :param str output_filename: checkpoint filename prefix
+  :param list[float]|None weights: see :func:`get_checkpoint_average_weights`
+  :param float|None ema_decay: see :func:`get_checkpoint_average_weights`
+  :param TFNetwork|None network: if given, the variables of the network are averaged,
+    where :class:`CustomCheckpointLoader` is used to resolve renames (e.g. LSTM conversions) in each checkpoint,
+    and the output uses the current variable names.
+    Otherwise all variables of the checkpoints are averaged, and all checkpoints must have the same variables.
+  :param int max_bytes_per_shard:
+  """
+  import os
+  import shutil
+  import tempfile
+  from tensorflow.python.ops import io_ops
+  assert filenames
+  output_filename = os.path.abspath(output_filename)  # TF needs absolute path
+  weights = get_checkpoint_average_weights(num_checkpoints=len(filenames), weights=weights, ema_decay=ema_decay)
+  print("Average checkpoints %r with weights %r into %r." % (filenames, weights, output_filename), file=log.v3)
+  if network:
+    loaders = [
+      CustomCheckpointLoader(filename=fn, saveable_params=network.get_saveable_params_list(), network=network)
+      for fn in filenames]
+    var_value_maps = [loader.get_variable_value_map() for loader in loaders]
+    var_names = [(var, var.op.name) for var in sorted(var_value_maps[-1].keys(), key=lambda v: v.name)]
+    for var_value_map, fn in zip(var_value_maps, filenames):
+      assert set(var_value_map.keys()) == set(var_value_maps[-1].keys()), "variables differ in %r" % fn
+
+    def read_values(key):
+      """
+      :param tf.Variable key:
+      :rtype: list[numpy.ndarray]
+      """
+      return [
+        var_value_map.pop(key).read_value(reader=loader.reader)
+        for (loader, var_value_map) in zip(loaders, var_value_maps)]
+
+  else:
+    readers = [tf.train.NewCheckpointReader(fn) for fn in filenames]
+    var_to_shape_map = readers[-1].get_variable_to_shape_map()
+    for reader, fn in zip(readers, filenames):
+      assert set(reader.get_variable_to_shape_map().keys()) == set(var_to_shape_map.keys()), (
+        "variables differ in %r" % fn)
+    var_names = [(name, name) for name in sorted(var_to_shape_map.keys())]
+
+    def read_values(key):
+      """
+      :param str key:
+      :rtype: list[numpy.ndarray]
+      """
+      return [reader.get_tensor(key) for reader in readers]
+
+  tmp_dir = tempfile.mkdtemp(prefix="%s.tmp-avg-" % os.path.basename(output_filename),
+                             dir=os.path.dirname(output_filename))
+  try:
+    shard_prefixes = []
+    shard_values = {}  # type: dict[str,numpy.ndarray]
+    shard_bytes = 0
+    for i, (key, name) in enumerate(var_names):
+      values = read_values(key)
+      for value, fn in zip(values, filenames):
+        assert value.shape == values[-1].shape and value.dtype == values[-1].dtype, (
+          "var %r: mismatch in %r: %s %s vs %s %s" % (name, fn, value.shape, value.dtype, values[-1].shape,
+                                                      values[-1].dtype))
+      if values[-1].dtype.kind == "f":
+        avg = numpy.zeros(values[-1].shape, dtype="float64")
+        for value, weight in zip(values, weights):
+          avg += value * weight
+        avg = avg.astype(values[-1].dtype)
+      else:
+        avg = values[-1]
+      del values
+      shard_values[name] = avg
+      shard_bytes += avg.nbytes
+      if shard_bytes >= max_bytes_per_shard or i == len(var_names) - 1:
+        shard_prefixes.append("%s/part-%05i" % (tmp_dir, len(shard_prefixes)))
+        write_checkpoint_values(filename=shard_prefixes[-1], values=shard_values)
+        shard_values.clear()
+        shard_bytes = 0
+    tmp_filename = "%s/merged" % tmp_dir
+    with tf.Graph().as_default() as graph:
+      merge_op = io_ops.merge_v2_checkpoints(
+        checkpoint_prefixes=shard_prefixes, destination_prefix=tmp_filename, delete_old_dirs=False)
+      with tf.Session(graph=graph, config=tf.ConfigProto(device_count={"GPU": 0})) as session:
+        session.run(merge_op)
+    rename_checkpoint_files(old_filename=tmp_filename, new_filename=output_filename)
+  finally:
+    shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -5237,18 +5237,22 @@ class FastBaumWelchLayer(_ConcatInputLayer):
   """
   Calls :func:`fast_baum_welch` or :func:`fast_baum_welch_by_sprint_automata`.
   We expect that our input are +log scores, e.g. use log-softmax.
+  With align_target "ctc", "optional_blank" or "hmm", the FSAs are built from the target labels
+  via :func:`Fsa.fast_bw_fsa_from_labels`, i.e. this does not need Sprint.
   """
   layer_class = "fast_bw"
   recurrent = True
 
-  def __init__(self, align_target, sprint_opts=None,
+  def __init__(self, align_target, sprint_opts=None, align_target_opts=None,
                input_type="log_prob",
                tdp_scale=1.0, am_scale=1.0, min_prob=0.0,
                staircase_seq_len_source=None,
                **kwargs):
     """
-    :param str align_target: e.g. "sprint" or "staircase"
+    :param str align_target: e.g. "sprint", "staircase", or "ctc", "optional_blank", "hmm" (using the target)
     :param dict[str] sprint_opts:
+    :param dict[str]|None align_target_opts: for "ctc" etc., passed to :func:`Fsa.fast_bw_fsa_from_labels`.
+      for "ctc" and "optional_blank", blank_idx defaults to the last input dim
     :param str input_type: "log_prob" or "prob"
     :param float tdp_scale:
     :param float am_scale:
@@ -5291,6 +5295,21 @@ class FastBaumWelchLayer(_ConcatInputLayer):
       from TFNativeOp import fast_baum_welch_staircase
       fwdbwd, obs_scores = fast_baum_welch_staircase(
         am_scores=am_scores, seq_lens=staircase_seq_len_source.output.get_sequence_lengths())
+    elif align_target in ("ctc", "optional_blank", "hmm"):
+      from TFUtil import sequence_mask_time_major
+      from TFNativeOp import fast_baum_welch_by_labels
+      target_data = self._get_target_value()
+      assert target_data and target_data.sparse, "%s: need sparse target for align_target %r" % (self, align_target)
+      align_target_opts = (align_target_opts or {}).copy()
+      if align_target != "hmm":
+        align_target_opts.setdefault("blank_idx", data.dim - 1)
+      align_target_opts.setdefault("topology", align_target)
+      fwdbwd, obs_scores = fast_baum_welch_by_labels(
+        am_scores=am_scores,
+        float_idx=sequence_mask_time_major(data.get_sequence_lengths()),
+        labels=target_data.get_placeholder_as_batch_major(),
+        label_lens=target_data.get_sequence_lengths(),
+        **align_target_opts)
     else:
       raise Exception("%s: invalid align_target %r" % (self, align_target))
     loss = tf.reduce_sum(obs_scores[0])
@@ -4351,12 +4351,16 @@ class KenLmStateLayer(_ConcatInputLayer):
   returns score (+log space, natural base e) of sequence,
   using KenLM (http://kheafield.com/code/kenlm/) (see :mod:`TFKenLM`).
   EOS (</s>) token must be used explicitly.
+
+  By default, we keep the KenLM state per hypothesis (see :func:`TFKenLM.ken_lm_next_states`),
+  which is reordered with the beam like any other rec var,
+  such that each step only scores the new word.
   """
   layer_class = "kenlm"
   recurrent = True
 
   def __init__(self, lm_file, vocab_file=None, vocab_unknown_label="UNK", bpe_merge_symbol=None,
-               input_step_offset=0, dense_output=False,
+               input_step_offset=0, dense_output=False, prefix_state_cache=True,
                debug=False,
                **kwargs):
     """
@@ -4366,6 +4370,7 @@ class KenLmStateLayer(_ConcatInputLayer):
     :param str|None bpe_merge_symbol: e.g. "@@" if you want to apply BPE merging
     :param int input_step_offset: if provided, will consider the input only from this step onwards
     :param bool dense_output: whether we output the score for all possible succeeding tokens
+    :param bool prefix_state_cache: keep the KenLM state per hypothesis. otherwise rescore the whole string each step
     :param bool debug: prints debug info
     """
     if callable(lm_file):
@@ -4413,21 +4418,38 @@ class KenLmStateLayer(_ConcatInputLayer):
     next_strings = prev_strings + new_input
     self.rec_vars_outputs["state"] = next_strings
     prev_scores = self._rec_previous_layer.rec_vars_outputs["scores"]
+    prev_lm_states = self._rec_previous_layer.rec_vars_outputs["lm_state"]
+    next_lm_states = prev_lm_states
     if dense_output:
       assert self.tf_vocab, "%s: provide vocab_file" % self
-      new_abs_scores, new_abs_scores_dense = TFKenLM.ken_lm_abs_score_bpe_strings_dense(
-        handle=self.lm_handle,
-        bpe_merge_symbol=bpe_merge_symbol or "",
-        strings=next_strings,
-        labels=self.tf_vocab)
+      if prefix_state_cache:
+        next_lm_states, new_abs_scores, new_abs_scores_dense = TFKenLM.ken_lm_next_states_dense(
+          handle=self.lm_handle,
+          bpe_merge_symbol=bpe_merge_symbol or "",
+          prev_states=prev_lm_states,
+          new_inputs=new_input,
+          labels=self.tf_vocab)
+      else:
+        new_abs_scores, new_abs_scores_dense = TFKenLM.ken_lm_abs_score_bpe_strings_dense(
+          handle=self.lm_handle,
+          bpe_merge_symbol=bpe_merge_symbol or "",
+          strings=next_strings,
+          labels=self.tf_vocab)
       new_abs_scores_bc = expand_multiple_dims(
         new_abs_scores, [i + new_abs_scores.get_shape().ndims for i in range(self.tf_vocab.get_shape().ndims)])
       new_rel_scores = new_abs_scores_dense - new_abs_scores_bc
     else:
-      new_abs_scores = TFKenLM.ken_lm_abs_score_bpe_strings(
-        handle=self.lm_handle,
-        bpe_merge_symbol=bpe_merge_symbol or "",
-        strings=next_strings)
+      if prefix_state_cache:
+        next_lm_states, new_abs_scores = TFKenLM.ken_lm_next_states(
+          handle=self.lm_handle,
+          bpe_merge_symbol=bpe_merge_symbol or "",
+          prev_states=prev_lm_states,
+          new_inputs=new_input)
+      else:
+        new_abs_scores = TFKenLM.ken_lm_abs_score_bpe_strings(
+          handle=self.lm_handle,
+          bpe_merge_symbol=bpe_merge_symbol or "",
+          strings=next_strings)
       new_rel_scores = new_abs_scores - prev_scores
     if debug:
       # Print some info. Only for the first 3 steps because it will spam a lot.
@@ -4443,6 +4465,7 @@ class KenLmStateLayer(_ConcatInputLayer):
         ["; vocab: ", self.tf_vocab] if self.tf_vocab else []),
         lambda: new_rel_scores)
     self.rec_vars_outputs["scores"] = new_abs_scores
+    self.rec_vars_outputs["lm_state"] = next_lm_states
     self.output.placeholder = new_rel_scores
 
   @classmethod
@@ -4474,7 +4497,8 @@ class KenLmStateLayer(_ConcatInputLayer):
     return {
       "state": tf.zeros(batch_shape, dtype=tf.string),
       "step": tf.constant(0, dtype=tf.int32),
-      "scores": tf.zeros(batch_shape, dtype=tf.float32)}
+      "scores": tf.zeros(batch_shape, dtype=tf.float32),
+      "lm_state": tf.zeros(batch_shape, dtype=tf.string)}
 
 
 class EditDistanceTableLayer(LayerBase):
@@ -90,20 +90,17 @@ class Updater(object):
     self.config = config
     self.learning_rate_var = tf.Variable(name="learning_rate", initial_value=0.0, trainable=False, dtype="float32")
     self.trainable_vars = []  # type: list[tf.Variable]
-    self.network = network
+    self.network = None  # type: TFNetwork
+    self.loss = None  # type: tf.Tensor
+    self.constraints = None  # type: tf.Tensor|None
+    self._set_network(network)
     self.use_locking = self.config.bool("optimizer_use_locking", False)
     self.initial_learning_rate = initial_learning_rate
-    if self.config.bool("decouple_constraints", False):
-      # https://arxiv.org/abs/1711.05101, Fixing Weight Decay Regularization in Adam
-      self.loss = network.get_total_loss()
-      self.constraints = network.get_total_constraints()
-    else:
-      self.loss = network.get_objective()
-      self.constraints = None
     self.optimizer = None  # type: WrapOptimizer
     self.optim_op = None  # type: tf.Operation
     self.optim_meta_losses = None  # type: dict[str,tf.Tensor]
     self.optimizer_vars = []  # type: list[tf.Variable]
+    self.optimizer_other_vars = []  # type: list[tf.Variable]  # non-slot vars, e.g. Adam beta1_power
     self.optimizer_init_vars_op = None  # type: tf.Operation
 
     # After graph was build: look if it only uses deterministic ops
@@ -112,6 +109,32 @@ class Updater(object):
       if non_det_ops:
         print("WARNING: The graph uses these non deterministic ops: {}".format(non_det_ops), file=log.v1)
 
+  def _set_network(self, network):
+    """
+    :param TFNetwork network:
+    """
+    self.network = network
+    if self.config.bool("decouple_constraints", False):
+      # https://arxiv.org/abs/1711.05101, Fixing Weight Decay Regularization in Adam
+      self.loss = network.get_total_loss()
+      self.constraints = network.get_total_constraints()
+    else:
+      self.loss = network.get_objective()
+      self.constraints = None
+
+  def set_network(self, network):
+    """
+    Switches to a new network in the same graph, e.g. the next pretrain network.
+    The learning rate var and the optimizer, incl. its slot vars for params which are kept, are reused,
+    instead of creating new ones next to the old ones in the graph.
+    The network must share the global train step with the previous network.
+
+    :param TFNetwork network:
+    """
+    assert network.global_train_step is self.network.global_train_step
+    self._set_network(network)
+    self.reset_optim_op()
+
   def reset_optim_op(self):
     """
     Call this if sth is changed which the optim_op depends on.
@@ -159,6 +182,39 @@ class Updater(object):
       lr *= hvd.size()
     return lr
 
+  def _get_accum_grad_step_count(self):
+    """
+    For the config options ``accum_grad_target_num_frames`` or ``accum_grad_target_num_seqs``:
+    The gradients are accumulated over multiple steps until the number of frames (of the data key
+    ``accum_grad_data_key``, by default the default target) or seqs reaches the target,
+    and then normalized by the real count and applied once. See :func:`accum_grad_until_count`.
+    This assumes that the loss is summed over the frames (i.e. not ``use_normalized_loss``).
+
+    :return: number of frames or seqs in the current step (float32 scalar), and the target count,
+      or (None, None) if not used
+    :rtype: (tf.Tensor|None,int|None)
+    """
+    target_num_frames = self.config.int("accum_grad_target_num_frames", 0)
+    target_num_seqs = self.config.int("accum_grad_target_num_seqs", 0)
+    if not target_num_frames and not target_num_seqs:
+      return None, None
+    assert not (target_num_frames and target_num_seqs), "specify either accum_grad_target_num_frames or _num_seqs"
+    assert not self.config.int("accum_grad_multiple_step", 0), "cannot combine with accum_grad_multiple_step"
+    data_key = self.config.value("accum_grad_data_key", self.network.extern_data.default_target)
+    data = self.network.get_extern_data(data_key, mark_data_key_as_used=True)
+    with tf.name_scope("accum_grad_step_count"):
+      if target_num_frames:
+        count = tf.reduce_sum(data.get_sequence_lengths())
+      else:
+        count = data.get_batch_dim()
+      count = tf.to_float(count)
+      if self.config.is_true("use_horovod") and self.config.value("horovod_reduce_type", "") == "grad":
+        # The grads are reduced over all ranks, thus the count must be as well.
+        # This also makes sure that all ranks apply the update in the same step.
+        import horovod.tensorflow as hvd
+        count = hvd.allreduce(count, average=self.config.is_true("horovod_avg_grad"))
+    return count, target_num_frames or target_num_seqs
+
   def create_optim_op(self):
     assert self.loss is not None
     assert self.trainable_vars, "no variables to update/optimize"
@@ -177,12 +233,16 @@ class Updater(object):
         trainable_vars_for_gradients.remove(v)
 
     if not self.optimizer:
+      accum_grad_step_count, accum_grad_target_count = self._get_accum_grad_step_count()
       self.optimizer = WrapOptimizer(
         config=self.config,
         learning_rate=self.get_current_step_learning_rate(),
         global_train_step=self.network.global_train_step,
-        use_locking=self.use_locking)
-      self.optimizer.create_all_needed_optimizers(trainable_vars_for_gradients)
+        use_locking=self.use_locking,
+        accum_grad_step_count=accum_grad_step_count,
+        accum_grad_target_count=accum_grad_target_count)
+    # There might be new vars (see set_network()), maybe with other optimizer opts.
+    self.optimizer.create_all_needed_optimizers(trainable_vars_for_gradients)
 
     with tf.variable_scope("optimize"):
       synthetic_gradient_scope = SyntheticGradient.enter_gradient_scope()
@@ -272,7 +332,9 @@ class Updater(object):
       other_new_vars.append(v)
     if other_new_vars:
       print("These additional variable were created by the optimizer: %s." % other_new_vars, file=log.v3)
-      self.optimizer_vars += other_new_vars
+      self.optimizer_other_vars += other_new_vars
+    # When the optimizer is reused (see set_network()), it does not create them again.
+    self.optimizer_vars += [v for v in self.optimizer_other_vars if v not in self.optimizer_vars]
     with tf.name_scope("optimizer_init_vars"):
       self.optimizer_init_vars_op = tf.variables_initializer(self.optimizer_vars, name="init_optim_slot_vars")
 
@@ -337,6 +399,28 @@ def accum_grad_multiple_step(grad, var, train_step, num_accum_steps):
       lambda: tf.assign_add(v, grad))
 
 
+def accum_grad_until_count(grad, var, is_first_step, accum_count):
+  """
+  :param tf.Tensor|tf.IndexedSlices grad:
+  :param tf.Variable var:
+  :param tf.Tensor is_first_step: bool, scalar. whether this step starts a new accumulation
+  :param tf.Tensor accum_count: float32, scalar. accumulated count (frames or seqs), including the current step
+  :return: accumulated grad, normalized by accum_count
+  :rtype: tf.Tensor
+  """
+  from TFUtil import reuse_name_scope_of_tensor, get_base_name
+  with reuse_name_scope_of_tensor(grad, postfix="/%s_accum_grad" % get_base_name(grad)):
+    shape = var.get_shape().as_list()
+    v = tf.get_variable(
+      name="var_accum_grad_until_count", shape=shape, dtype=grad.dtype,
+      initializer=tf.zeros_initializer(), trainable=False)
+    accum_grad = tf.cond(
+      is_first_step,
+      lambda: tf.assign(v, grad),
+      lambda: tf.assign_add(v, grad))
+    return accum_grad / tf.cast(tf.maximum(accum_count, 1.), dtype=grad.dtype)
+
+
 class WrapOptimizer:
   """
   Wraps a tf.train.Optimizer (or multiple).
@@ -344,17 +428,23 @@ class WrapOptimizer:
   This class is not derived from tf.train.Optimizer itself, to keep it simple.
   """
 
-  def __init__(self, config, learning_rate, global_train_step, use_locking):
+  def __init__(self, config, learning_rate, global_train_step, use_locking,
+               accum_grad_step_count=None, accum_grad_target_count=None):
     """
     :param Config.Config config:
     :param tf.Tensor learning_rate:
     :param tf.Tensor global_train_step:
     :param bool use_locking:
+    :param tf.Tensor|None accum_grad_step_count: float32 scalar, see :func:`Updater._get_accum_grad_step_count`
+    :param int|None accum_grad_target_count:
     """
     self.config = config
     self.learning_rate = learning_rate
     self.global_train_step = global_train_step
     self.use_locking = use_locking
+    self.accum_grad_step_count = accum_grad_step_count
+    self.accum_grad_target_count = accum_grad_target_count
+    self._accum_grad_count_state = None  # type: WrapOptimizer._AccumGradCountState|None
     from collections import OrderedDict
     self.optimizers = OrderedDict()  # optimizer_opts|None -> tf.train.Optimizer
 
@@ -525,6 +615,29 @@ class WrapOptimizer:
     default_opt = self.get_default_optimizer()
     return default_opt.compute_gradients(loss=loss, var_list=var_list, aggregation_method=aggregation_method)
 
+  class _AccumGradCountState:
+    def __init__(self, step_count, target_count):
+      """
+      :param tf.Tensor step_count: float32 scalar, count (frames or seqs) of the current step
+      :param int target_count: apply the accumulated grads when this count is reached
+      """
+      with tf.variable_scope("accum_grad_count"):
+        self.count_var = tf.get_variable(
+          name="accum_count", shape=(), dtype=tf.float32, initializer=tf.zeros_initializer(), trainable=False)
+        self.is_first_step = tf.less_equal(self.count_var, 0., name="is_first_step")
+        self.new_count = tf.add(self.count_var, step_count, name="new_count")
+        self.do_apply = tf.greater_equal(self.new_count, float(target_count), name="do_apply")
+
+    def make_update_op(self, deps):
+      """
+      :param list[tf.Operation|tf.Tensor] deps: all the apply grads ops
+      :return: resets the count after the grads were applied, or sets the new accumulated count
+      :rtype: tf.Operation
+      """
+      with tf.control_dependencies(deps):
+        return tf.assign(
+          self.count_var, tf.where(self.do_apply, 0., self.new_count), name="accum_count_update").op
+
   def _apply_gradients(self, grads_and_vars, opt_key, accum_grad_multiple_num_steps=0):
     """
     :param list[(tf.Tensor,tf.Variable) grads_and_vars:
@@ -534,6 +647,12 @@ class WrapOptimizer:
     """
     optimizer = self.optimizers[opt_key]
     assert isinstance(optimizer, tf.train.Optimizer)
+    if self._accum_grad_count_state:
+      return tf.cond(
+        self._accum_grad_count_state.do_apply,
+        true_fn=lambda: optimizer.apply_gradients(grads_and_vars),
+        false_fn=lambda: tf.no_op(),
+        name="apply_grads/accum_grad_until_count")
     if accum_grad_multiple_num_steps >= 1:
       return tf.cond(
         tf.equal(
@@ -760,6 +879,10 @@ class WrapOptimizer:
     if accum_grad_multiple_num_steps >= 1:
       grad = accum_grad_multiple_step(
         grad, var, train_step=self.global_train_step, num_accum_steps=accum_grad_multiple_num_steps)
+    if self._accum_grad_count_state:
+      grad = accum_grad_until_count(
+        grad, var, is_first_step=self._accum_grad_count_state.is_first_step,
+        accum_count=self._accum_grad_count_state.new_count)
 
     if updater_opts.get("debug_grad_summaries", self.config.bool_or_other("debug_grad_summaries", False)):
       from TFUtil import variable_summaries, get_base_name, reuse_name_scope_of_tensor
@@ -828,6 +951,9 @@ class WrapOptimizer:
     var_grads = {var: grad for (grad, var) in grads_and_vars if grad is not None}
     if not var_grads:
       raise Exception("no single variable to train")
+    if self.accum_grad_step_count is not None and not self._accum_grad_count_state:
+      self._accum_grad_count_state = self._AccumGradCountState(
+        step_count=self.accum_grad_step_count, target_count=self.accum_grad_target_count)
     global_info = self._GetGlobalInfo(optimizer=self, all_vars=var_list, var_grads=var_grads)
     if self.config.bool_or_other("debug_grad_summaries", False):
       tf.summary.scalar("global_grad_norm", global_info.get_global_grad_norm())
@@ -843,6 +969,8 @@ class WrapOptimizer:
     assert grads_per_apply_grad_opts
     for apply_grad_opts, grads_and_vars_per_opts in grads_per_apply_grad_opts.items():
       all_apply_grads.append(self._apply_gradients(grads_and_vars_per_opts, **apply_grad_opts))
+    if self._accum_grad_count_state:
+      all_apply_grads.append(self._accum_grad_count_state.make_update_op(deps=all_apply_grads))
     if len(all_apply_grads) == 1:
       return all_apply_grads[0]
     return tf.group(*all_apply_grads)
@@ -3617,6 +3617,20 @@ class VariableAssigner(object):
     """
     session.run(self.assign_op, feed_dict={self.assign_op.inputs[1]: value})
 
+  @classmethod
+  def assign_multiple(cls, var_values, session):
+    """
+    Assigns all the given variables with a single session.run, via the initializers of the vars.
+    This does not create any new ops in the graph.
+
+    :param list[(tf.Variable,numpy.ndarray)] var_values:
+    :param tf.Session session:
+    """
+    assigners = [(cls(var), value) for (var, value) in var_values]
+    session.run(
+      [assigner.assign_op for (assigner, _) in assigners],
+      feed_dict={assigner.assign_op.inputs[1]: value for (assigner, value) in assigners})
+
 
 class CudaEnv(object):
   _instance = None
@@ -3793,6 +3807,7 @@ class OpCodeCompiler(NativeCodeCompiler):
     self._tf_mod = None
 
   _relevant_info_keys = NativeCodeCompiler._relevant_info_keys + ("tf_version", "with_cuda", "cuda_path", "nvcc_opts")
+  loaded_op_libraries = []  # type: list[str]  # all loaded so-files, e.g. for TFGraphCache
 
   def _make_info_dict(self):
     from Util import describe_tensorflow_version
@@ -3828,6 +3843,8 @@ class OpCodeCompiler(NativeCodeCompiler):
       return self._tf_mod
     self._maybe_compile()
     self._tf_mod = tf.load_op_library(self._so_filename)
+    if self._so_filename not in OpCodeCompiler.loaded_op_libraries:
+      OpCodeCompiler.loaded_op_libraries.append(self._so_filename)
     return self._tf_mod
 
 
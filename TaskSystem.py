@@ -160,6 +160,8 @@ class SharedMem:
     shm_key_t = ctypes.c_int
     IPC_PRIVATE = 0
     IPC_RMID = 0
+    IPC_CREAT = 0o1000
+    IPC_EXCL = 0o2000
 
     # int shmget(key_t key, size_t size, int shmflg);
     shmget = libc.shmget
@@ -198,6 +200,38 @@ class SharedMem:
       cls.shmctl(shmid, cls.IPC_RMID, 0)
       return True
 
+    @classmethod
+    def get_shmid_for_key(cls, key, size, create=False):
+      """
+      For segments which are shared via a well-known key, not via pickling of the shmid.
+      Such segments are not removed automatically, see :func:`remove_shmid`.
+
+      :param int key: >0
+      :param int size:
+      :param bool create: if True, creates a new segment, and fails if it already exists
+      :return: shmid, or None if there is no segment for the key (or it already exists, with create=True)
+      :rtype: int|None
+      """
+      import ctypes
+      assert key > 0
+      flags = 0o600
+      if create:
+        flags |= cls.IPC_CREAT | cls.IPC_EXCL
+      shmid = cls.shmget(key, size, flags)
+      if shmid < 0 and ctypes.get_errno() in [errno.ENOENT, errno.EEXIST]:
+        return None
+      cls.check_ccall_error(shmid >= 0, "shmget")
+      return shmid
+
+    @classmethod
+    def remove_shmid(cls, shmid):
+      """
+      Marks the segment for removal. It gets destroyed after the last process detached from it.
+
+      :param int shmid:
+      """
+      cls.check_ccall_error(cls.shmctl(shmid, cls.IPC_RMID, 0) == 0, "shmctl")
+
     def __init__(self, size, shmid=None):
       self.size = size
       self.shmid = None
@@ -240,6 +274,187 @@ class SharedMem:
       return "<SharedMem shmid=%r size=%r is_creator=%r>" % (self.shmid, self.size, self.is_creator)
 
 
+class SharedMemSeqCache:
+  """
+  Read-only cache of sequence data in shared memory, which can be used by multiple processes on the same host,
+  e.g. Horovod ranks or hyper-parameter tuning workers which all use the same dataset.
+  The data is indexed by the corpus seq idx.
+
+  The segment is found via a SysV IPC key derived from the name.
+  The first process creates it and fills it via ``fill_func``,
+  all other processes attach to it and wait until it is filled.
+  The segment header contains a reference count (of the instances over all processes),
+  and the last instance which is closed removes the segment.
+  All changes of the header are protected via ``flock`` on a lock file in the temp dir.
+  If a process crashes, its reference stays, and the segment must be removed manually via ``ipcrm``.
+  """
+
+  class SeqCacheException(SharedMem.ShmException): pass
+  Magic = 0x52544e4e53484d43  # "RTNNSHMC"
+  HeaderSize = 64  # bytes. magic, fingerprint, state, ref count, creator pid
+  StateLoading, StateReady, StateFailed = 0, 1, 2
+
+  def __init__(self, name, layout, fill_func, wait_poll_interval=0.1):
+    """
+    :param str name: identifies the data, e.g. contains the filenames. all processes must use the same
+    :param dict[str,(str,tuple[int],numpy.ndarray)] layout: key -> (dtype, feature shape, seq lens)
+    :param ((SharedMemSeqCache)->None) fill_func: called only in the creating process,
+      should fill all the arrays via :func:`get_writable_array`
+    :param float wait_poll_interval: in secs
+    """
+    import hashlib
+    import tempfile
+    self.name = name
+    self.layout = {}  # type: dict[str,(numpy.dtype,tuple[int],numpy.ndarray)]  # key -> dtype, shape, seq starts
+    self._offsets = {}  # type: dict[str,int]  # key -> byte offset in mem
+    self.size = self.HeaderSize
+    for key, (dtype, shape, seq_lens) in sorted(layout.items()):
+      dtype = numpy.dtype(dtype)
+      seq_starts = numpy.zeros((len(seq_lens) + 1,), dtype="int64")
+      numpy.cumsum(seq_lens, dtype="int64", out=seq_starts[1:])
+      self.layout[key] = (dtype, tuple(shape), seq_starts)
+      self._offsets[key] = self.size
+      nbytes = int(seq_starts[-1]) * int(numpy.prod(shape, dtype="int64")) * dtype.itemsize
+      self.size += (nbytes + 63) // 64 * 64  # keep alignment
+    fingerprint_src = repr((name, [(key, str(dtype), shape, int(starts[-1]), len(starts))
+                                   for (key, (dtype, shape, starts)) in sorted(self.layout.items())]))
+    fingerprint = hashlib.sha1(fingerprint_src.encode("utf8")).digest()
+    self.key = struct.unpack("<I", fingerprint[:4])[0] & 0x7fffffff or 1
+    self.fingerprint = struct.unpack("<q", fingerprint[4:12])[0]
+    self.mem = None  # type: SharedMem|None
+    self.is_creator = False
+    self._lock_filename = os.path.join(tempfile.gettempdir(), "returnn_shm_seq_cache_%x.lock" % self.key)
+    self._open(fill_func=fill_func, wait_poll_interval=wait_poll_interval)
+    import atexit
+    atexit.register(self.close)
+
+  @contextmanager
+  def _lock(self):
+    import fcntl
+    with open(self._lock_filename, "a") as f:
+      fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+  def _get_buffer(self):
+    """
+    :return: the whole shared memory as uint8 array
+    :rtype: numpy.ndarray
+    """
+    import ctypes
+    assert self.mem and self.mem.ptr
+    return numpy.frombuffer((ctypes.c_uint8 * self.size).from_address(self.mem.ptr), dtype="uint8")
+
+  def _get_header(self):
+    """
+    :return: magic, fingerprint, state, ref count, creator pid
+    :rtype: numpy.ndarray
+    """
+    return self._get_buffer()[:self.HeaderSize].view("int64")
+
+  def _open(self, fill_func, wait_poll_interval):
+    with self._lock():
+      shmid = SharedMem.get_shmid_for_key(self.key, self.size)
+      if shmid is None:
+        shmid = SharedMem.get_shmid_for_key(self.key, self.size, create=True)
+        self.is_creator = True
+      self.mem = SharedMem(size=self.size, shmid=shmid)  # not the creator in the SharedMem sense, no auto removal
+      header = self._get_header()
+      if self.is_creator:
+        header[:5] = [self.Magic, self.fingerprint, self.StateLoading, 0, os.getpid()]
+      elif header[0] != self.Magic or header[1] != self.fingerprint:
+        self.mem.remove()
+        self.mem = None
+        raise self.SeqCacheException("%r: key %x is used by other data" % (self, self.key))
+      header[3] += 1
+    print("%r: %s" % (self, "created, filling" if self.is_creator else "attached"))
+    if self.is_creator:
+      try:
+        fill_func(self)
+      except BaseException:
+        with self._lock():
+          header[2] = self.StateFailed
+        self.close()
+        raise
+      with self._lock():
+        header[2] = self.StateReady
+      return
+    pid = int(header[4])
+    while header[2] == self.StateLoading:
+      try:
+        os.kill(pid, 0)
+      except OSError:
+        self.close()
+        raise self.SeqCacheException(
+          "%r: creator process %i died while filling. remove the segment via ipcrm." % (self, pid))
+      time.sleep(wait_poll_interval)
+    if header[2] != self.StateReady:
+      self.close()
+      raise self.SeqCacheException("%r: creator process %i failed to fill" % (self, pid))
+
+  def close(self):
+    """
+    Releases our reference. The last reference removes the shared memory segment.
+    """
+    if not self.mem:
+      return
+    with self._lock():
+      header = self._get_header()
+      header[3] -= 1
+      is_last = header[3] <= 0
+      shmid = self.mem.shmid
+      self.mem.remove()  # only detaches
+      self.mem = None
+      if is_last:
+        SharedMem.remove_shmid(shmid)
+    if is_last:
+      print("%r: removed" % self)
+
+  def get_ref_count(self):
+    """
+    :return: number of open instances over all processes
+    :rtype: int
+    """
+    with self._lock():
+      return int(self._get_header()[3])
+
+  def get_writable_array(self, key):
+    """
+    Only for ``fill_func``.
+
+    :param str key:
+    :return: all seqs concatenated, shape (total len,) + feature shape
+    :rtype: numpy.ndarray
+    """
+    assert self.is_creator
+    dtype, shape, seq_starts = self.layout[key]
+    nbytes = int(seq_starts[-1]) * int(numpy.prod(shape, dtype="int64")) * dtype.itemsize
+    offset = self._offsets[key]
+    return self._get_buffer()[offset:offset + nbytes].view(dtype).reshape((int(seq_starts[-1]),) + shape)
+
+  def get_seq(self, key, corpus_seq_idx):
+    """
+    :param str key:
+    :param int corpus_seq_idx:
+    :return: read-only view into the shared memory, shape (seq len,) + feature shape
+    :rtype: numpy.ndarray
+    """
+    dtype, shape, seq_starts = self.layout[key]
+    start, end = int(seq_starts[corpus_seq_idx]), int(seq_starts[corpus_seq_idx + 1])
+    feat_size = int(numpy.prod(shape, dtype="int64"))
+    offset = self._offsets[key] + start * feat_size * dtype.itemsize
+    nbytes = (end - start) * feat_size * dtype.itemsize
+    x = self._get_buffer()[offset:offset + nbytes].view(dtype).reshape((end - start,) + shape)
+    x.flags.writeable = False
+    return x
+
+  def __repr__(self):
+    return "<%s %r key=%x size=%i is_creator=%r>" % (
+      self.__class__.__name__, self.name, self.key, self.size, self.is_creator)
+
+
 def next_power_of_two(n):
   return 2 ** (int(n - 1).bit_length())
 
@@ -471,6 +686,269 @@ class SharedNumpyArray:
     return "<%s is_server=%r state=%r>" % (self.__class__.__name__, self.is_server, self.__getstate__())
 
 
+class PosixSharedMem:
+  """
+  POSIX shared memory (shm_open + mmap), identified by a name like "/returnn-shm-<pid>-<n>".
+  In contrast to :class:`SharedMem` (SysV shmget), the creator can unlink the name
+  as soon as the other process has attached (see :func:`unlink`).
+  After that, the kernel frees the memory once all processes have unmapped it,
+  i.e. also when any of them crashes.
+  Segments of crashed creators which were not unlinked yet can be removed via :func:`cleanup_stale`.
+  """
+
+  NamePrefix = "/returnn-shm-"
+  ShmDir = "/dev/shm"
+  _lib = None
+  _counter = 0
+
+  @classmethod
+  def _get_lib(cls):
+    """
+    :return: libc (or librt for older glibc) with shm_open/shm_unlink
+    :rtype: ctypes.CDLL
+    """
+    if cls._lib:
+      return cls._lib
+    import ctypes
+    import ctypes.util
+    for lib_name in ["c", "rt"]:
+      lib_so = ctypes.util.find_library(lib_name)
+      if not lib_so:
+        continue
+      lib = ctypes.CDLL(lib_so, use_errno=True)
+      if hasattr(lib, "shm_open"):
+        break
+    else:
+      raise SharedMem.ShmException("PosixSharedMem: shm_open not found")
+    # int shm_open(const char *name, int oflag, mode_t mode);
+    lib.shm_open.restype = ctypes.c_int
+    lib.shm_open.argtypes = (ctypes.c_char_p, ctypes.c_int, ctypes.c_uint)
+    # int shm_unlink(const char *name);
+    lib.shm_unlink.restype = ctypes.c_int
+    lib.shm_unlink.argtypes = (ctypes.c_char_p,)
+    cls._lib = lib
+    return lib
+
+  def __init__(self, size=None, name=None):
+    """
+    :param int|None size: for the creator. if attaching, the size of the existing segment is used
+    :param str|None name: if given, attach to this existing segment. otherwise create a new one
+    """
+    import ctypes
+    import mmap
+    self.is_creator = name is None
+    if self.is_creator:
+      assert size and size > 0
+      name = "%s%i-%i" % (self.NamePrefix, os.getpid(), PosixSharedMem._counter)
+      PosixSharedMem._counter += 1
+      flags = os.O_CREAT | os.O_EXCL | os.O_RDWR
+    else:
+      flags = os.O_RDWR
+    self.name = name
+    self.mmap = None
+    fd = self._get_lib().shm_open(name.encode("utf8"), flags, 0o600)
+    if fd < 0:
+      err = ctypes.get_errno()
+      raise SharedMem.CCallException(
+        "PosixSharedMem: shm_open(%r) failed with error %i (%s)" % (name, err, os.strerror(err)))
+    self.is_linked = self.is_creator
+    try:
+      if self.is_creator:
+        os.ftruncate(fd, size)
+        if hasattr(os, "posix_fallocate"):  # Python >=3.3, not on all platforms
+          # ftruncate only sets the size, the pages are allocated on first access.
+          # If /dev/shm is (nearly) full, that access would crash the process with SIGBUS.
+          # Allocate now, such that we get an error here (ENOSPC) and the caller can fall back.
+          os.posix_fallocate(fd, 0, size)
+      else:
+        size = os.fstat(fd).st_size
+      self.size = size
+      self.mmap = mmap.mmap(fd, size)
+    except (OSError, IOError, ValueError) as exc:
+      self.unlink()
+      raise SharedMem.ShmException("PosixSharedMem: cannot map %r (size %r): %s" % (name, size, exc))
+    finally:
+      os.close(fd)
+    if self.is_creator:
+      import atexit
+      atexit.register(self.unlink)
+
+  def unlink(self):
+    """
+    Removes the name. Existing mappings stay valid, but no other process can attach anymore.
+    """
+    if self.is_linked:
+      self._get_lib().shm_unlink(self.name.encode("utf8"))
+      self.is_linked = False
+
+  def close(self):
+    self.unlink()
+    if self.mmap is not None:
+      try:
+        self.mmap.close()
+      except BufferError:
+        pass  # there are still numpy views on it. it will be unmapped once they are gone
+      self.mmap = None
+
+  @classmethod
+  def cleanup_stale(cls):
+    """
+    Removes segments whose creator process does not exist anymore,
+    i.e. which were left over by a crashed process before it could unlink them.
+
+    :return: removed names
+    :rtype: list[str]
+    """
+    removed = []
+    if not os.path.isdir(cls.ShmDir):
+      return removed
+    prefix = cls.NamePrefix.lstrip("/")
+    for fn in sorted(os.listdir(cls.ShmDir)):
+      if not fn.startswith(prefix):
+        continue
+      try:
+        pid = int(fn[len(prefix):].split("-")[0])
+      except ValueError:
+        continue
+      try:
+        os.kill(pid, 0)
+      except OSError as exc:
+        if exc.errno == errno.ESRCH:
+          cls._get_lib().shm_unlink(("/" + fn).encode("utf8"))
+          removed.append("/" + fn)
+    return removed
+
+  def __repr__(self):
+    return "<PosixSharedMem name=%r size=%r is_creator=%r>" % (self.name, getattr(self, "size", None), self.is_creator)
+
+
+class ShmRingBuffer:
+  """
+  Ring buffer with fixed-size slots in :class:`PosixSharedMem`,
+  to send numpy arrays (e.g. batch tensors or parameter blocks) from one producer process to one consumer process.
+  The producer copies the arrays once into a slot (:func:`put_arrays`)
+  and sends only the small header over the normal pipe.
+  The consumer gets zero-copy numpy views (:func:`get_arrays`) and calls :func:`release` when done with them.
+
+  Memory layout: header (magic, num slots, slot size), one state flag (uint64) per slot, then the slots.
+  """
+
+  Magic = 0x52696e67  # "Ring"
+  HeaderSize = 4096
+  Alignment = 64
+  SlotFree = 0
+  SlotUsed = 1
+
+  def __init__(self, num_slots=None, slot_size=None, name=None):
+    """
+    :param int|None num_slots: for the creator
+    :param int|None slot_size: for the creator, in bytes
+    :param str|None name: if given, attach to this existing ring buffer, see :func:`get_name`
+    """
+    if name is None:
+      assert num_slots > 0 and slot_size > 0
+      assert (3 + num_slots) * 8 <= self.HeaderSize, "too many slots"
+      slot_size = self._aligned(slot_size)
+      self.mem = PosixSharedMem(size=self.HeaderSize + num_slots * slot_size)
+      numpy.frombuffer(self.mem.mmap, dtype="uint64", count=3)[:] = (self.Magic, num_slots, slot_size)
+    else:
+      self.mem = PosixSharedMem(name=name)
+      magic, num_slots, slot_size = [int(x) for x in numpy.frombuffer(self.mem.mmap, dtype="uint64", count=3)]
+      if magic != self.Magic:
+        self.mem.close()
+        raise SharedMem.ShmException("ShmRingBuffer: invalid magic in %r" % name)
+    self.num_slots = num_slots
+    self.slot_size = slot_size
+    self._slot_states = numpy.frombuffer(self.mem.mmap, dtype="uint64", count=num_slots, offset=3 * 8)
+    self._next_slot = 0
+
+  @classmethod
+  def _aligned(cls, n):
+    return (n + cls.Alignment - 1) // cls.Alignment * cls.Alignment
+
+  @classmethod
+  def get_needed_slot_size(cls, arrays):
+    """
+    :param list[numpy.ndarray] arrays:
+    :rtype: int
+    """
+    return sum([cls._aligned(a.nbytes) for a in arrays])
+
+  def get_name(self):
+    """
+    :return: name to attach to this ring buffer from another process, via ``ShmRingBuffer(name=...)``
+    :rtype: str
+    """
+    return self.mem.name
+
+  def _wait_for_free_slot(self, timeout):
+    """
+    :param float|None timeout: None means wait forever
+    :return: slot idx or None
+    :rtype: int|None
+    """
+    start_time = time.time()
+    while self._slot_states[self._next_slot] != self.SlotFree:
+      if timeout is not None and time.time() - start_time >= timeout:
+        return None
+      time.sleep(0.0001)
+    return self._next_slot
+
+  def put_arrays(self, arrays, timeout=None):
+    """
+    Copies the arrays into the next free slot.
+    Returns None if they do not fit into one slot or if no slot got free in time,
+    in which case the caller should use some other way (e.g. the pipe).
+
+    :param list[numpy.ndarray] arrays:
+    :param float|None timeout: how long to wait for a free slot. None means wait forever
+    :return: header for :func:`get_arrays`: slot idx, list of (offset, shape, dtype str)
+    :rtype: (int,list[(int,tuple[int],str)])|None
+    """
+    arrays = [numpy.asarray(a) for a in arrays]
+    if any([a.dtype.hasobject for a in arrays]):
+      return None
+    if self.get_needed_slot_size(arrays) > self.slot_size:
+      return None
+    slot_idx = self._wait_for_free_slot(timeout=timeout)
+    if slot_idx is None:
+      return None
+    offset = self.HeaderSize + slot_idx * self.slot_size
+    infos = []
+    for a in arrays:
+      numpy.ndarray(a.shape, dtype=a.dtype, buffer=self.mem.mmap, offset=offset)[...] = a
+      infos.append((offset, a.shape, a.dtype.str))
+      offset += self._aligned(a.nbytes)
+    self._slot_states[slot_idx] = self.SlotUsed
+    self._next_slot = (slot_idx + 1) % self.num_slots
+    return slot_idx, infos
+
+  def get_arrays(self, header):
+    """
+    :param (int,list[(int,tuple[int],str)]) header: from :func:`put_arrays`
+    :return: zero-copy views. only valid until :func:`release` is called
+    :rtype: list[numpy.ndarray]
+    """
+    slot_idx, infos = header
+    assert self._slot_states[slot_idx] == self.SlotUsed
+    return [
+      numpy.ndarray(shape, dtype=dtype, buffer=self.mem.mmap, offset=offset)
+      for (offset, shape, dtype) in infos]
+
+  def release(self, slot_idx):
+    """
+    :param int slot_idx: the slot can be reused by the producer
+    """
+    self._slot_states[slot_idx] = self.SlotFree
+
+  def close(self):
+    self._slot_states = None
+    self.mem.close()
+
+  def __repr__(self):
+    return "<ShmRingBuffer %r num_slots=%i slot_size=%i>" % (self.mem.name, self.num_slots, self.slot_size)
+
+
 def attrChain(base, *attribs, **kwargs):
   default = kwargs.get("default", None)
   obj = base
@@ -4,7 +4,6 @@ from __future__ import division
 
 import subprocess
 from subprocess import CalledProcessError
-import h5py
 from collections import deque
 import inspect
 import os
@@ -286,6 +285,7 @@ def eval_shell_str(s):
   return tokens
 
 def hdf5_dimension(filename, dimension):
+  import h5py
   fin = h5py.File(filename, "r")
   if '/' in dimension:
     res = fin['/'.join(dimension.split('/')[:-1])].attrs[dimension.split('/')[-1]]
@@ -295,12 +295,14 @@ def hdf5_dimension(filename, dimension):
   return res
 
 def hdf5_group(filename, dimension):
+  import h5py
   fin = h5py.File(filename, "r")
   res = { k : fin[dimension].attrs[k] for k in fin[dimension].attrs }
   fin.close()
   return res
 
 def hdf5_shape(filename, dimension):
+  import h5py
   fin = h5py.File(filename, "r")
   res = fin[dimension].shape
   fin.close()
@@ -312,6 +314,7 @@ def hdf5_strings(handle, name, data):
     dset = handle.create_dataset(name, (len(data),), dtype="S"+str(S))
     dset[...] = data
   except Exception:
+    import h5py
     dt = h5py.special_dtype(vlen=unicode)
     del handle[name]
     dset = handle.create_dataset(name, (len(data),), dtype=dt)
@@ -1693,6 +1696,62 @@ def load_txt_vector(filename):
   return [float(l) for l in open(filename).read().splitlines() if l and not l.startswith("<")]
 
 
+def md5_of_files(filenames, extra=None):
+  """
+  :param list[str] filenames:
+  :param str|None extra: also added to the hash, e.g. some options
+  :return: hex digest of the content of all files
+  :rtype: str
+  """
+  import hashlib
+  h = hashlib.md5()
+  for fn in filenames:
+    with open(fn, "rb") as f:
+      h.update(f.read())
+  if extra:
+    h.update(extra.encode("utf8"))
+  return h.hexdigest()
+
+
+def load_or_create_npz_cache(filename, cache_key, create_func, verbose_out=None):
+  """
+  Persistent cache of some Numpy arrays, which are expensive to create, e.g. some lookup tables
+  created from some text files. The cache file is usually next to the text file.
+  If we cannot write it (e.g. read-only dir), we just continue without it.
+
+  :param str filename: e.g. "%s.lookup.npz" % input_filename
+  :param str cache_key: e.g. via :func:`md5_of_files`. if it does not match the cache file, we recreate it
+  :param ()->dict[str,numpy.ndarray|int] create_func:
+  :param io.FileIO|None verbose_out:
+  :rtype: dict[str,numpy.ndarray]
+  """
+  if os.path.exists(filename):
+    try:
+      with np.load(filename) as f:
+        if str(f["__cache_key__"]) == cache_key:
+          if verbose_out:
+            print("Load cache file: %s" % filename, file=verbose_out)
+          return {k: f[k] for k in f.keys() if k != "__cache_key__"}
+    except Exception as exc:
+      from Log import log
+      print("Ignoring invalid cache file %r: %s" % (filename, exc), file=log.v3)
+  d = create_func()
+  d = {k: np.asarray(v) for (k, v) in d.items()}
+  tmp_filename = "%s.tmp.%i.npz" % (filename, os.getpid())
+  try:
+    with open(tmp_filename, "wb") as f:
+      np.savez(f, __cache_key__=np.array(cache_key), **d)
+    os.rename(tmp_filename, filename)
+    if verbose_out:
+      print("Wrote cache file: %s" % filename, file=verbose_out)
+  except (IOError, OSError) as exc:
+    from Log import log
+    print("Cannot write cache file %r: %s" % (filename, exc), file=log.v3)
+    if os.path.exists(tmp_filename):
+      os.remove(tmp_filename)
+  return d
+
+
 class CollectionReadCheckCovered:
   """
   Wraps around a dict. It keeps track about all the keys which were read from the dict.
@@ -2328,9 +2387,16 @@ def log_runtime_info_to_dir(path, config):
 class NativeCodeCompiler(object):
   """
   Helper class to compile native C/C++ code on-the-fly.
+
+  The compiled libs are cached in a content-addressed directory (see :func:`get_cache_base_dir`),
+  which can be shared between multiple processes and also multiple hosts (e.g. on network storage).
+  The compile runs under a lock file, and the final lib is published atomically via rename,
+  so other processes never see a partially written lib.
   """
 
   CacheDirName = "returnn_native"
+  CacheBaseDir = None  # type: None|str  # see get_cache_base_dir()
+  CacheBaseDirEnvName = "RETURNN_NATIVE_CACHE_DIR"
   CollectedCompilers = None  # type: None|list[NativeCodeCompiler]
 
   def __init__(self, base_name, code_version, code,
@@ -2346,8 +2412,9 @@ class NativeCodeCompiler(object):
     :param dict[str,str|int]|None c_macro_defines: e.g. {"TENSORFLOW": 1}
     :param list[str]|None ld_flags: e.g. ["-lblas"]
     :param list[str]|tuple[str] include_paths:
-    :param list[str]|None include_deps: if provided and an existing lib file, we will check if any dependency is newer
-      and we need to recompile. we could also do it automatically via -MD but that seems overkill and too slow.
+    :param list[str]|None include_deps: if provided, the content of these files is part of the code hash,
+      i.e. if any dependency changes, we will recompile.
+      we could also do it automatically via -MD but that seems overkill and too slow.
     :param str|None static_version_name: normally, we use .../base_name/hash as the dir
       but this would use .../base_name/static_version_name.
     :param bool should_cleanup_old_all: whether we should look in the cache dir
@@ -2358,7 +2425,7 @@ class NativeCodeCompiler(object):
     if self.CollectedCompilers is not None:
       self.CollectedCompilers.append(self)
     self.verbose = verbose
-    self.cache_dir = "%s/%s" % (get_temp_dir(), self.CacheDirName)
+    self.cache_dir = "%s/%s" % (self.get_cache_base_dir(), self.CacheDirName)
     self._include_paths = list(include_paths)
     self.base_name = base_name
     self.code_version = code_version
@@ -2368,6 +2435,7 @@ class NativeCodeCompiler(object):
     self.ld_flags = ld_flags or []
     self.include_deps = include_deps
     self.static_version_name = static_version_name
+    self.use_cxx11_abi = use_cxx11_abi
     self._code_hash = self._make_code_hash()
     self._info_dict = self._make_info_dict()
     self._hash = self._make_hash()
@@ -2375,13 +2443,29 @@ class NativeCodeCompiler(object):
     if should_cleanup_old_all:
       self._cleanup_old()
     self._should_cleanup_old_mydir = should_cleanup_old_mydir
-    self.use_cxx11_abi = use_cxx11_abi
     if self.verbose:
       print("%s: %r" % (self.__class__.__name__, self))
 
   def __repr__(self):
     return "<%s %r in %r>" % (self.__class__.__name__, self.base_name, self._mod_path)
 
+  @classmethod
+  def get_cache_base_dir(cls):
+    """
+    The base dir for the cache can be configured via :data:`CacheBaseDir`
+    (e.g. via the config option ``native_code_cache_dir``, see :func:`rnn.initBackendEngine`)
+    or via the env var ``RETURNN_NATIVE_CACHE_DIR``.
+    Otherwise, it is :func:`get_temp_dir`.
+
+    :return: base dir, where we create the :data:`CacheDirName` dir
+    :rtype: str
+    """
+    if cls.CacheBaseDir:
+      return cls.CacheBaseDir
+    if os.environ.get(cls.CacheBaseDirEnvName):
+      return os.environ[cls.CacheBaseDirEnvName]
+    return get_temp_dir()
+
   @property
   def _mod_path(self):
     return "%s/%s/%s" % (self.cache_dir, self.base_name, self.static_version_name or self._hash[:10])
@@ -2428,7 +2512,8 @@ class NativeCodeCompiler(object):
       if not os.path.exists(so_path):
         self._cleanup_old_path(full_dir_path, reason="corrupt dir, missing so")
         continue
-      dt = time.time() - os.path.getmtime(so_path)
+      # info.py gets touched whenever it is used, see _maybe_compile().
+      dt = time.time() - max(os.path.getmtime(so_path), os.path.getmtime(info_path))
       if dt > cleanup_time_limit_secs:
         self._cleanup_old_path(full_dir_path, reason="%s old" % hms(dt))
 
@@ -2448,9 +2533,11 @@ class NativeCodeCompiler(object):
     s = open(filename).read()
     return eval(s)
 
-  _relevant_info_keys = ("code_version", "code_hash", "c_macro_defines", "ld_flags")
+  _relevant_info_keys = (
+    "code_version", "code_hash", "c_macro_defines", "ld_flags", "compiler_bin", "compiler_version", "use_cxx11_abi")
 
   def _make_info_dict(self):
+    compiler_bin = self._get_compiler_bin()
     return {
       "base_name": self.base_name,
       "include_paths": self._include_paths,
@@ -2458,12 +2545,43 @@ class NativeCodeCompiler(object):
       "code_hash": self._code_hash,
       "c_macro_defines": self.c_macro_defines,
       "ld_flags": self.ld_flags,
+      "compiler_bin": compiler_bin,
+      "compiler_version": self._get_compiler_version(compiler_bin),
+      "use_cxx11_abi": self.use_cxx11_abi,
     }
 
+  _compiler_versions = {}  # type: dict[str,str]  # compiler bin -> version, cached per process
+
+  @classmethod
+  def _get_compiler_version(cls, compiler_bin):
+    """
+    As the cache dir can be shared between hosts, the compiler is part of the hash.
+
+    :param str compiler_bin: e.g. "g++" or ".../bin/nvcc"
+    :return: the output of ``compiler_bin --version``, or some placeholder if that fails
+    :rtype: str
+    """
+    if compiler_bin in cls._compiler_versions:
+      return cls._compiler_versions[compiler_bin]
+    from subprocess import Popen, PIPE, STDOUT
+    try:
+      proc = Popen([compiler_bin, "--version"], stdout=PIPE, stderr=STDOUT)
+      stdout, _ = proc.communicate()
+      version = stdout.decode("utf8").strip()
+      if proc.returncode != 0:
+        version = "<%s --version failed with exit code %i: %s>" % (compiler_bin, proc.returncode, version)
+    except OSError as exc:
+      version = "<%s --version exception: %s>" % (compiler_bin, exc)
+    cls._compiler_versions[compiler_bin] = version
+    return version
+
   def _make_code_hash(self):
     import hashlib
     hash = hashlib.md5()
     hash.update(self.code.encode("utf8"))
+    for fn in self.include_deps or ():
+      with open(fn, "rb") as f:
+        hash.update(f.read())
     return hash.hexdigest()
 
   def _make_hash(self):
@@ -2477,17 +2595,24 @@ class NativeCodeCompiler(object):
 
   def _save_info(self):
     filename = self._info_filename
-    with open(filename, "w") as f:
+    tmp_filename = self._get_tmp_filename(filename)
+    with open(tmp_filename, "w") as f:
       f.write("%s\n" % betterRepr(self._info_dict))
+    os.rename(tmp_filename, filename)
+
+  @staticmethod
+  def _get_tmp_filename(filename):
+    """
+    :param str filename:
+    :return: unique filename in the same dir, such that we can atomically rename it to filename
+    :rtype: str
+    """
+    import socket
+    return "%s.tmp.%s.%i" % (filename, socket.gethostname(), os.getpid())
 
   def _need_recompile(self):
     if not os.path.exists(self._so_filename):
       return True
-    if self.include_deps:
-      so_mtime = os.path.getmtime(self._so_filename)
-      for fn in self.include_deps:
-        if os.path.getmtime(fn) > so_mtime:
-          return True
     old_info = self._load_info()
     new_info = self._make_info_dict()
     if not old_info:
@@ -2518,6 +2643,10 @@ class NativeCodeCompiler(object):
       if os.path.exists(self._mod_path):
         self._cleanup_old_path(self._mod_path, reason="need recompile")
     with lock:
+      # Some other process might have compiled it in the meantime.
+      if not self._need_recompile():
+        os.utime(self._info_filename, None)
+        return
       self._maybe_compile_inner()
 
   def _get_compiler_bin(self):
@@ -2549,7 +2678,10 @@ class NativeCodeCompiler(object):
     common_opts += ["-D_GLIBCXX_USE_CXX11_ABI=%i" % (1 if self.use_cxx11_abi else 0)]
     common_opts += ["-D%s=%s" % item for item in sorted(self.c_macro_defines.items())]
     common_opts += ["-g"]
-    opts = common_opts + [self._c_filename, "-o", self._so_filename]
+    # Compile into a tmp file first, and then atomically rename it.
+    # Other processes might have loaded the existing lib, or might load it while we compile.
+    tmp_so_filename = self._get_tmp_filename(self._so_filename)
+    opts = common_opts + [self._c_filename, "-o", tmp_so_filename]
     opts += self.ld_flags
     cmd_bin = self._get_compiler_bin()
     cmd_args = [cmd_bin] + opts
@@ -2567,12 +2699,14 @@ class NativeCodeCompiler(object):
         print("This might be the error: https://github.com/tensorflow/tensorflow/issues/22766")
         print()
       raise CalledProcessError(returncode=proc.returncode, cmd=cmd_args)
-    assert os.path.exists(self._so_filename)
+    assert os.path.exists(tmp_so_filename)
     with open("%s/compile.log" % self._mod_path, "wb") as f:
       if self.verbose:
         print("%s: write compile log to: %s" % (self.__class__.__name__, f.name))
       f.write(("+ %s\n" % " ".join(cmd_args)).encode("utf8"))
       f.write(stdout)
+    # First the lib, then the info. A reader which sees the new lib with the old info will just wait for the lock.
+    os.rename(tmp_so_filename, self._so_filename)
     self._save_info()
     assert not self._need_recompile()
 
@@ -2776,6 +2910,202 @@ class Stats:
       numpy.savetxt("%s.std_dev.txt" % output_file_prefix, self.get_std_dev())
 
 
+class TimingStats:
+  """
+  Lightweight accumulation of timings (or other values, e.g. queue fill levels) per named stage.
+  E.g. used by :class:`TFEngine.Runner` to see whether a job is input-bound.
+  This is thread-safe, as some stages are measured in other threads (e.g. the data provider thread).
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.totals = {}  # type: dict[str,float]
+    self.counts = {}  # type: dict[str,int]
+    self.maxs = {}  # type: dict[str,float]
+    self.cur = {}  # type: dict[str,float]  # since the last call to pop_cur()
+
+  def collect(self, key, value):
+    """
+    :param str key: e.g. "session_run"
+    :param float|int value: e.g. duration in secs
+    """
+    with self.lock:
+      self.totals[key] = self.totals.get(key, 0.) + value
+      self.counts[key] = self.counts.get(key, 0) + 1
+      self.maxs[key] = max(self.maxs.get(key, value), value)
+      self.cur[key] = self.cur.get(key, 0.) + value
+
+  @contextlib.contextmanager
+  def measure(self, key):
+    """
+    Measures the wall time of the with-block and collects it under `key`.
+
+    :param str key:
+    """
+    start_time = time.time()
+    try:
+      yield
+    finally:
+      self.collect(key, time.time() - start_time)
+
+  def pop_cur(self):
+    """
+    :return: values collected since the last call, key -> summed value
+    :rtype: dict[str,float]
+    """
+    with self.lock:
+      cur, self.cur = self.cur, {}
+    return cur
+
+  def get_mean(self, key):
+    """
+    :param str key:
+    :rtype: float
+    """
+    return self.totals[key] / self.counts[key]
+
+  def get_summary_dict(self):
+    """
+    :return: key -> {"total", "count", "mean", "max"}
+    :rtype: dict[str,dict[str,float|int]]
+    """
+    with self.lock:
+      return {
+        key: {"total": self.totals[key], "count": self.counts[key],
+              "mean": self.totals[key] / self.counts[key], "max": self.maxs[key]}
+        for key in self.totals.keys()}
+
+  def get_summary_str(self, total_time=None, time_keys=None):
+    """
+    :param float|None total_time: if given, will also show the percentage of time_keys w.r.t. this
+    :param list[str]|set[str]|None time_keys: keys which are durations. all by default
+    :rtype: str
+    """
+    parts = []
+    for key, d in sorted(self.get_summary_dict().items()):
+      is_time = time_keys is None or key in time_keys
+      if is_time:
+        part = "%s avg %.3f sec (max %.3f)" % (key, d["mean"], d["max"])
+        if total_time:
+          part += " %.1f%%" % (d["total"] / total_time * 100.)
+      else:
+        part = "%s avg %.2f (max %s)" % (key, d["mean"], d["max"])
+      parts.append(part)
+    return ", ".join(parts) or "(no stats)"
+
+
+class PriorAccumulator:
+  """
+  Accumulates the sum of posteriors (or label counts) over a corpus for prior estimation,
+  see :func:`TFEngine.Engine.compute_priors`.
+  The per-batch sums are expected to be reduced already (e.g. inside the graph),
+  and they are accumulated in float64, optionally in log-space (via logaddexp),
+  which is stable when the posteriors of rare labels are tiny.
+  The state can be saved and loaded, to resume an interrupted computation,
+  and partial accumulators (e.g. of multiple shards of the corpus) can be merged.
+  """
+
+  def __init__(self, dim, log_space=False):
+    """
+    :param int dim: number of labels
+    :param bool log_space: whether the batch sums and the accumulated sum are in log-space
+    """
+    self.dim = dim
+    self.log_space = log_space
+    if log_space:
+      self.sum = np.full((dim,), -np.inf, dtype="float64")
+    else:
+      self.sum = np.zeros((dim,), dtype="float64")
+    self.num_frames = 0
+    self.num_batches = 0
+
+  def __repr__(self):
+    return "%s(dim=%i, log_space=%r, num_frames=%i, num_batches=%i)" % (
+      self.__class__.__name__, self.dim, self.log_space, self.num_frames, self.num_batches)
+
+  def add_batch_sum(self, batch_sum, num_frames):
+    """
+    :param numpy.ndarray batch_sum: shape (dim,). sum over all frames of the batch, or logsumexp if log_space
+    :param int num_frames:
+    """
+    assert batch_sum.shape == (self.dim,)
+    if self.log_space:
+      self.sum = np.logaddexp(self.sum, batch_sum.astype("float64"))
+    else:
+      self.sum += batch_sum
+    self.num_frames += int(num_frames)
+    self.num_batches += 1
+
+  def add_labels(self, labels):
+    """
+    For sparse outputs, counts the labels, without a one-hot expansion.
+
+    :param numpy.ndarray labels: shape (frames,), int
+    """
+    counts = np.bincount(labels, minlength=self.dim).astype("float64")
+    assert counts.shape == (self.dim,), "label out of range"
+    if self.log_space:
+      with np.errstate(divide="ignore"):
+        counts = np.log(counts)
+    self.add_batch_sum(counts, num_frames=labels.shape[0])
+
+  def merge(self, other):
+    """
+    :param PriorAccumulator other: e.g. of another shard. will be added to this one
+    """
+    assert isinstance(other, PriorAccumulator)
+    assert other.dim == self.dim, "dim mismatch: %r vs %r" % (self, other)
+    if self.log_space == other.log_space:
+      other_sum = other.sum
+    elif self.log_space:
+      with np.errstate(divide="ignore"):
+        other_sum = np.log(other.sum)
+    else:
+      other_sum = np.exp(other.sum)
+    if self.log_space:
+      self.sum = np.logaddexp(self.sum, other_sum)
+    else:
+      self.sum = self.sum + other_sum
+    self.num_frames += other.num_frames
+    self.num_batches += other.num_batches
+
+  def get_log_prior(self):
+    """
+    :return: average posterior in +log space, shape (dim,)
+    :rtype: numpy.ndarray
+    """
+    assert self.num_frames > 0, "%r: no frames" % self
+    if self.log_space:
+      return self.sum - np.log(self.num_frames)
+    with np.errstate(divide="ignore"):
+      return np.log(self.sum) - np.log(self.num_frames)
+
+  def save(self, filename):
+    """
+    Saves the state (npz format). The file is replaced atomically, thus this can be called regularly.
+
+    :param str filename:
+    """
+    tmp_filename = "%s.tmp" % filename
+    with open(tmp_filename, "wb") as f:
+      np.savez(
+        f, sum=self.sum, log_space=self.log_space, num_frames=self.num_frames, num_batches=self.num_batches)
+    os.rename(tmp_filename, filename)
+
+  @classmethod
+  def load(cls, filename):
+    """
+    :param str filename: via :func:`save`
+    :rtype: PriorAccumulator
+    """
+    with np.load(filename) as d:
+      acc = cls(dim=d["sum"].shape[0], log_space=bool(d["log_space"]))
+      acc.sum = d["sum"].astype("float64")
+      acc.num_frames = int(d["num_frames"])
+      acc.num_batches = int(d["num_batches"])
+    return acc
+
+
 def is_namedtuple(cls):
   """
   :param T cls: tuple, list or namedtuple type
@@ -24,11 +24,10 @@ import sys
 import time
 import numpy
 from Log import log
-from Device import Device, TheanoFlags, getDevicesInitArgs
 from Config import Config
-from Engine import Engine
 from Dataset import Dataset, init_dataset, init_dataset_via_str
-from HDFDataset import HDFDataset
+# Backend specific modules (Device, Engine, TFEngine, ...) and heavy optional deps (h5py, ...)
+# are only imported when needed.
 from Debug import initIPythonKernel, initBetterExchook, initFaulthandler, initCudaNotInMainProcCheck
 from Util import initThreadJoinHack, describe_crnn_version, describe_theano_version, \
   describe_tensorflow_version, BackendEngine, get_tensorflow_version_tuple
@@ -41,6 +40,7 @@ dev_data = None; """ :type: Dataset """
 eval_data = None; """ :type: Dataset """
 quit = False
 server = None; """:type: Server"""
+startup_profiler = None; """:type: Debug.StartupProfiler|None"""
 
 
 def initConfig(configFilename=None, commandLineOptions=(), default_config=None, extra_updates=None):
@@ -135,6 +135,7 @@ def initTheanoDevices():
   """
   if not BackendEngine.is_theano_selected():
     return None
+  from Device import Device, TheanoFlags, getDevicesInitArgs
   oldDeviceConfig = ",".join(config.list('device', ['default']))
   if config.value("task", "train") == "nop":
     return []
@@ -212,7 +213,8 @@ def load_data(config, cache_byte_size, files_config_key, **kwargs):
     config_str = config.value(files_config_key, "")
     data = init_dataset_via_str(config_str, config=config, cache_byte_size=cache_byte_size, **kwargs)
   cache_leftover = 0
-  if isinstance(data, HDFDataset):
+  hdf_dataset_module = sys.modules.get("HDFDataset")  # only imported if such a dataset is used
+  if hdf_dataset_module and isinstance(data, hdf_dataset_module.HDFDataset):
     cache_leftover = data.definite_cache_leftover
   return data, cache_leftover
 
@@ -276,6 +278,7 @@ def initEngine(devices):
   """
   global engine
   if BackendEngine.is_theano_selected():
+    from Engine import Engine
     engine = Engine(devices)
   elif BackendEngine.is_tensorflow_selected():
     import TFEngine
@@ -301,6 +304,10 @@ def returnnGreeting(configFilename=None, commandLineOptions=None):
 
 def initBackendEngine():
   BackendEngine.select_engine(config=config)
+  if config.value("native_code_cache_dir", None):
+    from Util import NativeCodeCompiler
+    NativeCodeCompiler.CacheBaseDir = config.value("native_code_cache_dir", None)
+    print("Native code cache dir: %s" % NativeCodeCompiler.CacheBaseDir, file=log.v4)
   if BackendEngine.is_theano_selected():
     print("Theano:", describe_theano_version(), file=log.v3)
     import TheanoUtil
@@ -357,7 +364,8 @@ def init(configFilename=None, commandLineOptions=(), config_updates=None, extra_
   """
   initBetterExchook()
   initThreadJoinHack()
-  initConfig(configFilename=configFilename, commandLineOptions=commandLineOptions, extra_updates=config_updates)
+  with _startup_step("initConfig"):
+    initConfig(configFilename=configFilename, commandLineOptions=commandLineOptions, extra_updates=config_updates)
   if config.bool("patch_atfork", False):
     from Util import maybe_restart_returnn_with_atfork_patch
     maybe_restart_returnn_with_atfork_patch()
@@ -366,7 +374,8 @@ def init(configFilename=None, commandLineOptions=(), config_updates=None, extra_
     print(extra_greeting, file=log.v1)
   returnnGreeting(configFilename=configFilename, commandLineOptions=commandLineOptions)
   initFaulthandler()
-  initBackendEngine()
+  with _startup_step("initBackendEngine"):
+    initBackendEngine()
   if BackendEngine.is_theano_selected():
     if config.value('task', 'train') == "theano_graph":
       config.set("multiprocessing", False)
@@ -375,16 +384,31 @@ def init(configFilename=None, commandLineOptions=(), config_updates=None, extra_
   if config.bool('ipython', False):
     initIPythonKernel()
   initConfigJsonNetwork()
-  devices = initTheanoDevices()
+  with _startup_step("initTheanoDevices"):
+    devices = initTheanoDevices()
   if needData():
-    initData()
+    with _startup_step("initData"):
+      initData()
   printTaskProperties(devices)
   if config.value('task', 'train') == 'server':
-    import Server
-    global server
-    server = Server.Server(config)
+    with _startup_step("initServer"):
+      import Server
+      global server
+      server = Server.Server(config)
   else:
-    initEngine(devices)
+    with _startup_step("initEngine"):
+      initEngine(devices)
+
+
+def _startup_step(name):
+  """
+  :param str name:
+  :return: context manager, which measures the time of this init step if we use the startup profiler
+  """
+  if startup_profiler:
+    return startup_profiler.step(name)
+  from Util import dummy_noop_ctx
+  return dummy_noop_ctx()
 
 
 def finalize():
@@ -592,10 +616,23 @@ def analyze_data(config):
 
 
 def main(argv):
+  """
+  :param list[str] argv: e.g. sys.argv.
+    If it contains "--startup-profile", we report the time of the imports and init steps after :func:`init`.
+  """
   return_code = 0
+  if "--startup-profile" in argv:
+    argv = [arg for arg in argv if arg != "--startup-profile"]
+    from Debug import StartupProfiler
+    global startup_profiler
+    startup_profiler = StartupProfiler()
+    startup_profiler.install()
   try:
     assert len(argv) >= 2, "usage: %s <config>" % argv[0]
     init(commandLineOptions=argv[1:])
+    if startup_profiler:
+      startup_profiler.uninstall()
+      startup_profiler.report(file=log.v1)
     executeMainTask()
   except KeyboardInterrupt:
     return_code = 1
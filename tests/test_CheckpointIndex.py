@@ -0,0 +1,106 @@
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import shutil
+from nose.tools import assert_equal
+
+sys.path.insert(0, os.path.realpath(os.path.dirname(os.path.abspath(__file__)) + "/.."))
+
+from CheckpointIndex import *
+from Util import CollectionReadCheckCovered
+
+import better_exchook
+better_exchook.replace_traceback_format_tb()
+
+from Log import log
+log.initialize()
+
+
+def _create_dummy_checkpoint(filename, size=10):
+  for ext in [".index", ".meta", ".data-00000-of-00001"]:
+    with open(filename + ext, "wb") as f:
+      f.write(b"x" * size)
+
+
+def test_scan_model_dir_and_get_checkpoint_files():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    model_filename = "%s/net-model/network" % tmp_dir
+    os.mkdir(os.path.dirname(model_filename))
+    _create_dummy_checkpoint(model_filename + ".pretrain.001")
+    _create_dummy_checkpoint(model_filename + ".100")
+    _create_dummy_checkpoint(model_filename + ".1000")
+    _create_dummy_checkpoint(model_filename + ".crash_5")  # not an epoch model
+    existing_models = CheckpointIndex.scan_model_dir(model_filename)
+    assert_equal(existing_models, {
+      1: model_filename + ".pretrain.001", 100: model_filename + ".100", 1000: model_filename + ".1000"})
+    # Epoch 100 must not cover the files of epoch 1000.
+    assert_equal(
+      sorted(get_checkpoint_files(model_filename + ".100")),
+      [model_filename + ".100" + ext for ext in [".data-00000-of-00001", ".index", ".meta"]])
+    index = CheckpointIndex(CheckpointIndex.get_default_filename(model_filename))
+    index.update_from_existing_models(existing_models)
+    assert_equal(index.entries[1]["is_pretrain"], True)
+    assert_equal(index.entries[100]["is_pretrain"], False)
+    index.update_sizes()
+    assert_equal(index.entries[100]["size"], 30)
+    index.save()
+    index2 = CheckpointIndex(index.filename)
+    assert_equal(index2.entries, index.entries)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_select_epochs_to_keep():
+  epoch_scores = {epoch: {"dev_score": 1.0 / epoch, "train_score": 2.0} for epoch in range(1, 21)}
+  epoch_scores[3]["dev_score"] = 0.01  # best
+  keep = select_epochs_to_keep(epoch_scores, keep_last_n=2, keep_best_n=1)
+  # 5, 10, 20 from the default keep pattern, 19, 20 as the last ones, 3 as the best one.
+  assert_equal(sorted(keep), [3, 5, 10, 19, 20])
+
+
+def test_cleanup_old_models():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    model_filename = "%s/network" % tmp_dir
+    index = CheckpointIndex(CheckpointIndex.get_default_filename(model_filename))
+    for epoch in range(1, 11):
+      _create_dummy_checkpoint(model_filename + ".%03d" % epoch)
+      index.add_checkpoint(
+        epoch=epoch, filename=model_filename + ".%03d" % epoch, is_pretrain=False, scores={"dev_score": 10.0 - epoch})
+    opts = {"keep_last_n": 2, "keep_best_n": 2, "keep": [], "num_workers": 3}
+    count_bytes = cleanup_old_models(index=index, opts=CollectionReadCheckCovered(opts), dry_run=True)
+    assert_equal(count_bytes, 8 * 30)
+    assert_equal(len(CheckpointIndex.scan_model_dir(model_filename)), 10)
+    count_bytes = cleanup_old_models(index=index, opts=CollectionReadCheckCovered(opts))
+    assert_equal(count_bytes, 8 * 30)
+    assert_equal(sorted(CheckpointIndex.scan_model_dir(model_filename).keys()), [9, 10])
+    assert_equal(sorted(os.listdir(tmp_dir)), sorted(
+      [os.path.basename(index.filename)] +
+      ["network.%03d%s" % (epoch, ext) for epoch in [9, 10] for ext in [".index", ".meta", ".data-00000-of-00001"]]))
+    assert_equal(sorted(CheckpointIndex(index.filename).entries.keys()), [9, 10])
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        v()
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
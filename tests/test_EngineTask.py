@@ -8,6 +8,7 @@ from nose.tools import assert_equal, assert_is_instance, assert_in, assert_great
 import time
 import sys
 from pprint import pprint
+import numpy
 
 from EngineTask import TaskThread, TrainTaskThread, EvalTaskThread
 from Device import Device
@@ -210,3 +211,109 @@ def test_DeviceBatchRun_outputs_format():
 
   assert_greater(tester.score, 0)
   assert_greater(tester.error, 0)
+
+
+class DummyParam:
+  def __init__(self, value, layer):
+    self.value = value.copy()
+    self.layer = layer
+
+  def get_value(self, borrow=False, return_internal_type=False):
+    return self.value.copy()
+
+  def set_value(self, value):
+    self.value = numpy.array(value, dtype="float32")
+
+
+class DummyParamsNetwork:
+  ctc_priors = None
+  update_step = 0
+
+  def __init__(self, values):
+    self.params = [DummyParam(value, layer) for (value, layer) in values]
+
+  def get_all_params_vars(self):
+    return self.params
+
+
+class DummySyncDevice:
+  def __init__(self, name, values):
+    self.name = name
+    self.network = DummyParamsNetwork(values)
+    self.total_cost = 1.0
+
+  def train_step(self, rnd):
+    for p in self.network.params:
+      p.value += rnd.randn(*p.value.shape).astype("float32")
+    self.total_cost = 1.0
+
+  def sync_net_train_params(self):
+    pass
+
+  def get_total_cost(self):
+    return self.total_cost
+
+  def get_num_updates(self):
+    return 1
+
+  def iter_net_train_params(self, network):
+    for p in self.network.params:
+      yield p.get_value()
+
+  def set_net_encoded_params_partial(self, param_indices, network_params, add=False):
+    self.total_cost = 0
+    for i, value in zip(param_indices, network_params):
+      p = self.network.params[i]
+      p.set_value(p.value + value if add else value)
+
+
+def make_param_sync_trainer(**kwargs):
+  values = [(numpy.zeros((3,), "float32"), "a"), (numpy.zeros((2, 2), "float32"), "a"), (numpy.zeros((4,), "float32"), "b")]
+
+  class DummyParamSyncTrainer(TrainTaskThread):
+    def start(self):
+      pass  # Don't start the thread.
+
+  return DummyParamSyncTrainer(
+    network=DummyParamsNetwork(values), devices=[DummySyncDevice("dev%i" % i, values) for i in range(3)],
+    data=None, batches=DummyBatches(), learning_rate=1.0, updater=DummyUpdater(), **kwargs)
+
+
+def test_TrainTaskThread_reduce_pipelined():
+  rnd = numpy.random.RandomState(42)
+  trainer = make_param_sync_trainer(param_sync_mode="pipelined")
+  assert_equal(trainer.get_param_blocks(), [[0, 1], [2]])
+  for dev in trainer.devices:
+    dev.train_step(rnd)
+  expected = [numpy.mean([dev.network.params[i].value for dev in trainer.devices], axis=0) for i in range(3)]
+  trainer.reduce(num_frames=NumbersDict(1))
+  for i in range(3):
+    numpy.testing.assert_allclose(trainer.network.params[i].value, expected[i], rtol=1e-5)
+    for dev in trainer.devices:
+      numpy.testing.assert_allclose(dev.network.params[i].value, expected[i], rtol=1e-5)
+
+
+def test_TrainTaskThread_reduce_delayed():
+  rnd = numpy.random.RandomState(42)
+  trainer = make_param_sync_trainer(param_sync_delayed=True)
+  for dev in trainer.devices:
+    dev.train_step(rnd)
+  consensus = [numpy.mean([dev.network.params[i].value for dev in trainer.devices], axis=0) for i in range(3)]
+  trainer.reduce(num_frames=NumbersDict(1))
+  # The devices continue with their own params, and get the consensus plus their own new updates at the next sync.
+  old_values = [[p.get_value() for p in dev.network.params] for dev in trainer.devices]
+  for dev in trainer.devices:
+    dev.train_step(rnd)
+  deltas = [[p.value - old for (p, old) in zip(dev.network.params, olds)]
+            for (dev, olds) in zip(trainer.devices, old_values)]
+  trainer.reduce(num_frames=NumbersDict(1))
+  for i in range(3):
+    numpy.testing.assert_allclose(trainer.network.params[i].value, consensus[i], rtol=1e-5)
+    for dev, delta in zip(trainer.devices, deltas):
+      numpy.testing.assert_allclose(dev.network.params[i].value, consensus[i] + delta[i], rtol=1e-4, atol=1e-5)
+  trainer._apply_delayed_consensus(keep_device_updates=False)
+  for i in range(3):
+    expected = consensus[i] + numpy.mean([delta[i] for delta in deltas], axis=0)
+    numpy.testing.assert_allclose(trainer.network.params[i].value, expected, rtol=1e-4, atol=1e-5)
+    for dev in trainer.devices:
+      numpy.testing.assert_allclose(dev.network.params[i].value, expected, rtol=1e-4, atol=1e-5)
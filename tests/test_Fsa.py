@@ -13,6 +13,7 @@ import unittest
 import time
 import numpy
 import tensorflow as tf
+from nose.tools import assert_equal
 
 print("TF version:", tf.__version__)
 
@@ -346,6 +347,157 @@ def test_fast_bw_fsa_staircase():
   check_fast_bw_fsa_staircase(3, 3, with_loop=True)
 
 
+def fast_bw_fsa_staircase_reference(seq_lens, with_loop=False, max_skip=None, start_max_skip=None, end_max_skip=None):
+  """
+  Straight-forward loop-based implementation of :func:`Fsa.fast_bw_fsa_staircase`,
+  which was used before it got vectorized. Used as reference here.
+
+  :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+  """
+  n_batch = len(seq_lens)
+  state_idx = 0
+  edges = []
+  start_end_states = []
+  for batch in range(n_batch):
+    seq_len = seq_lens[batch]
+    start_state_idx = state_idx
+    for i in range(seq_len):
+      cur_state_idx = state_idx
+      cur_max_skip = None
+      if not cur_max_skip and i == 0:
+        cur_max_skip = start_max_skip
+      if not cur_max_skip and end_max_skip and i + end_max_skip >= seq_len:
+        cur_max_skip = end_max_skip
+      if not cur_max_skip:
+        cur_max_skip = max_skip
+      j_max = seq_len
+      if cur_max_skip:
+        j_max = min(j_max, i + cur_max_skip)
+      if with_loop:
+        edges += [(cur_state_idx, cur_state_idx, i, batch)]
+      for j in range(i + 1, j_max + 1):
+        target_state_idx = cur_state_idx + j - i
+        if i > 0:
+          edges += [(cur_state_idx, target_state_idx, i, batch)]
+        else:
+          for t in range(i, j):
+            if with_loop and i == t and j < seq_len:
+              continue
+            edges += [(cur_state_idx, target_state_idx, t, batch)]
+          if with_loop and j < seq_len:
+            edges += [(cur_state_idx, target_state_idx, j, batch)]
+      state_idx += 1
+    start_end_states += [(start_state_idx, state_idx)]
+    state_idx += 1
+  return (
+    numpy.array(edges).reshape((len(edges), 4)).transpose(),
+    numpy.zeros((len(edges),)),
+    numpy.array(start_end_states).transpose())
+
+
+def test_fast_bw_fsa_staircase_reference():
+  import itertools
+  for seq_len, with_loop, max_skip, start_max_skip, end_max_skip in itertools.product(
+        range(1, 8), [False, True], [None, 1, 2, 3], [None, 1, 3], [None, 1, 2]):
+    seq_lens = [seq_len, max(seq_len - 2, 1), seq_len]
+    opts = dict(with_loop=with_loop, max_skip=max_skip, start_max_skip=start_max_skip, end_max_skip=end_max_skip)
+    edges, weights, start_end_states = fast_bw_fsa_staircase_reference(seq_lens, **opts)
+    fsa = Fsa.fast_bw_fsa_staircase(seq_lens, **opts)
+    numpy.testing.assert_array_equal(fsa.edges, edges)
+    numpy.testing.assert_array_equal(fsa.weights, weights)
+    numpy.testing.assert_array_equal(fsa.start_end_states, start_end_states)
+
+
+def test_FastBwFsaShared_get_fast_bw_fsa():
+  n_batch = 3
+  fsa = Fsa.FastBwFsaShared()
+  for i in range(4):
+    fsa.add_edge(i, i + 1, emission_idx=i, weight=float(i))  # fwd
+    fsa.add_edge(i + 1, i + 1, emission_idx=i)  # loop
+  fast_bw_fsa = fsa.get_fast_bw_fsa(n_batch=n_batch)
+  num_edges = len(fsa.edges)
+  assert fast_bw_fsa.edges.shape == (4, num_edges * n_batch)
+  for batch_idx in range(n_batch):
+    for edge_idx, edge in enumerate(fsa.edges):
+      assert tuple(fast_bw_fsa.edges[:, batch_idx * num_edges + edge_idx]) == (
+        edge.source_state_idx + batch_idx * fsa.num_states,
+        edge.target_state_idx + batch_idx * fsa.num_states,
+        edge.label,
+        batch_idx)
+      assert fast_bw_fsa.weights[batch_idx * num_edges + edge_idx] == edge.weight
+  numpy.testing.assert_array_equal(
+    fast_bw_fsa.start_end_states,
+    [[b * fsa.num_states for b in range(n_batch)], [(b + 1) * fsa.num_states - 1 for b in range(n_batch)]])
+
+
+def _fast_bw_fsa_emission_seqs(fsa, batch_idx, num_frames):
+  """
+  :param Fsa.FastBaumWelchBatchFsa fsa:
+  :param int batch_idx:
+  :param int num_frames:
+  :return: all emission seqs of the paths of length num_frames from the start to the end state
+  :rtype: list[tuple[int]]
+  """
+  edges = fsa.edges[:, fsa.edges[3] == batch_idx]
+  start_state, end_state = fsa.start_end_states[:, batch_idx]
+  cur = [(start_state, ())]
+  for t in range(num_frames):
+    cur = [
+      (edges[1, i], emissions + (edges[2, i],))
+      for (state, emissions) in cur for i in range(edges.shape[1]) if edges[0, i] == state]
+  return [emissions for (state, emissions) in cur if state == end_state]
+
+
+def test_fast_bw_fsa_from_labels_ctc():
+  import itertools
+  blank_idx = 3
+  labels = numpy.array([[0, 0, 1], [2, 0, 0], [1, 0, 0]])
+  label_lens = [3, 1, 0]
+  fsa = Fsa.fast_bw_fsa_from_labels(labels, label_lens, topology="ctc", blank_idx=blank_idx)
+
+  def ctc_collapse(seq):
+    res = []
+    for i, label in enumerate(seq):
+      if label != blank_idx and (i == 0 or seq[i - 1] != label):
+        res.append(label)
+    return tuple(res)
+
+  for batch_idx in range(len(label_lens)):
+    for num_frames in range(1, 7):
+      emission_seqs = sorted(_fast_bw_fsa_emission_seqs(fsa, batch_idx, num_frames))
+      expected = sorted(
+        seq for seq in itertools.product(range(blank_idx + 1), repeat=num_frames)
+        if ctc_collapse(seq) == tuple(labels[batch_idx, :label_lens[batch_idx]]))
+      assert_equal(emission_seqs, expected)
+
+
+def test_fast_bw_fsa_from_labels_hmm():
+  labels = numpy.array([[1, 2], [0, 0]])
+  fsa = Fsa.fast_bw_fsa_from_labels(
+    labels, [2, 1], topology="hmm", num_states_per_label=3, loop_weight=1.0, fwd_weight=2.0)
+  assert_equal(sorted(_fast_bw_fsa_emission_seqs(fsa, 1, 3)), [(0, 1, 2)])
+  assert_equal(
+    sorted(_fast_bw_fsa_emission_seqs(fsa, 1, 4)), [(0, 0, 1, 2), (0, 1, 1, 2), (0, 1, 2, 2)])
+  assert_equal(_fast_bw_fsa_emission_seqs(fsa, 0, 5), [])
+  assert_equal(len(_fast_bw_fsa_emission_seqs(fsa, 0, 7)), 6)
+  assert set(fsa.weights) == {1.0, 2.0}
+  fsa = Fsa.fast_bw_fsa_from_labels(labels[:1], [2], topology="hmm", num_states_per_label=2, with_skip=True)
+  assert_equal(sorted(_fast_bw_fsa_emission_seqs(fsa, 0, 2)), [(2, 4), (3, 4), (3, 5)])
+
+
+def benchmark_fast_bw_fsa_staircase(n_batch=40, num_steps=10):
+  """
+  Compares :func:`Fsa.fast_bw_fsa_staircase` against the loop-based reference.
+  Call via: ``python tests/test_Fsa.py benchmark_fast_bw_fsa_staircase``.
+  """
+  rnd = numpy.random.RandomState(42)
+  for name, func in [("reference", fast_bw_fsa_staircase_reference), ("vectorized", Fsa.fast_bw_fsa_staircase)]:
+    start_time = time.time()
+    for _ in range(num_steps):
+      func(list(rnd.randint(50, 200, size=n_batch)), with_loop=True, max_skip=3)
+    print("%s: %.2f ms per batch" % (name, (time.time() - start_time) * 1000. / num_steps))
+
+
 if __name__ == "__main__":
   import better_exchook
   better_exchook.install()
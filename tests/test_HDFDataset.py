@@ -72,8 +72,13 @@ class TestHDFDataset(object):
 
 
 def generate_dummy_hdf(num_datasets=1):
+  import tempfile
+  import shutil
+  import atexit
+  tmp_dir = tempfile.mkdtemp()
+  atexit.register(lambda: shutil.rmtree(tmp_dir, ignore_errors=True))
   for idx in range(1, num_datasets + 1):
-    dataset = h5py.File('./dummy.%i.hdf5' % idx, 'w')
+    dataset = h5py.File('%s/dummy.%i.hdf5' % (tmp_dir, idx), 'w')
     dataset.create_group('streams')
 
     dataset['streams'].create_group('features')
@@ -109,7 +114,7 @@ def generate_dummy_hdf(num_datasets=1):
       sequence_names_data[ind] = val
 
     dataset.close()
-  return ['./dummy.%i.hdf5' % idx for idx in range(1, num_datasets + 1)]
+  return ['%s/dummy.%i.hdf5' % (tmp_dir, idx) for idx in range(1, num_datasets + 1)]
 
 
 def _get_tmp_file(suffix):
@@ -570,6 +575,52 @@ def test_HDFDataset_no_cache_efficiency():
   # TODO... check alloc intervals etc
 
 
+def _check_shared_mem_cache_in_subprocess(hdf_fn, expected_sums):
+  dataset = HDFDataset(files=[hdf_fn], shared_mem_cache=True)
+  reader = _DatasetReader(dataset=dataset)
+  reader.read_all()
+  assert not dataset._shared_mem_cache.is_creator
+  for key, value in expected_sums.items():
+    assert numpy.sum([numpy.sum(x) for x in reader.data[key]]) == value
+  dataset._shared_mem_cache.close()
+
+
+@unittest.skipIf(sys.platform == "win32", "needs SysV shared memory")
+def test_HDFDataset_shared_mem_cache():
+  from TaskSystem import SharedMem
+  if not SharedMem.is_shmget_functioning():
+    raise unittest.SkipTest("shmget does not work")
+  import multiprocessing
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 23})
+  ref_reader = _DatasetReader(dataset=HDFDataset(files=[hdf_fn], cache_byte_size=0))
+  ref_reader.read_all()
+  dataset = HDFDataset(files=[hdf_fn], shared_mem_cache=True)
+  reader = _DatasetReader(dataset=dataset)
+  reader.read_all()
+  cache = dataset._shared_mem_cache
+  assert cache.is_creator
+  assert_equal(reader.num_seqs, ref_reader.num_seqs)
+  for key in ref_reader.data_keys:
+    for x, y in zip(reader.data[key], ref_reader.data[key]):
+      assert_equal(x.tolist(), y.tolist())
+  dataset2 = HDFDataset(files=[hdf_fn], shared_mem_cache=True)
+  dataset2.init_seq_order(epoch=1)
+  assert_equal(dataset2.get_data(0, "data").tolist(), ref_reader.data["data"][0].tolist())
+  assert not dataset2._shared_mem_cache.is_creator
+  assert_equal(cache.get_ref_count(), 2)
+  proc = multiprocessing.Process(
+    target=_check_shared_mem_cache_in_subprocess,
+    args=(hdf_fn, {key: numpy.sum([numpy.sum(x) for x in ref_reader.data[key]]) for key in ref_reader.data_keys}))
+  proc.start()
+  proc.join()
+  assert_equal(proc.exitcode, 0)
+  assert_equal(cache.get_ref_count(), 2)
+  dataset2._shared_mem_cache.close()
+  shmid = cache.mem.shmid
+  cache.close()
+  assert SharedMem.get_shmid_for_key(cache.key, cache.size) is None, "segment %i not removed" % shmid
+
+
 def test_siamese_triplet_sampling():
   datasets_path = generate_dummy_hdf(3)
   dataset = SiameseHDFDataset(input_stream_name="features", seq_label_stream="classes", files=datasets_path)
@@ -0,0 +1,115 @@
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import shutil
+import numpy
+from nose.tools import assert_equal, assert_not_equal
+
+sys.path.insert(0, os.path.realpath(os.path.dirname(os.path.abspath(__file__)) + "/.."))
+
+from Config import Config
+from GeneratingDataset import StaticDataset
+from HyperParamTuning import *
+
+import better_exchook
+better_exchook.replace_traceback_format_tb()
+
+from Log import log
+log.initialize()
+
+
+def _create_optimization(num_seqs=10, **opts):
+  learning_rate = HyperParam(float, [0.0001, 0.1], log=True, default=0.001)
+  config = Config()
+  config.update({
+    "learning_rate": learning_rate,
+    "network": {"output": {"class": "softmax", "dropout": HyperParam(float, [0.0, 0.5])}},
+    "hyper_param_tuning": dict(num_tune_iterations=1, num_individuals=4, num_train_steps=num_seqs, **opts)})
+  rnd = numpy.random.RandomState(42)
+  train_data = StaticDataset(
+    data=[{"data": rnd.normal(size=(5, 3)).astype("float32"), "classes": rnd.randint(0, 2, size=(5,))}
+          for _ in range(num_seqs)],
+    output_dim={"classes": (2, 1)}, input_dim=3)
+  return Optimization(config=config, train_data=train_data)
+
+
+def test_get_successive_halving_schedule():
+  assert_equal(get_successive_halving_schedule(num_train_steps=800, min_frac=0.125, eta=2), [100, 200, 400, 800])
+  # The last rung (450) would cut 2/3 of the survivors for only a few more train steps, thus merged.
+  assert_equal(get_successive_halving_schedule(num_train_steps=500, min_frac=0.1, eta=3), [50, 150, 500])
+  assert_equal(get_successive_halving_schedule(num_train_steps=100, min_frac=0.9, eta=2), [100])
+  assert_equal(get_successive_halving_schedule(num_train_steps=3, min_frac=0.1, eta=2), [1, 2, 3])
+
+
+def test_Optimization_get_train_steps_schedule():
+  optim = _create_optimization(successive_halving_min_frac=0.25)
+  assert_equal(len(optim.hyper_params), 2)
+  assert_equal(optim.get_num_train_steps(), 10)
+  assert_equal(optim.get_train_steps_schedule(), [2, 5, 10])
+  assert_equal(optim.get_train_data(num_train_steps=5, start_train_steps=2).num_seqs, 3)
+
+
+def test_hash_obj():
+  assert_equal(hash_obj(None), hash_obj(None))
+  assert_equal(hash_obj(0.5), hash_obj(0.5))
+  assert_not_equal(hash_obj(0.5), hash_obj(0.25))
+  assert_not_equal(hash_obj(None), hash_obj("none"))
+  assert_equal(hash_obj([1, "a", 0.1, None]), hash_obj((1, "a", 0.1, None)))
+  assert_not_equal(hash_obj([1, 2]), hash_obj([2, 1]))
+  assert 0 <= hash_obj([1, 0.5, None]) <= 0xFFFFFFFF
+
+
+def test_Individual_get_sort_key():
+  a = Individual({}, name="a")
+  a.cost, a.num_train_steps = 2.0, 10
+  b = Individual({}, name="b")
+  b.cost, b.num_train_steps = 1.0, 5  # better cost, but killed early
+  c = Individual({}, name="c")
+  c.cost, c.num_train_steps = 1.5, 10
+  assert_equal([p.name for p in sorted([a, b, c], key=lambda p: p.get_sort_key())], ["c", "a", "b"])
+
+
+def test_Optimization_cost_cache():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    cost_cache_file = "%s/costs.txt" % tmp_dir
+    optim = _create_optimization(cost_cache_file=cost_cache_file)
+    individual = optim.get_individual(iteration_idx=1, individual_idx=0)
+    assert optim.get_cached_cost(individual, num_train_steps=10) is None
+    optim.set_cost(individual, 0.5, num_train_steps=5)
+    optim.set_cost(individual, 0.25, num_train_steps=10)
+    optim.set_cost(individual, 0.75, num_train_steps=10)  # already cached, ignored
+    assert_equal(individual.num_train_steps, 10)
+    assert_equal(len(open(cost_cache_file).read().splitlines()), 2)
+    # New run with the same config, i.e. also new HyperParam instances.
+    optim2 = _create_optimization(cost_cache_file=cost_cache_file)
+    individual2 = optim2.get_individual(iteration_idx=1, individual_idx=0)
+    assert_equal(optim2.get_cached_cost(individual2, num_train_steps=5), 0.5)
+    assert_equal(optim2.get_cached_cost(individual2, num_train_steps=10), 0.25)
+    other = optim2.get_individual(iteration_idx=1, individual_idx=1)
+    assert optim2.get_cached_cost(other, num_train_steps=10) is None
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        v()
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
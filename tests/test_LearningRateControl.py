@@ -113,3 +113,72 @@ def test_newbob_multi_epoch():
     'train_score': 3.095824052426714,
   })
   assert_equal(lrc.getLearningRateForEpoch(2), lr)  # epoch 2 cannot be a different lr yet
+
+
+def test_jsonl_file_append_and_load():
+  import tempfile
+  import shutil
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    filename = "%s/learning_rates.jsonl" % tmp_dir
+    lrc = NewbobRelative(
+      defaultLearningRate=0.01, relativeErrorThreshold=-0.01, learningRateDecayFactor=0.5, filename=filename)
+    for epoch, score in [(1, 2.0), (2, 1.5), (3, 1.6)]:
+      lrc.getLearningRateForEpoch(epoch)
+      lrc.setEpochError(epoch, {"train_score": score + 0.5, "dev_score": score})
+      lrc.save()
+    lrc.save()  # nothing changed, should not append anything
+    assert_equal(len(open(filename).read().splitlines()), 3)
+    lrc.setEpochError(3, {"dev_error": 0.3})
+    lrc.save()  # only appends the record of epoch 3
+    assert_equal(len(open(filename).read().splitlines()), 4)
+    lrc2 = NewbobRelative(
+      defaultLearningRate=0.01, relativeErrorThreshold=-0.01, learningRateDecayFactor=0.5, filename=filename)
+    assert_equal(sorted(lrc2.epochData.keys()), [1, 2, 3])
+    for epoch in [1, 2, 3]:
+      assert_equal(lrc2.epochData[epoch].learningRate, lrc.epochData[epoch].learningRate)
+      assert_equal(lrc2.epochData[epoch].error, lrc.epochData[epoch].error)
+    assert_equal(lrc2.getLastBestEpoch(last_epoch=3), 2)
+    assert_equal(lrc2.getErrorKey(3), "dev_score")
+    # Simulate a crash in the middle of a write.
+    with open(filename, "a") as f:
+      f.write('{"epoch": 4, "error": {"dev_sc')
+    lrc3 = NewbobRelative(
+      defaultLearningRate=0.01, relativeErrorThreshold=-0.01, learningRateDecayFactor=0.5, filename=filename)
+    assert_equal(sorted(lrc3.epochData.keys()), [1, 2, 3])
+    assert_equal(len(open(filename).read().splitlines()), 3)  # compacted, the incomplete line is removed
+    # Continue after the crash: cut the file, load, save, load.
+    content = open(filename).read()
+    with open(filename, "w") as f:
+      f.write(content[:-10])  # cuts the record of epoch 3
+    lrc4 = NewbobRelative(
+      defaultLearningRate=0.01, relativeErrorThreshold=-0.01, learningRateDecayFactor=0.5, filename=filename)
+    assert_equal(sorted(lrc4.epochData.keys()), [1, 2])
+    lrc4.setEpochError(4, {"train_score": 1.0, "dev_score": 1.4})
+    lrc4.save()
+    lrc5 = NewbobRelative(
+      defaultLearningRate=0.01, relativeErrorThreshold=-0.01, learningRateDecayFactor=0.5, filename=filename)
+    assert_equal(sorted(lrc5.epochData.keys()), [1, 2, 4])
+    assert_equal(lrc5.epochData[4].error, lrc4.epochData[4].error)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_jsonl_file_convert_from_old_format():
+  import tempfile
+  import shutil
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    old_filename = "%s/newbob.data" % tmp_dir
+    with open(old_filename, "w") as f:
+      f.write("{\n1: EpochData(learningRate=0.001, error={'dev_score': 2.5, 'train_score': 3.0}),\n"
+              "2: EpochData(learningRate=0.001, error={'dev_score': float('nan'), 'train_score': 2.5}),\n}\n")
+    lrc = LearningRateControl(defaultLearningRate=0.001, filename=old_filename)
+    lrc.filename = "%s/learning_rates.jsonl" % tmp_dir
+    lrc.save()
+    lrc2 = LearningRateControl(defaultLearningRate=0.001, filename=lrc.filename)
+    assert_equal(sorted(lrc2.epochData.keys()), [1, 2])
+    assert_equal(lrc2.epochData[1].error, {'dev_score': 2.5, 'train_score': 3.0})
+    assert numpy.isnan(lrc2.epochData[2].error["dev_score"])
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+import numpy
+from nose.tools import assert_equal
+
+print("__file__:", __file__)
+base_path = os.path.realpath(os.path.dirname(os.path.abspath(__file__)) + "/..")
+print("base path:", base_path)
+sys.path.insert(0, base_path)
+
+from LmDataset import AllophoneState, StateTying
+from Log import log
+
+log.initialize(verbosity=[5])
+
+
+def test_AllophoneState_from_str():
+  for s in ["si{#+#}@i@f.0", "a{#+b}@i.2", "b{a+#}@f.1", "a{b+c}.0", "a{b-c+d}", "a{#+#}"]:
+    a = AllophoneState.from_str(s)
+    assert_equal(a.format(), s)
+
+
+def test_AllophoneState_index_many():
+  phone_idxs = {"si": 0, "a": 1, "b": 2}
+  allos = [AllophoneState.from_str(s) for s in ["si{#+#}@i@f.0", "a{#+b}@i.2", "b{a+#}@f.1", "a{b+b}.0"]]
+  assert_equal(
+    AllophoneState.index_many(allos, phone_idxs=phone_idxs).tolist(),
+    [a.index(phone_idxs=phone_idxs) for a in allos])
+  allos = [AllophoneState.from_str(s) for s in ["a{b-si+b-a}.3", "si{#+#}@i@f.0", "a{b-si+b-a}.3", "b{a+#}@f.1"]]
+  assert_equal(
+    AllophoneState.index_many(allos, phone_idxs=phone_idxs, num_states=4, context_length=2).tolist(),
+    [a.index(phone_idxs=phone_idxs, num_states=4, context_length=2) for a in allos])
+  assert_equal(AllophoneState.index_many([], phone_idxs=phone_idxs).tolist(), [])
+
+
+def test_StateTying_map_many():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    state_tying_file = "%s/state-tying" % tmp_dir
+    allo_strs = ["si{#+#}@i@f.0", "a{#+b}@i.0", "a{#+b}@i.1", "b{a+#}@f.0", "b{a+#}@f.1"]
+    with open(state_tying_file, "w") as f:
+      for i, s in enumerate(allo_strs):
+        f.write("%s %i\n" % (s, i))
+    phone_idxs = {"si": 0, "a": 1, "b": 2}
+    allos = [AllophoneState.from_str(s) for s in allo_strs + allo_strs[::-1]]
+    state_tying = StateTying(state_tying_file)
+    class_idxs = state_tying.map_many(allos, phone_idxs=phone_idxs, num_states=2)
+    assert_equal(class_idxs.tolist(), [state_tying.allo_map[a.format()] for a in allos])
+    assert_equal(len([fn for fn in os.listdir(tmp_dir) if fn.endswith(".npz")]), 1)
+    state_tying2 = StateTying(state_tying_file)
+    assert_equal(state_tying2.map_many(allos, phone_idxs=phone_idxs, num_states=2).tolist(), class_idxs.tolist())
+    # Another key gets its own cache file.
+    assert_equal(state_tying2.map_many(allos, phone_idxs=phone_idxs, num_states=3).tolist(), class_idxs.tolist())
+    assert_equal(len([fn for fn in os.listdir(tmp_dir) if fn.endswith(".npz")]), 2)
+    try:
+      state_tying2.map_many([AllophoneState.from_str("a{#+#}.0")], phone_idxs=phone_idxs, num_states=2)
+    except KeyError:
+      pass
+    else:
+      assert False, "KeyError expected"
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  import better_exchook
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
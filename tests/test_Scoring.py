@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+import numpy
+from nose.tools import assert_equal, assert_almost_equal
+
+print("__file__:", __file__)
+base_path = os.path.realpath(os.path.dirname(os.path.abspath(__file__)) + "/..")
+print("base path:", base_path)
+sys.path.insert(0, base_path)
+
+import Scoring
+from Util import compute_bleu
+
+
+def _naive_edit_distance(a, b):
+  d = list(range(len(b) + 1))
+  for i, x in enumerate(a):
+    nd = [i + 1]
+    for j, y in enumerate(b):
+      nd.append(min(d[j] + (x != y), d[j + 1] + 1, nd[j] + 1))
+    d = nd
+  return d[-1]
+
+
+def _random_texts(rnd, num_seqs, vocab_size=5, max_len=10):
+  return [
+    " ".join(["w%i" % w for w in rnd.randint(0, vocab_size, size=rnd.randint(1, max_len))])
+    for _ in range(num_seqs)]
+
+
+def test_edit_distance():
+  assert_equal(Scoring.edit_distance("a b c".split(), "a c d".split()), 2)
+  assert_equal(Scoring.edit_distance("kitten", "sitting"), 3)
+  assert_equal(Scoring.edit_distance([], "a b".split()), 2)
+  rnd = numpy.random.RandomState(42)
+  for _ in range(200):
+    a = rnd.randint(0, 4, size=rnd.randint(0, 12)).tolist()
+    b = rnd.randint(0, 4, size=rnd.randint(0, 12)).tolist()
+    assert_equal(Scoring.edit_distance(a, b), _naive_edit_distance(a, b))
+
+
+def test_Scorer_bleu_same_as_compute_bleu():
+  rnd = numpy.random.RandomState(42)
+  hyps, refs = _random_texts(rnd, 30), _random_texts(rnd, 30)
+  scorer = Scoring.Scorer(metrics=["bleu", "wer"], chunk_size=7)
+  for i, (hyp, ref) in enumerate(zip(hyps, refs)):
+    scorer.add(seq_tag="seq-%i" % i, hyp=hyp, ref=ref)
+  assert_equal(scorer.get_num_seqs(), 30)
+  assert_almost_equal(
+    scorer.get_corpus_score("bleu"), compute_bleu([r.split() for r in refs], [h.split() for h in hyps]), places=5)
+  wer = float(sum([_naive_edit_distance(h.split(), r.split()) for (h, r) in zip(hyps, refs)]))
+  wer /= sum([len(r.split()) for r in refs])
+  assert_almost_equal(scorer.get_corpus_score("wer"), wer)
+  lower, upper = scorer.get_bootstrap_interval("wer", num_samples=100)
+  assert lower <= wer <= upper
+
+
+def test_Scorer_add_pairs_num_workers():
+  rnd = numpy.random.RandomState(42)
+  pairs = [("seq-%i" % i, hyp, ref) for (i, (hyp, ref)) in enumerate(zip(_random_texts(rnd, 25), _random_texts(rnd, 25)))]
+  scorer = Scoring.Scorer(metrics=["wer", "cer"], num_workers=2, chunk_size=4)
+  scorer.add_pairs(iter(pairs))
+  ref_scorer = Scoring.Scorer(metrics=["wer", "cer"])
+  ref_scorer.add_pairs(pairs)
+  assert_equal(scorer.seq_tags, [seq_tag for (seq_tag, hyp, ref) in pairs])
+  for name in ["wer", "cer"]:
+    assert_equal(scorer.get_stats(name).tolist(), ref_scorer.get_stats(name).tolist())
+  per_seq = scorer.get_utterance_scores("wer")
+  assert_equal(per_seq["seq-3"], Scoring.get_metric("wer").get_score(Scoring.get_metric("wer").get_stats(
+    pairs[3][1], pairs[3][2])))
+
+
+def test_iter_text_file_iter_hyp_ref_pairs():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    with open("%s/refs.py" % tmp_dir, "w") as f:
+      f.write("{\n'seq-1': 'a b c',\n'seq-2': 'd e',\n'seq-3': 'f',\n}\n")
+    with open("%s/hyps.py" % tmp_dir, "w") as f:
+      # N-best format as written by search, not in the same order.
+      f.write("{\n'seq-2': [\n(-2.0, 'd'),\n(-1.0, 'd e'),\n],\n'seq-1': [\n(-0.5, 'a b x'),\n],\n}\n")
+    hyps = list(Scoring.iter_text_file("%s/hyps.py" % tmp_dir))
+    assert_equal(hyps, [("seq-2", "d e"), ("seq-1", "a b x")])
+    refs = Scoring.iter_text_file("%s/refs.py" % tmp_dir)
+    pairs = list(Scoring.iter_hyp_ref_pairs(hyps=hyps, refs=refs, missing_hyp=""))
+    assert_equal(sorted(pairs), [("seq-1", "a b x", "a b c"), ("seq-2", "d e", "d e"), ("seq-3", "", "f")])
+    try:
+      list(Scoring.iter_hyp_ref_pairs(hyps=hyps, refs=Scoring.iter_text_file("%s/refs.py" % tmp_dir)))
+    except Exception as exc:
+      print("Expected exception:", exc)
+    else:
+      assert False, "missing hyp should be an error"
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  import better_exchook
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+from struct import pack
+import numpy
+from nose.tools import assert_equal
+
+print("__file__:", __file__)
+base_path = os.path.realpath(os.path.dirname(os.path.abspath(__file__)) + "/..")
+print("base path:", base_path)
+sys.path.insert(0, base_path)
+
+from SprintCache import FileArchive, AllophoneLabeling, decode_align_rle
+
+
+def _write_align_archive(filename, aligns):
+  """
+  Writes a Sprint cache archive with ALIGNRLE alignments.
+  (FileArchive only supports writing features.)
+
+  :param str filename:
+  :param dict[str,list[(int,list[int])]] aligns: name -> runs, with (n, values) in the ALIGNRLE scheme,
+    see :func:`decode_align_rle`
+  """
+  data = FileArchive.SprintCacheHeader.encode("ascii") + pack("b", 1)
+  file_infos = []
+  for name, runs in sorted(aligns.items()):
+    size = sum([n if n > 0 else -n for (n, values) in runs])
+    content = pack("I", len("flow-alignment")) + b"flow-alignment" + pack("i", 0) + b"ALIGNRLE" + pack("I", size)
+    for n, values in runs:
+      content += pack("b", n) + b"".join([pack("i", v) for v in values])
+    data += pack("I", FileArchive.start_recovery_tag) + pack("i", len(name)) + name.encode("ascii")
+    file_infos.append((name, len(data), len(content)))
+    data += pack("iii", len(content), 0, 0) + content + pack("I", FileArchive.end_recovery_tag)
+  pos = len(data)
+  data += pack("i", len(file_infos))
+  for name, entry_pos, size in file_infos:
+    data += pack("i", len(name)) + name.encode("ascii") + pack("q", entry_pos) + pack("ii", size, 0)
+  data += pack("qq", 0, pos)
+  with open(filename, "wb") as f:
+    f.write(data)
+
+
+def test_read_align_array():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    allophones = ["si{#+#}@i@f", "a{#+#}", "b{#+#}"]
+    with open("%s/allophones" % tmp_dir, "w") as f:
+      f.write("# allophones\n" + "\n".join(allophones) + "\n")
+    with open("%s/state-tying" % tmp_dir, "w") as f:
+      label = 0
+      for allo in allophones:
+        for state in range(3):
+          f.write("%s.%i %i\n" % (allo, state, label))
+          label += 1
+    archive_filename = "%s/align.cache" % tmp_dir
+    runs = [(0, [0]), (-3, [0]), (2, [1 + (1 << 26), 2 + (2 << 26)]), (-4, [1]), (1, [2 + (1 << 26)])]
+    _write_align_archive(archive_filename, {"corpus/seq-1": runs})
+
+    archive = FileArchive(archive_filename)
+    archive.setAllophones("%s/allophones" % tmp_dir)
+    ref = archive.read("corpus/seq-1", "align")
+    assert_equal(len(ref), 10)
+    allo_states = archive.read_align_array("corpus/seq-1")
+    assert_equal(allo_states.dtype, numpy.int32)
+    assert_equal([(a, s) for (t, a, s) in ref], [(a & ((1 << 26) - 1), a >> 26) for a in allo_states.tolist()])
+
+    labeling = AllophoneLabeling(
+      silence_phone="si", allophone_file="%s/allophones" % tmp_dir, state_tying_file="%s/state-tying" % tmp_dir)
+    labels = archive.read_align_array("corpus/seq-1", label_lookup=labeling.get_label_lookup())
+    assert_equal(labels.tolist(), [labeling.get_label_idx(a, s) for (t, a, s) in ref])
+    assert_equal(labels.tolist(), [0, 0, 0, 4, 8, 3, 3, 3, 3, 7])
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_decode_align_rle_long_runs():
+  rng = numpy.random.RandomState(42)
+  buf = b""
+  ref = []
+  while len(ref) < 1000:
+    n = int(rng.randint(-127, 128))
+    if n > 0:
+      values = rng.randint(0, 100, size=n).tolist()
+      ref += values
+    elif n < 0:
+      values = [int(rng.randint(0, 100))]
+      ref += values * -n
+    else:
+      values = [len(ref)]
+    buf += pack("b", n) + b"".join([pack("i", v) for v in values])
+  res = decode_align_rle(buf, pos=0, size=len(ref))
+  assert_equal(res.tolist(), ref)
+
+
+def test_AllophoneLabeling_map_many_cached():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    allophones = ["si{#+#}@i@f", "a{#+b}@i", "b{a+#}@f"]
+    with open("%s/allophones" % tmp_dir, "w") as f:
+      f.write("\n".join(allophones) + "\n")
+    with open("%s/state-tying" % tmp_dir, "w") as f:
+      f.write("si{#+#}@i@f.0 0\n")
+      for allo in allophones[1:]:
+        for state in range(3):
+          f.write("%s.%i %i\n" % (allo, state, 1 + state))
+    opts = dict(silence_phone="si", allophone_file="%s/allophones" % tmp_dir, state_tying_file="%s/state-tying" % tmp_dir)
+    labeling = AllophoneLabeling(**opts)
+    assert os.path.exists("%s/state-tying.allophone_labeling.npz" % tmp_dir)
+    assert_equal((labeling.num_labels, labeling.num_allo_states, labeling.sil_label_idx), (4, 3, 0))
+    allo_states = numpy.array([[0, 1 + (1 << 26), 2 + (2 << 26)], [2, 1, 0]])
+    labels = labeling.map_many(allo_states)
+    assert_equal(labels.tolist(), [[0, 2, 3], [1, 1, 0]])
+    assert_equal(labels.tolist(), [[labeling.get_label_idx_by_allo_state_idx(int(a)) for a in l] for l in allo_states])
+    assert_equal(labeling.state_tying_by_allo_state_idx[1 + (1 << 26)], 2)
+    # Again, now from the cache.
+    labeling2 = AllophoneLabeling(**opts)
+    assert labeling2._state_tying is None
+    assert_equal(labeling2.map_many(allo_states).tolist(), labels.tolist())
+    try:
+      labeling2.get_label_idx(allo_idx=0, state_idx=1)
+    except KeyError:
+      pass
+    else:
+      assert False, "KeyError expected"
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  import better_exchook
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
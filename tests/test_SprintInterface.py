@@ -106,3 +106,131 @@ def test_forward():
   os.chdir(olddir)
   shutil.rmtree(tmpdir)
 
+
+def _make_dummy_automaton(num_states, rnd):
+  num_edges = num_states + 1
+  edges = rnd.randint(0, num_states, size=(3, num_edges)).astype("uint32")
+  weights = rnd.uniform(size=(num_edges,)).astype("float32")
+  return num_states, edges, weights
+
+
+def test_SprintAutomataCache_assemble_batch():
+  from SprintErrorSignals import SprintAutomataCache
+  rnd = numpy.random.RandomState(42)
+  automata = [_make_dummy_automaton(num_states, rnd) for num_states in [3, 5, 2]]
+  edges, weights, start_end_states = SprintAutomataCache.assemble_batch(automata)
+  assert_equal(edges.shape, (4, 4 + 6 + 3))
+  assert_equal(edges.dtype, numpy.uint32)
+  assert_equal(weights.dtype, numpy.float32)
+  assert_equal(start_end_states.tolist(), [[0, 3, 8], [2, 7, 9]])
+  offset = 0
+  state_offset = 0
+  for b, (num_states, seq_edges, seq_weights) in enumerate(automata):
+    num_edges = seq_edges.shape[1]
+    assert_equal(edges[0:2, offset:offset + num_edges].tolist(), (seq_edges[0:2] + state_offset).tolist())
+    assert_equal(edges[2, offset:offset + num_edges].tolist(), seq_edges[2].tolist())
+    assert_equal(edges[3, offset:offset + num_edges].tolist(), [b] * num_edges)
+    assert_equal(weights[offset:offset + num_edges].tolist(), seq_weights.tolist())
+    offset += num_edges
+    state_offset += num_states
+  edges, weights, start_end_states = SprintAutomataCache.assemble_batch([])
+  assert_equal((edges.shape, weights.shape, start_end_states.shape), ((4, 0), (0,), (2, 0)))
+
+
+def test_SprintAutomataCache_lru():
+  from SprintErrorSignals import SprintAutomataCache
+  rnd = numpy.random.RandomState(42)
+  cache = SprintAutomataCache(config_hash="dummy", max_num_entries=2)
+  a, b, c = [_make_dummy_automaton(3, rnd) for _ in range(3)]
+  cache.set("a", a)
+  cache.set("b", b)
+  assert cache.get("a") is a  # now "b" is the least recently used
+  cache.set("c", c)
+  assert_equal(list(cache.entries.keys()), ["a", "c"])
+  assert cache.get("b") is None
+  assert cache.get("c") is c
+  assert_equal((cache.num_hits, cache.num_misses), (2, 1))
+  assert_false(a[1].flags.writeable)
+
+
+def test_SprintAutomataCache_disk():
+  from SprintErrorSignals import SprintAutomataCache
+  tmp_dir = mkdtemp("returnn-test-sprint-automata-cache")
+  try:
+    rnd = numpy.random.RandomState(42)
+    automaton = _make_dummy_automaton(4, rnd)
+    cache = SprintAutomataCache(config_hash="dummy", max_num_entries=0, cache_dir=tmp_dir)
+    cache.set("corpus/seq/1", automaton)
+    assert_equal(len(os.listdir(cache.cache_dir)), 1)
+    # Other process, same config.
+    cache2 = SprintAutomataCache(config_hash="dummy", cache_dir=tmp_dir)
+    num_states, edges, weights = cache2.get("corpus/seq/1")
+    assert_equal(num_states, 4)
+    assert_equal(edges.tolist(), automaton[1].tolist())
+    assert_equal(weights.tolist(), automaton[2].tolist())
+    assert cache2.get("corpus/seq/2") is None
+    # Other config.
+    cache3 = SprintAutomataCache(config_hash="other", cache_dir=tmp_dir)
+    assert cache3.get("corpus/seq/1") is None
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_SprintAutomataCache_get_config_hash():
+  from SprintErrorSignals import SprintAutomataCache
+  tmp_dir = mkdtemp("returnn-test-sprint-automata-cache")
+  try:
+    open("%s/lexicon.xml" % tmp_dir, "w").write("<lexicon/>")
+    open("%s/main.config" % tmp_dir, "w").write(
+      "include %s/sub.config\n[*]\nlog-channel.file = /dev/null\n" % tmp_dir)
+    open("%s/sub.config" % tmp_dir, "w").write("[*.lexicon]\nfile = lexicon.xml  # relative to config\n")
+    sprint_opts = {
+      "sprintExecPath": "%s/DummySprintExec.py" % os.path.dirname(os.path.abspath(__file__)),
+      "sprintConfigStr": "--config=%s/main.config --*.seed=1" % tmp_dir}
+    assert_equal(
+      SprintAutomataCache.get_referenced_files(sprint_opts),
+      sorted([sprint_opts["sprintExecPath"]] + ["%s/%s" % (tmp_dir, fn) for fn in ["lexicon.xml", "main.config", "sub.config"]]))
+    config_hash = SprintAutomataCache.get_config_hash(sprint_opts)
+    assert_equal(SprintAutomataCache.get_config_hash(sprint_opts), config_hash)
+    open("%s/lexicon.xml" % tmp_dir, "w").write("<lexicon>changed</lexicon>")
+    assert SprintAutomataCache.get_config_hash(sprint_opts) != config_hash
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+class _DummySprintAutomataInstance:
+  """
+  Behaves like SprintSubprocessInstance for SprintInstancePool._get_automata_from_sprint.
+  """
+
+  def __init__(self):
+    read_fd, self.write_fd = os.pipe()
+    self.pipe_c2p = (os.fdopen(read_fd, "rb"), None)
+    self.pending = []
+
+  def _send(self, args):
+    cmd, segment_name = args
+    assert cmd == "export_allophone_state_fsa_by_segment_name"
+    self.pending.append(segment_name)
+    os.write(self.write_fd, b"x")
+
+  def _read(self):
+    self.pipe_c2p[0].read(1)
+    segment_name = self.pending.pop(0)
+    if segment_name.startswith("bad"):
+      return "error", "cannot build automaton for %s" % segment_name
+    return "ok", 2, 1, numpy.array([0, 1, 0], dtype="uint32"), numpy.array([0.5], dtype="float32")
+
+
+def test_SprintInstancePool_get_automata_from_sprint_error_drains_instances():
+  from SprintErrorSignals import SprintInstancePool
+  from nose.tools import assert_raises
+  pool = SprintInstancePool(sprint_opts={"sprintExecPath": "/bin/false", "numInstances": 2})
+  pool.instances = [_DummySprintAutomataInstance(), _DummySprintAutomataInstance()]
+  assert_equal(sorted(pool._get_automata_from_sprint(["a", "b", "c"]).keys()), ["a", "b", "c"])
+  assert_raises(RuntimeError, lambda: pool._get_automata_from_sprint(["a", "bad", "b", "c"]))
+  for instance in pool.instances:
+    assert_equal(instance.pending, [])
+  # The instances are in a clean state again, i.e. the next request gets its own replies.
+  num_states, edges, weights = pool._get_automata_from_sprint(["d"])["d"]
+  assert_equal(edges.tolist(), [[0], [1], [0]])
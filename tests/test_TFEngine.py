@@ -15,7 +15,7 @@ import Util
 import TFUtil
 TFUtil.debugRegisterBetterRepr()
 from Config import Config
-from nose.tools import assert_equal, assert_is_instance
+from nose.tools import assert_equal, assert_not_equal, assert_is_instance
 import unittest
 import numpy
 import numpy.testing
@@ -345,6 +345,37 @@ def test_engine_train_accum_grad_multiple_step_sparse():
   engine.finalize()
 
 
+def test_engine_train_accum_grad_target_num_frames():
+  from GeneratingDataset import DummyDataset
+  seq_len = 5
+  n_data_dim = 2
+  n_classes_dim = 3
+  train_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=7, seq_len=seq_len)
+  train_data.init_seq_order(epoch=1)
+  cv_data = DummyDataset(input_dim=n_data_dim, output_dim=n_classes_dim, num_seqs=2, seq_len=seq_len)
+  cv_data.init_seq_order(epoch=1)
+
+  config = Config()
+  config.update({
+    "model": "/tmp/model",
+    "num_outputs": n_classes_dim,
+    "num_inputs": n_data_dim,
+    "network": {"output": {"class": "softmax", "loss": "ce"}},
+    "start_epoch": 1,
+    "num_epochs": 1,
+    "max_seqs": 2,
+    "accum_grad_target_num_frames": 25,
+  })
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=train_data, dev_data=cv_data, eval_data=None)
+  engine.train()
+  # 7 seqs with max 2 seqs per batch, i.e. 10 frames per step (5 in the last step).
+  # Thus there should be an update after the 3rd step, and the 5 frames of the last step are left over.
+  count_var = engine.updater.optimizer._accum_grad_count_state.count_var
+  assert_equal(engine.tf_session.run(count_var), 5.)
+  engine.finalize()
+
+
 def test_engine_train_grad_noise_sparse():
   # Not sure how to test for it in a simple way...
   # You might see "Converting sparse IndexedSlices to a dense Tensor of unknown shape."
@@ -402,6 +433,62 @@ def test_engine_train_grad_noise_sparse():
   engine.finalize()
 
 
+def test_engine_train_pretrain_incremental_construction():
+  import tempfile
+  from GeneratingDataset import DummyDataset
+  model_tmp_dir = tempfile.mkdtemp("tmp-checkpoint")
+  train_data = DummyDataset(input_dim=2, output_dim=3, num_seqs=4, seq_len=5)
+  train_data.init_seq_order(epoch=1)
+  config = Config()
+  config.update({
+    "model": model_tmp_dir + "/model",
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {
+      "l1": {"class": "linear", "activation": "tanh", "n_out": 5},
+      "l2": {"class": "linear", "activation": "tanh", "n_out": 5, "from": ["l1"]},
+      "output": {"class": "softmax", "loss": "ce", "from": ["l2"]}},
+    "pretrain": "default",
+    "pretrain_incremental_construction": True,
+    "start_epoch": 1,
+    "num_epochs": 3
+  })
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=train_data)
+  assert_equal(engine.pretrain.get_train_num_epochs(), 2)
+  incremental_results = []
+  orig_init_network_incremental = engine._init_network_incremental
+
+  def init_network_incremental(net_desc):
+    res = orig_init_network_incremental(net_desc)
+    incremental_results.append(res)
+    return res
+
+  engine._init_network_incremental = init_network_incremental
+  updater = engine.updater
+  engine.train()
+  assert_equal(incremental_results, [True])
+  # The updater is reused, thus there is no new learning rate var, and no new optimizer slot vars for kept params.
+  assert engine.updater is updater
+  global_vars = engine.tf_session.graph.get_collection(tf.GraphKeys.GLOBAL_VARIABLES)
+  assert_equal(len([v for v in global_vars if v.op.name.endswith("learning_rate")]), 1)
+  params = engine.network.get_params_serialized(engine.tf_session)
+  model_filename = engine.get_epoch_model_filename(epoch=3)
+  engine.finalize()
+
+  # The checkpoint should have the usual var names, i.e. it should be loadable by a freshly constructed network.
+  with make_scope() as session:
+    network = TFNetwork(config=config, train_flag=False)
+    network.construct_from_dict(config.typed_dict["network"])
+    network.load_params_from_file(filename=model_filename, session=session)
+    params_loaded = network.get_params_serialized(session)
+    for layer_name in ["l1", "l2", "output"]:
+      for param_name in ["W", "b"]:
+        numpy.testing.assert_array_equal(
+          params.values_dict[layer_name][param_name], params_loaded.values_dict[layer_name][param_name])
+    assert_equal(params.global_train_step, params_loaded.global_train_step)
+
+
 def test_engine_analyze():
   from GeneratingDataset import DummyDataset
   seq_len = 5
@@ -451,6 +538,71 @@ def test_engine_forward_single():
   engine.finalize()
 
 
+def test_engine_forward_tf_graph_cache():
+  import tempfile
+  import shutil
+  from GeneratingDataset import DummyDataset
+  from TFGraphCache import CachedNetwork
+  dataset = DummyDataset(input_dim=2, output_dim=3, num_seqs=2, seq_len=5)
+  dataset.init_seq_order(epoch=1)
+  cache_dir = tempfile.mkdtemp("tf-graph-cache")
+  config = Config()
+  config.update({
+    "task": "forward",
+    "allow_random_model_init": True,
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {
+      "lstm": {"class": "rec", "unit": "lstm", "n_out": 4},
+      "output": {"class": "softmax", "loss": "ce", "from": ["lstm"]}},
+    "tf_graph_cache_dir": cache_dir
+  })
+  try:
+    engine = Engine(config=config)
+    engine.init_network_from_config(config=config)
+    assert not isinstance(engine.network, CachedNetwork)
+    assert len([fn for fn in os.listdir(cache_dir) if fn.endswith(".meta")]) == 1
+    params = engine.network.get_params_serialized(engine.tf_session)
+    out = engine.forward_single(dataset=dataset, seq_idx=0)
+    engine.finalize()
+
+    engine = Engine(config=config)
+    engine.init_network_from_config(config=config)
+    assert isinstance(engine.network, CachedNetwork)
+    assert_equal(set(engine.network.layers.keys()), {"lstm", "output"})
+    assert_equal(engine.network.layers["output"].output.dim, 3)
+    engine.network.set_params_by_serialized(params, session=engine.tf_session)
+    out_cached = engine.forward_single(dataset=dataset, seq_idx=0)
+    numpy.testing.assert_allclose(out, out_cached)
+    engine.finalize()
+  finally:
+    shutil.rmtree(cache_dir)
+
+
+def test_tf_graph_cache_hashable_repr():
+  from TFGraphCache import _get_hashable_repr, NotCacheable
+
+  class _Opts:
+    def __init__(self, x):
+      self.x = x
+
+    def __repr__(self):
+      return "_Opts(%r)" % self.x
+
+  class _NoRepr:
+    pass
+
+  assert_equal(_get_hashable_repr({"a": {1, 3, 2}}), _get_hashable_repr({"a": {3, 2, 1}}))
+  assert_not_equal(_get_hashable_repr({"a": _Opts(1)}), _get_hashable_repr({"a": _Opts(2)}))
+  assert_not_equal(_get_hashable_repr(numpy.zeros((2,))), _get_hashable_repr(numpy.ones((2,))))
+  try:
+    _get_hashable_repr({"a": _NoRepr()})
+  except NotCacheable as exc:
+    print("Expected exception:", exc)
+  else:
+    assert False, "expected NotCacheable"
+
+
 def test_engine_forward_to_hdf():
   from GeneratingDataset import DummyDataset
   import tempfile
@@ -1787,6 +1939,130 @@ def test_preload_from_files_ignore_missing():
   engine.finalize()
 
 
+def test_save_params_to_file_async():
+  import tempfile
+  from TFNetwork import AsyncCheckpointSaver
+  model_tmp_dir = tempfile.mkdtemp("tmp-checkpoint")
+  model_filename = model_tmp_dir + "/model"
+  config = Config()
+  config.update({
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {
+      "l1": {"class": "linear", "activation": None, "n_out": 5},
+      "output": {"class": "linear", "activation": None, "n_out": 3, "from": ["l1"]}
+    }
+  })
+  async_saver = AsyncCheckpointSaver()
+  with make_scope() as session:
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(config.typed_dict["network"])
+    network.initialize_params(session)
+    params_orig_dump = network.get_params_serialized(session)
+    network.save_params_to_file(filename=model_filename, session=session, async_saver=async_saver)
+    # Modify the params after the save. This should not have an effect on the written checkpoint.
+    network.initialize_params(session)
+  async_saver.wait()
+  assert not async_saver.have_pending()
+  assert os.path.exists(model_filename + ".index")
+  assert os.path.exists(model_filename + ".meta")
+
+  with make_scope() as session:
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(config.typed_dict["network"])
+    network.load_params_from_file(filename=model_filename, session=session)
+    params_dump = network.get_params_serialized(session)
+    for layer_name in ["l1", "output"]:
+      for param_name in ["W", "b"]:
+        numpy.testing.assert_array_equal(
+          params_orig_dump.values_dict[layer_name][param_name], params_dump.values_dict[layer_name][param_name])
+    assert_equal(params_orig_dump.global_train_step, params_dump.global_train_step)
+
+
+def test_CustomCheckpointLoader_load_now_parallel_chunks():
+  import tempfile
+  from TFNetwork import CustomCheckpointLoader
+  model_tmp_dir = tempfile.mkdtemp("tmp-checkpoint")
+  model_filename = model_tmp_dir + "/model"
+  config = Config()
+  config.update({
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {
+      "l1": {"class": "linear", "activation": None, "n_out": 5},
+      "l2": {"class": "linear", "activation": None, "n_out": 7, "from": ["l1"]},
+      "output": {"class": "linear", "activation": None, "n_out": 3, "from": ["l2"]}
+    }
+  })
+  with make_scope() as session:
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(config.typed_dict["network"])
+    network.initialize_params(session)
+    params_orig_dump = network.get_params_serialized(session)
+    network.save_params_to_file(filename=model_filename, session=session)
+
+  with make_scope() as session:
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(config.typed_dict["network"])
+    network.initialize_params(session)
+    # Small max_bytes_in_flight, such that we get multiple chunks.
+    loader = CustomCheckpointLoader(
+      filename=model_filename, saveable_params=network.get_saveable_params_list(), network=network,
+      num_threads=3, max_bytes_in_flight=64)
+    assert len(list(loader._iter_chunks(list(loader.get_variable_value_map().items())))) > 1
+    loader.load_now(session=session)
+    params_dump = network.get_params_serialized(session)
+    for layer_name in ["l1", "l2", "output"]:
+      for param_name in ["W", "b"]:
+        numpy.testing.assert_array_equal(
+          params_orig_dump.values_dict[layer_name][param_name], params_dump.values_dict[layer_name][param_name])
+
+
+def test_average_checkpoints():
+  import tempfile
+  from TFNetwork import average_checkpoints, get_checkpoint_average_weights
+  model_tmp_dir = tempfile.mkdtemp("tmp-checkpoint")
+  config = Config()
+  config.update({
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {
+      "l1": {"class": "linear", "activation": None, "n_out": 5},
+      "output": {"class": "linear", "activation": None, "n_out": 3, "from": ["l1"]}
+    }
+  })
+  filenames = []
+  params_dumps = []
+  for i in range(3):
+    with make_scope() as session:
+      network = TFNetwork(config=config, train_flag=True)
+      network.construct_from_dict(config.typed_dict["network"])
+      network.initialize_params(session)
+      network.set_global_train_step(i + 1, session=session)
+      params_dumps.append(network.get_params_serialized(session))
+      filenames.append("%s/model.%03i" % (model_tmp_dir, i + 1))
+      network.save_params_to_file(filename=filenames[-1], session=session)
+
+  weights = get_checkpoint_average_weights(num_checkpoints=3, ema_decay=0.5)
+  numpy.testing.assert_allclose(weights, [0.25, 0.25, 0.5])
+  for use_network in [False, True]:
+    output_filename = "%s/avg%i" % (model_tmp_dir, use_network)
+    with make_scope() as session:
+      network = TFNetwork(config=config, train_flag=True)
+      network.construct_from_dict(config.typed_dict["network"])
+      average_checkpoints(
+        filenames=filenames, output_filename=output_filename, ema_decay=0.5,
+        network=network if use_network else None, max_bytes_per_shard=50)
+      network.load_params_from_file(filename=output_filename, session=session)
+      params_dump = network.get_params_serialized(session)
+      for layer_name in ["l1", "output"]:
+        for param_name in ["W", "b"]:
+          expected = sum([
+            dump.values_dict[layer_name][param_name] * weight for (dump, weight) in zip(params_dumps, weights)])
+          numpy.testing.assert_allclose(params_dump.values_dict[layer_name][param_name], expected, rtol=1e-5)
+      assert_equal(params_dump.global_train_step, 3)
+
+
 def test_unflatten_2d():
   # See also test_SimpleHDFWriter_ndim1_var_len.
   # And unflatten_nd, and UnflattenNdLayer.
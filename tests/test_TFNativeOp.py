@@ -1214,6 +1214,39 @@ def test_fast_bw_uniform():
   print("Done.")
 
 
+def test_tf_fast_bw_fsa_from_labels():
+  from Fsa import fast_bw_fsa_from_labels
+  labels = numpy.array([[0, 0, 1], [2, 0, 0]], dtype="int32")
+  label_lens = numpy.array([3, 1], dtype="int32")
+  edges, weights, start_end_states = session.run(
+    tf_fast_bw_fsa_from_labels(labels, label_lens, topology="ctc", blank_idx=3))
+  fsa = fast_bw_fsa_from_labels(labels, label_lens, topology="ctc", blank_idx=3)
+  assert_equal(edges.tolist(), fsa.edges.tolist())
+  assert_equal(weights.tolist(), fsa.weights.tolist())
+  assert_equal(start_end_states.tolist(), fsa.start_end_states.tolist())
+
+
+def test_fast_baum_welch_by_labels_ctc_score():
+  n_batch = 2
+  seq_len = 6
+  n_classes = 4  # incl. blank as last
+  labels = numpy.array([[0, 0, 1], [2, 1, 0]], dtype="int32")
+  label_lens = numpy.array([3, 2], dtype="int32")
+  numpy.random.seed(42)
+  logits = tf.constant(numpy.random.normal(size=(seq_len, n_batch, n_classes)).astype("float32"))
+  seq_lens = tf.constant([seq_len] * n_batch, dtype=tf.int32)
+  from TFUtil import sequence_mask_time_major, sparse_labels
+  fwdbwd, obs_scores = fast_baum_welch_by_labels(
+    am_scores=-tf.nn.log_softmax(logits), float_idx=sequence_mask_time_major(seq_lens),
+    labels=labels, label_lens=label_lens, topology="ctc", blank_idx=n_classes - 1)
+  ctc_loss = tf.nn.ctc_loss(
+    inputs=logits, labels=sparse_labels(labels, label_lens), sequence_length=seq_lens, time_major=True)
+  fwdbwd, obs_scores, ctc_loss = session.run([fwdbwd, obs_scores, ctc_loss])
+  print("BW score:", obs_scores[0], "CTC loss:", ctc_loss)
+  assert_allclose(obs_scores[0], ctc_loss, rtol=1e-4)
+  assert_allclose(numpy.sum(numpy.exp(-fwdbwd), axis=2), numpy.ones((seq_len, n_batch)), rtol=1e-4)
+
+
 def test_edit_distance():
   rnd = numpy.random.RandomState(42)
   n_batch = 15
@@ -1881,6 +1914,122 @@ def test_next_edit_distance_reduce_optimal_completion():
   print()
 
 
+class _NativeOpCpuThreads:
+  """
+  Context which sets the number of threads for the native CPU kernels (see NativeOp.cpp _CpuThreadPool).
+  """
+
+  def __init__(self, num_threads):
+    """
+    :param int num_threads:
+    """
+    self.num_threads = num_threads
+    self.old_value = None
+
+  def __enter__(self):
+    self.old_value = os.environ.get("RETURNN_NATIVE_OP_CPU_THREADS")
+    os.environ["RETURNN_NATIVE_OP_CPU_THREADS"] = str(self.num_threads)
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    if self.old_value is None:
+      del os.environ["RETURNN_NATIVE_OP_CPU_THREADS"]
+    else:
+      os.environ["RETURNN_NATIVE_OP_CPU_THREADS"] = self.old_value
+
+
+def _make_cpu_fast_bw_ctc(n_batch=8, seq_len=50, n_classes=20, label_len=15):
+  """
+  :return: (fwdbwd, obs_scores) on CPU, via :func:`fast_baum_welch_by_labels`
+  :rtype: (tf.Tensor, tf.Tensor)
+  """
+  rnd = numpy.random.RandomState(42)
+  with tf.device("/cpu:0"):
+    am_scores = tf.nn.log_softmax(tf.constant(rnd.normal(size=(seq_len, n_batch, n_classes)).astype("float32")))
+    seq_lens = rnd.randint(seq_len // 2, seq_len + 1, size=(n_batch,))
+    seq_lens[0] = seq_len
+    from TFUtil import sequence_mask_time_major
+    return fast_baum_welch_by_labels(
+      am_scores=-am_scores, float_idx=sequence_mask_time_major(tf.constant(seq_lens, dtype=tf.int32)),
+      labels=rnd.randint(0, n_classes - 1, size=(n_batch, label_len)).astype("int32"),
+      label_lens=rnd.randint(1, label_len + 1, size=(n_batch,)).astype("int32"),
+      topology="ctc", blank_idx=n_classes - 1)
+
+
+def _make_cpu_edit_distance(n_batch=16, max_len=100, n_classes=5):
+  """
+  :rtype: tf.Tensor
+  """
+  rnd = numpy.random.RandomState(42)
+  with tf.device("/cpu:0"):
+    return edit_distance(
+      tf.constant(rnd.randint(0, n_classes, size=(n_batch, max_len)).astype("int32")),
+      tf.constant(rnd.randint(1, max_len + 1, size=(n_batch,)).astype("int32")),
+      tf.constant(rnd.randint(0, n_classes, size=(n_batch, max_len)).astype("int32")),
+      tf.constant(rnd.randint(1, max_len + 1, size=(n_batch,)).astype("int32")))
+
+
+def test_NativeLstm2_cpu_threads_consistent():
+  n_time, n_batch, n_hidden = 7, 5, 11
+  rnd = numpy.random.RandomState(42)
+  with tf.device("/cpu:0"), tf.variable_scope("test_NativeLstm2_cpu_threads_consistent"):
+    cell = NativeLstm2(n_hidden=n_hidden)
+    inputs = tf.constant(rnd.normal(size=(n_time, n_batch, n_hidden * 4)).astype("float32"))
+    index = tf.constant(
+      (numpy.arange(n_time)[:, None] < rnd.randint(1, n_time + 1, size=(n_batch,))[None, :]).astype("float32"))
+    outputs, final_state = cell(inputs, index)
+    params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=tf.get_variable_scope().name)
+    grads = tf.gradients(tf.reduce_sum(outputs ** 2), [inputs] + params)
+  session.run(tf.variables_initializer(params))
+  results = {}
+  for num_threads in [1, 4]:
+    with _NativeOpCpuThreads(num_threads):
+      results[num_threads] = session.run([outputs] + grads)
+  # Must be exactly the same, bit by bit.
+  for v1, v4 in zip(results[1], results[4]):
+    assert_equal(v1.tobytes(), v4.tobytes())
+
+
+def test_FastBaumWelch_cpu_threads_consistent():
+  fwdbwd, obs_scores = _make_cpu_fast_bw_ctc()
+  results = {}
+  for num_threads in [1, 4]:
+    with _NativeOpCpuThreads(num_threads):
+      results[num_threads] = session.run((fwdbwd, obs_scores))
+  # Must be exactly the same, bit by bit.
+  assert_equal(results[1][0].tobytes(), results[4][0].tobytes())
+  assert_equal(results[1][1].tobytes(), results[4][1].tobytes())
+  bw = numpy.exp(-results[1][0])
+  assert_allclose(numpy.sum(bw[:, 0], axis=1), 1.0, rtol=1e-4)
+
+
+def test_edit_distance_cpu_threads_consistent():
+  res = _make_cpu_edit_distance()
+  results = {}
+  for num_threads in [1, 4]:
+    with _NativeOpCpuThreads(num_threads):
+      results[num_threads] = session.run(res)
+  assert_equal(results[1].tolist(), results[4].tolist())
+
+
+def benchmark_native_op_cpu_threads(num_threads_list=(1, 2, 4, 8), num_steps=10):
+  """
+  Compares the native CPU kernels with different number of threads.
+  Call via: ``python tests/test_TFNativeOp.py benchmark_native_op_cpu_threads``.
+  """
+  import time
+  ops = [
+    ("FastBaumWelch", _make_cpu_fast_bw_ctc(n_batch=32, seq_len=300, n_classes=100, label_len=60)),
+    ("EditDistance", _make_cpu_edit_distance(n_batch=64, max_len=500))]
+  for name, op in ops:
+    for num_threads in num_threads_list:
+      with _NativeOpCpuThreads(num_threads):
+        session.run(op)  # warmup
+        start_time = time.time()
+        for _ in range(num_steps):
+          session.run(op)
+        print("%s, %i threads: %.2f ms per step" % (name, num_threads, (time.time() - start_time) * 1000. / num_steps))
+
+
 @unittest.skipIf(not is_gpu_available(), "no gpu on this system")
 @unittest.skipIf(is_gpu_available() and get_available_gpu_min_compute_capability() < 3.5, "too low compute capability")
 def test_init_blocksparse():
@@ -3022,6 +3022,79 @@ def test_KenLmStateLayer_dense():
       print("Scores are as expected.")
 
 
+def test_KenLmStateLayer_prefix_state_cache():
+  import TFKenLM
+  TFKenLM.get_tf_mod(verbose=True)
+  test_lm_file = TFKenLM.kenlm_dir + "/lm/test.arpa"
+  assert os.path.exists(test_lm_file)
+  from GeneratingDataset import Vocabulary
+  from TFNetworkLayer import InternalLayer
+  import tempfile
+  with make_scope() as session:
+    with tempfile.NamedTemporaryFile(mode="w", prefix="vocab") as tmp_bpe_vocab_file:
+      labels = "</s> <unk> be@@ yond imm@@ edi@@ ate conc@@ erns".split()
+      bpe_vocab_dict = Vocabulary.create_vocab_dict_from_labels(labels)
+      tmp_bpe_vocab_file.write(repr(bpe_vocab_dict))
+      tmp_bpe_vocab_file.flush()
+
+      net = TFNetwork(extern_data=ExternData())
+      net.extern_data.register_data(Data(
+        name="data", shape=(), time_dim_axis=None, dim=len(labels), sparse=True,
+        auto_create_placeholders=True))
+      data_layer = net.construct_layer(name="data", net_dict={})
+      batch_dim = 2
+      layers = {}
+      rec_states = {}
+      for prefix_state_cache in [False, True]:
+        layer_base_opts = dict(
+          name="output_%s" % ("cached" if prefix_state_cache else "ref"), network=net, sources=[data_layer],
+          lm_file=test_lm_file,
+          vocab_file=tmp_bpe_vocab_file.name, vocab_unknown_label="<unk>",
+          bpe_merge_symbol="@@",
+          prefix_state_cache=prefix_state_cache)
+        layer_out = KenLmStateLayer.get_out_data_from_opts(**layer_base_opts)
+        rec_state = session.run(
+          KenLmStateLayer.get_rec_initial_extra_outputs(batch_dim=batch_dim, rec_layer=None, **layer_base_opts))
+        prev_layer = InternalLayer(name="prev:%s" % layer_base_opts["name"], network=net, output=layer_out.copy())
+        prev_layer.rec_vars_outputs = {
+          k: tf.placeholder(name="prev_layer_%s_%s" % (layer_base_opts["name"], k), shape=v.shape, dtype=v.dtype)
+          for (k, v) in rec_state.items()}
+        with reuse_name_scope(KenLmStateLayer.cls_get_tf_scope_name(layer_base_opts["name"])):
+          layer = KenLmStateLayer(output=layer_out, rec_previous_layer=prev_layer, **layer_base_opts)
+          net.layers[layer.name] = layer
+        layers[prefix_state_cache] = (prev_layer, layer)
+        rec_states[prefix_state_cache] = rec_state
+
+      net.initialize_params(session=session)
+      hyps = [
+        "be@@ yond imm@@ edi@@ ate conc@@ erns </s>".split(),
+        "be@@ yond imm@@ edi@@ ate ate be@@ </s>".split()]
+      abs_scores = {False: numpy.zeros((batch_dim,)), True: numpy.zeros((batch_dim,))}
+      for i in range(len(hyps[0])):
+        if i == 3:
+          # Reorder the beam, like the search would do, also for the LM states.
+          hyps = hyps[::-1]
+          for prefix_state_cache in [False, True]:
+            abs_scores[prefix_state_cache] = abs_scores[prefix_state_cache][::-1]
+            rec_states[prefix_state_cache] = {
+              k: (v[::-1] if k != "step" else v) for (k, v) in rec_states[prefix_state_cache].items()}
+        feed_dict = {net.extern_data.data["data"].placeholder: [labels.index(hyp[i]) for hyp in hyps]}
+        fetches = {}
+        for prefix_state_cache, (prev_layer, layer) in layers.items():
+          feed_dict.update({
+            prev_layer.rec_vars_outputs[k]: v for (k, v) in rec_states[prefix_state_cache].items()})
+          fetches[prefix_state_cache] = (layer.output.placeholder, layer.rec_vars_outputs)
+        res = session.run(fetches, feed_dict=feed_dict)
+        for prefix_state_cache, (rel_scores, rec_state) in res.items():
+          abs_scores[prefix_state_cache] += rel_scores
+          rec_states[prefix_state_cache] = rec_state
+        print("step %i, words %r, scores %r" % (i, [hyp[i] for hyp in hyps], abs_scores))
+        assert_almost_equal(abs_scores[True], abs_scores[False], decimal=4)
+        assert_equal(rec_states[True]["state"].tolist(), rec_states[False]["state"].tolist())
+
+      assert_almost_equal(abs_scores[True][1], -9.251298, decimal=4)  # example from :func:`test_kenlm`
+
+
 @unittest.skipIf(not is_gpu_available(), "no gpu on this system")
 def test_BlocksparseLSTM_load_params_from_native_lstm():
   from TFNativeOp import have_blocksparse_requirements, init_blocksparse
@@ -1940,6 +1940,32 @@ def test_kenlm_bpe():
   print("Scores are as expected.")
 
 
+def test_kenlm_prefix_cached():
+  import TFKenLM
+  input_strings = [
+    "beyond immediate concerns </s>",
+    "beyond immediate </s>",
+    "beyond immediate concerns",
+    "immediate concerns </s>",
+    "beyond",
+    "",
+    "beyond immediate concerns </s>"]
+  test_lm_file = TFKenLM.kenlm_dir + "/lm/test.arpa"
+  assert os.path.exists(test_lm_file)
+  lm_tf = TFKenLM.ken_lm_load(filename=test_lm_file)
+  input_strings_tf = tf.placeholder(tf.string, [None])
+  ref_scores_tf = TFKenLM.ken_lm_abs_score_strings(handle=lm_tf, strings=input_strings_tf)
+  output_scores_tf = TFKenLM.ken_lm_abs_score_strings_prefix_cached(handle=lm_tf, strings=input_strings_tf)
+  with tf.Session() as session:
+    ref_scores, output_scores = session.run(
+      (ref_scores_tf, output_scores_tf), feed_dict={input_strings_tf: input_strings})
+  print("input strings:", input_strings)
+  print("output scores:", output_scores)
+  assert_equal(output_scores.shape, (len(input_strings),))
+  assert_almost_equal(output_scores, ref_scores)
+  assert_almost_equal(output_scores[0], -9.251298)  # example from :func:`test_kenlm`
+
+
 def test_layer_norms():
   from TFNativeOp import have_blocksparse_requirements
   from tensorflow.contrib.layers import layer_norm as tf_contrib_layer_norm
@@ -132,3 +132,56 @@ def test_AsyncTask_chdir():
   assert_equal(proc.conn.recv(), "hello c2p")
   proc.conn.send("hello p2c")
   proc.join()
+
+
+def test_ShmRingBuffer():
+  ring = ShmRingBuffer(num_slots=2, slot_size=1000)
+  other = ShmRingBuffer(name=ring.get_name())
+  ring.mem.unlink()
+  a, b = numpy.arange(10, dtype="float32"), numpy.ones((3, 4), dtype="int64")
+  header = ring.put_arrays([a, b])
+  assert_equal(header[0], 0)
+  a2, b2 = other.get_arrays(header)
+  assert_equal(a2.tolist(), a.tolist())
+  assert_equal((b2.dtype, b2.shape), (b.dtype, b.shape))
+  assert ring.put_arrays([numpy.zeros(1000)]) is None  # too big for one slot
+  assert ring.put_arrays([a]) is not None
+  assert ring.put_arrays([a], timeout=0.01) is None  # all slots used
+  other.release(header[0])
+  assert_equal(ring.put_arrays([b], timeout=0.01)[0], 0)
+  other.close()
+  ring.close()
+
+
+def test_ShmRingBuffer_AsyncTask():
+  def func(asyncTask):
+    """
+    :type asyncTask: AsyncTask
+    """
+    ring = ShmRingBuffer(name=asyncTask.conn.recv())
+    asyncTask.conn.send("attached")
+    while True:
+      header = asyncTask.conn.recv()
+      if header is None:
+        break
+      arrays = ring.get_arrays(header)
+      asyncTask.conn.send([float(x.sum()) for x in arrays])
+      arrays = None
+      ring.release(header[0])
+  proc = AsyncTask(
+    func=func,
+    name="AsyncTask proc",
+    mustExec=True,
+    env_update={})
+  ring = ShmRingBuffer(num_slots=2, slot_size=10000)
+  proc.conn.send(ring.get_name())
+  assert_equal(proc.conn.recv(), "attached")
+  ring.mem.unlink()
+  for i in range(5):
+    arrays = [numpy.random.randn(i + 1, 7).astype("float32"), numpy.arange(i * 10, dtype="int32")]
+    proc.conn.send(ring.put_arrays(arrays, timeout=10))
+    sums = proc.conn.recv()
+    numpy.testing.assert_allclose(sums, [float(x.sum()) for x in arrays], rtol=1e-5)
+  proc.conn.send(None)
+  proc.join()
+  ring.close()
@@ -177,6 +177,40 @@ def test_NativeCodeCompiler():
   assert_equal(lib.get_magic(), 42)
 
 
+def test_NativeCodeCompiler_shared_cache_dir():
+  import tempfile
+  import shutil
+  cache_base_dir = tempfile.mkdtemp()
+  old_cache_base_dir = NativeCodeCompiler.CacheBaseDir
+  try:
+    NativeCodeCompiler.CacheBaseDir = cache_base_dir
+    code = """
+    extern "C" int get_magic() { return 17; }
+    """
+    native = NativeCodeCompiler(base_name="test_NativeCodeCompiler_shared", code_version=1, code=code)
+    fn = native.get_lib_filename()
+    assert fn.startswith(cache_base_dir + "/")
+    assert_equal(
+      sorted(os.listdir(os.path.dirname(fn))),
+      ["compile.log", "info.py", "test_NativeCodeCompiler_shared.cc", "test_NativeCodeCompiler_shared.so"])
+    # Some other process with the same code should reuse it.
+    native2 = NativeCodeCompiler(base_name="test_NativeCodeCompiler_shared", code_version=1, code=code)
+    mtime = os.path.getmtime(fn)
+    assert_equal(native2.get_lib_filename(), fn)
+    assert_equal(os.path.getmtime(fn), mtime)
+    import ctypes
+    lib = ctypes.cdll.LoadLibrary(fn)
+    assert_equal(lib.get_magic(), 17)
+    # The cache dir can be shared between hosts, thus the compiler must be part of the hash.
+    assert "compiler_version" in native._relevant_info_keys
+    assert native._load_info()["compiler_version"]
+    native._info_dict = dict(native._info_dict, compiler_version="other compiler")
+    assert_not_equal(native._make_hash(), native2._make_hash())
+  finally:
+    NativeCodeCompiler.CacheBaseDir = old_cache_base_dir
+    shutil.rmtree(cache_base_dir)
+
+
 def test_Stats():
   rnd = numpy.random.RandomState(42)
   m = rnd.uniform(-2., 10., (1000, 3))
@@ -247,6 +281,89 @@ def test_get_func_kwargs():
   assert_equal(list(getargspec(dummy_func).args), ["net", "var", "update_ops"])
 
 
+def test_TimingStats():
+  stats = TimingStats()
+  stats.collect("data_wait", 1.0)
+  stats.collect("data_wait", 3.0)
+  with stats.measure("session_run"):
+    pass
+  cur = stats.pop_cur()
+  assert_equal(cur["data_wait"], 4.0)
+  assert_equal(set(cur.keys()), {"data_wait", "session_run"})
+  assert_equal(stats.pop_cur(), {})
+  assert_equal(stats.get_mean("data_wait"), 2.0)
+  summary = stats.get_summary_dict()
+  assert_equal(summary["data_wait"]["count"], 2)
+  assert_equal(summary["data_wait"]["max"], 3.0)
+  assert "data_wait" in stats.get_summary_str(total_time=10.)
+
+
+def test_PriorAccumulator_shards_merge():
+  import tempfile
+  import shutil
+  rnd = numpy.random.RandomState(42)
+  dim = 5
+  batches = [rnd.randint(0, dim - 1, size=rnd.randint(1, 20)) for _ in range(10)]  # last label never seen
+  ref = numpy.bincount(numpy.concatenate(batches), minlength=dim) / float(sum([len(b) for b in batches]))
+  shards = [PriorAccumulator(dim=dim), PriorAccumulator(dim=dim, log_space=True)]
+  for i, labels in enumerate(batches):
+    shards[i % 2].add_labels(labels)
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    shards[1].save("%s/shard1.npz" % tmp_dir)
+    loaded = PriorAccumulator.load("%s/shard1.npz" % tmp_dir)
+  finally:
+    shutil.rmtree(tmp_dir)
+  assert_equal((loaded.num_batches, loaded.num_frames, loaded.log_space), (5, shards[1].num_frames, True))
+  shards[0].merge(loaded)
+  assert_equal(shards[0].num_frames, sum([len(b) for b in batches]))
+  log_prior = shards[0].get_log_prior()
+  assert_almost_equal(numpy.exp(log_prior), ref)
+  assert_equal(log_prior[-1], -numpy.inf)
+
+
+def test_PriorAccumulator_log_space():
+  rnd = numpy.random.RandomState(42)
+  log_posteriors = numpy.log(numpy.array([softmax(rnd.normal(size=(7, 4)) * 50., axis=1) for _ in range(3)]))
+  acc_std = PriorAccumulator(dim=4)
+  acc_log = PriorAccumulator(dim=4, log_space=True)
+  for x in log_posteriors:
+    acc_std.add_batch_sum(numpy.sum(numpy.exp(x), axis=0), num_frames=7)
+    acc_log.add_batch_sum(numpy.logaddexp.reduce(x, axis=0), num_frames=7)
+  assert_almost_equal(acc_log.get_log_prior(), acc_std.get_log_prior())
+  assert_almost_equal(numpy.sum(numpy.exp(acc_log.get_log_prior())), 1.0)
+
+
+def test_rnn_import_no_backend():
+  # rnn should not import any backend or heavy optional deps before it knows what it needs.
+  import subprocess
+  import os
+  base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  out = subprocess.check_output([
+    sys.executable, "-c",
+    "import sys, rnn; print(sorted(set(sys.modules).intersection(['theano', 'tensorflow', 'h5py', 'Device'])))"],
+    cwd=base_dir)
+  assert_equal(out.decode("utf8").strip().splitlines()[-1], "[]")
+
+
+def test_StartupProfiler():
+  from Debug import StartupProfiler
+  import io
+  profiler = StartupProfiler()
+  profiler.install()
+  try:
+    with profiler.step("test"):
+      sys.modules.pop("colorsys", None)
+      import colorsys
+  finally:
+    profiler.uninstall()
+  assert "colorsys" in profiler.import_times
+  assert_equal([name for (name, elapsed) in profiler.steps], ["test"])
+  out = io.StringIO()
+  profiler.report(file=out)
+  assert "import colorsys" in out.getvalue()
+
+
 if __name__ == "__main__":
   better_exchook.install()
   if len(sys.argv) <= 1:
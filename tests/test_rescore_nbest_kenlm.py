@@ -0,0 +1,102 @@
+
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import numpy
+from nose.tools import assert_equal, assert_almost_equal
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import better_exchook
+better_exchook.replace_traceback_format_tb()
+
+
+def _load_tool():
+  """
+  The tool filename is not a valid module name, thus we cannot just import it.
+  TF is only imported when the LM is used, so this works without TF.
+
+  :return: the globals of tools/rescore-nbest-kenlm.py
+  :rtype: dict[str]
+  """
+  filename = "%s/tools/rescore-nbest-kenlm.py" % returnn_dir
+  tool_globals = {"__name__": "rescore_nbest_kenlm", "__file__": filename}
+  exec(compile(open(filename).read(), filename, "exec"), tool_globals)
+  return tool_globals
+
+
+tool = _load_tool()
+prepare_lm_text = tool["prepare_lm_text"]
+rescore_nbest = tool["rescore_nbest"]
+load_nbest = tool["load_nbest"]
+
+
+def _fake_lm_score_func(strings):
+  """
+  Like KenLmScoreGraph.score, i.e. in +log space. Every word costs 1, except "good" which is free.
+
+  :param list[str] strings:
+  :rtype: numpy.ndarray
+  """
+  return numpy.array([-float(len([w for w in s.split() if w != "good"])) for s in strings], dtype="float32")
+
+
+def test_prepare_lm_text():
+  assert_equal(prepare_lm_text("hello  world "), "hello world </s>")
+  assert_equal(prepare_lm_text("hello world", add_eos=False), "hello world")
+  assert_equal(prepare_lm_text("he@@ llo wor@@ ld", bpe_merge_symbol="@@"), "hello world </s>")
+  assert_equal(prepare_lm_text("he@@ llo wor@@", bpe_merge_symbol="@@", add_eos=False), "hello wor")
+  assert_equal(prepare_lm_text("he@@ llo", add_eos=False), "he@@ llo")
+
+
+def test_rescore_nbest():
+  nbest = {
+    "seq-a": [(-1.0, "a bad hyp"), (-2.0, "go@@ od")],
+    "seq-b": [(-1.5, "b"), (-0.5, "b c")]}
+  rescored = rescore_nbest(nbest, score_func=_fake_lm_score_func, lm_scale=0.5, bpe_merge_symbol="@@")
+  assert_equal(sorted(rescored.keys()), ["seq-a", "seq-b"])
+  # "a bad hyp </s>": 4 words -> -1.0 + 0.5 * -4 = -3.0. "good </s>": 1 word -> -2.0 + 0.5 * -1 = -2.5.
+  assert_equal([hyp for (score, hyp) in rescored["seq-a"]], ["go@@ od", "a bad hyp"])
+  assert_almost_equal(rescored["seq-a"][0][0], -2.5)
+  assert_almost_equal(rescored["seq-a"][1][0], -3.0)
+  # "b c </s>": -0.5 + 0.5 * -3 = -2.0. "b </s>": -1.5 + 0.5 * -2 = -2.5.
+  assert_equal([hyp for (score, hyp) in rescored["seq-b"]], ["b c", "b"])
+  # Without BPE merging, "go@@ od" are two (non-"good") words.
+  rescored_no_bpe = rescore_nbest(nbest, score_func=_fake_lm_score_func, lm_scale=0.5, am_scale=2.0)
+  assert_almost_equal(rescored_no_bpe["seq-a"][0][0], 2.0 * -1.0 + 0.5 * -4)
+  assert_almost_equal(rescored_no_bpe["seq-a"][1][0], 2.0 * -2.0 + 0.5 * -3)
+  # Parallel scoring gives the same.
+  rescored_threaded = rescore_nbest(
+    nbest, score_func=_fake_lm_score_func, lm_scale=0.5, bpe_merge_symbol="@@", num_threads=2)
+  assert_equal(rescored_threaded, rescored)
+
+
+def test_load_nbest():
+  with tempfile.NamedTemporaryFile(mode="w", suffix=".py") as f:
+    f.write("{\n'seq-a': [(-1.0, 'a b'), (-2.0, 'a')],\n}\n")
+    f.flush()
+    assert_equal(load_nbest(f.name), {"seq-a": [(-1.0, "a b"), (-2.0, "a")]})
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        v()
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
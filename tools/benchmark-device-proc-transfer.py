@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the transfer rate from the host proc to a device proc
+(fork+exec child via :class:`TaskSystem.AsyncTask`, like :class:`Device.Device`),
+comparing the pickled pipe (as in ``update_data``) with :class:`TaskSystem.ShmRingBuffer`.
+The child sums up each array, i.e. it touches all the data in both cases.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import numpy
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+from TaskSystem import AsyncTask, ShmRingBuffer
+
+
+def device_proc(asyncTask):
+  """
+  :param AsyncTask asyncTask:
+  """
+  conn = asyncTask.conn
+  ring = ShmRingBuffer(name=conn.recv())
+  conn.send("attached")
+  while True:
+    cmd = conn.recv()
+    if cmd == "stop":
+      break
+    elif cmd == "pipe":
+      arrays = conn.recv()
+      conn.send(sum([float(a.sum()) for a in arrays]))
+    elif cmd == "shm":
+      header = conn.recv()
+      arrays = ring.get_arrays(header)
+      res = sum([float(a.sum()) for a in arrays])
+      arrays = None
+      ring.release(header[0])
+      conn.send(res)
+    else:
+      raise Exception("cmd %s unknown" % cmd)
+
+
+def benchmark(conn, ring, mode, arrays, num_iterations):
+  """
+  :param TaskSystem.ExecingProcess_ConnectionWrapper conn:
+  :param ShmRingBuffer ring:
+  :param str mode: "pipe" or "shm"
+  :param list[numpy.ndarray] arrays:
+  :param int num_iterations:
+  :return: MB/sec
+  :rtype: float
+  """
+  expected = sum([float(a.sum()) for a in arrays])
+  start_time = time.time()
+  for i in range(num_iterations):
+    conn.send(mode)
+    if mode == "pipe":
+      conn.send(arrays)
+    else:
+      header = ring.put_arrays(arrays)
+      assert header, "arrays do not fit into a slot"
+      conn.send(header)
+    res = conn.recv()
+    assert abs(res - expected) <= 1e-3 * max(abs(expected), 1.0)
+  total_bytes = sum([a.nbytes for a in arrays]) * num_iterations
+  return total_bytes / (time.time() - start_time) / 1024. / 1024.
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("--sizes_mb", default="1,16,64", help="batch sizes in MB, comma-separated")
+  argparser.add_argument("--num_iterations", type=int, default=20)
+  argparser.add_argument("--num_slots", type=int, default=4)
+  args = argparser.parse_args(argv[1:])
+
+  sizes = [float(s) for s in args.sizes_mb.split(",")]
+  # Two arrays per batch, like data + index in Device.update_data.
+  ring = ShmRingBuffer(num_slots=args.num_slots, slot_size=int(max(sizes) * 1024 * 1024) + 2 * ShmRingBuffer.Alignment)
+  proc = AsyncTask(func=device_proc, name="benchmark device proc", mustExec=True)
+  proc.conn.send(ring.get_name())
+  assert proc.conn.recv() == "attached"
+  ring.mem.unlink()
+  try:
+    for size in sizes:
+      num_floats = int(size * 1024 * 1024) // 4
+      index = numpy.ones((num_floats // 100,), dtype="int8")
+      data = numpy.random.randn(num_floats - index.nbytes // 4).astype("float32")
+      rates = {mode: benchmark(proc.conn, ring, mode, [data, index], args.num_iterations) for mode in ["pipe", "shm"]}
+      print("%7.1f MB: pipe %8.1f MB/s, shm ring buffer %8.1f MB/s, speedup %.2fx" % (
+        size, rates["pipe"], rates["shm"], rates["shm"] / rates["pipe"]))
+  finally:
+    proc.conn.send("stop")
+    proc.join()
+    ring.close()
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the model averaging of multi-device Theano training
+(``param_sync_mode`` and ``param_sync_delayed``, see :class:`EngineTask.TrainTaskThread`)
+with 2-4 CPU devices, by running rnn.py on a 12AX demo config for each setting.
+Reports the time spent in the param sync and the epoch time.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import re
+import subprocess
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+
+
+Settings = [
+  ("sequential", {"param_sync_mode": "sequential"}),
+  ("pipelined", {"param_sync_mode": "pipelined"}),
+  ("delayed", {"param_sync_mode": "pipelined", "param_sync_delayed": "1"}),
+]
+
+
+def run_setting(config_filename, num_devices, opts, num_epochs, update_batch_size):
+  """
+  :param str config_filename:
+  :param int num_devices:
+  :param dict[str,str] opts: config options
+  :param int num_epochs:
+  :param int update_batch_size: sync the devices when the accumulated cost reaches this (see TaskThread.run_inner)
+  :return: (param sync time, epoch time) in secs, summed over all epochs
+  :rtype: (float,float)
+  """
+  args = [sys.executable, "%s/rnn.py" % returnn_dir, config_filename,
+          "++device", ",".join(["cpu%i" % i for i in range(num_devices)]),
+          "++num_epochs", str(num_epochs), "++update_batch_size", str(update_batch_size),
+          "++log_verbosity", "4", "++model", "/tmp/benchmark-param-sync.%i.network" % os.getpid(),
+          "++save_interval", str(num_epochs + 1)]
+  for key, value in sorted(opts.items()):
+    args += ["++%s" % key, value]
+  out = subprocess.check_output(args, cwd=returnn_dir, stderr=subprocess.STDOUT).decode("utf8")
+  sync_times = [float(m) for m in re.findall(r"param sync \([^)]*\): ([0-9.]+) sec", out)]
+  epoch_times = [sum([int(x) * 60 ** i for (i, x) in enumerate(reversed(m.split(":")))])
+                 for m in re.findall(r"score: .*? elapsed: ([0-9:]+)", out)]
+  assert len(sync_times) == num_epochs, "unexpected output:\n%s" % out
+  return sum(sync_times), sum(epoch_times)
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("--config", default="%s/demos/demo-theano-vanilla-lstm.12ax.config" % returnn_dir)
+  argparser.add_argument("--num_devices", default="2,3,4", help="comma-separated")
+  argparser.add_argument("--num_epochs", type=int, default=2)
+  argparser.add_argument("--update_batch_size", type=int, default=5000)
+  args = argparser.parse_args(argv[1:])
+
+  for num_devices in [int(n) for n in args.num_devices.split(",")]:
+    ref_sync_time = None
+    for name, opts in Settings:
+      sync_time, epoch_time = run_setting(
+        config_filename=args.config, num_devices=num_devices, opts=opts,
+        num_epochs=args.num_epochs, update_batch_size=args.update_batch_size)
+      if ref_sync_time is None:
+        ref_sync_time = sync_time
+      print("%i devices, %-10s: param sync %7.3f sec (speedup %.2fx), epochs %i sec" % (
+        num_devices, name, sync_time, ref_sync_time / max(sync_time, 1e-6), epoch_time))
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
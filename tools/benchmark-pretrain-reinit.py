@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the network reconstruction between pretrain epochs of the TF engine,
+i.e. :func:`TFEngine.Engine.maybe_init_new_network`,
+with the full reconstruction (new graph and session, params copied over)
+vs. ``pretrain_incremental_construction`` (see :func:`TFEngine.Engine._init_network_incremental`).
+The setup is like ``demos/demo-pretrain.config`` (``pretrain = "default"``, i.e. layer-wise),
+but with a configurable number and size of LSTM layers.
+No training is done, only the transitions are timed.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+from Config import Config
+from Log import log
+from GeneratingDataset import Task12AXDataset
+
+
+def get_config(num_layers, layer_size, incremental):
+  """
+  :param int num_layers:
+  :param int layer_size:
+  :param bool incremental:
+  :rtype: Config
+  """
+  network = {}
+  src = "data"
+  for i in range(num_layers):
+    network["lstm%i" % i] = {"class": "rec", "unit": "nativelstm2", "n_out": layer_size, "from": [src]}
+    src = "lstm%i" % i
+  network["output"] = {"class": "softmax", "loss": "ce", "from": [src]}
+  config = Config()
+  config.update({
+    "num_inputs": 9, "num_outputs": 2,
+    "network": network,
+    "pretrain": "default",
+    "pretrain_incremental_construction": incremental,
+    "adam": True,
+    "learning_rate": 0.01,
+    "log_verbosity": 2,
+    "start_epoch": 1,
+    "num_epochs": num_layers + 1,
+  })
+  return config
+
+
+def benchmark(num_layers, layer_size, incremental):
+  """
+  :param int num_layers:
+  :param int layer_size:
+  :param bool incremental:
+  :return: time in secs for each pretrain transition
+  :rtype: list[float]
+  """
+  from TFEngine import Engine
+  config = get_config(num_layers=num_layers, layer_size=layer_size, incremental=incremental)
+  train_data = Task12AXDataset(num_seqs=10)
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=train_data)
+  times = []
+  for epoch in range(2, engine.pretrain.get_train_num_epochs() + 1):
+    engine.epoch = epoch
+    start_time = time.time()
+    engine.maybe_init_new_network(engine.pretrain.get_network_json_for_epoch(epoch))
+    times.append(time.time() - start_time)
+  engine.finalize()
+  return times
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("--num_layers", type=int, default=6)
+  argparser.add_argument("--layer_size", type=int, default=512)
+  args = argparser.parse_args(argv[1:])
+
+  log.initialize(verbosity=[2])
+  results = {}
+  for incremental in [False, True]:
+    results[incremental] = benchmark(
+      num_layers=args.num_layers, layer_size=args.layer_size, incremental=incremental)
+  for i, (full_time, incremental_time) in enumerate(zip(results[False], results[True])):
+    print("transition to epoch %i: full %.3f sec, incremental %.3f sec" % (i + 2, full_time, incremental_time))
+  print("total: full %.3f sec, incremental %.3f sec (speedup %.2fx)" % (
+    sum(results[False]), sum(results[True]), sum(results[False]) / max(sum(results[True]), 1e-6)))
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
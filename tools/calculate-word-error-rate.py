@@ -5,7 +5,6 @@ from __future__ import print_function
 import os
 import sys
 import time
-import tensorflow as tf
 import numpy
 
 my_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,30 +17,7 @@ import argparse
 from Util import Stats, hms
 from Dataset import Dataset, init_dataset
 import Util
-import TFUtil
-
-
-class WerComputeGraph:
-  def __init__(self):
-    self.hyps = tf.placeholder(tf.string, [None])
-    self.refs = tf.placeholder(tf.string, [None])
-    self.wer, self.ref_num_words = TFUtil.string_words_calc_wer(hyps=self.hyps, refs=self.refs)
-    self.total_wer_var = tf.Variable(initial_value=0, trainable=False, dtype=tf.int64)
-    self.total_ref_num_words_var = tf.Variable(initial_value=0, trainable=False, dtype=tf.int64)
-    self.update_total_wer = self.total_wer_var.assign_add(tf.reduce_sum(self.wer))
-    self.update_ref_num_words = self.total_ref_num_words_var.assign_add(tf.reduce_sum(self.ref_num_words))
-    self.updated_normalized_wer = \
-      tf.cast(self.update_total_wer, tf.float32) / tf.cast(self.update_ref_num_words, tf.float32)
-
-  def step(self, session, hyps, refs):
-    """
-    :param tf.Session session:
-    :param list[str] hyps:
-    :param list[str] refs:
-    :return: updated normalized WER
-    :rtype: float
-    """
-    return session.run(self.updated_normalized_wer, feed_dict={self.hyps: hyps, self.refs: refs})
+import Scoring
 
 
 def calc_wer_on_dataset(dataset, refs, options, hyps):
@@ -59,11 +35,10 @@ def calc_wer_on_dataset(dataset, refs, options, hyps):
   seq_idx = options.startseq
   if options.endseq < 0:
     options.endseq = float("inf")
-  wer = 1.0
+  wer = None  # type: float|None  # updated every options.report_interval seqs
   remaining_hyp_seq_tags = set(hyps.keys())
   interactive = Util.is_tty() and not log.verbose[5]
-  collected = {"hyps": [], "refs": []}
-  max_num_collected = 1
+  scorer = Scoring.Scorer(metrics=["wer"])
   if dataset:
     dataset.init_seq_order(epoch=1)
   else:
@@ -102,7 +77,7 @@ def calc_wer_on_dataset(dataset, refs, options, hyps):
       num_seqs_s = str(len(refs))
 
     start_elapsed = time.time() - start_time
-    progress_prefix = "%i/%s (WER %.02f%%)" % (seq_idx, num_seqs_s, wer * 100)
+    progress_prefix = "%i/%s (WER %s)" % (seq_idx, num_seqs_s, ("%.02f%%" % (wer * 100)) if wer is not None else "?")
     progress = "%s (%.02f%%)" % (progress_prefix, complete_frac * 100)
     if complete_frac > 0:
       total_time_estimated = start_elapsed / complete_frac
@@ -113,21 +88,17 @@ def calc_wer_on_dataset(dataset, refs, options, hyps):
     hyp = hyps[seq_tag]
     seq_len_stats["hyps"].collect([len(hyp)])
     seq_len_stats["refs"].collect([len(ref)])
-    collected["hyps"].append(hyp)
-    collected["refs"].append(ref)
-
-    if len(collected["hyps"]) >= max_num_collected:
-      wer = wer_compute.step(session, **collected)
-      del collected["hyps"][:]
-      del collected["refs"][:]
+    scorer.add(seq_tag=seq_tag, hyp=hyp, ref=ref)
+    if options.report_interval > 0 and (seq_idx - options.startseq + 1) % options.report_interval == 0:
+      # This flushes the buffered stats of the scorer, thus not for every seq.
+      wer = scorer.get_corpus_score("wer")
 
     if interactive:
       Util.progress_bar_with_time(complete_frac, prefix=progress_prefix)
     elif log.verbose[5]:
       print(progress_prefix, "seq tag %r, ref/hyp len %i/%i chars" % (seq_tag, len(ref), len(hyp)))
     seq_idx += 1
-  if len(collected["hyps"]) > 0:
-    wer = wer_compute.step(session, **collected)
+  wer = scorer.get_corpus_score("wer")
   print("Done. Num seqs %i. Total time %s." % (
     seq_idx, hms(time.time() - start_time)), file=log.v1)
   print("Remaining num hyp seqs %i." % (len(remaining_hyp_seq_tags),), file=log.v1)
@@ -194,6 +165,9 @@ def main(argv):
   argparser.add_argument('--endseq', type=int, default=-1, help='end seq idx (inclusive) or -1 (default: -1)')
   argparser.add_argument("--key", default="raw", help="data-key, e.g. 'data' or 'classes'. (default: 'raw')")
   argparser.add_argument("--verbosity", default=4, type=int, help="5 for all seqs (default: 4)")
+  argparser.add_argument(
+    "--report_interval", default=100, type=int,
+    help="update the WER in the progress output every N seqs, 0 for only at the end (default: 100)")
   argparser.add_argument("--out", help="if provided, will write WER% (as string) to this file")
   argparser.add_argument("--expect_full", action="store_true", help="full dataset should be scored")
   args = argparser.parse_args(argv[1:])
@@ -212,24 +186,18 @@ def main(argv):
     dataset = init_dataset(config.opt_typed_value("wer_data"))
   hyps = load_hyps_refs(args.hyps)
 
-  global wer_compute
-  wer_compute = WerComputeGraph()
-  with tf.Session(config=tf.ConfigProto(device_count={"GPU": 0})) as _session:
-    global session
-    session = _session
-    session.run(tf.global_variables_initializer())
-    try:
-      wer = calc_wer_on_dataset(dataset=dataset, refs=refs, options=args, hyps=hyps)
-      print("Final WER: %.02f%%" % (wer * 100), file=log.v1)
-      if args.out:
-        with open(args.out, "w") as output_file:
-          output_file.write("%.02f\n" % (wer * 100))
-        print("Wrote WER%% to %r." % args.out)
-    except KeyboardInterrupt:
-      print("KeyboardInterrupt")
-      sys.exit(1)
-    finally:
-      rnn.finalize()
+  try:
+    wer = calc_wer_on_dataset(dataset=dataset, refs=refs, options=args, hyps=hyps)
+    print("Final WER: %.02f%%" % (wer * 100), file=log.v1)
+    if args.out:
+      with open(args.out, "w") as output_file:
+        output_file.write("%.02f\n" % (wer * 100))
+      print("Wrote WER%% to %r." % args.out)
+  except KeyboardInterrupt:
+    print("KeyboardInterrupt")
+    sys.exit(1)
+  finally:
+    rnn.finalize()
 
 
 if __name__ == '__main__':
@@ -1,56 +1,67 @@
 #!/usr/bin/env python3
 
+"""
+Deletes old models, like the config option ``cleanup_old_models`` during training.
+Does not initialize the engine (or TF). It uses the checkpoint index (see :mod:`CheckpointIndex`),
+which is synced with the existing model files, and takes the scores from the learning rate file.
+"""
+
+from __future__ import print_function
+
 import sys
 import os
 import argparse
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-import better_exchook
-better_exchook.install()
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
 
 from Log import log
-from rnn import init, finalize
+from Config import Config
+from Util import CollectionReadCheckCovered
+from LearningRateControl import LearningRateControl
+from CheckpointIndex import CheckpointIndex, cleanup_old_models
 
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument("--config")
+arg_parser = argparse.ArgumentParser(description=__doc__)
+arg_parser.add_argument("--config", help="reads model, learning_rate_file and cleanup_old_models from it")
 arg_parser.add_argument("--cwd", help="will change to this dir")
 arg_parser.add_argument("--model", help="model filenames")
 arg_parser.add_argument("--scores", help="learning_rate_control file, e.g. newbob.data")
-arg_parser.add_argument("--dry_run", action="store_true")
+arg_parser.add_argument("--dry_run", action="store_true", help="only report what would be deleted")
+arg_parser.add_argument("--yes", action="store_true", help="do not ask for confirmation")
 
 
 def main():
   args = arg_parser.parse_args()
   return_code = 0
+  log.initialize(verbosity=[5])
   try:
     if args.cwd:
       os.chdir(args.cwd)
-    init(
-      extra_greeting="Delete old models.",
-      configFilename=args.config or None,
-      config_updates={
-        "use_tensorflow": True,
-        "need_data": False,
-        "device": "cpu"})
-    from rnn import engine, config
-    if args.model:
-      config.set("model", args.model)
-    if args.scores:
-      config.set("learning_rate_file", args.scores)
-    if args.dry_run:
-      config.set("dry_run", True)
-    engine.cleanup_old_models(ask_for_confirmation=True)
+    config = Config()
+    if args.config:
+      config.load_file(args.config)
+    model_filename = args.model or config.value("model", None)
+    assert model_filename, "need --model or --config with model"
+    scores_filename = args.scores or config.value("learning_rate_file", None)
+    index = CheckpointIndex(CheckpointIndex.get_default_filename(model_filename))
+    index.update_from_existing_models(CheckpointIndex.scan_model_dir(model_filename))
+    if scores_filename:
+      index.update_scores_from_learning_rate_control(
+        LearningRateControl(defaultLearningRate=0.0, filename=scores_filename))
+    opts = CollectionReadCheckCovered(config.get_of_type("cleanup_old_models", dict, {}))
+    cleanup_old_models(index=index, opts=opts, dry_run=args.dry_run, ask_for_confirmation=not args.yes)
 
   except KeyboardInterrupt:
     return_code = 1
     print("KeyboardInterrupt", file=getattr(log, "v3", sys.stderr))
     if getattr(log, "verbose", [False] * 6)[5]:
       sys.excepthook(*sys.exc_info())
-  finalize()
   if return_code:
     sys.exit(return_code)
 
 
 if __name__ == "__main__":
+  import better_exchook
+  better_exchook.install()
   main()
@@ -58,6 +58,62 @@ def init(config_filename, log_verbosity):
     network.construct_from_dict(config.typed_dict["network"])
 
 
+def get_all_compilers(search_for_numpy_blas=True, blas_lib=None):
+  """
+  :param bool search_for_numpy_blas:
+  :param str|None blas_lib:
+  :return: compilers for all native ops (incl. their gradients) and TFKenLM (if the submodule is checked out)
+  :rtype: list[TFUtil.OpCodeCompiler]
+  """
+  import NativeOp
+  from TFNativeOp import OpMaker, OpDescription
+  compilers = []
+  descriptions = []
+  for name, cls in sorted(vars(NativeOp).items()):
+    if not isinstance(cls, type) or not issubclass(cls, NativeOp.NativeOpGenBase) or cls is NativeOp.NativeOpGenBase:
+      continue
+    description = OpDescription.from_gen_base(cls)
+    while description:
+      descriptions.append(description)
+      description = description.grad() if description.is_grad_defined else None
+  for description in descriptions:
+    maker = OpMaker(
+      description=description, compiler_opts={"verbose": True},
+      search_for_numpy_blas=search_for_numpy_blas, blas_lib=blas_lib)
+    if not description.cpu_support and not maker.with_cuda:
+      print("Skip native op %r, no CPU support and no CUDA." % description.name)
+      continue
+    compilers.append(maker.make_compiler())
+  import TFKenLM
+  from glob import glob
+  if glob("%s/lm/*.cc" % TFKenLM.kenlm_dir):
+    compilers.append(TFKenLM.get_tf_mod_compiler(verbose=True))
+  else:
+    print("Skip TFKenLM, submodule in %r not checked out (git submodule update --init)." % TFKenLM.kenlm_dir)
+  return compilers
+
+
+def compile_all(compilers, num_jobs):
+  """
+  Compiles (but does not load) the given compilers in parallel.
+  The compilers run as sub processes, thus threads are fine here.
+  The NativeCodeCompiler lock files make sure that we don't compile the same lib twice.
+
+  :param list[TFUtil.OpCodeCompiler] compilers:
+  :param int num_jobs:
+  """
+  from multiprocessing.pool import ThreadPool
+  start_time = time.time()
+  pool = ThreadPool(processes=num_jobs)
+  try:
+    for fn in pool.imap_unordered(lambda compiler: compiler.get_lib_filename(), compilers):
+      print("Done:", fn)
+  finally:
+    pool.close()
+    pool.join()
+  print("Compiled %i libs with %i jobs in %s." % (len(compilers), num_jobs, hms(time.time() - start_time)))
+
+
 def main(argv):
   from TFUtil import CudaEnv, NativeCodeCompiler
   CudaEnv.verbose_find_cuda = True
@@ -66,6 +122,10 @@ def main(argv):
   argparser = argparse.ArgumentParser(description='Compile some op')
   argparser.add_argument('--config', help="filename to config-file")
   argparser.add_argument('--native_op', help="op name. e.g. 'LstmGenericBase'")
+  argparser.add_argument('--all', action='store_true', help="compile all native ops and TFKenLM")
+  argparser.add_argument('--jobs', type=int, default=Util.get_number_available_cpus() or 1,
+                         help="number of parallel compile jobs for --all")
+  argparser.add_argument('--cache_dir', help="native code cache base dir (config native_code_cache_dir)")
   argparser.add_argument('--blas_lib', default=None,
                          help="specify which blas lib to use (path to .so or file name to search for)")
   argparser.add_argument('--search_for_numpy_blas', dest='search_for_numpy_blas', action='store_true',
@@ -76,6 +136,9 @@ def main(argv):
   argparser.add_argument("--output_file", help='if given, will write the list of libs to this file')
   args = argparser.parse_args(argv[1:])
   init(config_filename=args.config, log_verbosity=args.verbosity)
+  if args.cache_dir:
+    NativeCodeCompiler.CacheBaseDir = args.cache_dir
+  print("Native code cache base dir:", NativeCodeCompiler.get_cache_base_dir())
 
   import NativeOp
   from TFNativeOp import make_op, OpMaker
@@ -83,6 +146,10 @@ def main(argv):
     print("Loading native op %r" % args.native_op)
     make_op(getattr(NativeOp, args.native_op), compiler_opts={"verbose": True},
             search_for_numpy_blas=args.search_for_numpy_blas, blas_lib=args.blas_lib)
+  if args.all:
+    compile_all(
+      get_all_compilers(search_for_numpy_blas=args.search_for_numpy_blas, blas_lib=args.blas_lib),
+      num_jobs=args.jobs)
 
   libs = []
   if OpMaker.with_cuda and OpMaker.tf_blas_gemm_workaround:
@@ -101,7 +168,7 @@ def main(argv):
     for fn in libs:
       print(fn)
   else:
-    print("no libs compiled. use --native_op or --config")
+    print("no libs compiled. use --native_op, --all or --config")
 
   if args.output_file:
     with open(args.output_file, "w") as f:
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""
+Converts a learning rate file (``learning_rate_file``) between the formats
+supported by :class:`LearningRateControl.LearningRateControl`:
+the Python repr format (newbob file), which is rewritten completely on every save,
+and the append-only ``.jsonl`` format (one JSON record per line and epoch).
+The format is determined by the file extension.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+from LearningRateControl import LearningRateControl
+from Log import log
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("input", help="existing learning rate file")
+  argparser.add_argument("output", help="new learning rate file. use the extension .jsonl for the JSON format")
+  args = argparser.parse_args(argv[1:])
+  log.initialize(verbosity=[3])
+  assert os.path.exists(args.input), "Input file %r does not exist." % args.input
+  assert not os.path.exists(args.output), "Already existing output file %r." % args.output
+  control = LearningRateControl(defaultLearningRate=0.0, filename=args.input)
+  print("Loaded %i epochs from %r." % (len(control.epochData), args.input))
+  control.filename = args.output
+  control.save()
+  print("Saved to %r." % args.output)
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
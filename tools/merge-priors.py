@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""
+Merges partial prior sums, as written via ``task = "compute_priors"`` with ``prior_partial_file``
+(e.g. of multiple shards, via ``prior_num_shards`` and ``prior_shard_idx``),
+see :class:`Util.PriorAccumulator`, and writes the prior in +log space,
+in the same format as ``compute_priors`` (``output_file``).
+Does not need TF.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+import numpy
+from Util import PriorAccumulator
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("partial_files", nargs="+", help="partial prior sums (npz), via prior_partial_file")
+  argparser.add_argument("--out", required=True, help="prior in +log space, text format")
+  args = argparser.parse_args(argv[1:])
+
+  assert not os.path.exists(args.out), "Already existing output file %r." % args.out
+  accumulator = None
+  for filename in args.partial_files:
+    partial = PriorAccumulator.load(filename)
+    print("%s: %r" % (filename, partial))
+    if accumulator is None:
+      accumulator = partial
+    else:
+      accumulator.merge(partial)
+  print("Merged: %r" % accumulator)
+  log_prior = accumulator.get_log_prior()
+  avg_sum = numpy.sum(numpy.exp(log_prior))
+  assert numpy.isfinite(avg_sum)
+  print("Prior sum in std-space (should be close to 1.0):", avg_sum)
+  with open(args.out, "w") as f:
+    numpy.savetxt(f, log_prior, delimiter=' ')
+  print("Saved prior in %r in +log space." % args.out)
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
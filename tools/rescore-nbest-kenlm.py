@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""
+Rescores N-best lists, as dumped via search (``search_output_file_format = "py"``),
+with a KenLM n-gram LM, via the TFKenLM op.
+The LM score is log-linearly combined with the search score.
+
+For each utterance, all hyps are scored in one op call, where common word prefixes are only scored once
+(see :func:`TFKenLM.ken_lm_abs_score_strings_prefix_cached`).
+Multiple utterances are scored in parallel session runs.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+from Util import hms, betterRepr
+import Util
+
+
+class KenLmScoreGraph:
+  def __init__(self, lm_filename):
+    """
+    :param str lm_filename: ARPA or KenLM binary file
+    """
+    import tensorflow as tf
+    import TFKenLM
+    self.lm = TFKenLM.ken_lm_load(filename=lm_filename)
+    self.strings = tf.placeholder(tf.string, [None], name="strings")
+    self.scores = TFKenLM.ken_lm_abs_score_strings_prefix_cached(handle=self.lm, strings=self.strings)
+
+  def score(self, session, strings):
+    """
+    :param tf.Session session:
+    :param list[str] strings:
+    :return: LM scores in +log space (natural log)
+    :rtype: numpy.ndarray
+    """
+    return session.run(self.scores, feed_dict={self.strings: strings})
+
+
+def load_nbest(filename):
+  """
+  :param str filename: search output in py format
+  :return: seq tag -> list of (score, hyp)
+  :rtype: dict[str,list[(float,str)]]
+  """
+  content = eval(open(filename).read())
+  assert isinstance(content, dict)
+  assert len(content) > 0
+  example_seq_tag, example_nbest = next(iter(content.items()))
+  assert isinstance(example_seq_tag, str)
+  assert isinstance(example_nbest, list), "expected N-best list, got %r. search with beam output?" % (example_nbest,)
+  return content
+
+
+def prepare_lm_text(hyp, bpe_merge_symbol=None, add_eos=True):
+  """
+  :param str hyp:
+  :param str|None bpe_merge_symbol: e.g. "@@"
+  :param bool add_eos:
+  :rtype: str
+  """
+  if bpe_merge_symbol:
+    hyp = (hyp + " ").replace(bpe_merge_symbol + " ", "")
+  hyp = " ".join(hyp.split())
+  if add_eos:
+    hyp += " </s>"
+  return hyp
+
+
+def rescore_nbest(nbest, score_func, lm_scale, am_scale=1.0, bpe_merge_symbol=None, add_eos=True, num_threads=1):
+  """
+  :param dict[str,list[(float,str)]] nbest: seq tag -> list of (score, hyp)
+  :param (list[str])->numpy.ndarray score_func: LM scores for a list of LM texts
+  :param float lm_scale:
+  :param float am_scale: for the search score
+  :param str|None bpe_merge_symbol:
+  :param bool add_eos:
+  :param int num_threads: utterances which are scored in parallel
+  :return: seq tag -> list of (combined score, hyp), sorted, best first
+  :rtype: dict[str,list[(float,str)]]
+  """
+  def rescore_utterance(seq_tag):
+    hyps = nbest[seq_tag]
+    lm_scores = score_func([prepare_lm_text(hyp, bpe_merge_symbol=bpe_merge_symbol, add_eos=add_eos)
+                            for (score, hyp) in hyps])
+    assert len(lm_scores) == len(hyps)
+    res = [(am_scale * float(score) + lm_scale * float(lm_score), hyp)
+           for ((score, hyp), lm_score) in zip(hyps, lm_scores)]
+    return seq_tag, sorted(res, key=lambda x: -x[0])
+
+  seq_tags = sorted(nbest.keys())
+  if num_threads <= 1:
+    return dict(map(rescore_utterance, seq_tags))
+  from multiprocessing.pool import ThreadPool
+  pool = ThreadPool(processes=num_threads)
+  try:
+    return dict(pool.map(rescore_utterance, seq_tags))
+  finally:
+    pool.close()
+    pool.join()
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("--nbest", required=True, help="N-best lists, dumped via search in py format")
+  argparser.add_argument("--lm", required=True, help="KenLM LM file (ARPA or binary)")
+  argparser.add_argument("--lm_scale", type=float, default=0.3, help="weight of the LM score (default: 0.3)")
+  argparser.add_argument("--am_scale", type=float, default=1.0, help="weight of the search score (default: 1.0)")
+  argparser.add_argument("--bpe_merge_symbol", help="e.g. '@@'. if given, merges BPE units to words for the LM")
+  argparser.add_argument("--no_eos", action="store_true", help="do not add '</s>' for the LM")
+  argparser.add_argument("--num_threads", type=int, default=Util.get_number_available_cpus() or 1,
+                         help="utterances scored in parallel")
+  argparser.add_argument("--out", required=True, help="rescored N-best lists, in the same py format")
+  argparser.add_argument("--out_best", help="if given, writes the best hyp per seq tag (py format, for WER calc)")
+  args = argparser.parse_args(argv[1:])
+
+  import tensorflow as tf
+  nbest = load_nbest(args.nbest)
+  print("Loaded N-best lists for %i seqs." % len(nbest))
+  graph = KenLmScoreGraph(lm_filename=args.lm)
+  session_config = tf.ConfigProto(inter_op_parallelism_threads=args.num_threads)
+  with tf.Session(config=session_config) as session:
+    start_time = time.time()
+    rescored = rescore_nbest(
+      nbest, score_func=lambda strings: graph.score(session, strings),
+      lm_scale=args.lm_scale, am_scale=args.am_scale,
+      bpe_merge_symbol=args.bpe_merge_symbol, add_eos=not args.no_eos, num_threads=args.num_threads)
+    print("Rescored %i hyps in %s." % (sum([len(v) for v in nbest.values()]), hms(time.time() - start_time)))
+  num_changed = len([seq_tag for seq_tag in nbest if rescored[seq_tag][0][1] != max(nbest[seq_tag])[1]])
+  print("Best hyp changed for %i of %i seqs." % (num_changed, len(nbest)))
+
+  with open(args.out, "w") as f:
+    f.write("{\n")
+    for seq_tag in sorted(rescored.keys()):
+      f.write("%r: %s,\n" % (seq_tag, betterRepr(rescored[seq_tag])))
+    f.write("}\n")
+  print("Wrote:", args.out)
+  if args.out_best:
+    with open(args.out_best, "w") as f:
+      f.write("{\n")
+      for seq_tag in sorted(rescored.keys()):
+        f.write("%r: %r,\n" % (seq_tag, rescored[seq_tag][0][1]))
+      f.write("}\n")
+    print("Wrote:", args.out_best)
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""
+Scores hypotheses against references (WER, CER, BLEU), see :mod:`Scoring`.
+Does not need TF. The files are read in a streaming way,
+and the statistics are computed in parallel over a process pool.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import argparse
+from Util import hms
+import Util
+import Scoring
+
+
+def main(argv):
+  argparser = argparse.ArgumentParser(description=__doc__)
+  argparser.add_argument("--hyps", required=True, help="hypotheses, dumped via search in py format, or plain text")
+  argparser.add_argument("--refs", required=True, help="same format as hyps, e.g. via dump-dataset-raw-strings.py")
+  argparser.add_argument("--metrics", default="wer", help="comma-separated, from %s (default: wer)" % (
+    ",".join(sorted(Scoring.Metrics.keys())),))
+  argparser.add_argument("--num_workers", type=int, default=Util.get_number_available_cpus() or 1,
+                         help="number of processes. 0: compute in the main process")
+  argparser.add_argument("--chunk_size", type=int, default=100, help="seqs per job (default: 100)")
+  argparser.add_argument("--allow_missing_hyps", action="store_true", help="use empty hyp for missing seqs")
+  argparser.add_argument("--bootstrap_samples", type=int, default=1000,
+                         help="for the confidence interval. 0 to disable (default: 1000)")
+  argparser.add_argument("--confidence", type=float, default=0.95, help="(default: 0.95)")
+  argparser.add_argument("--per_utterance_out", help="if given, writes per-seq scores (py format)")
+  argparser.add_argument("--out", help="if given, writes the corpus score of the first metric in % to this file")
+  args = argparser.parse_args(argv[1:])
+
+  start_time = time.time()
+  scorer = Scoring.Scorer(
+    metrics=args.metrics.split(","), num_workers=args.num_workers, chunk_size=args.chunk_size)
+  scorer.add_pairs(Scoring.iter_hyp_ref_pairs(
+    hyps=Scoring.iter_text_file(args.hyps), refs=Scoring.iter_text_file(args.refs),
+    missing_hyp="" if args.allow_missing_hyps else None))
+  print("Scored %i seqs in %s." % (scorer.get_num_seqs(), hms(time.time() - start_time)))
+  scorer.print_report(num_bootstrap_samples=args.bootstrap_samples, confidence=args.confidence)
+
+  if args.per_utterance_out:
+    scores = {name: scorer.get_utterance_scores(name) for name in scorer.metric_names}
+    with open(args.per_utterance_out, "w") as f:
+      f.write("{\n")
+      for seq_tag in scorer.seq_tags:
+        f.write("%r: {%s},\n" % (seq_tag, ", ".join(["%r: %f" % (name, scores[name][seq_tag])
+                                                     for name in scorer.metric_names])))
+      f.write("}\n")
+    print("Wrote:", args.per_utterance_out)
+  if args.out:
+    with open(args.out, "w") as f:
+      f.write("%.02f\n" % (scorer.get_corpus_score(scorer.metric_names[0]) * 100))
+    print("Wrote:", args.out)
+
+
+if __name__ == '__main__':
+  import better_exchook
+  better_exchook.install()
+  main(sys.argv)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Averages the variables of multiple TF checkpoints, e.g. of the last N epochs,
+and writes the result as a normal RETURNN checkpoint.
+
+This works in a streaming way (one variable at a time), so it also works for big models with little memory.
+
+Examples:
+
+  tf_average_checkpoints.py --checkpoints net-model/network.078 net-model/network.079 --output net-model/avg
+  tf_average_checkpoints.py --config returnn.config --last 5 --ema_decay 0.5
+
+With --config, the network of the config is used to resolve the variable names
+(see CustomCheckpointLoader, e.g. for LSTM conversions),
+and the output can be loaded directly into this network.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+sys.path.insert(0, returnn_dir)
+
+import better_exchook
+better_exchook.install()
+
+from Log import log
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument("--checkpoints", nargs="+", help="checkpoint filenames (prefix), from old to new")
+  arg_parser.add_argument("--config", help="RETURNN config. then use --epochs or --last")
+  arg_parser.add_argument("--epochs", type=int, nargs="+", help="with --config, epochs to average")
+  arg_parser.add_argument("--last", type=int, help="with --config, average the last N existing epochs")
+  arg_parser.add_argument("--weights", type=float, nargs="+", help="one weight per checkpoint. uniform by default")
+  arg_parser.add_argument("--ema_decay", type=float, help="exponential moving average instead of weights")
+  arg_parser.add_argument("--output", help="output checkpoint filename (prefix)")
+  arg_parser.add_argument("--cwd", help="will change to this dir")
+  args = arg_parser.parse_args()
+  if args.cwd:
+    os.chdir(args.cwd)
+
+  if args.checkpoints:
+    assert not args.config, "use either --checkpoints or --config"
+    assert args.output, "need --output"
+    log.initialize(verbosity=[4])
+    from TFNetwork import average_checkpoints
+    average_checkpoints(
+      filenames=args.checkpoints, output_filename=args.output, weights=args.weights, ema_decay=args.ema_decay)
+    output_filename = args.output
+
+  else:
+    assert args.config, "need --checkpoints or --config"
+    import rnn
+    rnn.init(
+      extra_greeting="Average models.",
+      configFilename=args.config,
+      config_updates={
+        "use_tensorflow": True,
+        "need_data": False,
+        "device": "cpu"})
+    from rnn import engine, config
+    existing_models = engine.get_existing_models(config)
+    if args.epochs:
+      assert not args.last, "use either --epochs or --last"
+      epochs = args.epochs
+    else:
+      assert args.last, "need --epochs or --last"
+      epochs = sorted(existing_models.keys())[-args.last:]
+    engine.init_network_from_config(config)
+    output_filename = engine.average_models(
+      epochs=epochs, output_filename=args.output, weights=args.weights, ema_decay=args.ema_decay)
+    rnn.finalize()
+
+  print("Wrote averaged checkpoint:", output_filename)
+
+
+if __name__ == "__main__":
+  main()